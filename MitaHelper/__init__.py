@@ -10,8 +10,10 @@ import logging
 import os
 import sys
 import time
+from queue import Queue
 
 import telegram.ext as tg
+from telegram.utils.request import Request
 
 # Время запуска бота
 StartTime = time.time()
@@ -51,15 +53,44 @@ OWNER_ID = Config.OWNER_ID
 # База данных
 DATABASE_URL = Config.DATABASE_URL
 MONGO_DB_URI = Config.MONGO_DB_URI
+DB_FLUSH_INTERVAL = getattr(Config, 'DB_FLUSH_INTERVAL', 2)
 
 # Дополнительные настройки
 SUPPORT_CHAT = getattr(Config, 'SUPPORT_CHAT', None)
 EVENT_LOGS = getattr(Config, 'EVENT_LOGS', None)
 START_IMG = getattr(Config, 'START_IMG', None)
 
+# CAS Anti-Spam
+CAS_API_URL = getattr(Config, 'CAS_API_URL', 'https://api.cas.chat/check?user_id=')
+CAS_EXPORT_PATH = getattr(Config, 'CAS_EXPORT_PATH', '')
+
+# Варны
+WARN_EXPIRE_DAYS = getattr(Config, 'WARN_EXPIRE_DAYS', 30)
+
 # Количество воркеров
 WORKERS = getattr(Config, 'WORKERS', 8)
 
+# Адрес Bot API (по умолчанию - официальный)
+BOT_API_URL = getattr(Config, 'BOT_API_URL', 'https://api.telegram.org/bot')
+
+# Лимиты исходящих запросов к Telegram API
+OUTBOUND_GLOBAL_RATE = getattr(Config, 'OUTBOUND_GLOBAL_RATE', 30)
+OUTBOUND_GROUP_RATE = getattr(Config, 'OUTBOUND_GROUP_RATE', 20)
+
+# Вебхук
+WEBHOOK = getattr(Config, 'WEBHOOK', False)
+WEBHOOK_URL = getattr(Config, 'WEBHOOK_URL', '')
+WEBHOOK_LISTEN = getattr(Config, 'WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = getattr(Config, 'WEBHOOK_PORT', 8443)
+WEBHOOK_PATH = getattr(Config, 'WEBHOOK_PATH', 'webhook')
+WEBHOOK_SECRET = getattr(Config, 'WEBHOOK_SECRET', '')
+WEBHOOK_CERT = getattr(Config, 'WEBHOOK_CERT', '')
+WEBHOOK_KEY = getattr(Config, 'WEBHOOK_KEY', '')
+
+# Метрики
+METRICS_PORT = getattr(Config, 'METRICS_PORT', 0)
+METRICS_LISTEN = getattr(Config, 'METRICS_LISTEN', '127.0.0.1')
+
 # Пользователи с привилегиями
 OWNER_ID = Config.OWNER_ID
 
@@ -95,12 +126,42 @@ DEV_USERS.add(OWNER_ID)
 LOAD = getattr(Config, 'LOAD', [])
 NO_LOAD = getattr(Config, 'NO_LOAD', [])
 
+# Процессы для капч-картинок форкаются здесь, до создания бота и загрузки
+# модулей: потоков ещё нет, и ни одна блокировка не останется в дочернем
+# процессе занятой (см. helper_funcs/captcha_images.py)
+from MitaHelper.modules.helper_funcs.captcha_images import IMAGE_POOL
+
+IMAGE_POOL.start()
+
 # Инициализация бота
 LOGGER.info("Инициализация Telegram бота...")
 
-# PTB Updater
-updater = tg.Updater(TOKEN, workers=WORKERS, use_context=True)
-dispatcher = updater.dispatcher
+# Бот с планировщиком запросов (лимиты Telegram и приоритеты)
+from MitaHelper.modules.helper_funcs.outbound import BULK_WORKERS, OutboundBot, OutboundScheduler
+
+bot = OutboundBot(
+    TOKEN,
+    base_url=BOT_API_URL,
+    # Запросы к API идут из воркеров, BULK_WORKERS потоков массовых запросов,
+    # потоков логов, таймеров, капч, планировщика, очереди задач и getUpdates.
+    # Пул меньше числа таких потоков - под рейдом urllib3 выбрасывает
+    # соединения ("Connection pool is full"), поэтому +8 на служебные потоки
+    request=Request(con_pool_size=WORKERS + BULK_WORKERS + 8),
+    scheduler=OutboundScheduler(
+        global_rate=OUTBOUND_GLOBAL_RATE,
+        group_rate=OUTBOUND_GROUP_RATE,
+    ),
+)
+
+# Диспетчер с очередями по чатам: задачи одного чата выполняются по порядку,
+# разные чаты - параллельно (см. helper_funcs/executor.py)
+from MitaHelper.modules.helper_funcs.executor import ChatDispatcher
+
+dispatcher = ChatDispatcher(bot, Queue(), workers=WORKERS, job_queue=tg.JobQueue(), use_context=True)
+dispatcher.job_queue.set_dispatcher(dispatcher)
+
+# PTB Updater (воркеры уже у диспетчера)
+updater = tg.Updater(dispatcher=dispatcher, workers=None)
 
 # Получаем информацию о боте
 LOGGER.info("Получение информации о боте...")
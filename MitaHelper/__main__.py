@@ -7,6 +7,7 @@ import html
 import importlib
 import json
 import re
+import sys
 import time
 import traceback
 from platform import python_version
@@ -35,10 +36,20 @@ from MitaHelper import (
     BOT_NAME,
     BOT_USERNAME,
     LOGGER,
+    METRICS_LISTEN,
+    METRICS_PORT,
     OWNER_ID,
     START_IMG,
     SUPPORT_CHAT,
     TOKEN,
+    WEBHOOK,
+    WEBHOOK_CERT,
+    WEBHOOK_KEY,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
     StartTime,
     dispatcher,
     updater,
@@ -46,8 +57,14 @@ from MitaHelper import (
     DEV_USERS,
 )
 from MitaHelper.modules import ALL_MODULES
+from MitaHelper.modules.database import shutdown_database
 from MitaHelper.modules.helper_funcs.chat_status import is_user_admin
+from MitaHelper.modules.helper_funcs.metrics import instrument_dispatcher, start_metrics_server
 from MitaHelper.modules.helper_funcs.misc import paginate_modules
+from MitaHelper.modules.helper_funcs.timers import start_timers, stop_timers
+from MitaHelper.modules.captcha import start_captcha_sweeper, stop_captcha_sweeper
+from MitaHelper.modules.helper_funcs.webhook import collect_allowed_updates, start_webhook
+from MitaHelper.modules.logs import flush_logs
 
 
 def get_readable_time(seconds: int) -> str:
@@ -748,13 +765,60 @@ def main():
     # Обработчик ошибок
     dispatcher.add_error_handler(error_handler)
 
-    LOGGER.info("Запуск polling...")
-    updater.start_polling(timeout=15, read_latency=4, drop_pending_updates=True)
+    # Метрики: все обработчики уже зарегистрированы - оборачиваем
+    instrument_dispatcher(dispatcher)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_LISTEN, METRICS_PORT)
+
+    # Только те типы обновлений, которые кто-то обрабатывает
+    # (chat_member по умолчанию не приходит - он нужен для кеша админов)
+    allowed_updates = collect_allowed_updates(dispatcher)
+    LOGGER.info(f"Типы обновлений: {', '.join(allowed_updates)}")
+
+    if WEBHOOK:
+        LOGGER.info("Запуск вебхука...")
+        try:
+            start_webhook(
+                updater,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                webhook_url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                cert=WEBHOOK_CERT,
+                key=WEBHOOK_KEY,
+                allowed_updates=allowed_updates,
+                drop_pending_updates=True,
+            )
+        except ValueError as e:
+            # Вебхук без секрета на внешнем интерфейсе - ничего ещё не запущено
+            LOGGER.error(f"{e}. Бот остановлен.")
+            shutdown_database()
+            sys.exit(1)
+    else:
+        LOGGER.info("Запуск polling...")
+        updater.start_polling(
+            timeout=15,
+            read_latency=4,
+            drop_pending_updates=True,
+            allowed_updates=allowed_updates,
+        )
+
+    # Таймеры (в том числе просроченные, пока бот был выключен)
+    start_timers(dispatcher)
+    # Таймауты капч (снимаются пачками одним потоком)
+    start_captcha_sweeper()
 
     LOGGER.info(f"{BOT_NAME} успешно запущен!")
     
     updater.idle()
 
+    # Останавливаем таймеры, досылаем логи и дописываем на диск отложенные изменения БД
+    stop_timers()
+    stop_captcha_sweeper()
+    flush_logs()
+    shutdown_database()
+
 
 if __name__ == "__main__":
     LOGGER.info(f"Загружены модули: {ALL_MODULES}")
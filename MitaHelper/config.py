@@ -28,8 +28,8 @@ class Config:
     # ID владельца бота (ваш Telegram ID)
     OWNER_ID = int(os.environ.get("OWNER_ID", 0))
     
-    # URL базы данных PostgreSQL
-    # Получить бесплатно: https://elephantsql.com или https://railway.app
+    # URL базы данных. sqlite:///путь/к/bot.db - хранить данные в SQLite,
+    # пусто - в JSON файлах MitaHelper/data/
     DATABASE_URL = os.environ.get("DATABASE_URL", "")
     
     # URI MongoDB
@@ -55,6 +55,9 @@ class Config:
     # Количество воркеров (потоков)
     WORKERS = int(os.environ.get("WORKERS", 8))
     
+    # Интервал фоновой записи JSON-базы на диск (секунды)
+    DB_FLUSH_INTERVAL = float(os.environ.get("DB_FLUSH_INTERVAL", 2))
+    
     # ═══════════════════════════════════════════════════════════════
     #                  ПРИВИЛЕГИРОВАННЫЕ ПОЛЬЗОВАТЕЛИ
     # ═══════════════════════════════════════════════════════════════
@@ -99,3 +102,35 @@ class Config:
     
     # Показывать фото профиля в /info
     INFOPIC = bool(os.environ.get("INFOPIC", True))
+    
+    # CAS Anti-Spam: адрес API (можно подменить, например, на локальный сервер)
+    CAS_API_URL = os.environ.get("CAS_API_URL", "https://api.cas.chat/check?user_id=")
+    
+    # Путь к выгрузке CAS (https://api.cas.chat/export.csv) для офлайн-проверки
+    CAS_EXPORT_PATH = os.environ.get("CAS_EXPORT_PATH", "")
+    
+    # Через сколько дней варн сгорает (0 - варны не сгорают)
+    WARN_EXPIRE_DAYS = int(os.environ.get("WARN_EXPIRE_DAYS", 30))
+    
+    # Адрес Bot API (свой telegram-bot-api сервер или тестовый стенд)
+    BOT_API_URL = os.environ.get("BOT_API_URL", "https://api.telegram.org/bot")
+    
+    # Лимиты отправки: сообщений в секунду всего и в минуту в одну группу
+    OUTBOUND_GLOBAL_RATE = float(os.environ.get("OUTBOUND_GLOBAL_RATE", 30))
+    OUTBOUND_GROUP_RATE = float(os.environ.get("OUTBOUND_GROUP_RATE", 20))
+    
+    # Вебхук вместо polling
+    WEBHOOK = os.environ.get("WEBHOOK", "").lower() in ("1", "true", "yes")
+    # Публичный адрес вебхука (https://example.com/webhook); пусто - не регистрировать
+    WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+    WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "webhook")
+    WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+    # Свой TLS-сертификат; без него TLS делает обратный прокси
+    WEBHOOK_CERT = os.environ.get("WEBHOOK_CERT", "")
+    WEBHOOK_KEY = os.environ.get("WEBHOOK_KEY", "")
+    
+    # Метрики в формате Prometheus: http://METRICS_LISTEN:METRICS_PORT/metrics (0 - выключено)
+    METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+    METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
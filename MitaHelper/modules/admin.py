@@ -7,7 +7,7 @@ import html
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ParseMode, Update
 from telegram.error import BadRequest
-from telegram.ext import CallbackContext, CommandHandler
+from telegram.ext import CallbackContext, ChatMemberHandler, CommandHandler
 from telegram.utils.helpers import mention_html
 
 from MitaHelper import SUDO_USERS, dispatcher
@@ -16,6 +16,8 @@ from MitaHelper.modules.helper_funcs.chat_status import (
     can_pin,
     can_promote,
     connection_status,
+    invalidate_admin_cache,
+    update_admin_cache,
     user_admin,
 )
 from MitaHelper.modules.helper_funcs.extraction import (
@@ -179,6 +181,7 @@ def promote(update: Update, context: CallbackContext):
             can_manage_chat=True,
             can_manage_video_chats=True,
         )
+        invalidate_admin_cache(chat.id)
         msg.reply_text(
             f"✅ {mention_html(user_member.user.id, user_member.user.first_name)} "
             "повышен до администратора!",
@@ -240,6 +243,7 @@ def demote(update: Update, context: CallbackContext):
             can_manage_chat=False,
             can_manage_video_chats=False,
         )
+        invalidate_admin_cache(chat.id)
         msg.reply_text(
             f"✅ {mention_html(user_member.user.id, user_member.user.first_name)} "
             "понижен!",
@@ -394,6 +398,13 @@ def adminlist(update: Update, context: CallbackContext):
     msg.reply_text(text, parse_mode=ParseMode.HTML)
 
 
+def track_admin_changes(update: Update, context: CallbackContext):
+    """Обновляет кеш админов при смене статуса участника (и самого бота)"""
+    member_update = update.chat_member or update.my_chat_member
+    if member_update:
+        update_admin_cache(member_update.chat.id, member_update.new_chat_member)
+
+
 # ═══════════════════════════════════════════════════════════════
 #                      РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
 # ═══════════════════════════════════════════════════════════════
@@ -411,6 +422,7 @@ UNPIN_HANDLER = CommandHandler("unpin", unpin, run_async=True)
 UNPINALL_HANDLER = CommandHandler("unpinall", unpinall, run_async=True)
 INVITE_HANDLER = CommandHandler("invite", invite, run_async=True)
 ADMINLIST_HANDLER = CommandHandler("adminlist", adminlist, run_async=True)
+ADMIN_CACHE_HANDLER = ChatMemberHandler(track_admin_changes, ChatMemberHandler.ANY_CHAT_MEMBER)
 
 dispatcher.add_handler(SET_STICKER_HANDLER)
 dispatcher.add_handler(SET_PIC_HANDLER)
@@ -425,6 +437,8 @@ dispatcher.add_handler(UNPIN_HANDLER)
 dispatcher.add_handler(UNPINALL_HANDLER)
 dispatcher.add_handler(INVITE_HANDLER)
 dispatcher.add_handler(ADMINLIST_HANDLER)
+# Синхронно и раньше остальных групп - чтобы хендлеры видели свежий кеш
+dispatcher.add_handler(ADMIN_CACHE_HANDLER, group=-1)
 
 
 __mod_name__ = "👑 Админ"
@@ -4,36 +4,76 @@
 которые пишут от имени канала (анонимно)
 """
 
-from telegram import Update
-from telegram.ext import CallbackContext, MessageHandler, Filters
-from telegram.error import BadRequest
+from threading import Lock
+
+from cachetools import TTLCache
+from telegram import ParseMode, Update
+from telegram.ext import CallbackContext, CommandHandler, Filters
+from telegram.error import BadRequest, TelegramError
 
 from MitaHelper import dispatcher, LOGGER
-from MitaHelper.modules.database import is_antichannel_enabled
+from MitaHelper.modules.database import (
+    allow_antichannel_channel,
+    disallow_antichannel_channel,
+    get_antichannel_settings,
+    is_antichannel_enabled,
+)
+from MitaHelper.modules.helper_funcs.chat_status import user_admin
+from MitaHelper.modules.helper_funcs.pipeline import (
+    KIND_SENDER_CHAT,
+    KIND_STATUS,
+    MessageFeatures,
+    register_stage,
+)
+
+
+# Привязанный к группе канал {chat_id: linked_chat_id или 0}
+# Узнаётся через getChat один раз и хранится несколько часов
+LINKED_CHANNELS = TTLCache(maxsize=10000, ttl=6 * 60 * 60)
+# TTLCache не потокобезопасен (get удаляет просроченное), getChat - вне блокировки
+LINKED_LOCK = Lock()
 
 
-def check_channel_message(update: Update, context: CallbackContext):
-    """Проверяет и удаляет сообщения от каналов"""
+def get_linked_channel(bot, chat_id: int) -> int:
+    """ID канала, привязанного к группе (0 - нет)"""
+    with LINKED_LOCK:
+        linked = LINKED_CHANNELS.get(chat_id)
+    if linked is None:
+        try:
+            linked = bot.get_chat(chat_id).linked_chat_id or 0
+        except TelegramError as e:
+            LOGGER.warning(f"Антиканал: не удалось получить чат {chat_id}: {e}")
+            # Ошибку не кешируем - спросим при следующем сообщении
+            return 0
+        with LINKED_LOCK:
+            LINKED_CHANNELS[chat_id] = linked
+    return linked
+
+
+def is_channel_allowed(bot, chat_id: int, settings: dict, channel_id: int) -> bool:
+    """Разрешён ли канал: из списка чата или привязанный к группе"""
+    if channel_id in settings.get("allowed", ()):
+        return True
+    if settings.get("allow_linked", True):
+        return channel_id == get_linked_channel(bot, chat_id)
+    return False
+
+
+def check_channel_message(update: Update, context: CallbackContext, features: MessageFeatures):
+    """
+    Проверяет и удаляет сообщения от каналов.
+    Этап конвейера: сюда попадают только сообщения в группах от имени чужого
+    канала (не анонимного админа) и только если антиканал включён.
+    """
     msg = update.effective_message
     chat = update.effective_chat
+    settings = get_antichannel_settings(chat.id)
     
-    if not msg or not chat:
-        return
-    
-    # Только для групп/супергрупп
-    if chat.type not in ['group', 'supergroup']:
-        return
-    
-    # Проверяем, есть ли sender_chat (сообщение от имени канала)
-    if not msg.sender_chat:
-        return
-    
-    # Пропускаем если это сам чат (анонимный админ группы)
-    if msg.sender_chat.id == chat.id:
+    # Автопересылка постов привязанного канала в обсуждение
+    if msg.is_automatic_forward and settings.get("allow_linked", True):
         return
     
-    # Проверяем, включён ли антиканал для этого чата
-    if not is_antichannel_enabled(chat.id):
+    if is_channel_allowed(context.bot, chat.id, settings, msg.sender_chat.id):
         return
     
     # Удаляем сообщение от канала
@@ -43,22 +83,100 @@ def check_channel_message(update: Update, context: CallbackContext):
             f"Антиканал: удалено сообщение от канала '{msg.sender_chat.title}' "
             f"(ID: {msg.sender_chat.id}) в чате {chat.title}"
         )
+        return True
     except BadRequest as e:
         LOGGER.warning(f"Не удалось удалить сообщение от канала: {e}")
     except Exception as e:
         LOGGER.error(f"Ошибка при удалении сообщения от канала: {e}")
 
 
-# Обработчик сообщений с высоким приоритетом (group=1)
-# чтобы срабатывал раньше других обработчиков
-antichannel_handler = MessageHandler(
-    Filters.chat_type.groups & ~Filters.status_update,
+def _extract_channel_id(update: Update, context: CallbackContext):
+    """ID канала из ответа на его сообщение или из аргумента команды"""
+    msg = update.effective_message
+    reply = msg.reply_to_message
+    if reply and reply.sender_chat and reply.sender_chat.id != update.effective_chat.id:
+        return reply.sender_chat.id
+    if reply and reply.forward_from_chat:
+        return reply.forward_from_chat.id
+    if context.args:
+        try:
+            return int(context.args[0])
+        except ValueError:
+            return None
+    return None
+
+
+@user_admin
+def allow_channel(update: Update, context: CallbackContext):
+    """Разрешает каналу писать в чат"""
+    msg = update.effective_message
+    channel_id = _extract_channel_id(update, context)
+    if not channel_id:
+        msg.reply_text(
+            "❌ Ответьте на сообщение канала или укажите ID: `/allowchannel -100...`",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+        return
+    
+    if allow_antichannel_channel(update.effective_chat.id, channel_id):
+        msg.reply_text(f"✅ Канал `{channel_id}` может писать в чат.", parse_mode=ParseMode.MARKDOWN)
+    else:
+        msg.reply_text("ℹ️ Этот канал уже разрешён.")
+
+
+@user_admin
+def disallow_channel(update: Update, context: CallbackContext):
+    """Убирает канал из разрешённых"""
+    msg = update.effective_message
+    channel_id = _extract_channel_id(update, context)
+    if not channel_id:
+        msg.reply_text("❌ Ответьте на сообщение канала или укажите его ID.")
+        return
+    
+    if disallow_antichannel_channel(update.effective_chat.id, channel_id):
+        msg.reply_text(f"✅ Канал `{channel_id}` больше не разрешён.", parse_mode=ParseMode.MARKDOWN)
+    else:
+        msg.reply_text("ℹ️ Этого канала нет в списке.")
+
+
+@user_admin
+def allowed_channels(update: Update, context: CallbackContext):
+    """Показывает разрешённые каналы"""
+    chat = update.effective_chat
+    msg = update.effective_message
+    settings = get_antichannel_settings(chat.id)
+    
+    text = "📢 *Разрешённые каналы:*\n\n"
+    if settings.get("allow_linked", True):
+        linked = get_linked_channel(context.bot, chat.id)
+        text += f"• Привязанный канал: `{linked}`\n" if linked else "• Привязанный канал (нет)\n"
+    for channel_id in settings.get("allowed", []):
+        text += f"• `{channel_id}`\n"
+    if not settings.get("allowed") and not settings.get("allow_linked", True):
+        text += "_Список пуст_"
+    
+    msg.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+
+ALLOW_CHANNEL_HANDLER = CommandHandler("allowchannel", allow_channel, filters=Filters.chat_type.groups, run_async=True)
+DISALLOW_CHANNEL_HANDLER = CommandHandler("disallowchannel", disallow_channel, filters=Filters.chat_type.groups, run_async=True)
+ALLOWED_CHANNELS_HANDLER = CommandHandler("allowedchannels", allowed_channels, filters=Filters.chat_type.groups, run_async=True)
+
+dispatcher.add_handler(ALLOW_CHANNEL_HANDLER)
+dispatcher.add_handler(DISALLOW_CHANNEL_HANDLER)
+dispatcher.add_handler(ALLOWED_CHANNELS_HANDLER)
+
+
+# Первый этап конвейера: сообщение канала удаляется до остальных проверок
+register_stage(
+    "antichannel",
     check_channel_message,
-    run_async=True
+    order=10,
+    enabled=is_antichannel_enabled,
+    kinds=KIND_SENDER_CHAT,
+    exclude=KIND_STATUS,
 )
 
-dispatcher.add_handler(antichannel_handler, group=1)
-
 
 __mod_name__ = "📢 Антиканал"
 
@@ -69,12 +187,18 @@ __help__ = """
 сообщения от пользователей, которые пишут от имени канала.
 
 *Что удаляется:*
-• Сообщения от привязанных каналов
-• Сообщения от любых каналов (не являющихся связанным каналом группы)
+• Сообщения от любых каналов, кроме разрешённых
 
 *Что НЕ удаляется:*
 • Сообщения от обычных пользователей
 • Сообщения от анонимных админов группы
+• Посты и сообщения привязанного канала группы (можно отключить)
+• Сообщения от каналов из списка разрешённых
+
+*Команды (для админов):*
+• /allowchannel `<ID>` — разрешить канал (или ответом на его сообщение)
+• /disallowchannel `<ID>` — убрать канал из разрешённых
+• /allowedchannels — список разрешённых каналов
 
 *Настройка:*
 Используйте /config → выберите чат → 📢 Антиканал
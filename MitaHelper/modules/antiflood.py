@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Модуль антифлуда - наказывает за слишком частые сообщения
+"""
+
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from threading import RLock
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Tuple
+
+from telegram import ChatPermissions, Update
+from telegram.error import BadRequest
+from telegram.ext import CallbackContext, Filters, MessageHandler
+
+from MitaHelper import dispatcher, LOGGER
+from MitaHelper.modules.helper_funcs.chat_status import is_user_admin
+from MitaHelper.modules.helper_funcs.executor import enforcement
+from MitaHelper.modules.helper_funcs.misc import delete_messages
+
+# Импорт логов
+try:
+    from MitaHelper.modules.logs import log_ban, log_kick, log_mute
+except ImportError:
+    log_ban = None
+    log_kick = None
+    log_mute = None
+
+
+# Окно, в котором считаются сообщения (секунды):
+# больше limit сообщений за FLOOD_WINDOW - флуд
+FLOOD_WINDOW = 10
+# Длительность мута за флуд
+FLOOD_MUTE_TIME = timedelta(hours=1)
+# Сколько пользователей на чат держим в памяти (самые давние вытесняются)
+MAX_TRACKED_PER_CHAT = 5000
+# Через сколько секунд собирается пачка сообщений на удаление
+DELETE_DELAY = 1
+
+# {chat_id: OrderedDict{user_id: deque[(время, message_id или None)]}}
+# deque с maxlen - кольцевой буфер на limit + 1 последних сообщений
+_flood_windows: Dict[int, "OrderedDict[int, Deque[Tuple[float, int]]]"] = {}
+# {chat_id: [message_id, ...]} - сообщения, ждущие пакетного удаления
+_pending_deletes: Dict[int, List[int]] = {}
+FLOOD_LOCK = RLock()
+_last_sweep = 0.0
+
+
+def _get_antiflood_settings(chat_id: int) -> dict:
+    """Настройки антифлуда хранятся в панели управления"""
+    try:
+        from MitaHelper.modules.config_panel import get_antiflood_settings
+    except ImportError:
+        return {"enabled": False}
+    return get_antiflood_settings(chat_id)
+
+
+def _sweep(now: float):
+    """Удаляет счётчики пользователей, которые молчат дольше окна"""
+    global _last_sweep
+    _last_sweep = now
+    for chat_id in list(_flood_windows):
+        users = _flood_windows[chat_id]
+        # OrderedDict упорядочен по последнему сообщению - идём с самых давних
+        while users:
+            user_id, window = next(iter(users.items()))
+            if window and now - window[-1][0] <= FLOOD_WINDOW:
+                break
+            users.popitem(last=False)
+        if not users:
+            del _flood_windows[chat_id]
+
+
+def register_message(chat_id: int, user_id: int, message_id: int, limit: int) -> Optional[List[int]]:
+    """
+    Учитывает сообщение.
+    Если пользователь превысил limit сообщений за FLOOD_WINDOW секунд,
+    возвращает ID его сообщений в окне, иначе None.
+    """
+    now = monotonic()
+    with FLOOD_LOCK:
+        if now - _last_sweep > FLOOD_WINDOW:
+            _sweep(now)
+
+        users = _flood_windows.setdefault(chat_id, OrderedDict())
+        window = users.get(user_id)
+        if window is None or window.maxlen != limit + 1:
+            window = deque(window or (), maxlen=limit + 1)
+            users[user_id] = window
+        users.move_to_end(user_id)
+        if len(users) > MAX_TRACKED_PER_CHAT:
+            users.popitem(last=False)
+
+        window.append((now, message_id))
+        if len(window) <= limit or now - window[0][0] > FLOOD_WINDOW:
+            return None
+        # Уже отправленные на удаление помечены None
+        flood_ids = [msg_id for _, msg_id in window if msg_id is not None]
+        for i, (ts, _) in enumerate(window):
+            window[i] = (ts, None)
+        return flood_ids
+
+
+def reset_user(chat_id: int, user_id: int):
+    """Сбрасывает счётчик пользователя (после наказания)"""
+    with FLOOD_LOCK:
+        users = _flood_windows.get(chat_id)
+        if users:
+            users.pop(user_id, None)
+
+
+def _flush_deletes(context: CallbackContext):
+    """Удаляет накопившиеся сообщения чата одной пачкой"""
+    chat_id = context.job.context
+    with FLOOD_LOCK:
+        message_ids = _pending_deletes.pop(chat_id, [])
+    if message_ids:
+        delete_messages(context.bot, chat_id, message_ids)
+
+
+def _queue_deletes(context: CallbackContext, chat_id: int, message_ids: List[int]):
+    """Ставит сообщения в очередь на удаление"""
+    with FLOOD_LOCK:
+        pending = _pending_deletes.get(chat_id)
+        if pending is None:
+            _pending_deletes[chat_id] = list(message_ids)
+            context.job_queue.run_once(_flush_deletes, DELETE_DELAY, context=chat_id)
+        else:
+            pending.extend(message_ids)
+
+
+@enforcement
+def check_flood(update: Update, context: CallbackContext):
+    """Проверяет сообщение на флуд"""
+    msg = update.effective_message
+    chat = update.effective_chat
+    user = update.effective_user
+
+    if not msg or not user or user.is_bot:
+        return
+
+    settings = _get_antiflood_settings(chat.id)
+    if not settings.get("enabled", False):
+        return
+
+    limit = settings.get("limit", 5)
+    flood_ids = register_message(chat.id, user.id, msg.message_id, limit)
+    if not flood_ids:
+        return
+
+    # Админов не трогаем (проверка только при срабатывании, а не на каждом сообщении)
+    if is_user_admin(chat, user.id):
+        reset_user(chat.id, user.id)
+        return
+
+    action = settings.get("action", "mute")
+    _queue_deletes(context, chat.id, flood_ids)
+
+    # Только удаление: счётчик не сбрасываем, лишние сообщения удаляются дальше
+    if action == "delete":
+        return
+
+    reset_user(chat.id, user.id)
+    reason = f"Флуд: больше {limit} сообщений за {FLOOD_WINDOW} сек"
+
+    try:
+        if action == "ban":
+            context.bot.ban_chat_member(chat.id, user.id)
+            action_text = "забанен"
+            if log_ban:
+                log_ban(context.bot, chat, None, user, reason)
+        elif action == "kick":
+            context.bot.ban_chat_member(chat.id, user.id)
+            context.bot.unban_chat_member(chat.id, user.id)
+            action_text = "кикнут"
+            if log_kick:
+                log_kick(context.bot, chat, None, user, reason)
+        else:
+            context.bot.restrict_chat_member(
+                chat.id,
+                user.id,
+                permissions=ChatPermissions(can_send_messages=False),
+                until_date=datetime.utcnow() + FLOOD_MUTE_TIME,
+            )
+            action_text = "замучен на 1 час"
+            if log_mute:
+                log_mute(context.bot, chat, None, user, "1 час", reason)
+    except BadRequest as e:
+        LOGGER.warning(f"Антифлуд: не удалось наказать {user.id} в {chat.id}: {e}")
+        return
+
+    try:
+        context.bot.send_message(chat.id, f"🛡 {user.first_name} {action_text} за флуд!")
+    except BadRequest:
+        pass
+
+
+# Раньше остальных обработчиков сообщений (отдельная группа,
+# чтобы не конкурировать с хендлерами group=1)
+ANTIFLOOD_HANDLER = MessageHandler(
+    Filters.chat_type.groups & Filters.update.message & ~Filters.status_update,
+    check_flood,
+    run_async=True,
+)
+
+dispatcher.add_handler(ANTIFLOOD_HANDLER, group=-2)
+
+
+__mod_name__ = "🌊 Антифлуд"
+
+__help__ = """
+*Антифлуд:*
+
+Если пользователь отправляет больше N сообщений за 10 секунд,
+бот удаляет эти сообщения и применяет наказание.
+
+*Действия:*
+• 🔇 Мут — на 1 час
+• 👢 Кик — выгнать из чата
+• 🔨 Бан — навсегда забанить
+• 🗑 Удалить — только удалять лишние сообщения
+
+Админов антифлуд не трогает.
+
+*Настройка:*
+/config → Выберите чат → 🛡 Антифлуд
+"""
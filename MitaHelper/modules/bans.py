@@ -26,6 +26,7 @@ from MitaHelper.modules.helper_funcs.extraction import (
     extract_user_for_moderation,
     extract_user_and_text_for_moderation,
 )
+from MitaHelper.modules.helper_funcs.timers import delete_message_later
 
 # Импорт логов
 try:
@@ -57,18 +58,6 @@ def try_delete_command(msg, user_id):
             pass
 
 
-def delete_punishment_message(context: CallbackContext):
-    """Удаляет сообщение о наказании по таймеру"""
-    job = context.job
-    try:
-        context.bot.delete_message(
-            chat_id=job.context["chat_id"],
-            message_id=job.context["message_id"]
-        )
-    except:
-        pass
-
-
 def get_undo_keyboard(action: str, user_id: int, chat_id: int) -> InlineKeyboardMarkup:
     """Создает клавиатуру с кнопкой отмены наказания"""
     return InlineKeyboardMarkup([
@@ -81,12 +70,7 @@ def get_undo_keyboard(action: str, user_id: int, chat_id: int) -> InlineKeyboard
 
 def schedule_message_deletion(context: CallbackContext, chat_id: int, message_id: int):
     """Планирует удаление сообщения через заданное время"""
-    context.job_queue.run_once(
-        delete_punishment_message,
-        PUNISHMENT_MSG_DELETE_TIME,
-        context={"chat_id": chat_id, "message_id": message_id},
-        name=f"delete_punishment_{chat_id}_{message_id}"
-    )
+    delete_message_later(chat_id, message_id, PUNISHMENT_MSG_DELETE_TIME)
 
 
 def parse_time(time_val: str) -> timedelta:
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Модуль чёрного списка - удаляет сообщения с запрещёнными словами
+"""
+
+from datetime import datetime, timedelta
+from threading import RLock
+from typing import Dict
+
+from telegram import ChatPermissions, ParseMode, Update
+from telegram.error import BadRequest
+from telegram.ext import CallbackContext, CommandHandler, Filters, MessageHandler
+
+from MitaHelper import dispatcher, LOGGER
+from MitaHelper.modules.helper_funcs.chat_status import is_user_admin, user_admin
+from MitaHelper.modules.helper_funcs.executor import enforcement
+from MitaHelper.modules.helper_funcs.keyword_matcher import TokenMatcher
+
+# Импорт логов
+try:
+    from MitaHelper.modules.logs import log_ban, log_kick, log_mute
+except ImportError:
+    log_ban = None
+    log_kick = None
+    log_mute = None
+
+
+# Длительность мута за запрещённое слово
+BLACKLIST_MUTE_TIME = timedelta(hours=1)
+
+# Скомпилированные списки {chat_id: TokenMatcher}
+# Пересобираются только после изменения настроек чёрного списка чата
+_matchers: Dict[int, TokenMatcher] = {}
+MATCHERS_LOCK = RLock()
+
+
+def _get_blacklist_settings(chat_id: int) -> dict:
+    """Настройки чёрного списка хранятся в панели управления"""
+    try:
+        from MitaHelper.modules.config_panel import get_blacklist_settings
+    except ImportError:
+        return {"enabled": False, "words": [], "action": "delete"}
+    return get_blacklist_settings(chat_id)
+
+
+def _set_blacklist_settings(chat_id: int, settings: dict):
+    from MitaHelper.modules.config_panel import set_blacklist_settings
+    set_blacklist_settings(chat_id, settings)
+
+
+def invalidate_blacklist_matcher(chat_id: int):
+    """Сбрасывает скомпилированный список чата после изменения настроек"""
+    with MATCHERS_LOCK:
+        _matchers.pop(chat_id, None)
+
+
+def _get_blacklist_matcher(chat_id: int, settings: dict) -> TokenMatcher:
+    """Получает (или собирает) матчер по словам чата"""
+    with MATCHERS_LOCK:
+        matcher = _matchers.get(chat_id)
+        if matcher is None:
+            matcher = TokenMatcher(
+                settings.get("words", []),
+                homoglyphs=settings.get("homoglyphs", True),
+            )
+            _matchers[chat_id] = matcher
+        return matcher
+
+
+def find_blacklisted(chat_id: int, text: str):
+    """Возвращает запрещённое слово из текста или None"""
+    settings = _get_blacklist_settings(chat_id)
+    if not settings.get("enabled", False) or not settings.get("words"):
+        return None
+    return _get_blacklist_matcher(chat_id, settings).search(text)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ПРОВЕРКА СООБЩЕНИЙ
+# ═══════════════════════════════════════════════════════════════
+
+@enforcement
+def check_blacklist(update: Update, context: CallbackContext):
+    """Проверяет текст и подписи к медиа на слова из чёрного списка"""
+    msg = update.effective_message
+    chat = update.effective_chat
+    user = update.effective_user
+
+    if not msg or not user or user.is_bot:
+        return
+
+    text = msg.text or msg.caption
+    if not text:
+        return
+
+    settings = _get_blacklist_settings(chat.id)
+    if not settings.get("enabled", False) or not settings.get("words"):
+        return
+
+    word = _get_blacklist_matcher(chat.id, settings).search(text)
+    if not word:
+        return
+
+    # Админов не трогаем (проверка только при совпадении)
+    if is_user_admin(chat, user.id):
+        return
+
+    try:
+        msg.delete()
+    except BadRequest:
+        pass
+
+    action = settings.get("action", "delete")
+    reason = f"Слово из чёрного списка: {word}"
+
+    try:
+        if action == "warn":
+            try:
+                from MitaHelper.modules.warns import warn_user
+            except ImportError:
+                return
+            count, limit, punishment = warn_user(chat.id, user.id, reason, chat=chat, user=user, bot=context.bot)
+            if punishment:
+                action_text = f"набрал {count}/{limit} варнов и {punishment}"
+            else:
+                action_text = f"получает варн ({count}/{limit})"
+        elif action == "mute":
+            context.bot.restrict_chat_member(
+                chat.id,
+                user.id,
+                permissions=ChatPermissions(can_send_messages=False),
+                until_date=datetime.utcnow() + BLACKLIST_MUTE_TIME,
+            )
+            action_text = "замучен на 1 час"
+            if log_mute:
+                log_mute(context.bot, chat, None, user, "1 час", reason)
+        elif action == "kick":
+            context.bot.ban_chat_member(chat.id, user.id)
+            context.bot.unban_chat_member(chat.id, user.id)
+            action_text = "кикнут"
+            if log_kick:
+                log_kick(context.bot, chat, None, user, reason)
+        elif action == "ban":
+            context.bot.ban_chat_member(chat.id, user.id)
+            action_text = "забанен"
+            if log_ban:
+                log_ban(context.bot, chat, None, user, reason)
+        else:  # delete only
+            return
+    except BadRequest as e:
+        LOGGER.warning(f"Чёрный список: не удалось наказать {user.id} в {chat.id}: {e}")
+        return
+
+    try:
+        context.bot.send_message(chat.id, f"🚫 {user.first_name} {action_text} за запрещённое слово!")
+    except BadRequest:
+        pass
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      КОМАНДЫ
+# ═══════════════════════════════════════════════════════════════
+
+def _parse_words(msg) -> list:
+    """Слова из команды: каждая строка - отдельное слово или фраза"""
+    text = msg.text.split(None, 1)
+    if len(text) < 2:
+        return []
+    return [line.strip() for line in text[1].splitlines() if line.strip()]
+
+
+@user_admin
+def add_blacklist(update: Update, context: CallbackContext):
+    """Добавляет слова в чёрный список"""
+    chat = update.effective_chat
+    msg = update.effective_message
+
+    words = _parse_words(msg)
+    if not words:
+        msg.reply_text(
+            "❌ Использование: `/addblacklist <слово>`\n"
+            "Несколько слов - каждое с новой строки.",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+        return
+
+    settings = _get_blacklist_settings(chat.id)
+    current = settings.setdefault("words", [])
+    existing = {w.casefold() for w in current}
+    added = [w for w in words if w.casefold() not in existing]
+    current.extend(added)
+    _set_blacklist_settings(chat.id, settings)
+
+    if added:
+        msg.reply_text(f"✅ Добавлено в чёрный список: {len(added)}")
+    else:
+        msg.reply_text("ℹ️ Эти слова уже в чёрном списке.")
+
+
+@user_admin
+def remove_blacklist(update: Update, context: CallbackContext):
+    """Удаляет слова из чёрного списка"""
+    chat = update.effective_chat
+    msg = update.effective_message
+
+    words = _parse_words(msg)
+    if not words:
+        msg.reply_text("❌ Укажите слово для удаления.")
+        return
+
+    settings = _get_blacklist_settings(chat.id)
+    removing = {w.casefold() for w in words}
+    current = settings.get("words", [])
+    kept = [w for w in current if w.casefold() not in removing]
+
+    if len(kept) == len(current):
+        msg.reply_text("❌ Этих слов нет в чёрном списке.")
+        return
+
+    settings["words"] = kept
+    _set_blacklist_settings(chat.id, settings)
+    msg.reply_text(f"✅ Удалено из чёрного списка: {len(current) - len(kept)}")
+
+
+@user_admin
+def list_blacklist(update: Update, context: CallbackContext):
+    """Показывает чёрный список чата"""
+    chat = update.effective_chat
+    msg = update.effective_message
+
+    settings = _get_blacklist_settings(chat.id)
+    words = settings.get("words", [])
+    if not words:
+        msg.reply_text("🚫 Чёрный список пуст.")
+        return
+
+    status = "✅ Вкл" if settings.get("enabled", False) else "❌ Выкл"
+    text = f"🚫 *Чёрный список* ({status}):\n\n"
+    for word in words[:100]:
+        text += f"• `{word}`\n"
+    if len(words) > 100:
+        text += f"\n_...и ещё {len(words) - 100}_"
+
+    msg.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
+# ═══════════════════════════════════════════════════════════════
+
+ADD_BLACKLIST_HANDLER = CommandHandler("addblacklist", add_blacklist, run_async=True)
+REMOVE_BLACKLIST_HANDLER = CommandHandler(["unblacklist", "rmblacklist"], remove_blacklist, run_async=True)
+LIST_BLACKLIST_HANDLER = CommandHandler("blacklist", list_blacklist, run_async=True)
+# Проверяются и отредактированные сообщения - иначе слово можно дописать правкой
+BLACKLIST_HANDLER = MessageHandler(
+    Filters.chat_type.groups & (Filters.text | Filters.caption) & ~Filters.command,
+    check_blacklist,
+    run_async=True,
+)
+
+dispatcher.add_handler(ADD_BLACKLIST_HANDLER)
+dispatcher.add_handler(REMOVE_BLACKLIST_HANDLER)
+dispatcher.add_handler(LIST_BLACKLIST_HANDLER)
+dispatcher.add_handler(BLACKLIST_HANDLER, group=4)
+
+
+__mod_name__ = "🚫 Чёрный список"
+
+__help__ = """
+*Чёрный список слов:*
+
+Сообщения и подписи к медиа с запрещёнными словами удаляются,
+к автору применяется выбранное действие.
+
+🚫 *Команды (для админов):*
+• /addblacklist `<слово>` — добавить (несколько — с новой строки)
+• /unblacklist `<слово>` — удалить
+• /blacklist — показать список
+
+*Действия:*
+• 🗑 Удалить — только удалить сообщение
+• ⚠️ Варн — удалить и выдать варн
+• 🔇 Мут — на 1 час
+• 🔨 Бан — навсегда забанить
+
+Регистр не важен, обход заменой букв (латинская «a» вместо «а»,
+полноширинные и «жирные» юникод-буквы) тоже ловится.
+Слово засчитывается только целиком.
+
+*Настройка:*
+/config → Выберите чат → 🚫 Чёрный список
+"""
@@ -6,7 +6,8 @@
 import random
 import time
 from datetime import datetime, timedelta
-from threading import RLock
+from threading import Event, Thread
+from typing import List, Optional, Tuple
 
 from telegram import (
     ChatPermissions,
@@ -15,14 +16,11 @@ from telegram import (
     ParseMode,
     Update,
 )
-from telegram.error import BadRequest
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import (
     CallbackContext,
     CallbackQueryHandler,
     CommandHandler,
-    Filters,
-    MessageHandler,
-    JobQueue,
 )
 
 from MitaHelper import dispatcher, LOGGER
@@ -31,23 +29,49 @@ from MitaHelper.modules.helper_funcs.chat_status import (
     can_restrict,
     user_admin,
 )
+from MitaHelper.modules.helper_funcs.captcha_images import DIFFICULTIES, IMAGE_POOL
+from MitaHelper.modules.helper_funcs.captcha_queue import PendingCaptchas
+from MitaHelper.modules.helper_funcs.misc import delete_messages
+from MitaHelper.modules.helper_funcs.pipeline import (
+    KIND_JOIN,
+    MessageFeatures,
+    invalidate_chat_features,
+    register_stage,
+)
+from MitaHelper.modules.helper_funcs.raid import JOIN_FAILED, JOIN_PASSED, RECENT_JOINS
+from MitaHelper.modules.helper_funcs.timers import (
+    cancel_timer,
+    delete_message_later,
+    iter_timers,
+)
 from MitaHelper.modules.helper_funcs.topics import get_thread_id
 
 # Импорт логов
 try:
-    from MitaHelper.modules.logs import log_captcha_pass, log_captcha_fail, log_join
+    from MitaHelper.modules.logs import (
+        log_captcha_fail,
+        log_captcha_pass,
+        log_captcha_timeouts,
+        log_join,
+    )
 except ImportError:
     log_captcha_pass = None
     log_captcha_fail = None
+    log_captcha_timeouts = None
     log_join = None
 
 
-# Блокировка для потокобезопасности
-CAPTCHA_LOCK = RLock()
-
 # Хранилища
 captcha_settings = {}  # {chat_id: {"enabled": bool, "timeout": int, "mode": str, "kick_on_fail": bool}}
-pending_captcha = {}   # {(chat_id, user_id): {"answer": ..., "message_id": ..., "time": ...}}
+
+# Незавершённые капчи {chat_id: {user_id: {"answer": ..., "message_id": ..., "deadline": ...}}}
+PENDING = PendingCaptchas()
+pending_captcha = PENDING.chats
+
+# Истёкшие капчи снимает один поток: не чаще раза в SWEEP_INTERVAL секунд
+# и не больше SWEEP_BATCH капч за проход
+SWEEP_INTERVAL = 1
+SWEEP_BATCH = 500
 
 # Загрузка настроек из БД
 try:
@@ -67,12 +91,57 @@ def _save_captcha_to_db():
         save_captcha_settings_db(captcha_settings)
 
 
+try:
+    from MitaHelper.modules.database import load_pending_captcha, save_pending_captcha
+except ImportError:
+    load_pending_captcha = None
+    save_pending_captcha = None
+
+
+def _save_pending_to_db(chat_ids):
+    """Ставит капчи этих чатов в очередь на запись"""
+    # Снимок всех чатов, а не только chat_ids: JSON файл переписывается целиком
+    if save_pending_captcha:
+        save_pending_captcha(PENDING.snapshot, set(chat_ids))
+
+
+# Незавершённые капчи переживают перезапуск - восстанавливаем их из БД
+try:
+    if load_pending_captcha:
+        for _chat_id, _captchas in load_pending_captcha().items():
+            for _user_id, _captcha in _captchas.items():
+                PENDING.add(_chat_id, int(_user_id), _captcha)
+except Exception as e:
+    LOGGER.warning(f"Не удалось загрузить незавершённые капчи: {e}")
+
+# Раньше у каждой капчи был свой таймер таймаута - переносим их в общую очередь
+_migrated = set()
+for _name, _data in iter_timers("captcha_timeout"):
+    _captcha = _data["captcha"]
+    _timeout = captcha_settings.get(_data["chat_id"], {}).get("timeout", 120)
+    _captcha.setdefault("deadline", _captcha.get("time", time.time()) + _timeout)
+    PENDING.add(_data["chat_id"], _data["user_id"], _captcha)
+    _migrated.add(_data["chat_id"])
+    cancel_timer(_name)
+if _migrated:
+    _save_pending_to_db(_migrated)
+if len(PENDING):
+    LOGGER.info(f"Незавершённых капч: {len(PENDING)}")
+
+
 # Режимы капчи
 CAPTCHA_MODES = {
     "button": "Кнопка",
     "math": "Математика",
     "text": "Текст",
     "emoji": "Эмодзи",
+    "image": "Картинка",
+}
+
+# Сложность капчи-картинки
+IMAGE_DIFFICULTIES = {
+    "easy": "Пример",
+    "hard": "Код из символов",
 }
 
 # Эмодзи-капча - наборы картинок и вариантов
@@ -152,6 +221,7 @@ DEFAULT_SETTINGS = {
     "kick_on_fail": True,
     "mute_until_solved": True,
     "newbie_mute": 0,  # Мут после прохождения капчи (0 = выкл, 5/10/15 минут)
+    "image_difficulty": "easy",  # Для режима image: easy / hard
 }
 
 
@@ -163,7 +233,16 @@ def get_captcha_settings(chat_id):
 def set_captcha_settings(chat_id, settings):
     """Устанавливает настройки капчи"""
     captcha_settings[chat_id] = settings
+    invalidate_chat_features(chat_id)
     _save_captcha_to_db()
+    if settings.get("mode") == "image":
+        # Картинки рисуются заранее - к первому входу пул уже будет готов
+        IMAGE_POOL.warm((settings.get("image_difficulty", "easy"),))
+
+
+def is_captcha_enabled(chat_id):
+    """Включена ли капча в чате"""
+    return captcha_settings.get(chat_id, DEFAULT_SETTINGS)["enabled"]
 
 
 def generate_math_captcha():
@@ -257,19 +336,16 @@ def generate_emoji_captcha():
 
 @bot_admin
 @can_restrict
-def new_member_captcha(update: Update, context: CallbackContext):
-    """Обрабатывает новых участников с капчей"""
+def new_member_captcha(update: Update, context: CallbackContext, features: MessageFeatures):
+    """Обрабатывает новых участников с капчей (этап конвейера)"""
     chat = update.effective_chat
     msg = update.effective_message
     
     settings = get_captcha_settings(chat.id)
     
-    if not settings["enabled"]:
-        return
-    
     for new_mem in msg.new_chat_members:
-        # Пропускаем ботов и самого бота
-        if new_mem.is_bot or new_mem.id == context.bot.id:
+        # Пропускаем ботов, самого бота и уже забаненных CAS
+        if new_mem.is_bot or new_mem.id == context.bot.id or new_mem.id in features.removed_members:
             continue
         
         user_id = new_mem.id
@@ -288,8 +364,42 @@ def new_member_captcha(update: Update, context: CallbackContext):
         
         # Генерируем капчу в зависимости от режима
         mode = settings["mode"]
+        challenge = None
+        
+        if mode == "image":
+            challenge = IMAGE_POOL.take(settings.get("image_difficulty", "easy"))
+            if challenge is None:
+                # Пул пуст (рейд) или нет Pillow - рисовать здесь нельзя, даём пример
+                mode = "math"
+        
+        if mode == "image":
+            answer = challenge["answer"]
+            options = challenge["options"]
+            
+            keyboard = [
+                [
+                    InlineKeyboardButton(
+                        opt,
+                        callback_data=f"captcha_{user_id}_{opt}"
+                    )
+                    for opt in options[:2]
+                ],
+                [
+                    InlineKeyboardButton(
+                        opt,
+                        callback_data=f"captcha_{user_id}_{opt}"
+                    )
+                    for opt in options[2:]
+                ],
+            ]
+            
+            text = (
+                f"👋 Привет, *{user_name}*!\n\n"
+                f"🔐 Выберите ответ с картинки.\n\n"
+                f"⏱ У вас {settings['timeout']} секунд."
+            )
         
-        if mode == "math":
+        elif mode == "math":
             question, answer = generate_math_captcha()
             options = generate_button_options(answer, is_math=True)
             
@@ -394,14 +504,16 @@ def new_member_captcha(update: Update, context: CallbackContext):
         try:
             send_kwargs = {
                 "chat_id": chat.id,
-                "text": text,
                 "parse_mode": ParseMode.MARKDOWN,
                 "reply_markup": InlineKeyboardMarkup(keyboard),
             }
             if thread_id:
                 send_kwargs["message_thread_id"] = thread_id
             
-            captcha_msg = context.bot.send_message(**send_kwargs)
+            if challenge is not None:
+                captcha_msg = context.bot.send_photo(photo=challenge["image"], caption=text, **send_kwargs)
+            else:
+                captcha_msg = context.bot.send_message(text=text, **send_kwargs)
             
             # Удаляем сервисное сообщение о входе
             try:
@@ -409,88 +521,122 @@ def new_member_captcha(update: Update, context: CallbackContext):
             except:
                 pass
             
-            # Сохраняем информацию о капче
-            with CAPTCHA_LOCK:
-                pending_captcha[(chat.id, user_id)] = {
-                    "answer": str(answer),
-                    "message_id": captcha_msg.message_id,
-                    "time": time.time(),
-                    "mode": mode,
-                    "thread_id": thread_id,  # Сохраняем топик
-                }
-            
-            # Планируем таймаут
-            context.job_queue.run_once(
-                captcha_timeout,
-                settings["timeout"],
-                context=(chat.id, user_id),
-                name=f"captcha_timeout_{chat.id}_{user_id}",
-            )
+            # Сохраняем информацию о капче, таймаут снимет поток капч
+            now = time.time()
+            PENDING.add(chat.id, user_id, {
+                "answer": str(answer),
+                "message_id": captcha_msg.message_id,
+                "time": now,
+                "deadline": now + settings["timeout"],
+                "mode": mode,
+                "thread_id": thread_id,  # Сохраняем топик
+            })
+            _save_pending_to_db((chat.id,))
             
         except BadRequest as e:
             LOGGER.warning(f"Ошибка отправки капчи: {e}")
 
 
-def delete_welcome_after_captcha(context: CallbackContext):
-    """Удаляет приветственное сообщение после капчи по таймеру"""
-    job_data = context.job.context
-    try:
-        context.bot.delete_message(job_data["chat_id"], job_data["message_id"])
-    except BadRequest:
-        pass
-
-
-def captcha_timeout(context: CallbackContext):
-    """Обработчик таймаута капчи"""
-    chat_id, user_id = context.job.context
-    
-    with CAPTCHA_LOCK:
-        captcha_data = pending_captcha.pop((chat_id, user_id), None)
-    
-    if not captcha_data:
-        return
-    
+def _expire_captchas(bot, chat_id: int, captchas: List[Tuple[int, dict]]):
+    """
+    Капчи чата, которые не решили вовремя (пачкой из потока капч):
+    сообщения удаляются одним deleteMessages, кик - массовыми наказаниями,
+    в чат уходит одно сообщение на всю пачку.
+    """
+    user_ids = [user_id for user_id, _ in captchas]
+    for user_id in user_ids:
+        RECENT_JOINS.set_status(chat_id, user_id, JOIN_FAILED)
     settings = get_captcha_settings(chat_id)
-    
+
     try:
-        # Удаляем сообщение с капчей
-        context.bot.delete_message(chat_id, captcha_data["message_id"])
-    except BadRequest:
-        pass
-    
-    # Получаем сохранённый thread_id
-    thread_id = captcha_data.get("thread_id") if captcha_data else None
-    
-    if settings["kick_on_fail"]:
+        delete_messages(bot, chat_id, [captcha["message_id"] for _, captcha in captchas])
+    except TelegramError as e:
+        # RetryAfter/сеть - сообщения останутся, но кик ниже важнее
+        LOGGER.warning(f"Не удалось удалить капчи в {chat_id}: {e}")
+
+    kick = settings["kick_on_fail"]
+    if kick:
         try:
-            # Кикаем пользователя
-            context.bot.ban_chat_member(chat_id, user_id)
-            context.bot.unban_chat_member(chat_id, user_id)
-            
-            # Логируем провал капчи
-            if log_captcha_fail:
-                try:
-                    chat = context.bot.get_chat(chat_id)
-                    user = type('User', (), {'id': user_id, 'first_name': 'Пользователь'})()
-                    log_captcha_fail(context.bot, chat, user, "Таймаут")
-                except:
-                    pass
-            
-            send_kwargs = {"chat_id": chat_id, "text": f"⏰ Пользователь не прошёл капчу вовремя и был удалён."}
-            if thread_id:
-                send_kwargs["message_thread_id"] = thread_id
-            context.bot.send_message(**send_kwargs)
-        except BadRequest as e:
-            LOGGER.warning(f"Не удалось кикнуть: {e}")
-    else:
+            bot.bulk_restrict(chat_id, user_ids, "kick")
+        except Exception as e:
+            LOGGER.warning(f"Не удалось кикнуть не прошедших капчу в {chat_id}: {e}")
+    if log_captcha_timeouts:
+        # Одна запись на пачку: при рейде капчи истекают сотнями
+        log_captcha_timeouts(bot, chat_id, user_ids, kick)
+
+    if kick:
+        if len(user_ids) == 1:
+            text = "⏰ Пользователь не прошёл капчу вовремя и был удалён."
+        else:
+            text = f"⏰ {len(user_ids)} пользователей не прошли капчу вовремя и были удалены."
+    elif len(user_ids) == 1:
         # Просто оставляем замученным
-        try:
-            send_kwargs = {"chat_id": chat_id, "text": f"⏰ Пользователь не прошёл капчу. Он остаётся в муте."}
-            if thread_id:
-                send_kwargs["message_thread_id"] = thread_id
-            context.bot.send_message(**send_kwargs)
-        except BadRequest:
-            pass
+        text = "⏰ Пользователь не прошёл капчу. Он остаётся в муте."
+    else:
+        text = f"⏰ {len(user_ids)} пользователей не прошли капчу. Они остаются в муте."
+
+    # Получаем сохранённый thread_id (последней капчи пачки)
+    thread_id = captchas[-1][1].get("thread_id")
+    try:
+        send_kwargs = {"chat_id": chat_id, "text": text}
+        if thread_id:
+            send_kwargs["message_thread_id"] = thread_id
+        bot.send_message(**send_kwargs)
+    except TelegramError as e:
+        LOGGER.warning(f"Не удалось сообщить о таймауте капчи в {chat_id}: {e}")
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ПОТОК КАПЧ
+# ═══════════════════════════════════════════════════════════════
+
+_sweeper: Optional[Thread] = None
+_sweeper_stop = Event()
+
+
+def _sweep_loop():
+    """Один поток на все капчи: ждёт ближайший срок и снимает истёкшие пачками"""
+    while not _sweeper_stop.is_set():
+        PENDING.wait_due()
+        if _sweeper_stop.is_set():
+            return
+        expired = PENDING.pop_expired(limit=SWEEP_BATCH)
+        if expired:
+            _save_pending_to_db(expired)
+            # Запросы к Telegram - в пуле воркеров диспетчера
+            for chat_id, captchas in expired.items():
+                dispatcher.run_async(_expire_captchas, dispatcher.bot, chat_id, captchas)
+        # Пауза между проходами собирает капчи рейда в общие пачки
+        _sweeper_stop.wait(SWEEP_INTERVAL)
+
+
+def start_captcha_sweeper():
+    """Запускает поток капч (просроченные за время простоя снимутся сразу)"""
+    global _sweeper
+    if _sweeper is not None:
+        return
+    # Заодно рисуем картинки для чатов с капчей-картинкой
+    difficulties = {
+        settings.get("image_difficulty", "easy")
+        for settings in list(captcha_settings.values())
+        if settings.get("enabled") and settings.get("mode") == "image"
+    }
+    if difficulties:
+        IMAGE_POOL.warm(difficulties)
+    _sweeper_stop.clear()
+    _sweeper = Thread(target=_sweep_loop, name="captcha", daemon=True)
+    _sweeper.start()
+
+
+def stop_captcha_sweeper():
+    """Останавливает поток капч (сами капчи остаются в БД)"""
+    global _sweeper
+    _sweeper_stop.set()
+    PENDING.notify()
+    thread, _sweeper = _sweeper, None
+    if thread is not None:
+        thread.join(timeout=5)
+    IMAGE_POOL.shutdown()
 
 
 def captcha_callback(update: Update, context: CallbackContext):
@@ -513,8 +659,7 @@ def captcha_callback(update: Update, context: CallbackContext):
         query.answer("❌ Эта капча не для вас!", show_alert=True)
         return
     
-    with CAPTCHA_LOCK:
-        captcha_data = pending_captcha.get((chat.id, user.id))
+    captcha_data = PENDING.get(chat.id, user.id)
     
     if not captcha_data:
         query.answer("❌ Капча устарела")
@@ -528,14 +673,12 @@ def captcha_callback(update: Update, context: CallbackContext):
     
     # Проверяем ответ
     if user_answer == correct_answer or user_answer in ("human", "verify"):
-        # Капча пройдена!
-        with CAPTCHA_LOCK:
-            pending_captcha.pop((chat.id, user.id), None)
-        
-        # Отменяем таймаут
-        jobs = context.job_queue.get_jobs_by_name(f"captcha_timeout_{chat.id}_{user.id}")
-        for job in jobs:
-            job.schedule_removal()
+        # Капча пройдена! Если её успел забрать поток капч - она истекла
+        if PENDING.pop(chat.id, user.id) is None:
+            query.answer("❌ Капча устарела")
+            return
+        _save_pending_to_db((chat.id,))
+        RECENT_JOINS.set_status(chat.id, user.id, JOIN_PASSED)
         
         # Снимаем мут
         try:
@@ -641,12 +784,7 @@ def captcha_callback(update: Update, context: CallbackContext):
                 # Автоудаление приветствия
                 delete_after = welcome_settings.get("delete_after", 0)
                 if delete_after > 0 and sent_msg:
-                    context.job_queue.run_once(
-                        delete_welcome_after_captcha,
-                        delete_after,
-                        context={"chat_id": chat.id, "message_id": sent_msg.message_id},
-                        name=f"del_welcome_{sent_msg.message_id}"
-                    )
+                    delete_message_later(chat.id, sent_msg.message_id, delete_after)
             else:
                 # Если приветствие выключено, просто сообщаем о прохождении капчи
                 mute_text = f"\n\n🔇 _Вы сможете писать через {newbie_mute} мин._" if newbie_mute > 0 else ""
@@ -692,16 +830,21 @@ def captcha_cmd(update: Update, context: CallbackContext):
         status = "✅ Включена" if settings["enabled"] else "❌ Выключена"
         mode_name = CAPTCHA_MODES.get(settings["mode"], settings["mode"])
         kick = "Да" if settings["kick_on_fail"] else "Нет"
+        image_line = ""
+        if settings["mode"] == "image":
+            image_line = f"Картинка: `{IMAGE_DIFFICULTIES[settings.get('image_difficulty', 'easy')]}`\n"
         
         msg.reply_text(
             f"🔐 *Настройки капчи:*\n\n"
             f"Статус: {status}\n"
             f"Режим: `{mode_name}`\n"
+            f"{image_line}"
             f"Таймаут: `{settings['timeout']}` сек\n"
             f"Кик при неудаче: `{kick}`\n\n"
             f"*Команды:*\n"
             f"• `/captcha on/off` — вкл/выкл\n"
-            f"• `/captcha mode <button/math/text>` — режим\n"
+            f"• `/captcha mode <button/math/text/emoji/image>` — режим\n"
+            f"• `/captcha difficulty <easy/hard>` — сложность картинки\n"
             f"• `/captcha timeout <сек>` — таймаут\n"
             f"• `/captcha kick on/off` — кик при неудаче",
             parse_mode=ParseMode.MARKDOWN,
@@ -731,7 +874,24 @@ def captcha_cmd(update: Update, context: CallbackContext):
                 f"❌ Доступные режимы:\n"
                 f"• `button` — нажать кнопку\n"
                 f"• `math` — решить пример\n"
-                f"• `text` — ввести слово",
+                f"• `text` — ввести слово\n"
+                f"• `emoji` — узнать эмодзи\n"
+                f"• `image` — ответ с картинки",
+                parse_mode=ParseMode.MARKDOWN,
+            )
+    
+    elif cmd == "difficulty" and len(args) > 1:
+        difficulty = args[1].lower()
+        if difficulty in DIFFICULTIES:
+            settings["image_difficulty"] = difficulty
+            set_captcha_settings(chat.id, settings)
+            msg.reply_text(
+                f"✅ Капча-картинка: `{IMAGE_DIFFICULTIES[difficulty]}`",
+                parse_mode=ParseMode.MARKDOWN,
+            )
+        else:
+            msg.reply_text(
+                "❌ Сложность: `easy` — пример, `hard` — код из символов",
                 parse_mode=ParseMode.MARKDOWN,
             )
             
@@ -765,11 +925,6 @@ def captcha_cmd(update: Update, context: CallbackContext):
 # ═══════════════════════════════════════════════════════════════
 
 CAPTCHA_HANDLER = CommandHandler("captcha", captcha_cmd, run_async=True)
-NEW_MEMBER_CAPTCHA_HANDLER = MessageHandler(
-    Filters.status_update.new_chat_members, 
-    new_member_captcha, 
-    run_async=True
-)
 CAPTCHA_CALLBACK_HANDLER = CallbackQueryHandler(
     captcha_callback, 
     pattern=r"^captcha_", 
@@ -777,10 +932,13 @@ CAPTCHA_CALLBACK_HANDLER = CallbackQueryHandler(
 )
 
 dispatcher.add_handler(CAPTCHA_HANDLER)
-dispatcher.add_handler(NEW_MEMBER_CAPTCHA_HANDLER, group=1)
 dispatcher.add_handler(CAPTCHA_CALLBACK_HANDLER)
 
 
+# Этап конвейера: вход участников, после CAS
+register_stage("captcha", new_member_captcha, order=30, enabled=is_captcha_enabled, kinds=KIND_JOIN)
+
+
 __mod_name__ = "🔐 Капча"
 
 __help__ = """
@@ -792,6 +950,7 @@ __help__ = """
 
 ⚙️ *Настройка:*
 • /captcha mode `<режим>` — режим капчи
+• /captcha difficulty `easy/hard` — сложность капчи-картинки
 • /captcha timeout `<сек>` — время на ответ (30-600)
 • /captcha kick `on/off` — кикать при неудаче
 
@@ -799,6 +958,8 @@ __help__ = """
 • `button` — нажать кнопку "Я не бот"
 • `math` — решить простой пример (2+3=?)
 • `text` — ввести показанное слово
+• `emoji` — узнать, что на эмодзи
+• `image` — выбрать ответ с картинки (пример или код из символов)
 
 🛡 *Как работает:*
 1. Новый участник получает капчу
@@ -4,25 +4,27 @@
 https://cas.chat/
 """
 
-import json
-import os
-import urllib.request
-import urllib.error
-from datetime import datetime
-
 from telegram import Update, ParseMode, ChatPermissions
 from telegram.error import BadRequest
-from telegram.ext import CallbackContext, MessageHandler, Filters
-
-from MitaHelper import dispatcher, LOGGER
+from telegram.ext import CallbackContext
 
+from MitaHelper import LOGGER, CAS_API_URL, CAS_EXPORT_PATH
+from MitaHelper.modules.database import (
+    load_cas_settings as load_cas_settings_db,
+    save_cas_settings_db,
+)
+from MitaHelper.modules.helper_funcs.cas_client import create_cas_client
+from MitaHelper.modules.helper_funcs.outbound import PRIORITY_LOW, outbound_priority
+from MitaHelper.modules.helper_funcs.pipeline import (
+    KIND_JOIN,
+    MessageFeatures,
+    invalidate_chat_features,
+    register_stage,
+)
 
-# API CAS
-CAS_API_URL = "https://api.cas.chat/check?user_id="
 
-# Путь к файлу с настройками
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-CAS_SETTINGS_FILE = os.path.join(DATA_DIR, "cas_settings.json")
+# Клиент CAS: кеш, пул соединений, параллельные проверки, офлайн-выгрузка
+CAS_CLIENT = create_cas_client(CAS_API_URL, CAS_EXPORT_PATH)
 
 # Хранилище настроек
 # {chat_id: {"enabled": True, "action": "ban", "notify": True}}
@@ -30,25 +32,21 @@ cas_settings = {}
 
 
 def load_cas_settings():
-    """Загружает настройки из файла"""
+    """Загружает настройки из БД"""
     global cas_settings
     try:
-        if os.path.exists(CAS_SETTINGS_FILE):
-            with open(CAS_SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                cas_settings = {int(k): v for k, v in data.items()}
-                LOGGER.info(f"Загружены CAS настройки для {len(cas_settings)} чатов")
+        cas_settings = load_cas_settings_db()
+        if cas_settings:
+            LOGGER.info(f"Загружены CAS настройки для {len(cas_settings)} чатов")
     except Exception as e:
         LOGGER.error(f"Ошибка загрузки CAS настроек: {e}")
         cas_settings = {}
 
 
 def save_cas_settings():
-    """Сохраняет настройки в файл"""
+    """Сохраняет настройки в БД"""
     try:
-        os.makedirs(DATA_DIR, exist_ok=True)
-        with open(CAS_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cas_settings, f, ensure_ascii=False, indent=2)
+        save_cas_settings_db(cas_settings)
     except Exception as e:
         LOGGER.error(f"Ошибка сохранения CAS настроек: {e}")
 
@@ -78,9 +76,15 @@ def get_cas_settings(chat_id: int) -> dict:
 def set_cas_settings(chat_id: int, settings: dict):
     """Сохраняет настройки CAS"""
     cas_settings[chat_id] = settings
+    invalidate_chat_features(chat_id)
     save_cas_settings()
 
 
+def is_cas_enabled(chat_id: int) -> bool:
+    """Включена ли проверка CAS в чате"""
+    return cas_settings.get(chat_id, {}).get("enabled", False)
+
+
 def toggle_cas(chat_id: int) -> bool:
     """Включает/выключает CAS. Возвращает новое состояние."""
     settings = get_cas_settings(chat_id)
@@ -106,23 +110,18 @@ def toggle_cas_notify(chat_id: int) -> bool:
 
 def check_cas(user_id: int) -> dict:
     """
-    Проверяет пользователя через CAS API
-    Возвращает: {"ok": True/False, "result": {...}} или None при ошибке
+    Проверяет пользователя через CAS (с кешем)
+    Возвращает: {"ok": True/False, "result": {...}}
     """
-    try:
-        url = f"{CAS_API_URL}{user_id}"
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=5) as response:
-            if response.status == 200:
-                data = json.loads(response.read().decode('utf-8'))
-                return data
-    except urllib.error.URLError as e:
-        LOGGER.warning(f"Ошибка запроса к CAS API: {e}")
-    except json.JSONDecodeError:
-        LOGGER.warning("Ошибка парсинга ответа CAS API")
-    except Exception as e:
-        LOGGER.warning(f"Ошибка CAS: {e}")
-    return None
+    result = CAS_CLIENT.check(user_id)
+    return {"ok": bool(result), "result": result or {}}
+
+
+def _cas_reason(result: dict) -> str:
+    """Текст причины из ответа CAS"""
+    if result.get("offline"):
+        return "В выгрузке CAS"
+    return f"Offenses: {result.get('offenses', 0)}"
 
 
 def is_cas_banned(user_id: int) -> tuple:
@@ -130,32 +129,16 @@ def is_cas_banned(user_id: int) -> tuple:
     Проверяет, забанен ли пользователь в CAS
     Возвращает: (is_banned: bool, reason: str or None)
     """
-    data = check_cas(user_id)
-    if data and data.get("ok"):
-        result = data.get("result", {})
-        if result:
-            # Пользователь в базе CAS
-            offenses = result.get("offenses", 0)
-            time_added = result.get("time_added")
-            return True, f"Offenses: {offenses}"
+    result = CAS_CLIENT.check(user_id)
+    if result:
+        return True, _cas_reason(result)
     return False, None
 
 
-def check_new_member_cas(update: Update, context: CallbackContext):
-    """Проверяет нового участника через CAS"""
-    if not update.effective_message:
-        return
-    
+def check_new_member_cas(update: Update, context: CallbackContext, features: MessageFeatures):
+    """Проверяет нового участника через CAS (этап конвейера, до капчи)"""
     chat = update.effective_chat
-    
-    # Только в группах
-    if chat.type == "private":
-        return
-    
-    # Получаем настройки
     settings = get_cas_settings(chat.id)
-    if not settings.get("enabled", False):
-        return
     
     new_members = update.effective_message.new_chat_members
     if not new_members:
@@ -164,15 +147,16 @@ def check_new_member_cas(update: Update, context: CallbackContext):
     action = settings.get("action", "ban")
     notify = settings.get("notify", True)
     
-    for member in new_members:
-        # Пропускаем ботов (кроме спам-ботов)
-        if member.is_bot:
-            continue
-        
-        # Проверяем через CAS
-        is_banned, reason = is_cas_banned(member.id)
-        
-        if is_banned:
+    # Пропускаем ботов (кроме спам-ботов)
+    humans = [member for member in new_members if not member.is_bot]
+    if not humans:
+        return
+    
+    # Всех новых участников проверяем параллельно
+    results = CAS_CLIENT.check_many(member.id for member in humans)
+    
+    for member in humans:
+        if results.get(member.id):
             LOGGER.info(f"CAS: Обнаружен спамер {member.id} ({member.first_name}) в чате {chat.id}")
             
             try:
@@ -194,6 +178,10 @@ def check_new_member_cas(update: Update, context: CallbackContext):
                     context.bot.ban_chat_member(chat.id, member.id)
                     action_text = "забанен"
                 
+                # Забаненным и кикнутым капча и приветствие уже не нужны
+                if action != "mute":
+                    features.removed_members.add(member.id)
+                
                 # Уведомление в чат
                 if notify:
                     text = (
@@ -204,12 +192,13 @@ def check_new_member_cas(update: Update, context: CallbackContext):
                         f"✅ Действие: {action_text}\n\n"
                         f"<i>Проверить: cas.chat/query?u={member.id}</i>"
                     )
-                    context.bot.send_message(
-                        chat.id,
-                        text,
-                        parse_mode=ParseMode.HTML,
-                        disable_web_page_preview=True,
-                    )
+                    with outbound_priority(PRIORITY_LOW):
+                        context.bot.send_message(
+                            chat.id,
+                            text,
+                            parse_mode=ParseMode.HTML,
+                            disable_web_page_preview=True,
+                        )
                 
                 # Логируем
                 try:
@@ -227,15 +216,8 @@ def check_new_member_cas(update: Update, context: CallbackContext):
                 LOGGER.warning(f"CAS: Не удалось выполнить действие: {e}")
 
 
-# Регистрация обработчика
-CAS_HANDLER = MessageHandler(
-    Filters.status_update.new_chat_members,
-    check_new_member_cas,
-    run_async=True
-)
-
-# Добавляем с высоким приоритетом (раньше капчи)
-dispatcher.add_handler(CAS_HANDLER, group=1)
+# Этап конвейера: вход участников, раньше капчи и приветствия
+register_stage("cas", check_new_member_cas, order=20, enabled=is_cas_enabled, kinds=KIND_JOIN)
 
 
 __mod_name__ = "🛡 CAS Anti-Spam"
@@ -5,9 +5,10 @@
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ParseMode, Update
 from telegram.ext import CallbackContext, CommandHandler
-from telegram.error import BadRequest
 
 from MitaHelper import dispatcher, LOGGER, OWNER_ID, SUDO_USERS, BOT_USERNAME
+from MitaHelper.modules.helper_funcs.chat_status import is_chat_admin_cached
+from MitaHelper.modules.helper_funcs.timers import delete_message_later
 from MitaHelper.modules.database import (
     add_chat,
     remove_chat,
@@ -21,18 +22,6 @@ from MitaHelper.modules.database import (
 ADDMITA_MSG_DELETE_TIME = 120  # 2 минуты
 
 
-def delete_addmita_message(context: CallbackContext):
-    """Удаляет сообщение о добавлении чата по таймеру"""
-    job = context.job
-    try:
-        context.bot.delete_message(
-            chat_id=job.context["chat_id"],
-            message_id=job.context["message_id"]
-        )
-    except:
-        pass
-
-
 def addmita(update: Update, context: CallbackContext):
     """Добавляет чат для управления ботом"""
     chat = update.effective_chat
@@ -45,27 +34,18 @@ def addmita(update: Update, context: CallbackContext):
         return
     
     # Проверяем, является ли пользователь админом чата в Telegram
-    try:
-        member = chat.get_member(user.id)
-        if member.status not in ("administrator", "creator"):
-            # Разрешаем также владельцу бота и sudo-юзерам
-            if user.id != OWNER_ID and user.id not in SUDO_USERS:
-                msg.reply_text("❌ Только администраторы чата могут добавить его для управления!")
-                return
-    except BadRequest:
-        msg.reply_text("❌ Не удалось проверить ваши права.")
-        return
+    if not is_chat_admin_cached(chat, user.id):
+        # Разрешаем также владельцу бота и sudo-юзерам
+        if user.id != OWNER_ID and user.id not in SUDO_USERS:
+            msg.reply_text("❌ Только администраторы чата могут добавить его для управления!")
+            return
     
     # Проверяем, является ли бот админом
-    try:
-        bot_member = chat.get_member(context.bot.id)
-        if bot_member.status != "administrator":
-            msg.reply_text(
-                "⚠️ Сделайте меня администратором чата для полноценной работы!\n\n"
-                "Чат всё равно добавлен, но некоторые функции могут не работать."
-            )
-    except BadRequest:
-        pass
+    if not is_chat_admin_cached(chat, context.bot.id):
+        msg.reply_text(
+            "⚠️ Сделайте меня администратором чата для полноценной работы!\n\n"
+            "Чат всё равно добавлен, но некоторые функции могут не работать."
+        )
     
     # Добавляем чат
     if is_chat_added(chat.id):
@@ -78,12 +58,7 @@ def addmita(update: Update, context: CallbackContext):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         # Планируем удаление сообщения
-        context.job_queue.run_once(
-            delete_addmita_message,
-            ADDMITA_MSG_DELETE_TIME,
-            context={"chat_id": chat.id, "message_id": sent_msg.message_id},
-            name=f"delete_addmita_{chat.id}_{sent_msg.message_id}"
-        )
+        delete_message_later(chat.id, sent_msg.message_id, ADDMITA_MSG_DELETE_TIME)
     else:
         add_chat(chat.id, chat.title, user.id)
         keyboard = [[
@@ -97,12 +72,7 @@ def addmita(update: Update, context: CallbackContext):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         # Планируем удаление сообщения
-        context.job_queue.run_once(
-            delete_addmita_message,
-            ADDMITA_MSG_DELETE_TIME,
-            context={"chat_id": chat.id, "message_id": sent_msg.message_id},
-            name=f"delete_addmita_{chat.id}_{sent_msg.message_id}"
-        )
+        delete_message_later(chat.id, sent_msg.message_id, ADDMITA_MSG_DELETE_TIME)
         LOGGER.info(f"Чат {chat.title} ({chat.id}) добавлен пользователем {user.id}")
 
 
@@ -118,15 +88,10 @@ def delmita(update: Update, context: CallbackContext):
         return
     
     # Проверяем права
-    try:
-        member = chat.get_member(user.id)
-        if member.status not in ("administrator", "creator"):
-            if user.id != OWNER_ID and user.id not in SUDO_USERS:
-                msg.reply_text("❌ Только администраторы чата могут удалить его!")
-                return
-    except BadRequest:
-        msg.reply_text("❌ Не удалось проверить ваши права.")
-        return
+    if not is_chat_admin_cached(chat, user.id):
+        if user.id != OWNER_ID and user.id not in SUDO_USERS:
+            msg.reply_text("❌ Только администраторы чата могут удалить его!")
+            return
     
     # Удаляем чат
     if not is_chat_added(chat.id):
@@ -13,16 +13,17 @@ from telegram import (
 from telegram.error import BadRequest, Unauthorized
 from telegram.ext import (
     CallbackContext,
-    CallbackQueryHandler,
     CommandHandler,
     ConversationHandler,
     Filters,
     MessageHandler,
 )
 
-from MitaHelper import dispatcher, OWNER_ID, LOGGER
+from MitaHelper import dispatcher, OWNER_ID, LOGGER, WARN_EXPIRE_DAYS
 from MitaHelper.modules.bot_admins import is_bot_admin, get_user_role, get_bot_admins, add_bot_admin, remove_bot_admin, ROLES
 from MitaHelper.modules.database import get_user_chats, is_chat_added, get_chat, add_chat_admin, is_chat_admin, reset_all_data
+from MitaHelper.modules.helper_funcs.callback_router import CallbackRouter
+from MitaHelper.modules.helper_funcs.pipeline import invalidate_chat_features
 
 # Импорты настроек из других модулей
 try:
@@ -51,11 +52,17 @@ except ImportError:
     clear_rules = None
 
 try:
-    from MitaHelper.modules.filters import get_all_filters, save_filter, delete_filter
+    from MitaHelper.modules.filters import get_all_filters, save_filter, delete_filter, invalidate_filter_matcher
 except ImportError:
     get_all_filters = None
     save_filter = None
     delete_filter = None
+    invalidate_filter_matcher = None
+
+try:
+    from MitaHelper.modules.blacklist import invalidate_blacklist_matcher
+except ImportError:
+    invalidate_blacklist_matcher = None
 
 try:
     from MitaHelper.modules.notes import get_all_notes, save_note, delete_note, get_note
@@ -201,6 +208,7 @@ def get_delete_service_messages(chat_id):
 def set_delete_service_messages(chat_id, enabled):
     """Устанавливает удаление сервисных сообщений"""
     delete_service_messages[chat_id] = enabled
+    invalidate_chat_features(chat_id)
 
 
 def get_antiflood_settings(chat_id):
@@ -222,6 +230,8 @@ def get_blacklist_settings(chat_id):
 
 def set_blacklist_settings(chat_id, settings):
     blacklist_settings[chat_id] = settings
+    if invalidate_blacklist_matcher:
+        invalidate_blacklist_matcher(chat_id)
     _save_blacklist_to_db()
 
 
@@ -234,12 +244,16 @@ def set_multi_filter(chat_id, keyword, responses):
     if chat_id not in multi_filters:
         multi_filters[chat_id] = {}
     multi_filters[chat_id][keyword.lower()] = responses
+    if invalidate_filter_matcher:
+        invalidate_filter_matcher(chat_id)
     _save_multi_filters_to_db()
 
 def delete_multi_filter(chat_id, keyword):
     """Удаляет мультифильтр"""
     if chat_id in multi_filters and keyword.lower() in multi_filters[chat_id]:
         del multi_filters[chat_id][keyword.lower()]
+        if invalidate_filter_matcher:
+            invalidate_filter_matcher(chat_id)
         _save_multi_filters_to_db()
 
 
@@ -321,12 +335,11 @@ def show_main_menu(update: Update, context: CallbackContext):
 #                      НАСТРОЙКИ ЧАТА
 # ═══════════════════════════════════════════════════════════════
 
-def chat_settings_callback(update: Update, context: CallbackContext):
+def chat_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Показывает настройки выбранного чата"""
     query = update.callback_query
     user = update.effective_user
     
-    chat_id = int(query.data.split("_")[2])
     query.answer()
     
     user_editing[user.id] = {"chat_id": chat_id}
@@ -387,14 +400,10 @@ def chat_settings_callback(update: Update, context: CallbackContext):
 #                    НАСТРОЙКИ ПРИВЕТСТВИЙ
 # ═══════════════════════════════════════════════════════════════
 
-def welcome_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def welcome_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки приветствий"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -495,10 +504,9 @@ def welcome_settings_callback(update: Update, context: CallbackContext, chat_id_
     return EDITING_SETTING
 
 
-def toggle_welcome(update: Update, context: CallbackContext):
+def toggle_welcome(update: Update, context: CallbackContext, chat_id: int):
     """Переключает приветствие"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if get_welcome_settings and set_welcome_settings:
         settings = get_welcome_settings(chat_id)
@@ -508,13 +516,12 @@ def toggle_welcome(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return welcome_settings_callback(update, context, chat_id_override=chat_id)
+    return welcome_settings_callback(update, context, chat_id)
 
 
-def toggle_lockdown(update: Update, context: CallbackContext):
+def toggle_lockdown(update: Update, context: CallbackContext, chat_id: int):
     """Переключает режим ЧС"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if get_lockdown_settings and set_lockdown_settings:
         settings = get_lockdown_settings(chat_id)
@@ -528,13 +535,12 @@ def toggle_lockdown(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return welcome_settings_callback(update, context, chat_id_override=chat_id)
+    return welcome_settings_callback(update, context, chat_id)
 
 
-def welcome_edit_callback(update: Update, context: CallbackContext):
+def welcome_edit_callback(update: Update, context: CallbackContext, chat_id: int):
     """Начинает редактирование текста приветствия"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "welcome", "action": "edit"}
@@ -591,12 +597,9 @@ def process_welcome_input(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def welcome_delete_after_callback(update: Update, context: CallbackContext):
+def welcome_delete_after_callback(update: Update, context: CallbackContext, seconds: int, chat_id: int):
     """Устанавливает время автоудаления приветствия"""
     query = update.callback_query
-    parts = query.data.split("_")
-    seconds = int(parts[3])
-    chat_id = int(parts[4])
     
     if get_welcome_settings and set_welcome_settings:
         settings = get_welcome_settings(chat_id)
@@ -612,13 +615,12 @@ def welcome_delete_after_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return welcome_settings_callback(update, context, chat_id_override=chat_id)
+    return welcome_settings_callback(update, context, chat_id)
 
 
-def welcome_add_button_callback(update: Update, context: CallbackContext):
+def welcome_add_button_callback(update: Update, context: CallbackContext, chat_id: int):
     """Начинает добавление кнопки к приветствию"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "welcome", "action": "add_button"}
@@ -715,13 +717,9 @@ def process_welcome_button(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def welcome_delete_button_callback(update: Update, context: CallbackContext):
+def welcome_delete_button_callback(update: Update, context: CallbackContext, btn_index: int, chat_id: int):
     """Удаляет кнопку из приветствия"""
     query = update.callback_query
-    parts = query.data.split("_")
-    # cfg_wel_delbtn_{index}_{chat_id}
-    btn_index = int(parts[3])
-    chat_id = int(parts[4])
     
     if get_welcome_settings and set_welcome_settings:
         settings = get_welcome_settings(chat_id)
@@ -737,21 +735,17 @@ def welcome_delete_button_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return welcome_settings_callback(update, context, chat_id_override=chat_id)
+    return welcome_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      НАСТРОЙКИ КАПЧИ
 # ═══════════════════════════════════════════════════════════════
 
-def captcha_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def captcha_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки капчи"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -762,7 +756,9 @@ def captcha_settings_callback(update: Update, context: CallbackContext, chat_id_
     
     enabled = "✅ Вкл" if settings.get("enabled") else "❌ Выкл"
     mode = settings.get("mode", "button")
-    mode_name = {"button": "🔘 Кнопка", "math": "🔢 Математика", "text": "📝 Текст", "emoji": "🖼 Эмодзи"}.get(mode, mode)
+    mode_name = {
+        "button": "🔘 Кнопка", "math": "🔢 Математика", "text": "📝 Текст", "emoji": "🖼 Эмодзи", "image": "🧩 Картинка",
+    }.get(mode, mode)
     newbie_mute = settings.get("newbie_mute", 0)
     newbie_mute_text = f"{newbie_mute} мин" if newbie_mute > 0 else "Выкл"
     
@@ -790,6 +786,9 @@ def captcha_settings_callback(update: Update, context: CallbackContext, chat_id_
             InlineKeyboardButton("🖼 Эмодзи", callback_data=f"cfg_cap_mode_emoji_{chat_id}"),
             InlineKeyboardButton("📝 Текст", callback_data=f"cfg_cap_mode_text_{chat_id}"),
         ],
+        [
+            InlineKeyboardButton("🧩 Картинка", callback_data=f"cfg_cap_mode_image_{chat_id}"),
+        ],
         [
             InlineKeyboardButton("⏱ 60с", callback_data=f"cfg_cap_timeout_60_{chat_id}"),
             InlineKeyboardButton("⏱ 120с", callback_data=f"cfg_cap_timeout_120_{chat_id}"),
@@ -809,9 +808,8 @@ def captcha_settings_callback(update: Update, context: CallbackContext, chat_id_
     return EDITING_SETTING
 
 
-def toggle_captcha(update: Update, context: CallbackContext):
+def toggle_captcha(update: Update, context: CallbackContext, chat_id: int):
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if get_captcha_settings and set_captcha_settings:
         settings = get_captcha_settings(chat_id)
@@ -821,14 +819,11 @@ def toggle_captcha(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return captcha_settings_callback(update, context, chat_id_override=chat_id)
+    return captcha_settings_callback(update, context, chat_id)
 
 
-def set_captcha_mode(update: Update, context: CallbackContext):
+def set_captcha_mode(update: Update, context: CallbackContext, mode: str, chat_id: int):
     query = update.callback_query
-    parts = query.data.split("_")
-    mode = parts[3]
-    chat_id = int(parts[4])
     
     if get_captcha_settings and set_captcha_settings:
         settings = get_captcha_settings(chat_id)
@@ -836,14 +831,11 @@ def set_captcha_mode(update: Update, context: CallbackContext):
         set_captcha_settings(chat_id, settings)
         query.answer(f"✅ Режим: {mode}")
     
-    return captcha_settings_callback(update, context, chat_id_override=chat_id)
+    return captcha_settings_callback(update, context, chat_id)
 
 
-def set_captcha_timeout(update: Update, context: CallbackContext):
+def set_captcha_timeout(update: Update, context: CallbackContext, timeout: int, chat_id: int):
     query = update.callback_query
-    parts = query.data.split("_")
-    timeout = int(parts[3])
-    chat_id = int(parts[4])
     
     if get_captcha_settings and set_captcha_settings:
         settings = get_captcha_settings(chat_id)
@@ -851,15 +843,12 @@ def set_captcha_timeout(update: Update, context: CallbackContext):
         set_captcha_settings(chat_id, settings)
         query.answer(f"✅ Таймаут: {timeout}с")
     
-    return captcha_settings_callback(update, context, chat_id_override=chat_id)
+    return captcha_settings_callback(update, context, chat_id)
 
 
-def set_newbie_mute(update: Update, context: CallbackContext):
+def set_newbie_mute(update: Update, context: CallbackContext, mute_time: int, chat_id: int):
     """Устанавливает время мута новичков после капчи"""
     query = update.callback_query
-    parts = query.data.split("_")
-    mute_time = int(parts[3])  # 0, 5, 10, 15
-    chat_id = int(parts[4])
     
     if get_captcha_settings and set_captcha_settings:
         settings = get_captcha_settings(chat_id)
@@ -872,17 +861,16 @@ def set_newbie_mute(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return captcha_settings_callback(update, context, chat_id_override=chat_id)
+    return captcha_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      НАСТРОЙКИ ПРАВИЛ
 # ═══════════════════════════════════════════════════════════════
 
-def rules_settings_callback(update: Update, context: CallbackContext):
+def rules_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки правил"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "rules"}
@@ -915,10 +903,9 @@ def rules_settings_callback(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def rules_edit_callback(update: Update, context: CallbackContext):
+def rules_edit_callback(update: Update, context: CallbackContext, chat_id: int):
     """Начинает редактирование правил"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "rules", "action": "edit"}
@@ -957,10 +944,9 @@ def process_rules_input(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def rules_clear_callback(update: Update, context: CallbackContext):
+def rules_clear_callback(update: Update, context: CallbackContext, chat_id: int):
     """Очищает правила"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if clear_rules:
         clear_rules(chat_id)
@@ -968,21 +954,17 @@ def rules_clear_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return rules_settings_callback(update, context)
+    return rules_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      НАСТРОЙКИ ФИЛЬТРОВ
 # ═══════════════════════════════════════════════════════════════
 
-def filters_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def filters_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки фильтров"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "filters"}
@@ -1054,14 +1036,10 @@ def filters_settings_callback(update: Update, context: CallbackContext, chat_id_
     return EDITING_SETTING
 
 
-def filter_autodelete_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def filter_autodelete_callback(update: Update, context: CallbackContext, chat_id: int):
     """Показывает меню выбора времени автоудаления"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -1092,15 +1070,10 @@ def filter_autodelete_callback(update: Update, context: CallbackContext, chat_id
     return EDITING_SETTING
 
 
-def filter_autodelete_set_callback(update: Update, context: CallbackContext):
+def filter_autodelete_set_callback(update: Update, context: CallbackContext, minutes: int, chat_id: int):
     """Устанавливает время автоудаления"""
     query = update.callback_query
     
-    # Формат: cfg_flt_adel_{minutes}_{chat_id}
-    parts = query.data.split("_")
-    minutes = int(parts[3])
-    chat_id = int(parts[4])
-    
     set_filter_autodelete(chat_id, minutes)
     
     if minutes > 0:
@@ -1108,13 +1081,12 @@ def filter_autodelete_set_callback(update: Update, context: CallbackContext):
     else:
         query.answer("✅ Автоудаление выключено")
     
-    return filter_autodelete_callback(update, context, chat_id_override=chat_id)
+    return filter_autodelete_callback(update, context, chat_id)
 
 
-def filter_add_callback(update: Update, context: CallbackContext):
+def filter_add_callback(update: Update, context: CallbackContext, chat_id: int):
     """Начинает добавление фильтра"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "filters", "action": "add"}
@@ -1227,13 +1199,9 @@ def process_filter_response(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def filter_delete_callback(update: Update, context: CallbackContext):
+def filter_delete_callback(update: Update, context: CallbackContext, keyword: str, chat_id: int):
     """Удаляет фильтр"""
     query = update.callback_query
-    parts = query.data.split("_")
-    # cfg_flt_del_{keyword}_{chat_id}
-    keyword = parts[3]
-    chat_id = int(parts[4])
     
     if delete_filter:
         if delete_filter(chat_id, keyword):
@@ -1243,17 +1211,16 @@ def filter_delete_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return filters_settings_callback(update, context, chat_id_override=chat_id)
+    return filters_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      МУЛЬТИФИЛЬТРЫ
 # ═══════════════════════════════════════════════════════════════
 
-def multi_filter_add_callback(update: Update, context: CallbackContext):
+def multi_filter_add_callback(update: Update, context: CallbackContext, chat_id: int):
     """Начинает добавление мультифильтра"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {
@@ -1350,11 +1317,10 @@ def process_multi_response(update: Update, context: CallbackContext):
     return WAITING_MULTI_RESPONSES
 
 
-def multi_filter_done_callback(update: Update, context: CallbackContext):
+def multi_filter_done_callback(update: Update, context: CallbackContext, chat_id: int):
     """Завершает добавление мультифильтра"""
     query = update.callback_query
     user = update.effective_user
-    chat_id = int(query.data.split("_")[3])
     
     editing = user_editing.get(user.id, {})
     keyword = editing.get("keyword")
@@ -1372,37 +1338,28 @@ def multi_filter_done_callback(update: Update, context: CallbackContext):
     # Очищаем
     user_editing.pop(user.id, None)
     
-    return filters_settings_callback(update, context, chat_id_override=chat_id)
+    return filters_settings_callback(update, context, chat_id)
 
 
-def multi_filter_delete_callback(update: Update, context: CallbackContext):
+def multi_filter_delete_callback(update: Update, context: CallbackContext, keyword: str, chat_id: int):
     """Удаляет мультифильтр"""
     query = update.callback_query
     
-    # Формат: cfg_mflt_del_{keyword}_{chat_id}
-    parts = query.data.split("_")
-    chat_id = int(parts[-1])
-    keyword = "_".join(parts[3:-1])  # keyword может содержать _
-    
     # Удаляем через функцию (с сохранением в БД)
     delete_multi_filter(chat_id, keyword)
     query.answer(f"✅ Мультифильтр '{keyword}' удалён!")
     
-    return filters_settings_callback(update, context, chat_id_override=chat_id)
+    return filters_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      НАСТРОЙКИ ЗАМЕТОК
 # ═══════════════════════════════════════════════════════════════
 
-def notes_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def notes_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки заметок"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "notes"}
@@ -1447,12 +1404,9 @@ def notes_settings_callback(update: Update, context: CallbackContext, chat_id_ov
     return EDITING_SETTING
 
 
-def note_view_callback(update: Update, context: CallbackContext):
+def note_view_callback(update: Update, context: CallbackContext, note_name: str, chat_id: int):
     """Просмотр заметки"""
     query = update.callback_query
-    parts = query.data.split("_")
-    note_name = parts[3]
-    chat_id = int(parts[4])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "notes", "note_name": note_name}
@@ -1497,10 +1451,9 @@ def note_view_callback(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def note_add_callback(update: Update, context: CallbackContext):
+def note_add_callback(update: Update, context: CallbackContext, chat_id: int):
     """Начинает добавление заметки"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "notes", "action": "add"}
@@ -1567,12 +1520,9 @@ def process_note_content(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def note_delete_callback(update: Update, context: CallbackContext):
+def note_delete_callback(update: Update, context: CallbackContext, note_name: str, chat_id: int):
     """Удаляет заметку"""
     query = update.callback_query
-    parts = query.data.split("_")
-    note_name = parts[3]
-    chat_id = int(parts[4])
     
     if delete_note:
         if delete_note(chat_id, note_name):
@@ -1582,15 +1532,12 @@ def note_delete_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль не найден")
     
-    return notes_settings_callback(update, context, chat_id_override=chat_id)
+    return notes_settings_callback(update, context, chat_id)
 
 
-def note_buttons_callback(update: Update, context: CallbackContext):
+def note_buttons_callback(update: Update, context: CallbackContext, note_name: str, chat_id: int):
     """Управление кнопками заметки"""
     query = update.callback_query
-    parts = query.data.split("_")
-    note_name = parts[3]
-    chat_id = int(parts[4])
     query.answer()
     
     user_editing[update.effective_user.id] = {
@@ -1707,13 +1654,9 @@ def process_note_button(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def note_button_delete_callback(update: Update, context: CallbackContext):
+def note_button_delete_callback(update: Update, context: CallbackContext, note_name: str, btn_index: int, chat_id: int):
     """Удаляет кнопку из заметки"""
     query = update.callback_query
-    parts = query.data.split("_")
-    note_name = parts[3]
-    btn_index = int(parts[4])
-    chat_id = int(parts[5])
     
     if get_note and save_note:
         note = get_note(chat_id, note_name)
@@ -1738,29 +1681,31 @@ def note_button_delete_callback(update: Update, context: CallbackContext):
         query.answer("❌ Модуль не найден")
     
     # Возвращаемся к управлению кнопками
-    return note_buttons_callback(update, context)
+    return note_buttons_callback(update, context, note_name, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      НАСТРОЙКИ ВАРНОВ
 # ═══════════════════════════════════════════════════════════════
 
-def warns_settings_callback(update: Update, context: CallbackContext):
+def warns_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки варнов"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     settings = get_warns_settings(chat_id)
     limit = settings.get("limit", 3)
     action = settings.get("action", "ban")
+    expire_days = settings.get("expire_days", WARN_EXPIRE_DAYS)
     
     action_text = {"ban": "🔨 Бан", "kick": "👢 Кик", "mute": "🔇 Мут"}.get(action, action)
+    expire_text = f"{expire_days} дн." if expire_days else "бессрочно"
     
     text = (
         f"⚠️ *Настройки предупреждений*\n\n"
         f"Лимит варнов: `{limit}`\n"
-        f"Действие: {action_text}\n\n"
+        f"Действие: {action_text}\n"
+        f"Срок действия варна: {expire_text}\n\n"
         f"При достижении лимита будет применено действие."
     )
     
@@ -1777,6 +1722,9 @@ def warns_settings_callback(update: Update, context: CallbackContext):
             InlineKeyboardButton("👢 Кик", callback_data=f"cfg_warns_action_kick_{chat_id}"),
             InlineKeyboardButton("🔇 Мут", callback_data=f"cfg_warns_action_mute_{chat_id}"),
         ],
+        [
+            InlineKeyboardButton(f"⏳ Срок: {expire_text}", callback_data=f"cfg_warns_expire_{chat_id}"),
+        ],
         [
             InlineKeyboardButton("⬅️ Назад", callback_data=f"cfg_chat_{chat_id}"),
         ],
@@ -1786,11 +1734,8 @@ def warns_settings_callback(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def warns_limit_callback(update: Update, context: CallbackContext):
+def warns_limit_callback(update: Update, context: CallbackContext, action: str, chat_id: int):
     query = update.callback_query
-    parts = query.data.split("_")
-    action = parts[3]  # inc или dec
-    chat_id = int(parts[4])
     
     settings = get_warns_settings(chat_id)
     limit = settings.get("limit", 3)
@@ -1804,31 +1749,45 @@ def warns_limit_callback(update: Update, context: CallbackContext):
     set_warns_settings(chat_id, settings)
     query.answer(f"Лимит: {limit}")
     
-    return warns_settings_callback(update, context)
+    return warns_settings_callback(update, context, chat_id)
 
 
-def warns_action_callback(update: Update, context: CallbackContext):
+# Варианты срока действия варна (дни, 0 - бессрочно)
+WARN_EXPIRE_OPTIONS = [0, 7, 30, 90]
+
+
+def warns_expire_callback(update: Update, context: CallbackContext, chat_id: int):
+    query = update.callback_query
+    
+    settings = get_warns_settings(chat_id)
+    current = settings.get("expire_days", WARN_EXPIRE_DAYS)
+    # Следующий вариант по кругу
+    later = [days for days in WARN_EXPIRE_OPTIONS if days > current]
+    settings["expire_days"] = later[0] if later else WARN_EXPIRE_OPTIONS[0]
+    set_warns_settings(chat_id, settings)
+    query.answer("✅ Срок варна изменён")
+    
+    return warns_settings_callback(update, context, chat_id)
+
+
+def warns_action_callback(update: Update, context: CallbackContext, action: str, chat_id: int):
     query = update.callback_query
-    parts = query.data.split("_")
-    action = parts[3]  # ban, kick, mute
-    chat_id = int(parts[4])
     
     settings = get_warns_settings(chat_id)
     settings["action"] = action
     set_warns_settings(chat_id, settings)
     query.answer(f"✅ Действие: {action}")
     
-    return warns_settings_callback(update, context)
+    return warns_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      НАСТРОЙКИ АНТИФЛУДА
 # ═══════════════════════════════════════════════════════════════
 
-def antiflood_settings_callback(update: Update, context: CallbackContext):
+def antiflood_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки антифлуда"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     settings = get_antiflood_settings(chat_id)
@@ -1837,15 +1796,15 @@ def antiflood_settings_callback(update: Update, context: CallbackContext):
     action = settings.get("action", "mute")
     
     status = "✅ Вкл" if enabled else "❌ Выкл"
-    action_text = {"ban": "🔨 Бан", "kick": "👢 Кик", "mute": "🔇 Мут"}.get(action, action)
+    action_text = {"ban": "🔨 Бан", "kick": "👢 Кик", "mute": "🔇 Мут", "delete": "🗑 Удалить"}.get(action, action)
     
     text = (
         f"🛡 *Настройки антифлуда*\n\n"
         f"Статус: {status}\n"
         f"Лимит сообщений: `{limit}`\n"
         f"Действие: {action_text}\n\n"
-        f"Если пользователь отправит больше {limit} сообщений подряд, "
-        f"к нему будет применено действие."
+        f"Если пользователь отправит больше {limit} сообщений за 10 секунд, "
+        f"его сообщения будут удалены и к нему будет применено действие."
     )
     
     keyboard = [
@@ -1867,6 +1826,9 @@ def antiflood_settings_callback(update: Update, context: CallbackContext):
             InlineKeyboardButton("👢 Кик", callback_data=f"cfg_flood_action_kick_{chat_id}"),
             InlineKeyboardButton("🔇 Мут", callback_data=f"cfg_flood_action_mute_{chat_id}"),
         ],
+        [
+            InlineKeyboardButton("🗑 Только удалять", callback_data=f"cfg_flood_action_delete_{chat_id}"),
+        ],
         [
             InlineKeyboardButton("⬅️ Назад", callback_data=f"cfg_chat_{chat_id}"),
         ],
@@ -1876,23 +1838,19 @@ def antiflood_settings_callback(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def antiflood_toggle_callback(update: Update, context: CallbackContext):
+def antiflood_toggle_callback(update: Update, context: CallbackContext, chat_id: int):
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     settings = get_antiflood_settings(chat_id)
     settings["enabled"] = not settings.get("enabled", False)
     set_antiflood_settings(chat_id, settings)
     query.answer(f"✅ Антифлуд {'включён' if settings['enabled'] else 'выключен'}")
     
-    return antiflood_settings_callback(update, context)
+    return antiflood_settings_callback(update, context, chat_id)
 
 
-def antiflood_limit_callback(update: Update, context: CallbackContext):
+def antiflood_limit_callback(update: Update, context: CallbackContext, action: str, chat_id: int):
     query = update.callback_query
-    parts = query.data.split("_")
-    action = parts[3]
-    chat_id = int(parts[4])
     
     settings = get_antiflood_settings(chat_id)
     limit = settings.get("limit", 5)
@@ -1906,31 +1864,27 @@ def antiflood_limit_callback(update: Update, context: CallbackContext):
     set_antiflood_settings(chat_id, settings)
     query.answer(f"Лимит: {limit}")
     
-    return antiflood_settings_callback(update, context)
+    return antiflood_settings_callback(update, context, chat_id)
 
 
-def antiflood_action_callback(update: Update, context: CallbackContext):
+def antiflood_action_callback(update: Update, context: CallbackContext, action: str, chat_id: int):
     query = update.callback_query
-    parts = query.data.split("_")
-    action = parts[3]
-    chat_id = int(parts[4])
     
     settings = get_antiflood_settings(chat_id)
     settings["action"] = action
     set_antiflood_settings(chat_id, settings)
     query.answer(f"✅ Действие: {action}")
     
-    return antiflood_settings_callback(update, context)
+    return antiflood_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      СЕРВИСНЫЕ СООБЩЕНИЯ
 # ═══════════════════════════════════════════════════════════════
 
-def service_settings_callback(update: Update, context: CallbackContext):
+def service_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки удаления сервисных сообщений"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     enabled = get_delete_service_messages(chat_id)
@@ -1960,10 +1914,9 @@ def service_settings_callback(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def service_toggle_callback(update: Update, context: CallbackContext):
+def service_toggle_callback(update: Update, context: CallbackContext, chat_id: int):
     """Переключает удаление сервисных сообщений"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     current = get_delete_service_messages(chat_id)
     set_delete_service_messages(chat_id, not current)
@@ -1974,21 +1927,17 @@ def service_toggle_callback(update: Update, context: CallbackContext):
         query.answer("❌ Удаление сервисных сообщений выключено")
     
     # Обновляем меню
-    return service_settings_callback(update, context)
+    return service_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      НАСТРОЙКИ ЛОГОВ
 # ═══════════════════════════════════════════════════════════════
 
-def logs_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def logs_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки логирования"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -2057,10 +2006,9 @@ def logs_settings_callback(update: Update, context: CallbackContext, chat_id_ove
     return EDITING_SETTING
 
 
-def logs_set_channel_callback(update: Update, context: CallbackContext):
+def logs_set_channel_callback(update: Update, context: CallbackContext, chat_id: int):
     """Запрос на ввод ID канала логов"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "logs", "action": "set_channel"}
@@ -2142,10 +2090,9 @@ def process_log_channel_input(update: Update, context: CallbackContext):
         return WAITING_LOG_CHANNEL
 
 
-def logs_delete_channel_callback(update: Update, context: CallbackContext):
+def logs_delete_channel_callback(update: Update, context: CallbackContext, chat_id: int):
     """Удаляет канал логов"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if remove_log_channel:
         remove_log_channel(chat_id)
@@ -2153,16 +2100,12 @@ def logs_delete_channel_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return logs_settings_callback(update, context, chat_id_override=chat_id)
+    return logs_settings_callback(update, context, chat_id)
 
 
-def logs_toggle_event_callback(update: Update, context: CallbackContext):
+def logs_toggle_event_callback(update: Update, context: CallbackContext, event: str, chat_id: int):
     """Переключает логирование события"""
     query = update.callback_query
-    parts = query.data.split("_")
-    # cfg_log_ev_{event}_{chat_id}
-    event = parts[3]
-    chat_id = int(parts[4])
     
     if toggle_log_event:
         new_state = toggle_log_event(chat_id, event)
@@ -2174,21 +2117,17 @@ def logs_toggle_event_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return logs_settings_callback(update, context, chat_id_override=chat_id)
+    return logs_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                     МЕДИА-ФИЛЬТРЫ
 # ═══════════════════════════════════════════════════════════════
 
-def media_filters_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def media_filters_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки медиа-фильтров"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -2240,14 +2179,10 @@ def media_filters_settings_callback(update: Update, context: CallbackContext, ch
     return EDITING_SETTING
 
 
-def media_filters_types_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def media_filters_types_callback(update: Update, context: CallbackContext, chat_id: int):
     """Показывает список типов контента для фильтрации"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -2295,10 +2230,9 @@ def media_filters_types_callback(update: Update, context: CallbackContext, chat_
     return EDITING_SETTING
 
 
-def media_filter_toggle_callback(update: Update, context: CallbackContext):
+def media_filter_toggle_callback(update: Update, context: CallbackContext, chat_id: int):
     """Включает/выключает медиа-фильтры"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if toggle_media_filters_enabled:
         new_state = toggle_media_filters_enabled(chat_id)
@@ -2309,21 +2243,12 @@ def media_filter_toggle_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return media_filters_settings_callback(update, context, chat_id_override=chat_id)
+    return media_filters_settings_callback(update, context, chat_id)
 
 
-def media_filter_type_toggle_callback(update: Update, context: CallbackContext):
+def media_filter_type_toggle_callback(update: Update, context: CallbackContext, media_type: str, chat_id: int):
     """Переключает фильтр для конкретного типа медиа"""
     query = update.callback_query
-    # cfg_mf_t_{media_type}_{chat_id}
-    # media_type может содержать _, поэтому берём chat_id с конца
-    data = query.data
-    # Убираем префикс cfg_mf_t_
-    rest = data[9:]  # после "cfg_mf_t_" (9 символов)
-    # chat_id - последняя часть после _
-    last_underscore = rest.rfind("_")
-    media_type = rest[:last_underscore]
-    chat_id = int(rest[last_underscore + 1:])
     
     if toggle_media_filter:
         new_state = toggle_media_filter(chat_id, media_type)
@@ -2335,17 +2260,13 @@ def media_filter_type_toggle_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return media_filters_types_callback(update, context, chat_id_override=chat_id)
+    return media_filters_types_callback(update, context, chat_id)
 
 
-def media_filter_action_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def media_filter_action_callback(update: Update, context: CallbackContext, chat_id: int):
     """Показывает меню выбора действия"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -2379,13 +2300,9 @@ def media_filter_action_callback(update: Update, context: CallbackContext, chat_
     return EDITING_SETTING
 
 
-def media_filter_set_action_callback(update: Update, context: CallbackContext):
+def media_filter_set_action_callback(update: Update, context: CallbackContext, action: str, chat_id: int):
     """Устанавливает действие для медиа-фильтров"""
     query = update.callback_query
-    parts = query.data.split("_")
-    # cfg_mf_setact_{action}_{chat_id}
-    action = parts[3]
-    chat_id = int(parts[4])
     
     if set_filter_action:
         set_filter_action(chat_id, action)
@@ -2394,21 +2311,17 @@ def media_filter_set_action_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return media_filter_action_callback(update, context, chat_id_override=chat_id)
+    return media_filter_action_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      CAS ANTI-SPAM
 # ═══════════════════════════════════════════════════════════════
 
-def cas_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def cas_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки CAS Anti-Spam"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -2458,10 +2371,9 @@ def cas_settings_callback(update: Update, context: CallbackContext, chat_id_over
     return EDITING_SETTING
 
 
-def cas_toggle_callback(update: Update, context: CallbackContext):
+def cas_toggle_callback(update: Update, context: CallbackContext, chat_id: int):
     """Включает/выключает CAS"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if toggle_cas:
         new_state = toggle_cas(chat_id)
@@ -2472,13 +2384,12 @@ def cas_toggle_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Модуль CAS не загружен")
     
-    return cas_settings_callback(update, context, chat_id_override=chat_id)
+    return cas_settings_callback(update, context, chat_id)
 
 
-def cas_notify_callback(update: Update, context: CallbackContext):
+def cas_notify_callback(update: Update, context: CallbackContext, chat_id: int):
     """Переключает уведомления CAS"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     if toggle_cas_notify:
         new_state = toggle_cas_notify(chat_id)
@@ -2489,17 +2400,13 @@ def cas_notify_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return cas_settings_callback(update, context, chat_id_override=chat_id)
+    return cas_settings_callback(update, context, chat_id)
 
 
-def cas_action_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def cas_action_callback(update: Update, context: CallbackContext, chat_id: int):
     """Показывает меню выбора действия CAS"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     
@@ -2533,13 +2440,9 @@ def cas_action_callback(update: Update, context: CallbackContext, chat_id_overri
     return EDITING_SETTING
 
 
-def cas_set_action_callback(update: Update, context: CallbackContext):
+def cas_set_action_callback(update: Update, context: CallbackContext, action: str, chat_id: int):
     """Устанавливает действие для CAS"""
     query = update.callback_query
-    parts = query.data.split("_")
-    # cfg_cas_setact_{action}_{chat_id}
-    action = parts[3]
-    chat_id = int(parts[4])
     
     if set_cas_action:
         set_cas_action(chat_id, action)
@@ -2548,33 +2451,31 @@ def cas_set_action_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return cas_action_callback(update, context, chat_id_override=chat_id)
+    return cas_action_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      АНТИКАНАЛ
 # ═══════════════════════════════════════════════════════════════
 
-def antichannel_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def antichannel_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки антиканала"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
-        query.answer()
-    
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "antichannel"}
     
     settings = get_antichannel_settings(chat_id)
     enabled = settings.get("enabled", False)
+    allow_linked = settings.get("allow_linked", True)
+    allowed = settings.get("allowed", [])
     
     status = "✅ Вкл" if enabled else "❌ Выкл"
     
     text = (
         f"📢 *Антиканал*\n\n"
-        f"Статус: {status}\n\n"
+        f"Статус: {status}\n"
+        f"Привязанный канал: {'✅ разрешён' if allow_linked else '❌ удаляется'}\n"
+        f"Разрешённых каналов: `{len(allowed)}`\n\n"
         f"_Эта функция удаляет сообщения от пользователей,_\n"
         f"_которые пишут от имени канала (анонимно)._\n\n"
         f"_Полезно для защиты от спама и рекламы через каналы._"
@@ -2587,6 +2488,12 @@ def antichannel_settings_callback(update: Update, context: CallbackContext, chat
                 callback_data=f"cfg_achan_toggle_{chat_id}"
             ),
         ],
+        [
+            InlineKeyboardButton(
+                f"🔗 Привязанный канал: {'разрешён' if allow_linked else 'удаляется'}",
+                callback_data=f"cfg_achan_linked_{chat_id}"
+            ),
+        ],
         [InlineKeyboardButton("⬅️ Назад", callback_data=f"cfg_chat_{chat_id}")],
     ]
     
@@ -2594,34 +2501,47 @@ def antichannel_settings_callback(update: Update, context: CallbackContext, chat
     return EDITING_SETTING
 
 
-def antichannel_toggle_callback(update: Update, context: CallbackContext):
+def antichannel_toggle_callback(update: Update, context: CallbackContext, chat_id: int):
     """Включает/выключает антиканал"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     new_state = toggle_antichannel(chat_id)
+    invalidate_chat_features(chat_id)
     if new_state:
         query.answer("✅ Антиканал включён")
     else:
         query.answer("❌ Антиканал выключен")
     
-    return antichannel_settings_callback(update, context, chat_id_override=chat_id)
+    return antichannel_settings_callback(update, context, chat_id)
+
+
+def antichannel_linked_callback(update: Update, context: CallbackContext, chat_id: int):
+    """Разрешает/запрещает сообщения привязанного канала"""
+    query = update.callback_query
+    
+    settings = dict(get_antichannel_settings(chat_id))
+    settings["allow_linked"] = not settings.get("allow_linked", True)
+    set_antichannel_settings(chat_id, settings)
+    invalidate_chat_features(chat_id)
+    query.answer("✅ Привязанный канал разрешён" if settings["allow_linked"] else "❌ Привязанный канал удаляется")
+    
+    return antichannel_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      ЧЁРНЫЙ СПИСОК
 # ═══════════════════════════════════════════════════════════════
 
-def blacklist_settings_callback(update: Update, context: CallbackContext):
+def blacklist_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Настройки чёрного списка"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     settings = get_blacklist_settings(chat_id)
     enabled = settings.get("enabled", False)
     words = settings.get("words", [])
     action = settings.get("action", "delete")
+    homoglyphs = settings.get("homoglyphs", True)
     
     status = "✅ Вкл" if enabled else "❌ Выкл"
     action_text = {"delete": "🗑 Удалить", "warn": "⚠️ Варн", "mute": "🔇 Мут", "ban": "🔨 Бан"}.get(action, action)
@@ -2630,6 +2550,7 @@ def blacklist_settings_callback(update: Update, context: CallbackContext):
         f"🚫 *Чёрный список слов*\n\n"
         f"Статус: {status}\n"
         f"Действие: {action_text}\n"
+        f"Похожие буквы (a/а, o/о...): {'✅ ловить' if homoglyphs else '❌ не ловить'}\n"
         f"Слов в списке: `{len(words)}`\n\n"
     )
     
@@ -2650,6 +2571,12 @@ def blacklist_settings_callback(update: Update, context: CallbackContext):
                 callback_data=f"cfg_bl_toggle_{chat_id}"
             ),
         ],
+        [
+            InlineKeyboardButton(
+                f"🔤 Похожие буквы: {'вкл' if homoglyphs else 'выкл'}",
+                callback_data=f"cfg_bl_homoglyphs_{chat_id}"
+            ),
+        ],
         [
             InlineKeyboardButton("🗑 Удалить", callback_data=f"cfg_bl_action_delete_{chat_id}"),
             InlineKeyboardButton("⚠️ Варн", callback_data=f"cfg_bl_action_warn_{chat_id}"),
@@ -2667,44 +2594,47 @@ def blacklist_settings_callback(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def blacklist_toggle_callback(update: Update, context: CallbackContext):
+def blacklist_toggle_callback(update: Update, context: CallbackContext, chat_id: int):
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     
     settings = get_blacklist_settings(chat_id)
     settings["enabled"] = not settings.get("enabled", False)
     set_blacklist_settings(chat_id, settings)
     query.answer(f"✅ Чёрный список {'включён' if settings['enabled'] else 'выключен'}")
     
-    return blacklist_settings_callback(update, context)
+    return blacklist_settings_callback(update, context, chat_id)
 
 
-def blacklist_action_callback(update: Update, context: CallbackContext):
+def blacklist_homoglyphs_callback(update: Update, context: CallbackContext, chat_id: int):
+    query = update.callback_query
+    
+    settings = get_blacklist_settings(chat_id)
+    settings["homoglyphs"] = not settings.get("homoglyphs", True)
+    set_blacklist_settings(chat_id, settings)
+    query.answer(f"✅ Похожие буквы {'учитываются' if settings['homoglyphs'] else 'не учитываются'}")
+    
+    return blacklist_settings_callback(update, context, chat_id)
+
+
+def blacklist_action_callback(update: Update, context: CallbackContext, action: str, chat_id: int):
     query = update.callback_query
-    parts = query.data.split("_")
-    action = parts[3]
-    chat_id = int(parts[4])
     
     settings = get_blacklist_settings(chat_id)
     settings["action"] = action
     set_blacklist_settings(chat_id, settings)
     query.answer(f"✅ Действие: {action}")
     
-    return blacklist_settings_callback(update, context)
+    return blacklist_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
 #                      АДМИНЫ БОТА
 # ═══════════════════════════════════════════════════════════════
 
-def admins_settings_callback(update: Update, context: CallbackContext, chat_id_override=None):
+def admins_settings_callback(update: Update, context: CallbackContext, chat_id: int):
     """Управление админами бота"""
     query = update.callback_query
     
-    if chat_id_override:
-        chat_id = chat_id_override
-    else:
-        chat_id = int(query.data.split("_")[3])
     
     query.answer()
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "admins"}
@@ -2749,10 +2679,9 @@ def admins_settings_callback(update: Update, context: CallbackContext, chat_id_o
     return EDITING_SETTING
 
 
-def admin_add_callback(update: Update, context: CallbackContext):
+def admin_add_callback(update: Update, context: CallbackContext, chat_id: int):
     """Начинает добавление админа"""
     query = update.callback_query
-    chat_id = int(query.data.split("_")[3])
     query.answer()
     
     user_editing[update.effective_user.id] = {"chat_id": chat_id, "module": "admins", "action": "add"}
@@ -2813,15 +2742,10 @@ def process_admin_id(update: Update, context: CallbackContext):
     return EDITING_SETTING
 
 
-def admin_role_callback(update: Update, context: CallbackContext):
+def admin_role_callback(update: Update, context: CallbackContext, role: str, admin_id: int, chat_id: int):
     """Устанавливает роль админа"""
     query = update.callback_query
     user = update.effective_user
-    parts = query.data.split("_")
-    # cfg_adm_role_{role}_{admin_id}_{chat_id}
-    role = parts[3]
-    admin_id = int(parts[4])
-    chat_id = int(parts[5])
     
     if add_bot_admin:
         add_bot_admin(chat_id, admin_id, role, user.id)
@@ -2830,16 +2754,12 @@ def admin_role_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return admins_settings_callback(update, context, chat_id_override=chat_id)
+    return admins_settings_callback(update, context, chat_id)
 
 
-def admin_delete_callback(update: Update, context: CallbackContext):
+def admin_delete_callback(update: Update, context: CallbackContext, admin_id: int, chat_id: int):
     """Удаляет админа"""
     query = update.callback_query
-    parts = query.data.split("_")
-    # cfg_adm_del_{admin_id}_{chat_id}
-    admin_id = int(parts[3])
-    chat_id = int(parts[4])
     
     if remove_bot_admin:
         if remove_bot_admin(chat_id, admin_id):
@@ -2849,7 +2769,7 @@ def admin_delete_callback(update: Update, context: CallbackContext):
     else:
         query.answer("❌ Ошибка")
     
-    return admins_settings_callback(update, context, chat_id_override=chat_id)
+    return admins_settings_callback(update, context, chat_id)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -2937,6 +2857,7 @@ def reset_confirm_callback(update: Update, context: CallbackContext):
     
     # Выполняем сброс
     success, result = reset_all_data()
+    invalidate_chat_features()
     
     if success:
         deleted_files = result
@@ -2985,173 +2906,189 @@ def cancel_cmd(update: Update, context: CallbackContext):
 #                      РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
 # ═══════════════════════════════════════════════════════════════
 
+# Все кнопки cfg_ разбирает один маршрутизатор (helper_funcs/callback_router.py):
+# поиск по префиксному дереву, параметры приходят в обработчик уже разобранными
+
+MENU_ROUTES = [
+    ("cfg_chat_{chat_id:int}", chat_settings_callback),
+    ("cfg_refresh", refresh_callback),
+    ("cfg_close", close_callback),
+    ("cfg_reset_bot", reset_bot_callback),
+    ("cfg_reset_confirm", reset_confirm_callback),
+]
+
+MODULE_ROUTES = [
+    ("cfg_mod_welcome_{chat_id:int}", welcome_settings_callback),
+    ("cfg_mod_captcha_{chat_id:int}", captcha_settings_callback),
+    ("cfg_mod_rules_{chat_id:int}", rules_settings_callback),
+    ("cfg_mod_filters_{chat_id:int}", filters_settings_callback),
+    ("cfg_mod_notes_{chat_id:int}", notes_settings_callback),
+    ("cfg_mod_warns_{chat_id:int}", warns_settings_callback),
+    ("cfg_mod_antiflood_{chat_id:int}", antiflood_settings_callback),
+    ("cfg_mod_blacklist_{chat_id:int}", blacklist_settings_callback),
+    ("cfg_mod_admins_{chat_id:int}", admins_settings_callback),
+    ("cfg_mod_service_{chat_id:int}", service_settings_callback),
+    ("cfg_mod_logs_{chat_id:int}", logs_settings_callback),
+    ("cfg_mod_mediafilters_{chat_id:int}", media_filters_settings_callback),
+    ("cfg_mod_cas_{chat_id:int}", cas_settings_callback),
+    ("cfg_mod_antichannel_{chat_id:int}", antichannel_settings_callback),
+    ("cfg_back_main", back_to_main),
+]
+
+SETTING_ROUTES = [
+    # Приветствия
+    ("cfg_wel_toggle_{chat_id:int}", toggle_welcome),
+    ("cfg_lockdown_toggle_{chat_id:int}", toggle_lockdown),
+    ("cfg_wel_edit_{chat_id:int}", welcome_edit_callback),
+    ("cfg_wel_del_{seconds:int}_{chat_id:int}", welcome_delete_after_callback),
+    ("cfg_wel_addbtn_{chat_id:int}", welcome_add_button_callback),
+    ("cfg_wel_delbtn_{btn_index:int}_{chat_id:int}", welcome_delete_button_callback),
+    # Капча
+    ("cfg_cap_toggle_{chat_id:int}", toggle_captcha),
+    ("cfg_cap_mode_{mode}_{chat_id:int}", set_captcha_mode),
+    ("cfg_cap_timeout_{timeout:int}_{chat_id:int}", set_captcha_timeout),
+    ("cfg_cap_newbie_{mute_time:int}_{chat_id:int}", set_newbie_mute),
+    # Правила
+    ("cfg_rules_edit_{chat_id:int}", rules_edit_callback),
+    ("cfg_rules_clear_{chat_id:int}", rules_clear_callback),
+    # Фильтры
+    ("cfg_flt_add_{chat_id:int}", filter_add_callback),
+    ("cfg_flt_del_{keyword:rest}_{chat_id:int}", filter_delete_callback),
+    ("cfg_flt_autodel_{chat_id:int}", filter_autodelete_callback),
+    ("cfg_flt_adel_{minutes:int}_{chat_id:int}", filter_autodelete_set_callback),
+    # Мультифильтры
+    ("cfg_mflt_add_{chat_id:int}", multi_filter_add_callback),
+    ("cfg_mflt_done_{chat_id:int}", multi_filter_done_callback),
+    ("cfg_mflt_del_{keyword:rest}_{chat_id:int}", multi_filter_delete_callback),
+    # Заметки
+    ("cfg_note_add_{chat_id:int}", note_add_callback),
+    ("cfg_note_view_{note_name:rest}_{chat_id:int}", note_view_callback),
+    ("cfg_note_del_{note_name:rest}_{chat_id:int}", note_delete_callback),
+    ("cfg_note_btns_{note_name:rest}_{chat_id:int}", note_buttons_callback),
+    ("cfg_note_btndel_{note_name:rest}_{btn_index:int}_{chat_id:int}", note_button_delete_callback),
+    # Админы
+    ("cfg_adm_add_{chat_id:int}", admin_add_callback),
+    ("cfg_adm_del_{admin_id:int}_{chat_id:int}", admin_delete_callback),
+    ("cfg_adm_role_{role}_{admin_id:int}_{chat_id:int}", admin_role_callback),
+    # Варны
+    ("cfg_warns_limit_{action:inc|dec}_{chat_id:int}", warns_limit_callback),
+    ("cfg_warns_action_{action}_{chat_id:int}", warns_action_callback),
+    ("cfg_warns_expire_{chat_id:int}", warns_expire_callback),
+    # Антифлуд
+    ("cfg_flood_toggle_{chat_id:int}", antiflood_toggle_callback),
+    ("cfg_flood_limit_{action:inc|dec}_{chat_id:int}", antiflood_limit_callback),
+    ("cfg_flood_action_{action}_{chat_id:int}", antiflood_action_callback),
+    # Чёрный список
+    ("cfg_bl_toggle_{chat_id:int}", blacklist_toggle_callback),
+    ("cfg_bl_homoglyphs_{chat_id:int}", blacklist_homoglyphs_callback),
+    ("cfg_bl_action_{action}_{chat_id:int}", blacklist_action_callback),
+    # Сервисные сообщения
+    ("cfg_srv_toggle_{chat_id:int}", service_toggle_callback),
+    # Логи
+    ("cfg_log_setchan_{chat_id:int}", logs_set_channel_callback),
+    ("cfg_log_delchan_{chat_id:int}", logs_delete_channel_callback),
+    ("cfg_log_ev_{event:rest}_{chat_id:int}", logs_toggle_event_callback),
+    # Медиа-фильтры
+    ("cfg_mf_toggle_{chat_id:int}", media_filter_toggle_callback),
+    ("cfg_mf_types_{chat_id:int}", media_filters_types_callback),
+    ("cfg_mf_t_{media_type:rest}_{chat_id:int}", media_filter_type_toggle_callback),
+    ("cfg_mf_action_{chat_id:int}", media_filter_action_callback),
+    ("cfg_mf_setact_{action}_{chat_id:int}", media_filter_set_action_callback),
+    # CAS Anti-Spam
+    ("cfg_cas_toggle_{chat_id:int}", cas_toggle_callback),
+    ("cfg_cas_notify_{chat_id:int}", cas_notify_callback),
+    ("cfg_cas_action_{chat_id:int}", cas_action_callback),
+    ("cfg_cas_setact_{action}_{chat_id:int}", cas_set_action_callback),
+    # Антиканал
+    ("cfg_achan_toggle_{chat_id:int}", antichannel_toggle_callback),
+    ("cfg_achan_linked_{chat_id:int}", antichannel_linked_callback),
+    # Навигация
+    ("cfg_noop", noop_callback),
+]
+
+CONFIG_ROUTER = CallbackRouter(MENU_ROUTES + MODULE_ROUTES + SETTING_ROUTES)
+
+
+def _templates(routes) -> list:
+    return [template for template, _ in routes]
+
+
 config_conversation = ConversationHandler(
     entry_points=[
         CommandHandler(["config", "settings"], config_cmd),
     ],
     states={
         SELECTING_CHAT: [
-            CallbackQueryHandler(chat_settings_callback, pattern=r"^cfg_chat_-?\d+$"),
-            CallbackQueryHandler(refresh_callback, pattern=r"^cfg_refresh$"),
-            CallbackQueryHandler(close_callback, pattern=r"^cfg_close$"),
-            CallbackQueryHandler(reset_bot_callback, pattern=r"^cfg_reset_bot$"),
-            CallbackQueryHandler(reset_confirm_callback, pattern=r"^cfg_reset_confirm$"),
+            CONFIG_ROUTER.only(*_templates(MENU_ROUTES)),
         ],
         SELECTING_MODULE: [
-            CallbackQueryHandler(welcome_settings_callback, pattern=r"^cfg_mod_welcome_-?\d+$"),
-            CallbackQueryHandler(captcha_settings_callback, pattern=r"^cfg_mod_captcha_-?\d+$"),
-            CallbackQueryHandler(rules_settings_callback, pattern=r"^cfg_mod_rules_-?\d+$"),
-            CallbackQueryHandler(filters_settings_callback, pattern=r"^cfg_mod_filters_-?\d+$"),
-            CallbackQueryHandler(notes_settings_callback, pattern=r"^cfg_mod_notes_-?\d+$"),
-            CallbackQueryHandler(warns_settings_callback, pattern=r"^cfg_mod_warns_-?\d+$"),
-            CallbackQueryHandler(antiflood_settings_callback, pattern=r"^cfg_mod_antiflood_-?\d+$"),
-            CallbackQueryHandler(blacklist_settings_callback, pattern=r"^cfg_mod_blacklist_-?\d+$"),
-            CallbackQueryHandler(admins_settings_callback, pattern=r"^cfg_mod_admins_-?\d+$"),
-            CallbackQueryHandler(service_settings_callback, pattern=r"^cfg_mod_service_-?\d+$"),
-            CallbackQueryHandler(logs_settings_callback, pattern=r"^cfg_mod_logs_-?\d+$"),
-            CallbackQueryHandler(media_filters_settings_callback, pattern=r"^cfg_mod_mediafilters_-?\d+$"),
-            CallbackQueryHandler(cas_settings_callback, pattern=r"^cfg_mod_cas_-?\d+$"),
-            CallbackQueryHandler(antichannel_settings_callback, pattern=r"^cfg_mod_antichannel_-?\d+$"),
-            CallbackQueryHandler(back_to_main, pattern=r"^cfg_back_main$"),
+            CONFIG_ROUTER.only(*_templates(MODULE_ROUTES)),
         ],
         EDITING_SETTING: [
-            # Приветствия
-            CallbackQueryHandler(toggle_welcome, pattern=r"^cfg_wel_toggle_-?\d+$"),
-            CallbackQueryHandler(toggle_lockdown, pattern=r"^cfg_lockdown_toggle_-?\d+$"),
-            CallbackQueryHandler(welcome_edit_callback, pattern=r"^cfg_wel_edit_-?\d+$"),
-            CallbackQueryHandler(welcome_delete_after_callback, pattern=r"^cfg_wel_del_\d+_-?\d+$"),
-            CallbackQueryHandler(welcome_add_button_callback, pattern=r"^cfg_wel_addbtn_-?\d+$"),
-            CallbackQueryHandler(welcome_delete_button_callback, pattern=r"^cfg_wel_delbtn_\d+_-?\d+$"),
-            # Капча
-            CallbackQueryHandler(toggle_captcha, pattern=r"^cfg_cap_toggle_-?\d+$"),
-            CallbackQueryHandler(set_captcha_mode, pattern=r"^cfg_cap_mode_\w+_-?\d+$"),
-            CallbackQueryHandler(set_captcha_timeout, pattern=r"^cfg_cap_timeout_\d+_-?\d+$"),
-            CallbackQueryHandler(set_newbie_mute, pattern=r"^cfg_cap_newbie_\d+_-?\d+$"),
-            # Правила
-            CallbackQueryHandler(rules_edit_callback, pattern=r"^cfg_rules_edit_-?\d+$"),
-            CallbackQueryHandler(rules_clear_callback, pattern=r"^cfg_rules_clear_-?\d+$"),
-            # Фильтры
-            CallbackQueryHandler(filter_add_callback, pattern=r"^cfg_flt_add_-?\d+$"),
-            CallbackQueryHandler(filter_delete_callback, pattern=r"^cfg_flt_del_.+_-?\d+$"),
-            CallbackQueryHandler(filter_autodelete_callback, pattern=r"^cfg_flt_autodel_-?\d+$"),
-            CallbackQueryHandler(filter_autodelete_set_callback, pattern=r"^cfg_flt_adel_\d+_-?\d+$"),
-            # Мультифильтры
-            CallbackQueryHandler(multi_filter_add_callback, pattern=r"^cfg_mflt_add_-?\d+$"),
-            CallbackQueryHandler(multi_filter_done_callback, pattern=r"^cfg_mflt_done_-?\d+$"),
-            CallbackQueryHandler(multi_filter_delete_callback, pattern=r"^cfg_mflt_del_.+_-?\d+$"),
-            # Заметки
-            CallbackQueryHandler(note_add_callback, pattern=r"^cfg_note_add_-?\d+$"),
-            CallbackQueryHandler(note_view_callback, pattern=r"^cfg_note_view_.+_-?\d+$"),
-            CallbackQueryHandler(note_delete_callback, pattern=r"^cfg_note_del_.+_-?\d+$"),
-            CallbackQueryHandler(note_buttons_callback, pattern=r"^cfg_note_btns_.+_-?\d+$"),
-            CallbackQueryHandler(note_button_delete_callback, pattern=r"^cfg_note_btndel_.+_\d+_-?\d+$"),
-            # Админы
-            CallbackQueryHandler(admin_add_callback, pattern=r"^cfg_adm_add_-?\d+$"),
-            CallbackQueryHandler(admin_delete_callback, pattern=r"^cfg_adm_del_\d+_-?\d+$"),
-            CallbackQueryHandler(admin_role_callback, pattern=r"^cfg_adm_role_\w+_\d+_-?\d+$"),
-            # Варны
-            CallbackQueryHandler(warns_limit_callback, pattern=r"^cfg_warns_limit_(inc|dec)_-?\d+$"),
-            CallbackQueryHandler(warns_action_callback, pattern=r"^cfg_warns_action_\w+_-?\d+$"),
-            # Антифлуд
-            CallbackQueryHandler(antiflood_toggle_callback, pattern=r"^cfg_flood_toggle_-?\d+$"),
-            CallbackQueryHandler(antiflood_limit_callback, pattern=r"^cfg_flood_limit_(inc|dec)_-?\d+$"),
-            CallbackQueryHandler(antiflood_action_callback, pattern=r"^cfg_flood_action_\w+_-?\d+$"),
-            # Чёрный список
-            CallbackQueryHandler(blacklist_toggle_callback, pattern=r"^cfg_bl_toggle_-?\d+$"),
-            CallbackQueryHandler(blacklist_action_callback, pattern=r"^cfg_bl_action_\w+_-?\d+$"),
-            # Сервисные сообщения
-            CallbackQueryHandler(service_toggle_callback, pattern=r"^cfg_srv_toggle_-?\d+$"),
-            # Логи
-            CallbackQueryHandler(logs_settings_callback, pattern=r"^cfg_mod_logs_-?\d+$"),
-            CallbackQueryHandler(logs_set_channel_callback, pattern=r"^cfg_log_setchan_-?\d+$"),
-            CallbackQueryHandler(logs_delete_channel_callback, pattern=r"^cfg_log_delchan_-?\d+$"),
-            CallbackQueryHandler(logs_toggle_event_callback, pattern=r"^cfg_log_ev_\w+_-?\d+$"),
-            # Медиа-фильтры
-            CallbackQueryHandler(media_filters_settings_callback, pattern=r"^cfg_mod_mediafilters_-?\d+$"),
-            CallbackQueryHandler(media_filter_toggle_callback, pattern=r"^cfg_mf_toggle_-?\d+$"),
-            CallbackQueryHandler(media_filters_types_callback, pattern=r"^cfg_mf_types_-?\d+$"),
-            CallbackQueryHandler(media_filter_type_toggle_callback, pattern=r"^cfg_mf_t_\w+_-?\d+$"),
-            CallbackQueryHandler(media_filter_action_callback, pattern=r"^cfg_mf_action_-?\d+$"),
-            CallbackQueryHandler(media_filter_set_action_callback, pattern=r"^cfg_mf_setact_\w+_-?\d+$"),
-            # CAS Anti-Spam
-            CallbackQueryHandler(cas_settings_callback, pattern=r"^cfg_mod_cas_-?\d+$"),
-            CallbackQueryHandler(cas_toggle_callback, pattern=r"^cfg_cas_toggle_-?\d+$"),
-            CallbackQueryHandler(cas_notify_callback, pattern=r"^cfg_cas_notify_-?\d+$"),
-            CallbackQueryHandler(cas_action_callback, pattern=r"^cfg_cas_action_-?\d+$"),
-            CallbackQueryHandler(cas_set_action_callback, pattern=r"^cfg_cas_setact_\w+_-?\d+$"),
-            # Антиканал
-            CallbackQueryHandler(antichannel_settings_callback, pattern=r"^cfg_mod_antichannel_-?\d+$"),
-            CallbackQueryHandler(antichannel_toggle_callback, pattern=r"^cfg_achan_toggle_-?\d+$"),
-            # Навигация
-            CallbackQueryHandler(noop_callback, pattern=r"^cfg_noop$"),
-            CallbackQueryHandler(chat_settings_callback, pattern=r"^cfg_chat_-?\d+$"),
-            CallbackQueryHandler(welcome_settings_callback, pattern=r"^cfg_mod_welcome_-?\d+$"),
-            CallbackQueryHandler(captcha_settings_callback, pattern=r"^cfg_mod_captcha_-?\d+$"),
-            CallbackQueryHandler(rules_settings_callback, pattern=r"^cfg_mod_rules_-?\d+$"),
-            CallbackQueryHandler(filters_settings_callback, pattern=r"^cfg_mod_filters_-?\d+$"),
-            CallbackQueryHandler(notes_settings_callback, pattern=r"^cfg_mod_notes_-?\d+$"),
-            CallbackQueryHandler(warns_settings_callback, pattern=r"^cfg_mod_warns_-?\d+$"),
-            CallbackQueryHandler(antiflood_settings_callback, pattern=r"^cfg_mod_antiflood_-?\d+$"),
-            CallbackQueryHandler(blacklist_settings_callback, pattern=r"^cfg_mod_blacklist_-?\d+$"),
-            CallbackQueryHandler(admins_settings_callback, pattern=r"^cfg_mod_admins_-?\d+$"),
-            CallbackQueryHandler(back_to_main, pattern=r"^cfg_back_main$"),
+            CONFIG_ROUTER.only("cfg_chat_{chat_id:int}", *_templates(MODULE_ROUTES + SETTING_ROUTES)),
         ],
         WAITING_RULES_INPUT: [
             MessageHandler(Filters.text & ~Filters.command, process_rules_input),
-            CallbackQueryHandler(rules_settings_callback, pattern=r"^cfg_mod_rules_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_rules_{chat_id:int}"),
         ],
         WAITING_WELCOME_INPUT: [
             MessageHandler(Filters.text & ~Filters.command, process_welcome_input),
-            CallbackQueryHandler(welcome_settings_callback, pattern=r"^cfg_mod_welcome_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_welcome_{chat_id:int}"),
         ],
         WAITING_FILTER_KEYWORD: [
             MessageHandler(Filters.text & ~Filters.command, process_filter_keyword),
-            CallbackQueryHandler(filters_settings_callback, pattern=r"^cfg_mod_filters_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_filters_{chat_id:int}"),
         ],
         WAITING_FILTER_RESPONSE: [
             MessageHandler(
                 (Filters.text | Filters.animation | Filters.sticker | Filters.photo | Filters.video | Filters.document) & ~Filters.command,
                 process_filter_response
             ),
-            CallbackQueryHandler(filters_settings_callback, pattern=r"^cfg_mod_filters_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_filters_{chat_id:int}"),
         ],
         WAITING_NOTE_NAME: [
             MessageHandler(Filters.text & ~Filters.command, process_note_name),
-            CallbackQueryHandler(notes_settings_callback, pattern=r"^cfg_mod_notes_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_notes_{chat_id:int}"),
         ],
         WAITING_NOTE_CONTENT: [
             MessageHandler(Filters.text & ~Filters.command, process_note_content),
-            CallbackQueryHandler(notes_settings_callback, pattern=r"^cfg_mod_notes_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_notes_{chat_id:int}"),
         ],
         WAITING_ADMIN_ID: [
             MessageHandler(Filters.text & ~Filters.command, process_admin_id),
-            CallbackQueryHandler(admin_role_callback, pattern=r"^cfg_adm_role_\w+_\d+_-?\d+$"),
-            CallbackQueryHandler(admins_settings_callback, pattern=r"^cfg_mod_admins_-?\d+$"),
+            CONFIG_ROUTER.only(
+                "cfg_adm_role_{role}_{admin_id:int}_{chat_id:int}",
+                "cfg_mod_admins_{chat_id:int}",
+            ),
         ],
         WAITING_MULTI_KEYWORD: [
             MessageHandler(Filters.text & ~Filters.command, process_multi_keyword),
-            CallbackQueryHandler(filters_settings_callback, pattern=r"^cfg_mod_filters_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_filters_{chat_id:int}"),
         ],
         WAITING_MULTI_RESPONSES: [
             MessageHandler(
                 (Filters.text | Filters.animation | Filters.sticker | Filters.photo) & ~Filters.command,
                 process_multi_response
             ),
-            CallbackQueryHandler(multi_filter_done_callback, pattern=r"^cfg_mflt_done_-?\d+$"),
-            CallbackQueryHandler(filters_settings_callback, pattern=r"^cfg_mod_filters_-?\d+$"),
+            CONFIG_ROUTER.only(
+                "cfg_mflt_done_{chat_id:int}",
+                "cfg_mod_filters_{chat_id:int}",
+            ),
         ],
         WAITING_LOG_CHANNEL: [
             MessageHandler(Filters.text & ~Filters.command, process_log_channel_input),
-            CallbackQueryHandler(logs_settings_callback, pattern=r"^cfg_mod_logs_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_logs_{chat_id:int}"),
         ],
         WAITING_WELCOME_BUTTON: [
             MessageHandler(Filters.text & ~Filters.command, process_welcome_button),
-            CallbackQueryHandler(welcome_settings_callback, pattern=r"^cfg_mod_welcome_-?\d+$"),
+            CONFIG_ROUTER.only("cfg_mod_welcome_{chat_id:int}"),
         ],
         WAITING_NOTE_BUTTON: [
             MessageHandler(Filters.text & ~Filters.command, process_note_button),
-            CallbackQueryHandler(note_buttons_callback, pattern=r"^cfg_note_btns_.+_-?\d+$"),
-            CallbackQueryHandler(note_view_callback, pattern=r"^cfg_note_view_.+_-?\d+$"),
+            CONFIG_ROUTER.only(
+                "cfg_note_btns_{note_name:rest}_{chat_id:int}",
+                "cfg_note_view_{note_name:rest}_{chat_id:int}",
+            ),
         ],
     },
     fallbacks=[
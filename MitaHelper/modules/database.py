@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 """
 Файловая база данных для хранения данных бота
+
+По умолчанию данные лежат в JSON файлах в data/,
+с DATABASE_URL=sqlite:///... - в SQLite (см. sql/sqlite_store.py).
 """
 
+import atexit
+import glob
 import json
 import os
-from threading import RLock
-from typing import Dict, List, Optional, Any
+import sys
+from contextlib import nullcontext
+from threading import Event, Lock, RLock, Thread
+from typing import Callable, Dict, List, Optional, Set, Tuple, Any
 
-from MitaHelper import LOGGER
+from MitaHelper import LOGGER, DATABASE_URL, DB_FLUSH_INTERVAL
+from MitaHelper.modules.sql.sqlite_store import SQLiteStore, path_from_url
 
 # Путь к файлу базы данных
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
@@ -16,6 +24,9 @@ CHATS_FILE = os.path.join(DB_PATH, "chats.json")
 USERS_FILE = os.path.join(DB_PATH, "users.json")
 SETTINGS_FILE = os.path.join(DB_PATH, "settings.json")
 
+# Хранилище: JsonStore или SQLiteStore, выбирается в init_database()
+_backend = None
+
 # Блокировки для потокобезопасности
 CHATS_LOCK = RLock()
 USERS_LOCK = RLock()
@@ -34,24 +45,216 @@ def _ensure_db_dir():
 
 
 def _load_json(filepath: str) -> dict:
-    """Загружает JSON файл"""
+    """Загружает набор данных (ключи - str, как в JSON файле)"""
+    # Ещё не записанные изменения новее того, что лежит в хранилище
+    with DIRTY_LOCK:
+        pending = _dirty.get(filepath)
+    if pending is not None:
+        getter, lock, _ = pending
+        try:
+            with lock or nullcontext():
+                return json.loads(_backend_json(getter()))
+        except Exception as e:
+            LOGGER.warning(f"Ошибка чтения несохранённых данных {filepath}: {e}")
+
     try:
-        if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
-                return json.load(f)
+        return _backend.load(filepath)
     except Exception as e:
         LOGGER.warning(f"Ошибка загрузки {filepath}: {e}")
     return {}
 
 
 def _save_json(filepath: str, data: dict):
-    """Сохраняет данные в JSON файл"""
-    _ensure_db_dir()
+    """
+    Ставит данные в очередь на запись.
+    Словари модулей меняются без общей блокировки, поэтому в очередь
+    попадает копия, снятая сейчас - в потоке, который их изменил.
+    Фоновый поток живой словарь не обходит.
+    """
+    snapshot = json.loads(_backend_json(data))
+    _mark_dirty(filepath, lambda: snapshot)
+
+
+def _backend_json(data: dict) -> str:
+    """Словарь с ключами, приведёнными к str, как JSON-текст"""
+    return json.dumps({str(k): v for k, v in data.items()}, ensure_ascii=False)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                    ХРАНИЛИЩЕ НА ДИСКЕ
+# ═══════════════════════════════════════════════════════════════
+
+class JsonStore:
+    """
+    Хранилище по умолчанию - по JSON файлу на каждый набор данных.
+    prepare() вызывается под блокировкой набора, commit() - уже без неё.
+    """
+
+    def load(self, filepath: str) -> dict:
+        if os.path.exists(filepath):
+            with open(filepath, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def prepare(self, filepath: str, data: dict, keys: Optional[Set] = None) -> str:
+        # JSON файл переписывается целиком, keys не нужны
+        return json.dumps({str(k): v for k, v in data.items()}, ensure_ascii=False, indent=2)
+
+    def commit(self, filepath: str, text: str):
+        """
+        Записывает файл атомарно: временный файл + fsync + rename.
+        При падении посреди записи на диске остаётся старая версия, а не обрубок.
+        """
+        _ensure_db_dir()
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+
+        # Фиксируем сам rename (на Windows каталог так не открыть)
+        if os.name == "posix":
+            dir_fd = os.open(DB_PATH, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def reset(self) -> List[str]:
+        """Удаляет все JSON файлы в папке data"""
+        deleted_files = []
+        if os.path.exists(DB_PATH):
+            for filepath in glob.glob(os.path.join(DB_PATH, "*.json")):
+                try:
+                    os.remove(filepath)
+                    deleted_files.append(os.path.basename(filepath))
+                    LOGGER.info(f"Удалён файл: {filepath}")
+                except Exception as e:
+                    LOGGER.error(f"Ошибка удаления {filepath}: {e}")
+        return deleted_files
+
+
+def _open_backend():
+    """
+    Выбирает хранилище по DATABASE_URL.
+    sqlite:///путь - SQLite (при первом запуске туда импортируются data/*.json),
+    иначе - JSON файлы в data/.
+    Если SQLite задана, но не открывается или импорт не удался, бот
+    не запускается: молча работать на старых JSON файлах - значит
+    потерять всё, что записано в SQLite.
+    """
+    sqlite_path = path_from_url(DATABASE_URL)
+    if sqlite_path is None:
+        return JsonStore()
+
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        store = SQLiteStore(sqlite_path)
+        store.import_json_dir(DB_PATH)
+        return store
     except Exception as e:
-        LOGGER.error(f"Ошибка сохранения {filepath}: {e}")
+        LOGGER.error(f"Не удалось открыть SQLite {sqlite_path}: {e}. Бот остановлен.")
+        sys.exit(1)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                    ОТЛОЖЕННАЯ ЗАПИСЬ НА ДИСК
+# ═══════════════════════════════════════════════════════════════
+
+# Изменения не пишутся на диск сразу: набор данных помечается «грязным»,
+# а фоновый поток раз в DB_FLUSH_INTERVAL секунд записывает всё
+# накопившееся. Сколько бы раз набор ни менялся за интервал,
+# на диск он попадёт один раз.
+
+# {путь к файлу: (функция, возвращающая актуальный словарь, его блокировка,
+#                изменённые ключи или None, если менялось что угодно)}
+_dirty: Dict[str, Tuple[Callable[[], dict], Optional[RLock], Optional[Set]]] = {}
+DIRTY_LOCK = Lock()
+# Одновременно на диск пишет только один поток
+FLUSH_LOCK = Lock()
+
+_flush_stop = Event()
+_flusher: Optional[Thread] = None
+
+
+def _merge_keys(old: Optional[Set], new: Optional[Set]) -> Optional[Set]:
+    """Объединяет изменённые ключи (None - изменилось всё)"""
+    if old is None or new is None:
+        return None
+    return old | new
+
+
+def _mark_dirty(filepath: str, getter: Callable[[], dict], lock: RLock = None, keys: Set = None):
+    """
+    Помечает набор данных как изменённый, запись выполнит фоновый поток.
+    keys - какие записи поменялись; SQLite тогда обновит только их.
+    getter вызывается под lock; без lock он должен возвращать данные,
+    которые больше никто не меняет (копию).
+    """
+    with DIRTY_LOCK:
+        entry = _dirty.get(filepath)
+        if entry is None:
+            merged = set(keys) if keys is not None else None
+        elif entry[2] is not None and keys is not None:
+            # Множество принадлежит очереди - дополняем на месте,
+            # чтобы серия мелких изменений не копировала его каждый раз
+            merged = entry[2]
+            merged.update(keys)
+        else:
+            merged = None
+        _dirty[filepath] = (getter, lock, merged)
+    _start_flusher()
+
+
+def flush_database():
+    """Записывает на диск все несохранённые изменения"""
+    with FLUSH_LOCK:
+        with DIRTY_LOCK:
+            pending = dict(_dirty)
+            _dirty.clear()
+
+        for filepath, (getter, lock, keys) in pending.items():
+            try:
+                with lock or nullcontext():
+                    payload = _backend.prepare(filepath, getter(), keys)
+                _backend.commit(filepath, payload)
+                continue
+            except Exception as e:
+                LOGGER.error(f"Ошибка сохранения {filepath}: {e}")
+
+            # Не получилось - вернём в очередь (свежая версия, если есть, важнее)
+            with DIRTY_LOCK:
+                newer = _dirty.get(filepath)
+                if newer is None:
+                    _dirty[filepath] = (getter, lock, keys)
+                else:
+                    _dirty[filepath] = (newer[0], newer[1], _merge_keys(newer[2], keys))
+
+
+def _flush_loop():
+    """Фоновый поток записи"""
+    while not _flush_stop.wait(DB_FLUSH_INTERVAL):
+        flush_database()
+
+
+def _start_flusher():
+    """Запускает фоновый поток записи, если он ещё не запущен"""
+    global _flusher
+    if _flusher is not None or _flush_stop.is_set():
+        return
+    with DIRTY_LOCK:
+        if _flusher is None:
+            _flusher = Thread(target=_flush_loop, name="db-flusher", daemon=True)
+            _flusher.start()
+
+
+def shutdown_database():
+    """Останавливает фоновую запись и сбрасывает на диск всё, что осталось"""
+    _flush_stop.set()
+    flush_database()
+
+
+atexit.register(shutdown_database)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -70,10 +273,7 @@ def load_chats():
 
 def save_chats():
     """Сохраняет чаты в файл"""
-    with CHATS_LOCK:
-        # Конвертируем ключи в str для JSON
-        data = {str(k): v for k, v in _chats_cache.items()}
-        _save_json(CHATS_FILE, data)
+    _mark_dirty(CHATS_FILE, lambda: _chats_cache, CHATS_LOCK)
 
 
 def add_chat(chat_id: int, title: str, added_by: int) -> bool:
@@ -174,46 +374,84 @@ def is_chat_admin(chat_id: int, user_id: int) -> bool:
 #                         ПОЛЬЗОВАТЕЛИ
 # ═══════════════════════════════════════════════════════════════
 
+# Индекс username (в нижнем регистре) -> user_id.
+# Поддерживается ensure_user, чтобы поиск по @username не перебирал всех.
+_username_index: Dict[str, int] = {}
+
+
+def _build_username_index():
+    """Перестраивает индекс username по кешу пользователей"""
+    global _username_index
+    with USERS_LOCK:
+        _username_index = {
+            data["username"]: user_id
+            for user_id, data in _users_cache.items()
+            if data.get("username")
+        }
+
+
 def load_users():
     """Загружает пользователей из файла"""
     global _users_cache
     with USERS_LOCK:
         data = _load_json(USERS_FILE)
         _users_cache = {int(k): v for k, v in data.items()}
+        _build_username_index()
     LOGGER.info(f"Загружено {len(_users_cache)} пользователей из БД")
 
 
 def save_users():
     """Сохраняет пользователей в файл"""
-    with USERS_LOCK:
-        data = {str(k): v for k, v in _users_cache.items()}
-        _save_json(USERS_FILE, data)
+    _mark_dirty(USERS_FILE, lambda: _users_cache, USERS_LOCK)
 
 
 def ensure_user(user_id: int, username: str = None, first_name: str = None):
-    """Добавляет/обновляет пользователя"""
+    """
+    Добавляет/обновляет пользователя.
+    username - как в Telegram: None значит, что username у пользователя нет
+    (если был - он удаляется из индекса, его может занять другой).
+    """
+    username = username.lower() if username else None
     with USERS_LOCK:
-        if user_id not in _users_cache:
-            _users_cache[user_id] = {}
+        # Частый случай - пользователь уже известен и ничего не поменял
+        data = _users_cache.get(user_id)
+        if (
+            data is not None
+            and data.get("username") == username
+            and (not first_name or data.get("first_name") == first_name)
+        ):
+            return
         
-        if username:
-            _users_cache[user_id]["username"] = username.lower()
+        changed = {user_id}
+        data = _users_cache.setdefault(user_id, {})
+        
+        old_username = data.get("username")
+        if old_username != username:
+            # Пользователь сменил или убрал username - старый больше не его
+            if old_username and _username_index.get(old_username) == user_id:
+                del _username_index[old_username]
+            if username:
+                # Username освободился и достался другому
+                previous_owner = _username_index.get(username)
+                if previous_owner is not None and previous_owner != user_id:
+                    _users_cache.get(previous_owner, {}).pop("username", None)
+                    changed.add(previous_owner)
+                _username_index[username] = user_id
+                data["username"] = username
+            else:
+                data.pop("username", None)
         if first_name:
-            _users_cache[user_id]["first_name"] = first_name
+            data["first_name"] = first_name
         
-        # Сохраняем каждые N пользователей или при первом добавлении
-        if len(_users_cache) % 100 == 0:
-            save_users()
+        # Записываются только изменённые пользователи
+        _mark_dirty(USERS_FILE, lambda: _users_cache, USERS_LOCK, changed)
 
 
 def get_user_by_username(username: str) -> Optional[int]:
     """Получает ID пользователя по username"""
-    username = username.lower().lstrip("@")
+    username = username.lstrip("@").lower()
     with USERS_LOCK:
-        for user_id, data in _users_cache.items():
-            if data.get("username", "").lower() == username:
-                return user_id
-    return None
+        return _username_index.get(username)
 
 
 def get_user(user_id: int) -> Optional[dict]:
@@ -222,6 +460,74 @@ def get_user(user_id: int) -> Optional[dict]:
         return _users_cache.get(user_id)
 
 
+def get_all_users() -> Dict[int, dict]:
+    """Получает всех пользователей"""
+    with USERS_LOCK:
+        return _users_cache.copy()
+
+
+def count_users() -> int:
+    """Возвращает количество пользователей"""
+    with USERS_LOCK:
+        return len(_users_cache)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                    ЧАТЫ, ГДЕ ВИДЕЛИ БОТА
+# ═══════════════════════════════════════════════════════════════
+
+# Все чаты, откуда приходили сообщения (в отличие от _chats_cache,
+# где только чаты, добавленные в панель управления)
+TRACKED_CHATS_FILE = os.path.join(DB_PATH, "tracked_chats.json")
+TRACKED_CHATS_LOCK = RLock()
+_tracked_chats_cache: Dict[int, dict] = {}
+
+
+def load_tracked_chats():
+    """Загружает отслеживаемые чаты"""
+    global _tracked_chats_cache
+    with TRACKED_CHATS_LOCK:
+        data = _load_json(TRACKED_CHATS_FILE)
+        _tracked_chats_cache = {int(k): v for k, v in data.items()}
+
+
+def ensure_tracked_chat(chat_id: int, title: str = None, username: str = None):
+    """Добавляет/обновляет отслеживаемый чат"""
+    with TRACKED_CHATS_LOCK:
+        data = _tracked_chats_cache.get(chat_id)
+        if (
+            data is not None
+            and (not title or data.get("title") == title)
+            and (not username or data.get("username") == username)
+        ):
+            return
+        
+        data = _tracked_chats_cache.setdefault(chat_id, {})
+        if title:
+            data["title"] = title
+        if username:
+            data["username"] = username
+        _mark_dirty(TRACKED_CHATS_FILE, lambda: _tracked_chats_cache, TRACKED_CHATS_LOCK, {chat_id})
+
+
+def get_tracked_chat(chat_id: int) -> Optional[dict]:
+    """Получает данные отслеживаемого чата"""
+    with TRACKED_CHATS_LOCK:
+        return _tracked_chats_cache.get(chat_id)
+
+
+def get_all_tracked_chats() -> Dict[int, dict]:
+    """Получает все отслеживаемые чаты"""
+    with TRACKED_CHATS_LOCK:
+        return _tracked_chats_cache.copy()
+
+
+def count_tracked_chats() -> int:
+    """Возвращает количество отслеживаемых чатов"""
+    with TRACKED_CHATS_LOCK:
+        return len(_tracked_chats_cache)
+
+
 # ═══════════════════════════════════════════════════════════════
 #                         НАСТРОЙКИ
 # ═══════════════════════════════════════════════════════════════
@@ -237,6 +543,9 @@ MEDIA_FILTERS_FILE = os.path.join(DB_PATH, "media_filters.json")
 CAS_SETTINGS_FILE = os.path.join(DB_PATH, "cas_settings.json")
 ANTIFLOOD_FILE = os.path.join(DB_PATH, "antiflood.json")
 WARNS_FILE = os.path.join(DB_PATH, "warns.json")
+USER_WARNS_FILE = os.path.join(DB_PATH, "user_warns.json")
+TIMERS_FILE = os.path.join(DB_PATH, "timers.json")
+PENDING_CAPTCHA_FILE = os.path.join(DB_PATH, "pending_captcha.json")
 BLACKLIST_FILE = os.path.join(DB_PATH, "blacklist.json")
 USER_SETTINGS_FILE = os.path.join(DB_PATH, "user_settings.json")
 MULTI_FILTERS_FILE = os.path.join(DB_PATH, "multi_filters.json")
@@ -253,8 +562,7 @@ def load_settings():
 
 def save_settings():
     """Сохраняет настройки в файл"""
-    with SETTINGS_LOCK:
-        _save_json(SETTINGS_FILE, _settings_cache)
+    _mark_dirty(SETTINGS_FILE, lambda: _settings_cache, SETTINGS_LOCK)
 
 
 def get_setting(chat_id: int, key: str, default=None):
@@ -300,10 +608,9 @@ def load_module_settings(filepath: str) -> dict:
 
 
 def save_module_settings(filepath: str, data: dict):
-    """Сохраняет настройки модуля в файл"""
-    # Конвертируем ключи в str для JSON
-    json_data = {str(k): v for k, v in data.items()}
-    _save_json(filepath, json_data)
+    """Сохраняет настройки модуля в файл (отложенно)"""
+    # Ключи конвертируются в str в момент записи
+    _save_json(filepath, data)
 
 
 # Функции для welcome
@@ -386,6 +693,40 @@ def save_warns_settings(data: dict):
     save_module_settings(WARNS_FILE, data)
 
 
+# Функции для варнов пользователей {chat_id: {user_id: [варн, ...]}}
+def load_user_warns() -> dict:
+    return load_module_settings(USER_WARNS_FILE)
+
+def save_user_warns(data: dict, lock: RLock = None, chat_ids: Set = None):
+    """
+    Ставит варны в очередь на запись.
+    chat_ids - чаты, где что-то поменялось: SQLite перепишет только их строки.
+    """
+    _mark_dirty(USER_WARNS_FILE, lambda: data, lock, chat_ids)
+
+
+# Функции для таймеров {имя: {"kind": str, "at": float, "data": dict}}
+def load_timers() -> dict:
+    return load_module_settings(TIMERS_FILE)
+
+def save_timers(data: dict, lock: RLock = None, names: Set = None):
+    """Ставит таймеры в очередь на запись (names - изменённые таймеры)"""
+    _mark_dirty(TIMERS_FILE, lambda: data, lock, names)
+
+
+# Функции для незавершённых капч {chat_id: {user_id: капча}}
+def load_pending_captcha() -> dict:
+    return load_module_settings(PENDING_CAPTCHA_FILE)
+
+def save_pending_captcha(snapshot: Callable[[], dict], chat_ids: Set = None):
+    """
+    Ставит капчи в очередь на запись (chat_ids - чаты, где что-то поменялось).
+    Капчи защищены блокировками по чатам, а не одной, поэтому вместо
+    словаря передаётся snapshot - он сам копирует их под своими блокировками.
+    """
+    _mark_dirty(PENDING_CAPTCHA_FILE, snapshot, None, chat_ids)
+
+
 # Функции для blacklist
 def load_blacklist_settings() -> dict:
     return load_module_settings(BLACKLIST_FILE)
@@ -403,35 +744,72 @@ def save_multi_filters_settings(data: dict):
 
 
 # Функции для antichannel (антиканал)
+# Настройки держатся в памяти: проверка идёт на каждое сообщение в группе,
+# поэтому читать файл каждый раз нельзя.
+# {chat_id: {"enabled": bool, "allow_linked": bool, "allowed": [channel_id, ...]}}
+_antichannel_cache: Dict[int, dict] = {}
+ANTICHANNEL_LOCK = RLock()
+
 def load_antichannel_settings() -> dict:
-    return load_module_settings(ANTICHANNEL_FILE)
+    """Загружает настройки антиканала в кеш"""
+    global _antichannel_cache
+    with ANTICHANNEL_LOCK:
+        _antichannel_cache = load_module_settings(ANTICHANNEL_FILE)
+    return _antichannel_cache
 
-def save_antichannel_settings(data: dict):
-    save_module_settings(ANTICHANNEL_FILE, data)
+def save_antichannel_settings(chat_ids: Set = None):
+    """Ставит настройки антиканала в очередь на запись"""
+    _mark_dirty(ANTICHANNEL_FILE, lambda: _antichannel_cache, ANTICHANNEL_LOCK, chat_ids)
 
 def get_antichannel_settings(chat_id: int) -> dict:
-    """Получает настройки антиканала для чата"""
-    data = load_antichannel_settings()
-    return data.get(chat_id, {"enabled": False})
+    """Получает настройки антиканала для чата (один поиск в словаре)"""
+    settings = _antichannel_cache.get(chat_id)
+    if settings is None:
+        return {"enabled": False}
+    return settings
 
 def set_antichannel_settings(chat_id: int, settings: dict):
     """Сохраняет настройки антиканала для чата"""
-    data = load_antichannel_settings()
-    data[chat_id] = settings
-    save_antichannel_settings(data)
+    with ANTICHANNEL_LOCK:
+        _antichannel_cache[chat_id] = settings
+        save_antichannel_settings({chat_id})
 
 def toggle_antichannel(chat_id: int) -> bool:
     """Переключает антиканал и возвращает новое состояние"""
-    settings = get_antichannel_settings(chat_id)
-    new_state = not settings.get("enabled", False)
-    settings["enabled"] = new_state
-    set_antichannel_settings(chat_id, settings)
+    with ANTICHANNEL_LOCK:
+        settings = dict(get_antichannel_settings(chat_id))
+        new_state = not settings.get("enabled", False)
+        settings["enabled"] = new_state
+        set_antichannel_settings(chat_id, settings)
     return new_state
 
 def is_antichannel_enabled(chat_id: int) -> bool:
     """Проверяет, включён ли антиканал"""
-    settings = get_antichannel_settings(chat_id)
-    return settings.get("enabled", False)
+    return get_antichannel_settings(chat_id).get("enabled", False)
+
+def allow_antichannel_channel(chat_id: int, channel_id: int) -> bool:
+    """Добавляет канал в разрешённые. False - уже был в списке"""
+    with ANTICHANNEL_LOCK:
+        settings = dict(get_antichannel_settings(chat_id))
+        allowed = list(settings.get("allowed", []))
+        if channel_id in allowed:
+            return False
+        allowed.append(channel_id)
+        settings["allowed"] = allowed
+        set_antichannel_settings(chat_id, settings)
+    return True
+
+def disallow_antichannel_channel(chat_id: int, channel_id: int) -> bool:
+    """Убирает канал из разрешённых. False - его там не было"""
+    with ANTICHANNEL_LOCK:
+        settings = dict(get_antichannel_settings(chat_id))
+        allowed = list(settings.get("allowed", []))
+        if channel_id not in allowed:
+            return False
+        allowed.remove(channel_id)
+        settings["allowed"] = allowed
+        set_antichannel_settings(chat_id, settings)
+    return True
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -451,9 +829,7 @@ def load_user_settings() -> dict:
 
 def save_user_settings_db():
     """Сохраняет пользовательские настройки"""
-    with USER_SETTINGS_LOCK:
-        data = {str(k): v for k, v in _user_settings_cache.items()}
-        _save_json(USER_SETTINGS_FILE, data)
+    _mark_dirty(USER_SETTINGS_FILE, lambda: _user_settings_cache, USER_SETTINGS_LOCK)
 
 def get_user_setting(user_id: int, key: str, default=None):
     """Получает настройку пользователя"""
@@ -486,38 +862,38 @@ def set_delete_mod_commands(user_id: int, enabled: bool):
 def reset_all_data():
     """
     Полностью сбрасывает все данные бота.
-    Удаляет все JSON файлы из папки data/.
+    Удаляет все JSON файлы из папки data/ (для SQLite - очищает таблицы).
     НЕ затрагивает .env файл.
     """
-    global _chats_cache, _users_cache, _settings_cache, _user_settings_cache
-    
-    import glob
+    global _chats_cache, _users_cache, _settings_cache, _user_settings_cache, _tracked_chats_cache
+    global _antichannel_cache
     
     # Очищаем кеши
     with CHATS_LOCK:
         _chats_cache = {}
     with USERS_LOCK:
         _users_cache = {}
+        _username_index.clear()
     with SETTINGS_LOCK:
         _settings_cache = {}
     with USER_SETTINGS_LOCK:
         _user_settings_cache = {}
+    with TRACKED_CHATS_LOCK:
+        _tracked_chats_cache = {}
+    with ANTICHANNEL_LOCK:
+        _antichannel_cache = {}
     
-    # Удаляем все JSON файлы в папке data
-    deleted_files = []
-    try:
-        if os.path.exists(DB_PATH):
-            json_files = glob.glob(os.path.join(DB_PATH, "*.json"))
-            for filepath in json_files:
-                try:
-                    os.remove(filepath)
-                    deleted_files.append(os.path.basename(filepath))
-                    LOGGER.info(f"Удалён файл: {filepath}")
-                except Exception as e:
-                    LOGGER.error(f"Ошибка удаления {filepath}: {e}")
-    except Exception as e:
-        LOGGER.error(f"Ошибка при сбросе данных: {e}")
-        return False, str(e)
+    # Очищаем хранилище.
+    # Очередь записи чистим под FLUSH_LOCK, чтобы фоновый поток
+    # не вернул удалённые данные на место.
+    with FLUSH_LOCK:
+        with DIRTY_LOCK:
+            _dirty.clear()
+        try:
+            deleted_files = _backend.reset()
+        except Exception as e:
+            LOGGER.error(f"Ошибка при сбросе данных: {e}")
+            return False, str(e)
     
     LOGGER.warning("ПОЛНЫЙ СБРОС ДАННЫХ ВЫПОЛНЕН!")
     return True, deleted_files
@@ -529,11 +905,15 @@ def reset_all_data():
 
 def init_database():
     """Инициализирует базу данных"""
+    global _backend
     _ensure_db_dir()
+    _backend = _open_backend()
     load_chats()
     load_users()
+    load_tracked_chats()
     load_settings()
     load_user_settings()
+    load_antichannel_settings()
     LOGGER.info("База данных инициализирована")
 
 
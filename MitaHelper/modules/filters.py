@@ -3,24 +3,37 @@
 Модуль фильтров - автоматические ответы на ключевые слова
 """
 
-import re
 import random
+from threading import RLock
+
 from telegram import ParseMode, Update
 from telegram.error import BadRequest
 from telegram.ext import (
     CallbackContext,
     CommandHandler,
-    Filters,
-    MessageHandler,
 )
 
 from MitaHelper import dispatcher, LOGGER
 from MitaHelper.modules.helper_funcs.chat_status import user_admin
+from MitaHelper.modules.helper_funcs.keyword_matcher import KeywordMatcher
+from MitaHelper.modules.helper_funcs.pipeline import (
+    KIND_COMMAND,
+    KIND_TEXT,
+    MessageFeatures,
+    invalidate_chat_features,
+    register_stage,
+)
+from MitaHelper.modules.helper_funcs.timers import delete_message_later
 
 
 # Хранилище фильтров
 filters_storage = {}
 
+# Скомпилированные матчеры ключевых слов {chat_id: (KeywordMatcher, {keyword: "multi"/"filter"})}
+# Пересобираются только после изменения фильтров или мультифильтров чата
+_matchers = {}
+MATCHERS_LOCK = RLock()
+
 # Загрузка из БД
 try:
     from MitaHelper.modules.database import load_filters_settings, save_filters_settings
@@ -39,6 +52,43 @@ def _save_filters_to_db():
         save_filters_settings(filters_storage)
 
 
+def invalidate_filter_matcher(chat_id):
+    """Сбрасывает скомпилированный матчер чата после изменения ключевых слов"""
+    with MATCHERS_LOCK:
+        _matchers.pop(chat_id, None)
+    invalidate_chat_features(chat_id)
+
+
+def _get_filter_matcher(chat_id):
+    """Получает (или собирает) матчер по мультифильтрам и обычным фильтрам чата"""
+    with MATCHERS_LOCK:
+        cached = _matchers.get(chat_id)
+        if cached is not None:
+            return cached
+
+        try:
+            from MitaHelper.modules.config_panel import get_multi_filters
+            multi = get_multi_filters(chat_id)
+        except ImportError:
+            multi = {}
+
+        # Мультифильтры проверяются первыми, затем обычные фильтры
+        kinds = {}
+        for keyword in list(multi):
+            kinds.setdefault(keyword, "multi")
+        for keyword in list(filters_storage.get(chat_id, {})):
+            kinds.setdefault(keyword, "filter")
+
+        cached = (KeywordMatcher(kinds), kinds)
+        _matchers[chat_id] = cached
+        return cached
+
+
+def has_filters(chat_id) -> bool:
+    """Есть ли в чате фильтры или мультифильтры"""
+    return bool(_get_filter_matcher(chat_id)[1])
+
+
 def get_filter(chat_id, keyword):
     """Получает фильтр по ключевому слову"""
     chat_filters = filters_storage.get(chat_id, {})
@@ -56,6 +106,7 @@ def save_filter(chat_id, keyword, content, media_type=None, media_id=None):
         "media_type": media_type,
         "media_id": media_id,
     }
+    invalidate_filter_matcher(chat_id)
     _save_filters_to_db()
 
 
@@ -64,6 +115,7 @@ def delete_filter(chat_id, keyword):
     if chat_id in filters_storage:
         if keyword.lower() in filters_storage[chat_id]:
             del filters_storage[chat_id][keyword.lower()]
+            invalidate_filter_matcher(chat_id)
             _save_filters_to_db()
             return True
     return False
@@ -168,28 +220,17 @@ def filters_list(update: Update, context: CallbackContext):
     msg.reply_text(text, parse_mode=ParseMode.MARKDOWN)
 
 
-def schedule_delete(context: CallbackContext):
-    """Удаляет сообщение по расписанию"""
-    job = context.job
-    chat_id = job.context["chat_id"]
-    message_id = job.context["message_id"]
-    
-    try:
-        context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception as e:
-        LOGGER.warning(f"Не удалось удалить сообщение фильтра: {e}")
-
-
-def reply_filter(update: Update, context: CallbackContext):
-    """Обрабатывает сообщения и отвечает на фильтры"""
+def reply_filter(update: Update, context: CallbackContext, features: MessageFeatures):
+    """Обрабатывает сообщения и отвечает на фильтры (этап конвейера)"""
     chat = update.effective_chat
     msg = update.effective_message
     
-    if not msg.text:
+    # Один проход скомпилированного матчера вместо регекса на каждое слово
+    matcher, kinds = _get_filter_matcher(chat.id)
+    keyword = matcher.search(features.text_lower)
+    if keyword is None:
         return
     
-    text_lower = msg.text.lower()
-    
     # Получаем время автоудаления
     try:
         from MitaHelper.modules.config_panel import get_filter_autodelete
@@ -199,80 +240,65 @@ def reply_filter(update: Update, context: CallbackContext):
     
     sent_msg = None
     
-    # Сначала проверяем мультифильтры
-    try:
-        from MitaHelper.modules.config_panel import get_multi_filters
-        multi = get_multi_filters(chat.id)
+    # Мультифильтр: выбираем случайный ответ
+    if kinds[keyword] == "multi":
+        try:
+            from MitaHelper.modules.config_panel import get_multi_filters
+            responses = get_multi_filters(chat.id).get(keyword)
+        except ImportError:
+            responses = None
         
-        for keyword, responses in multi.items():
-            pattern = r'(?:^|[^\w])' + re.escape(keyword) + r'(?:[^\w]|$)'
-            if re.search(pattern, text_lower):
-                # Выбираем случайный ответ
-                response = random.choice(responses)
-                try:
-                    if response["type"] == "sticker":
-                        sent_msg = msg.reply_sticker(response["file_id"])
-                    elif response["type"] == "animation":
-                        sent_msg = msg.reply_animation(response["file_id"], caption=response.get("caption") or None)
-                    elif response["type"] == "photo":
-                        sent_msg = msg.reply_photo(response["file_id"], caption=response.get("caption") or None)
-                    elif response["type"] == "text":
-                        sent_msg = msg.reply_text(response["content"])
-                    
-                    # Планируем удаление
-                    if sent_msg and autodelete_minutes > 0:
-                        context.job_queue.run_once(
-                            schedule_delete,
-                            autodelete_minutes * 60,
-                            context={"chat_id": chat.id, "message_id": sent_msg.message_id}
-                        )
-                except BadRequest as e:
-                    LOGGER.warning(f"Ошибка отправки мультифильтра: {e}")
-                return
-    except ImportError:
-        pass
+        if not responses:
+            return
+        
+        response = random.choice(responses)
+        try:
+            if response["type"] == "sticker":
+                sent_msg = msg.reply_sticker(response["file_id"])
+            elif response["type"] == "animation":
+                sent_msg = msg.reply_animation(response["file_id"], caption=response.get("caption") or None)
+            elif response["type"] == "photo":
+                sent_msg = msg.reply_photo(response["file_id"], caption=response.get("caption") or None)
+            elif response["type"] == "text":
+                sent_msg = msg.reply_text(response["content"])
+            
+            # Планируем удаление
+            if sent_msg and autodelete_minutes > 0:
+                delete_message_later(chat.id, sent_msg.message_id, autodelete_minutes * 60)
+        except BadRequest as e:
+            LOGGER.warning(f"Ошибка отправки мультифильтра: {e}")
+        return
     
-    # Затем обычные фильтры
-    all_filters = get_all_filters(chat.id)
-    if not all_filters:
+    # Обычный фильтр
+    filt = get_all_filters(chat.id).get(keyword)
+    if not filt:
         return
     
-    for keyword, filt in all_filters.items():
-        # Проверяем, содержит ли сообщение ключевое слово
-        pattern = r'(?:^|[^\w])' + re.escape(keyword) + r'(?:[^\w]|$)'
-        if re.search(pattern, text_lower):
-            try:
-                if filt["media_type"] == "animation":
-                    sent_msg = msg.reply_animation(filt["media_id"], caption=filt["content"] or None)
-                elif filt["media_type"] == "photo":
-                    sent_msg = msg.reply_photo(filt["media_id"], caption=filt["content"] or None)
-                elif filt["media_type"] == "video":
-                    sent_msg = msg.reply_video(filt["media_id"], caption=filt["content"] or None)
-                elif filt["media_type"] == "document":
-                    sent_msg = msg.reply_document(filt["media_id"], caption=filt["content"] or None)
-                elif filt["media_type"] == "audio":
-                    sent_msg = msg.reply_audio(filt["media_id"], caption=filt["content"] or None)
-                elif filt["media_type"] == "sticker":
-                    sent_msg = msg.reply_sticker(filt["media_id"])
-                else:
-                    sent_msg = msg.reply_text(
-                        filt["content"],
-                        parse_mode=ParseMode.MARKDOWN,
-                        disable_web_page_preview=True,
-                    )
-                
-                # Планируем удаление
-                if sent_msg and autodelete_minutes > 0:
-                    context.job_queue.run_once(
-                        schedule_delete,
-                        autodelete_minutes * 60,
-                        context={"chat_id": chat.id, "message_id": sent_msg.message_id}
-                    )
-            except BadRequest as e:
-                LOGGER.warning(f"Ошибка отправки фильтра: {e}")
-            
-            # Срабатывает только первый фильтр
-            return
+    try:
+        if filt["media_type"] == "animation":
+            sent_msg = msg.reply_animation(filt["media_id"], caption=filt["content"] or None)
+        elif filt["media_type"] == "photo":
+            sent_msg = msg.reply_photo(filt["media_id"], caption=filt["content"] or None)
+        elif filt["media_type"] == "video":
+            sent_msg = msg.reply_video(filt["media_id"], caption=filt["content"] or None)
+        elif filt["media_type"] == "document":
+            sent_msg = msg.reply_document(filt["media_id"], caption=filt["content"] or None)
+        elif filt["media_type"] == "audio":
+            sent_msg = msg.reply_audio(filt["media_id"], caption=filt["content"] or None)
+        elif filt["media_type"] == "sticker":
+            sent_msg = msg.reply_sticker(filt["media_id"])
+        else:
+            sent_msg = msg.reply_text(
+                filt["content"],
+                parse_mode=ParseMode.MARKDOWN,
+                disable_web_page_preview=True,
+            )
+        
+        # Планируем удаление
+        if sent_msg and autodelete_minutes > 0:
+            delete_message_later(chat.id, sent_msg.message_id, autodelete_minutes * 60)
+    except BadRequest as e:
+        LOGGER.warning(f"Ошибка отправки фильтра: {e}")
 
 
 @user_admin
@@ -284,6 +310,8 @@ def clear_all_filters(update: Update, context: CallbackContext):
     if chat.id in filters_storage:
         count = len(filters_storage[chat.id])
         filters_storage[chat.id] = {}
+        invalidate_filter_matcher(chat.id)
+        _save_filters_to_db()
         msg.reply_text(f"✅ Удалено {count} фильтров!")
     else:
         msg.reply_text("🔍 В этом чате нет фильтров.")
@@ -297,17 +325,21 @@ FILTER_HANDLER = CommandHandler("filter", add_filter, run_async=True)
 STOP_HANDLER = CommandHandler(["stop", "removefilter"], stop_filter, run_async=True)
 LIST_HANDLER = CommandHandler("filters", filters_list, run_async=True)
 CLEARALL_HANDLER = CommandHandler("stopall", clear_all_filters, run_async=True)
-REPLY_HANDLER = MessageHandler(
-    Filters.text & Filters.chat_type.groups & ~Filters.command, 
-    reply_filter, 
-    run_async=True
-)
 
 dispatcher.add_handler(FILTER_HANDLER)
 dispatcher.add_handler(STOP_HANDLER)
 dispatcher.add_handler(LIST_HANDLER)
 dispatcher.add_handler(CLEARALL_HANDLER)
-dispatcher.add_handler(REPLY_HANDLER, group=69)
+
+# Этап конвейера: текст без команды, в чатах с фильтрами
+register_stage(
+    "filters",
+    reply_filter,
+    order=60,
+    enabled=has_filters,
+    kinds=KIND_TEXT,
+    exclude=KIND_COMMAND,
+)
 
 
 __mod_name__ = "🔍 Фильтры"
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Маршрутизатор callback-кнопок по префиксному дереву.
+
+Вместо десятков CallbackQueryHandler с регулярками (PTB проверяет их по
+очереди на каждое нажатие, а обработчик потом снова режет query.data)
+кнопки описываются шаблонами:
+
+    router.route("cfg_cap_mode_{mode}_{chat_id:int}", set_captcha_mode)
+
+Данные кнопки делятся по "_", литеральная часть шаблона ищется в дереве
+по токенам - O(len(data)) при любом числе маршрутов, а параметры
+разбираются и передаются обработчику именованными аргументами:
+set_captcha_mode(update, context, mode="math", chat_id=-100...).
+
+Типы параметров:
+- {name} - один токен (str);
+- {name:int} - целое число (в том числе отрицательное);
+- {name:a|b} - один из перечисленных вариантов;
+- {name:rest} - строка, которая сама может содержать "_" (не больше
+  одного такого параметра на шаблон).
+"""
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import CallbackContext, Handler
+
+
+# Токены шаблона: {параметр} (имя может содержать "_") или литерал между "_"
+_TEMPLATE_TOKEN = re.compile(r"\{[^}]*\}|[^_]+")
+
+
+class Route:
+    """Маршрут: литеральный префикс, параметры и обработчик"""
+
+    __slots__ = ("template", "prefix", "params", "callback")
+
+    def __init__(self, template: str, callback: Callable):
+        self.template = template
+        self.callback = callback
+        self.prefix: List[str] = []
+        # (имя, тип), тип: "str", "int", "rest" или frozenset вариантов
+        self.params: List[Tuple[str, object]] = []
+        for token in _TEMPLATE_TOKEN.findall(template):
+            if token.startswith("{") and token.endswith("}"):
+                name, _, kind = token[1:-1].partition(":")
+                kind = kind or "str"
+                if "|" in kind:
+                    kind = frozenset(kind.split("|"))
+                self.params.append((name, kind))
+            elif self.params:
+                raise ValueError(f"Литерал после параметров в шаблоне {template}")
+            else:
+                self.prefix.append(token)
+        if sum(1 for _, kind in self.params if kind == "rest") > 1:
+            raise ValueError(f"Больше одного параметра rest в шаблоне {template}")
+
+    def parse(self, tokens: List[str]) -> Optional[dict]:
+        """Разбирает токены после префикса; None - данные не подходят"""
+        params = self.params
+        rest = next((i for i, (_, kind) in enumerate(params) if kind == "rest"), None)
+        if rest is None:
+            if len(tokens) != len(params):
+                return None
+            values = tokens
+        else:
+            tail = len(params) - rest - 1
+            if len(tokens) < len(params):
+                return None
+            values = (
+                tokens[:rest]
+                + ["_".join(tokens[rest:len(tokens) - tail])]
+                + tokens[len(tokens) - tail:]
+            )
+
+        kwargs = {}
+        for (name, kind), value in zip(params, values):
+            if kind == "int":
+                try:
+                    value = int(value)
+                except ValueError:
+                    return None
+            elif isinstance(kind, frozenset):
+                if value not in kind:
+                    return None
+            elif not value:
+                return None
+            kwargs[name] = value
+        return kwargs
+
+
+class _Node:
+    __slots__ = ("children", "routes")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # Маршруты с префиксом, который кончается на этом узле
+        self.routes: List[Route] = []
+
+
+class CallbackRouter(Handler):
+    """
+    Один обработчик на все кнопки пространства имён (например, cfg_).
+
+    Работает внутри ConversationHandler как обычный CallbackQueryHandler:
+    возвращает то, что вернул обработчик маршрута (новое состояние).
+    only() даёт обработчик с частью маршрутов - для состояний, где
+    должны работать только некоторые кнопки.
+    """
+
+    # Типы обновлений для allowed_updates (helper_funcs/webhook.py)
+    update_types = ["callback_query"]
+
+    def __init__(self, routes: Iterable[Tuple[str, Callable]] = (), allowed: Optional[set] = None):
+        super().__init__(self.dispatch)
+        self._root = _Node()
+        self._routes: Dict[str, Route] = {}
+        self._allowed = allowed
+        for template, callback in routes:
+            self.route(template, callback)
+
+    def route(self, template: str, callback: Callable) -> Route:
+        """Добавляет маршрут (шаблон - см. описание модуля)"""
+        route = Route(template, callback)
+        node = self._root
+        for token in route.prefix:
+            node = node.children.setdefault(token, _Node())
+        node.routes.append(route)
+        self._routes[template] = route
+        return route
+
+    def only(self, *templates: str) -> "CallbackRouter":
+        """Обработчик с теми же маршрутами, но принимающий только перечисленные"""
+        for template in templates:
+            if template not in self._routes:
+                raise KeyError(f"Нет маршрута {template}")
+        view = CallbackRouter(allowed=set(templates))
+        view._root = self._root
+        view._routes = self._routes
+        return view
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, dict]]:
+        """Маршрут и разобранные параметры для данных кнопки"""
+        tokens = data.split("_")
+        node = self._root
+        # Узлы с маршрутами по пути: сначала пробуем самый длинный префикс
+        candidates = []
+        for depth, token in enumerate(tokens):
+            node = node.children.get(token)
+            if node is None:
+                break
+            if node.routes:
+                candidates.append((depth + 1, node))
+        for depth, node in reversed(candidates):
+            for route in node.routes:
+                if self._allowed is not None and route.template not in self._allowed:
+                    continue
+                kwargs = route.parse(tokens[depth:])
+                if kwargs is not None:
+                    return route, kwargs
+        return None
+
+    def check_update(self, update: object) -> Optional[Tuple[Route, dict]]:
+        if not isinstance(update, Update) or not update.callback_query:
+            return None
+        data = update.callback_query.data
+        if not data:
+            return None
+        return self.resolve(data)
+
+    def handle_update(self, update: Update, dispatcher, check_result: Tuple[Route, dict], context=None):
+        route, kwargs = check_result
+        return route.callback(update, context, **kwargs)
+
+    def dispatch(self, update: Update, context: CallbackContext):
+        """Вызывает обработчик кнопки напрямую (без check_update)"""
+        resolved = self.resolve(update.callback_query.data)
+        if resolved is None:
+            return None
+        route, kwargs = resolved
+        return route.callback(update, context, **kwargs)
+
+    def wrap_callbacks(self, wrapper: Callable[[Callable], Callable]) -> int:
+        """
+        Оборачивает обработчики всех маршрутов (метрики и т.п.).
+        Маршруты общие с only(), поэтому wrapper должен пропускать уже
+        обёрнутые; возвращает число обёрнутых на этот раз.
+        """
+        wrapped = 0
+        for route in self._routes.values():
+            callback = wrapper(route.callback)
+            if callback is not route.callback:
+                route.callback = callback
+                wrapped += 1
+        return wrapped
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Капча-картинка: искажённый текст или пример, нарисованный в PNG.
+
+Картинки рисуются заранее в отдельных процессах и лежат в пуле по
+сложностям - при входе участника капча берётся из пула за O(1), а пул
+пополняется в фоне. На воркерах PTB картинки не рисуются никогда:
+если пул опустел (рейд), вызывающий получает None и выбирает другой режим.
+
+Процессы создаются fork'ом, а fork процесса с потоками может оставить
+дочернему процессу чужую занятую блокировку (deadlock). Поэтому
+IMAGE_POOL.start() вызывается при запуске бота до того, как появится
+хоть один поток; позже процессы не создаются никогда.
+"""
+
+import io
+import multiprocessing
+import random
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Dict, List, Optional
+
+from MitaHelper import LOGGER
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+except ImportError:
+    Image = None
+
+
+# Сложности: easy - пример на сложение/вычитание, hard - код из символов
+DIFFICULTIES = ("easy", "hard")
+
+# Сколько готовых капч держать на каждую сложность и с какого остатка пополнять
+POOL_SIZE = 64
+REFILL_AT = 32
+
+# Процессы, которые рисуют картинки
+RENDER_WORKERS = 2
+
+# Символы для кода: без похожих друг на друга (0/O, 1/I/L и т.п.)
+CODE_ALPHABET = "ABCDEFHKMNPRSTUVWXYZ2345678"
+CODE_LENGTH = 5
+
+WIDTH, HEIGHT = 240, 90
+
+
+def is_available() -> bool:
+    """Есть ли Pillow (без него режим картинок недоступен)"""
+    return Image is not None
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      РИСОВАНИЕ (в процессах пула)
+# ═══════════════════════════════════════════════════════════════
+
+def _reseed():
+    """Процессы создаются fork'ом - у каждого должен быть свой random"""
+    random.seed()
+
+
+def _make_question(difficulty: str):
+    """Текст на картинке, правильный ответ и 3 неправильных"""
+    if difficulty == "easy":
+        a, b = random.randint(2, 19), random.randint(1, 9)
+        op = random.choice("+-")
+        answer = a + b if op == "+" else a - b
+        wrong = set()
+        while len(wrong) < 3:
+            value = answer + random.randint(-5, 5)
+            if value != answer and value >= 0:
+                wrong.add(value)
+        return f"{a} {op} {b} = ?", str(answer), [str(value) for value in wrong]
+
+    answer = "".join(random.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+    wrong = set()
+    while len(wrong) < 3:
+        # Отличаются от ответа одним-двумя символами
+        chars = list(answer)
+        for pos in random.sample(range(CODE_LENGTH), random.randint(1, 2)):
+            chars[pos] = random.choice(CODE_ALPHABET.replace(answer[pos], ""))
+        wrong.add("".join(chars))
+    return answer, answer, sorted(wrong)
+
+
+def _glyph(char: str, font, scale: int, color) -> "Image.Image":
+    """Один символ: увеличен и повёрнут на случайный угол"""
+    left, top, right, bottom = font.getbbox(char)
+    glyph = Image.new("L", (right - left + 2, bottom - top + 2), 0)
+    ImageDraw.Draw(glyph).text((1 - left, 1 - top), char, font=font, fill=255)
+    glyph = glyph.resize((glyph.width * scale, glyph.height * scale), Image.NEAREST)
+    glyph = glyph.rotate(random.uniform(-25, 25), resample=Image.BICUBIC, expand=True)
+    tile = Image.new("RGB", glyph.size, color)
+    tile.putalpha(glyph)
+    return tile
+
+
+def render_challenge(difficulty: str) -> dict:
+    """
+    Рисует капчу: {"difficulty", "answer", "options", "image" (PNG)}.
+    Выполняется в процессе пула, поэтому только Pillow и random.
+    """
+    question, answer, wrong = _make_question(difficulty)
+    hard = difficulty == "hard"
+
+    image = Image.new("RGB", (WIDTH, HEIGHT), tuple(random.randint(225, 255) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    # Встроенный шрифт есть всегда, крупные буквы получаем масштабированием
+    font = ImageFont.load_default()
+
+    # Шумовые линии под текстом
+    for _ in range(8 if hard else 4):
+        draw.line(
+            [(random.randint(0, WIDTH), random.randint(0, HEIGHT)) for _ in range(2)],
+            fill=tuple(random.randint(120, 200) for _ in range(3)),
+            width=random.randint(1, 2),
+        )
+
+    glyphs = [
+        _glyph(char, font, 3, tuple(random.randint(0, 110) for _ in range(3)))
+        for char in question if char != " "
+    ]
+    step = (WIDTH - 20) / max(len(glyphs), 1)
+    for index, glyph in enumerate(glyphs):
+        x = int(10 + index * step + random.uniform(-3, 3))
+        y = int((HEIGHT - glyph.height) / 2 + random.uniform(-8, 8))
+        image.paste(glyph, (x, y), glyph)
+
+    # Линии поверх текста и точки - то, что мешает распознаванию
+    draw = ImageDraw.Draw(image)
+    for _ in range(4 if hard else 2):
+        draw.line(
+            [(0, random.randint(10, HEIGHT - 10)), (WIDTH, random.randint(10, HEIGHT - 10))],
+            fill=tuple(random.randint(60, 140) for _ in range(3)),
+            width=2,
+        )
+    for _ in range(400 if hard else 150):
+        draw.point(
+            (random.randint(0, WIDTH - 1), random.randint(0, HEIGHT - 1)),
+            fill=tuple(random.randint(0, 255) for _ in range(3)),
+        )
+    if hard:
+        image = image.filter(ImageFilter.SMOOTH)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    options = [answer] + wrong
+    random.shuffle(options)
+    return {"difficulty": difficulty, "answer": answer, "options": options, "image": buffer.getvalue()}
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ПУЛ ГОТОВЫХ КАПЧ
+# ═══════════════════════════════════════════════════════════════
+
+class ChallengePool:
+    """
+    Готовые капчи по сложностям. take() - popleft из очереди, без
+    рисования; когда в очереди остаётся REFILL_AT капч, недостающие
+    заказываются у процессов пула, и готовые сами дописываются в очередь.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, refill_at: int = REFILL_AT, workers: int = RENDER_WORKERS):
+        self._size = size
+        self._refill_at = refill_at
+        self._workers = workers
+        self._ready: Dict[str, deque] = {difficulty: deque() for difficulty in DIFFICULTIES}
+        self._rendering: Dict[str, int] = {difficulty: 0 for difficulty in DIFFICULTIES}
+        self._executor: Optional[Executor] = None
+        self._lock = Lock()
+        self.misses = 0
+
+    def start(self):
+        """
+        Создаёт процессы пула. Вызывать, пока в процессе нет других потоков
+        (в MitaHelper/__init__ до создания бота): fork копирует только текущий поток,
+        а блокировки остальных остались бы в дочернем процессе занятыми.
+        """
+        if not is_available() or self._executor is not None:
+            return
+        if "fork" not in multiprocessing.get_all_start_methods():
+            # Без fork (Windows) дочерний процесс импортировал бы весь бот
+            return
+        executor = ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_reseed,
+        )
+        # С fork все процессы создаются прямо в первом submit(), до служебных
+        # потоков самого пула. Результатов не ждём: start() вызывается во время
+        # импорта MitaHelper, а передача задачи в процесс требует блокировки
+        # импорта - она освободится, когда импорт закончится
+        for _ in range(self._workers):
+            executor.submit(_reseed)
+        with self._lock:
+            self._executor = executor
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            # start() не вызывали или процессы пула умерли: форкать сейчас
+            # нельзя (уже есть потоки) - рисуем в отдельном потоке, но всё
+            # равно не в воркерах PTB
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="captcha-render")
+        return self._executor
+
+    def _broken(self, executor: Executor):
+        """Процесс пула умер - дальше рисуем в потоке (см. _get_executor)"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        LOGGER.warning("Процессы капч-картинок завершились, рисуем в потоке")
+        executor.shutdown(wait=False)
+
+    def _refill(self, difficulty: str) -> List[str]:
+        """Сколько капч заказать (под self._lock)"""
+        missing = self._size - len(self._ready[difficulty]) - self._rendering[difficulty]
+        if missing <= 0:
+            return []
+        self._rendering[difficulty] += missing
+        return [difficulty] * missing
+
+    def _submit(self, orders: List[str]):
+        if not orders:
+            return
+        with self._lock:
+            executor = self._get_executor()
+        for index, difficulty in enumerate(orders):
+            try:
+                future = executor.submit(render_challenge, difficulty)
+            except BrokenProcessPool:
+                self._broken(executor)
+                self._submit(orders[index:])
+                return
+            future.add_done_callback(lambda f, d=difficulty: self._done(d, f))
+
+    def _done(self, difficulty: str, future):
+        try:
+            challenge = None if future.cancelled() else future.result()
+        except Exception as e:
+            LOGGER.warning(f"Не удалось нарисовать капчу: {e}")
+            challenge = None
+        with self._lock:
+            self._rendering[difficulty] -= 1
+            if challenge is not None:
+                self._ready[difficulty].append(challenge)
+
+    def warm(self, difficulties=DIFFICULTIES):
+        """Заполняет пул заранее (при запуске или включении режима)"""
+        if not is_available():
+            return
+        orders = []
+        with self._lock:
+            for difficulty in difficulties:
+                orders += self._refill(difficulty)
+        self._submit(orders)
+
+    def take(self, difficulty: str) -> Optional[dict]:
+        """Готовая капча или None, если пул пуст (тогда нужен другой режим)"""
+        if not is_available():
+            return None
+        orders = []
+        with self._lock:
+            ready = self._ready[difficulty]
+            challenge = ready.popleft() if ready else None
+            if challenge is None:
+                self.misses += 1
+            if len(ready) <= self._refill_at:
+                orders = self._refill(difficulty)
+        self._submit(orders)
+        return challenge
+
+    def ready(self, difficulty: str) -> int:
+        return len(self._ready[difficulty])
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+IMAGE_POOL = ChallengePool()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Незавершённые капчи - по чатам и по сроку истечения
+"""
+
+import heapq
+from itertools import count
+from threading import Condition, Lock
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+
+# Сколько блокировок на все чаты (чат попадает в свою по chat_id)
+SHARDS = 64
+
+
+class PendingCaptchas:
+    """
+    Капчи, которые ещё не решены: {chat_id: {user_id: капча}}.
+
+    - У каждой капчи есть "deadline" (unix-время), и все сроки лежат в
+      одной куче - ближайший всегда наверху, поэтому истёкшие капчи
+      достаются пачкой без перебора всех остальных.
+    - Капчи чата защищает одна из SHARDS блокировок, так что ответы
+      на капчу в разных чатах друг друга не ждут.
+    - Решённые капчи из кучи не удаляются, а пропускаются при извлечении
+      (как отменённые таймеры в helper_funcs/timers.py).
+    """
+
+    def __init__(self, shards: int = SHARDS):
+        self.chats: Dict[int, Dict[int, dict]] = {}
+        self._locks = [Lock() for _ in range(shards)]
+        # (deadline, порядковый номер, chat_id, user_id)
+        self._heap: List[Tuple[float, int, int, int]] = []
+        self._seq = count()
+        self._heap_lock = Lock()
+        self._wakeup = Condition(self._heap_lock)
+
+    def _lock(self, chat_id: int) -> Lock:
+        return self._locks[chat_id % len(self._locks)]
+
+    def add(self, chat_id: int, user_id: int, captcha: dict):
+        """Добавляет капчу (с ключом "deadline"); прежняя капча пользователя заменяется"""
+        with self._lock(chat_id):
+            self.chats.setdefault(chat_id, {})[user_id] = captcha
+        seq = next(self._seq)
+        with self._heap_lock:
+            heapq.heappush(self._heap, (captcha["deadline"], seq, chat_id, user_id))
+            # Будим поток, только если новая капча истекает раньше всех
+            if self._heap[0][1] == seq:
+                self._wakeup.notify()
+
+    def get(self, chat_id: int, user_id: int) -> Optional[dict]:
+        with self._lock(chat_id):
+            return self.chats.get(chat_id, {}).get(user_id)
+
+    def pop(self, chat_id: int, user_id: int) -> Optional[dict]:
+        """Забирает капчу; None - её уже решили или она истекла"""
+        with self._lock(chat_id):
+            captchas = self.chats.get(chat_id)
+            if not captchas:
+                return None
+            captcha = captchas.pop(user_id, None)
+            if not captchas:
+                del self.chats[chat_id]
+            return captcha
+
+    def snapshot(self, chat_ids=None) -> Dict[int, Dict[int, dict]]:
+        """
+        Копия капч для записи в БД (по умолчанию - всех чатов).
+        Каждый чат копируется под своей блокировкой: фоновый поток
+        записи не обходит словари, которые меняют обработчики.
+        """
+        if chat_ids is None:
+            chat_ids = list(self.chats)
+        result = {}
+        for chat_id in chat_ids:
+            with self._lock(chat_id):
+                captchas = self.chats.get(chat_id)
+                if captchas:
+                    result[chat_id] = dict(captchas)
+        return result
+
+    def pop_expired(self, now: float = None, limit: int = None) -> Dict[int, List[Tuple[int, dict]]]:
+        """Забирает истёкшие капчи (не больше limit): {chat_id: [(user_id, капча), ...]}"""
+        now = time() if now is None else now
+        due = []
+        with self._heap_lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+                due.append(heapq.heappop(self._heap))
+
+        expired: Dict[int, List[Tuple[int, dict]]] = {}
+        for deadline, _, chat_id, user_id in due:
+            with self._lock(chat_id):
+                captchas = self.chats.get(chat_id)
+                captcha = captchas.get(user_id) if captchas else None
+                # Решена или заменена новой капчей с другим сроком
+                if captcha is None or captcha["deadline"] != deadline:
+                    continue
+                del captchas[user_id]
+                if not captchas:
+                    del self.chats[chat_id]
+            expired.setdefault(chat_id, []).append((user_id, captcha))
+        return expired
+
+    def wait_due(self, timeout: float = None):
+        """Ждёт, пока истечёт ближайшая капча (не дольше timeout)"""
+        with self._heap_lock:
+            if self._heap:
+                delay = self._heap[0][0] - time()
+                if delay <= 0:
+                    return
+                if timeout is not None:
+                    delay = min(delay, timeout)
+            else:
+                delay = timeout
+            self._wakeup.wait(delay)
+
+    def notify(self):
+        with self._heap_lock:
+            self._wakeup.notify_all()
+
+    def __len__(self) -> int:
+        return sum(len(captchas) for captchas in list(self.chats.values()))
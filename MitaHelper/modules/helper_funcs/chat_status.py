@@ -6,9 +6,11 @@
 from functools import wraps
 from threading import RLock
 from time import perf_counter
+from typing import Dict
 
 from cachetools import TTLCache
 from telegram import Chat, ChatMember, ParseMode, Update
+from telegram.error import BadRequest, TelegramError, Unauthorized
 from telegram.ext import CallbackContext
 
 from MitaHelper import (
@@ -28,9 +30,87 @@ except ImportError:
     is_bot_admin_db = lambda chat_id, user_id: False
     has_permission = lambda chat_id, user_id, perm: False
 
-# Кэш для администраторов (5 минут)
-ADMIN_CACHE = TTLCache(maxsize=512, ttl=300)
+# Кэш администраторов (5 минут): {chat_id: {user_id: ChatMember}}
+# getChatAdministrators возвращает и самого бота с его правами,
+# поэтому одна запись даёт и список админов, и права бота в чате.
+# Помимо TTL, запись обновляется по апдейтам chat_member/my_chat_member
+# (см. update_admin_cache) и сбрасывается после /promote и /demote.
+ADMIN_CACHE = TTLCache(maxsize=4096, ttl=300)
 THREAD_LOCK = RLock()
+# Последний полученный список админов (без TTL): отдаётся, если API
+# временно недоступен - пустой список сделал бы админов обычными участниками
+LAST_ADMINS: Dict[int, Dict[int, ChatMember]] = {}
+
+
+# ═══════════════════════════════════════════════════════════════
+#                        КЕШ АДМИНОВ
+# ═══════════════════════════════════════════════════════════════
+
+def get_chat_admins(chat: Chat) -> Dict[int, ChatMember]:
+    """Возвращает админов чата {user_id: ChatMember} из кеша или из API"""
+    with THREAD_LOCK:
+        admins = ADMIN_CACHE.get(chat.id)
+    if admins is not None:
+        return admins
+
+    try:
+        admins = {admin.user.id: admin for admin in chat.get_administrators()}
+    except (BadRequest, Unauthorized) as e:
+        # Бота нет в чате или нет доступа - не долбим API на каждом сообщении
+        LOGGER.debug(f"Не удалось получить админов {chat.id}: {e}")
+        admins = {}
+    except TelegramError as e:
+        # Сетевая ошибка - не кешируем. Отдаём прошлый список, а если его нет,
+        # пробрасываем ошибку: наказания не должны применяться к админам
+        with THREAD_LOCK:
+            stale = LAST_ADMINS.get(chat.id)
+        if stale is None:
+            raise
+        LOGGER.warning(f"Не удалось получить админов {chat.id}, используем прежний список: {e}")
+        return stale
+
+    with THREAD_LOCK:
+        ADMIN_CACHE[chat.id] = admins
+        LAST_ADMINS[chat.id] = admins
+    return admins
+
+
+def invalidate_admin_cache(chat_id: int):
+    """Сбрасывает кеш админов чата"""
+    with THREAD_LOCK:
+        ADMIN_CACHE.pop(chat_id, None)
+
+
+def update_admin_cache(chat_id: int, member: ChatMember):
+    """Применяет новый статус участника к кешу (из апдейта chat_member)"""
+    with THREAD_LOCK:
+        for cache in (ADMIN_CACHE, LAST_ADMINS):
+            admins = cache.get(chat_id)
+            if admins is None:
+                continue
+            admins = dict(admins)
+            if member.status in ("administrator", "creator"):
+                admins[member.user.id] = member
+            else:
+                admins.pop(member.user.id, None)
+            cache[chat_id] = admins
+
+
+def is_chat_admin_cached(chat: Chat, user_id: int) -> bool:
+    """Проверяет, является ли пользователь админом чата в Telegram (по кешу)"""
+    return user_id in get_chat_admins(chat)
+
+
+def bot_has_right(chat: Chat, bot_id: int, right: str) -> bool:
+    """Проверяет право бота в чате (can_delete_messages и т.п.) по кешу"""
+    if chat.type == "private":
+        return True
+    bot_member = get_chat_admins(chat).get(bot_id)
+    if bot_member is None:
+        return False
+    if bot_member.status == "creator":
+        return True
+    return bool(getattr(bot_member, right, False))
 
 
 def is_whitelist_plus(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
@@ -80,16 +160,7 @@ def is_user_admin(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
         return True
 
     if not member:
-        with THREAD_LOCK:
-            admin_list = ADMIN_CACHE.get(chat.id)
-            if admin_list is None:
-                admin_list = [
-                    admin.user.id
-                    for admin in chat.get_administrators()
-                ]
-                ADMIN_CACHE[chat.id] = admin_list
-
-            return user_id in admin_list
+        return is_chat_admin_cached(chat, user_id)
     
     return member.status in ("administrator", "creator")
 
@@ -100,7 +171,7 @@ def is_bot_admin(chat: Chat, bot_id: int, bot_member: ChatMember = None) -> bool
         return True
 
     if not bot_member:
-        bot_member = chat.get_member(bot_id)
+        return is_chat_admin_cached(chat, bot_id)
 
     return bot_member.status in ("administrator", "creator")
 
@@ -116,17 +187,19 @@ def can_delete(func):
             return func(update, context, *args, **kwargs)
         
         try:
-            member = chat.get_member(bot.id)
-            if member.can_delete_messages:
-                return func(update, context, *args, **kwargs)
-            else:
-                update.effective_message.reply_text(
-                    "❌ У меня нет прав на удаление сообщений!"
-                )
-        except Exception:
+            has_right = bot_has_right(chat, bot.id, "can_delete_messages")
+        except TelegramError:
             update.effective_message.reply_text(
                 "❌ Не могу проверить свои права. Убедитесь, что я админ."
             )
+            return
+        if has_right:
+            return func(update, context, *args, **kwargs)
+        # Права могли выдать только что - следующая попытка перепроверит
+        invalidate_admin_cache(chat.id)
+        update.effective_message.reply_text(
+            "❌ У меня нет прав на удаление сообщений!"
+        )
     
     return delete_rights
 
@@ -142,17 +215,19 @@ def can_pin(func):
             return func(update, context, *args, **kwargs)
         
         try:
-            member = chat.get_member(bot.id)
-            if member.can_pin_messages:
-                return func(update, context, *args, **kwargs)
-            else:
-                update.effective_message.reply_text(
-                    "❌ У меня нет прав на закрепление сообщений!"
-                )
-        except Exception:
+            has_right = bot_has_right(chat, bot.id, "can_pin_messages")
+        except TelegramError:
             update.effective_message.reply_text(
                 "❌ Не могу проверить свои права. Убедитесь, что я админ."
             )
+            return
+        if has_right:
+            return func(update, context, *args, **kwargs)
+        # Права могли выдать только что - следующая попытка перепроверит
+        invalidate_admin_cache(chat.id)
+        update.effective_message.reply_text(
+            "❌ У меня нет прав на закрепление сообщений!"
+        )
     
     return pin_rights
 
@@ -168,17 +243,19 @@ def can_promote(func):
             return func(update, context, *args, **kwargs)
         
         try:
-            member = chat.get_member(bot.id)
-            if member.can_promote_members:
-                return func(update, context, *args, **kwargs)
-            else:
-                update.effective_message.reply_text(
-                    "❌ У меня нет прав на управление админами!"
-                )
-        except Exception:
+            has_right = bot_has_right(chat, bot.id, "can_promote_members")
+        except TelegramError:
             update.effective_message.reply_text(
                 "❌ Не могу проверить свои права. Убедитесь, что я админ."
             )
+            return
+        if has_right:
+            return func(update, context, *args, **kwargs)
+        # Права могли выдать только что - следующая попытка перепроверит
+        invalidate_admin_cache(chat.id)
+        update.effective_message.reply_text(
+            "❌ У меня нет прав на управление админами!"
+        )
     
     return promote_rights
 
@@ -194,17 +271,19 @@ def can_restrict(func):
             return func(update, context, *args, **kwargs)
         
         try:
-            member = chat.get_member(bot.id)
-            if member.can_restrict_members:
-                return func(update, context, *args, **kwargs)
-            else:
-                update.effective_message.reply_text(
-                    "❌ У меня нет прав на бан/мут пользователей!"
-                )
-        except Exception:
+            has_right = bot_has_right(chat, bot.id, "can_restrict_members")
+        except TelegramError:
             update.effective_message.reply_text(
                 "❌ Не могу проверить свои права. Убедитесь, что я админ."
             )
+            return
+        if has_right:
+            return func(update, context, *args, **kwargs)
+        # Права могли выдать только что - следующая попытка перепроверит
+        invalidate_admin_cache(chat.id)
+        update.effective_message.reply_text(
+            "❌ У меня нет прав на бан/мут пользователей!"
+        )
     
     return restrict_rights
 
@@ -222,7 +301,7 @@ def is_user_ban_protected(chat: Chat, user_id: int, member: ChatMember = None) -
         return True
 
     if not member:
-        member = chat.get_member(user_id)
+        return is_chat_admin_cached(chat, user_id)
 
     return member.status in ("administrator", "creator")
 
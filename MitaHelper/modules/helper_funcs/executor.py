@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Исполнитель задач по чатам (модель акторов с почтовыми ящиками).
+
+У каждого чата свой почтовый ящик: задачи run_async одного чата
+выполняются строго по одной и по порядку, задачи разных чатов -
+параллельно в общем пуле воркеров. Поэтому:
+
+- обработчики одного чата не гоняются за общие словари
+  (filters_storage, pending_captcha и т.д.) - глобальные блокировки
+  для этого не нужны;
+- чат под рейдом занимает не больше одного воркера, остальные чаты
+  обслуживаются по кругу;
+- задачи модерации (enforcement) идут раньше остальных - и в ящике
+  чата, и в общей очереди воркеров.
+"""
+
+from collections import deque
+from queue import Queue
+from threading import Condition, Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Dispatcher
+from telegram.ext.utils.promise import Promise
+
+
+def enforcement(func: Callable) -> Callable:
+    """Помечает обработчик модерации: его задачи выполняются первыми"""
+    func.__enforcement__ = True
+    return func
+
+
+def chat_key(update: object) -> Optional[int]:
+    """Ящик для обновления: чат, иначе пользователь (None - без очереди)"""
+    if not isinstance(update, Update):
+        return None
+    chat = update.effective_chat
+    if chat is not None:
+        return chat.id
+    user = update.effective_user
+    return user.id if user is not None else None
+
+
+class ChatPromise(Promise):
+    """Задача из ящика чата: по завершении запускает следующую задачу этого чата"""
+
+    __slots__ = ("key", "urgent", "_executor")
+
+    def __init__(self, pooled_function: Callable, args, kwargs, update: object = None,
+                 error_handling: bool = True, key: int = None, urgent: bool = False,
+                 executor: "ChatExecutor" = None):
+        super().__init__(pooled_function, args, kwargs, update=update, error_handling=error_handling)
+        self.key = key
+        self.urgent = urgent
+        self._executor = executor
+
+    def run(self) -> None:
+        try:
+            super().run()
+        finally:
+            if self._executor is not None:
+                self._executor.finished(self.key)
+
+
+class LaneQueue(Queue):
+    """Очередь пула воркеров: срочные задачи (urgent) забираются раньше"""
+
+    def _init(self, maxsize):
+        self.urgent = deque()
+        self.queue = deque()
+
+    def _qsize(self):
+        return len(self.urgent) + len(self.queue)
+
+    def _put(self, item):
+        if getattr(item, "urgent", False):
+            self.urgent.append(item)
+        else:
+            self.queue.append(item)
+
+    def _get(self):
+        if self.urgent:
+            return self.urgent.popleft()
+        return self.queue.popleft()
+
+
+class Mailbox:
+    """Ящик чата: срочные задачи, обычные задачи и флаг «задача в работе»"""
+
+    __slots__ = ("urgent", "normal", "running")
+
+    def __init__(self):
+        self.urgent = deque()
+        self.normal = deque()
+        self.running = False
+
+    def pop(self) -> Optional[ChatPromise]:
+        if self.urgent:
+            return self.urgent.popleft()
+        if self.normal:
+            return self.normal.popleft()
+        return None
+
+    def __len__(self):
+        return len(self.urgent) + len(self.normal)
+
+
+class ChatExecutor:
+    """
+    Почтовые ящики чатов. В пул воркеров (submit) попадает не больше
+    одной задачи каждого чата; следующая ставится, когда текущая
+    завершилась, - в конец общей очереди, так чаты чередуются.
+    """
+
+    def __init__(self, submit: Callable[[Promise], None]):
+        self._submit = submit
+        self._mailboxes: Dict[int, Mailbox] = {}
+        self._lock = Lock()
+        self._idle = Condition(self._lock)
+
+    def submit(self, promise: ChatPromise):
+        with self._lock:
+            mailbox = self._mailboxes.get(promise.key)
+            if mailbox is None:
+                mailbox = self._mailboxes[promise.key] = Mailbox()
+            if mailbox.running:
+                (mailbox.urgent if promise.urgent else mailbox.normal).append(promise)
+                return
+            mailbox.running = True
+        self._submit(promise)
+
+    def finished(self, key: int):
+        """Задача чата завершилась - ставим следующую из его ящика"""
+        with self._lock:
+            mailbox = self._mailboxes.get(key)
+            if mailbox is None:
+                return
+            promise = mailbox.pop()
+            if promise is None:
+                del self._mailboxes[key]
+                if not self._mailboxes:
+                    self._idle.notify_all()
+                return
+        self._submit(promise)
+
+    # ───────────────────────── состояние ─────────────────────────
+
+    def queued(self) -> int:
+        """Задачи, ждущие в ящиках (без тех, что уже в пуле)"""
+        with self._lock:
+            return sum(len(mailbox) for mailbox in self._mailboxes.values())
+
+    def active_chats(self) -> int:
+        with self._lock:
+            return len(self._mailboxes)
+
+    def busiest(self, limit: int = 5) -> List[Tuple[int, int]]:
+        """Чаты с самыми длинными ящиками: [(chat_id, задач)]"""
+        with self._lock:
+            sizes = [(key, len(mailbox)) for key, mailbox in self._mailboxes.items() if len(mailbox)]
+        sizes.sort(key=lambda item: item[1], reverse=True)
+        return sizes[:limit]
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Ждёт, пока все ящики опустеют (для тестов и бенчмарков)"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._mailboxes, timeout)
+
+
+class ChatDispatcher(Dispatcher):
+    """Dispatcher, у которого run_async идёт через ящики чатов"""
+
+    __slots__ = ("executor",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._Dispatcher__async_queue = LaneQueue()
+        # Очередь берётся при каждой постановке: её можно подменить до start()
+        self.executor = ChatExecutor(lambda promise: self._Dispatcher__async_queue.put(promise))
+
+    def _run_async(self, func: Callable, *args, update: object = None,
+                   error_handling: bool = True, **kwargs) -> Promise:
+        key = chat_key(update)
+        urgent = bool(getattr(func, "__enforcement__", False))
+        if key is None:
+            # Задачи без чата (таймеры, задачи очереди заданий) - сразу в пул
+            promise = ChatPromise(func, args, kwargs, update=update, error_handling=error_handling, urgent=urgent)
+            self._Dispatcher__async_queue.put(promise)
+            return promise
+        promise = ChatPromise(
+            func, args, kwargs, update=update, error_handling=error_handling,
+            key=key, urgent=urgent, executor=self.executor,
+        )
+        self.executor.submit(promise)
+        return promise
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Скомпилированный поиск ключевых слов в тексте
+"""
+
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+
+class KeywordMatcher:
+    """
+    Набор ключевых слов, скомпилированный в один регекс.
+
+    Слово засчитывается, только если стоит отдельно (не внутри другого слова).
+    Если в тексте есть несколько слов из набора, побеждает то,
+    которое раньше в исходном списке, а не то, что раньше в тексте.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = []
+        self._priority = {}
+        for keyword in keywords:
+            if keyword not in self._priority:
+                self._priority[keyword] = len(self.keywords)
+                self.keywords.append(keyword)
+
+        self._pattern = None
+        if self.keywords:
+            # Ветки идут в порядке приоритета, поэтому на каждой позиции
+            # регекс возвращает лучшее из слов, начинающихся в ней.
+            # Lookahead не поглощает текст - пересекающиеся слова не теряются.
+            alternation = "|".join(re.escape(kw) + r"(?!\w)" for kw in self.keywords)
+            self._pattern = re.compile(r"(?<!\w)(?=(" + alternation + r"))")
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def search(self, text: str) -> Optional[str]:
+        """Возвращает самое приоритетное слово из найденных в тексте или None"""
+        if self._pattern is None or not text:
+            return None
+
+        best = None
+        best_priority = len(self.keywords)
+        for match in self._pattern.finditer(text):
+            keyword = match.group(1)
+            priority = self._priority[keyword]
+            if priority < best_priority:
+                best, best_priority = keyword, priority
+                if priority == 0:
+                    break
+        return best
+
+
+# Кириллические буквы, которые выглядят как латинские (после casefold).
+# Слова и текст приводятся к одному алфавиту, поэтому «спам» с латинскими
+# «с» и «а» совпадает с «спам», написанным кириллицей.
+HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x",
+    "і": "i", "ї": "i", "ј": "j", "ѕ": "s", "һ": "h", "ԁ": "d", "ԛ": "q", "ԝ": "w",
+})
+
+# Слово целиком или отдельный символ-не-буква (эмодзи, точка в ссылке и т.п.)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def normalize_text(text: str, normalize: bool = True, casefold: bool = True, homoglyphs: bool = False) -> str:
+    """
+    Приводит текст к виду для сравнения:
+    NFKC (полноширинные и «математические» буквы -> обычные), casefold,
+    замена похожих кириллических букв на латинские.
+    """
+    if normalize:
+        text = unicodedata.normalize("NFKC", text)
+    if casefold:
+        text = text.casefold()
+    if homoglyphs:
+        text = text.translate(HOMOGLYPHS)
+    return text
+
+
+class TokenMatcher:
+    """
+    Набор слов и фраз, разложенный по словарю первого токена.
+
+    В отличие от KeywordMatcher, время проверки зависит от длины текста,
+    а не от размера набора: каждый токен текста - один поиск в dict.
+    Подходит для списков из тысяч слов (чёрный список).
+    """
+
+    def __init__(self, keywords: Iterable[str], normalize: bool = True,
+                 casefold: bool = True, homoglyphs: bool = False):
+        self._options = {"normalize": normalize, "casefold": casefold, "homoglyphs": homoglyphs}
+        # {первый токен: [(токены фразы, исходное слово), ...]}
+        self._index = {}
+        self._size = 0
+        seen = set()
+        for keyword in keywords:
+            tokens = tuple(self.tokenize(keyword))
+            if not tokens or tokens in seen:
+                continue
+            seen.add(tokens)
+            self._index.setdefault(tokens[0], []).append((tokens, keyword))
+            self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def tokenize(self, text: str):
+        return _TOKEN_RE.findall(normalize_text(text, **self._options))
+
+    def search(self, text: str) -> Optional[str]:
+        """Возвращает первое найденное в тексте слово из набора или None"""
+        if not self._index or not text:
+            return None
+
+        tokens = self.tokenize(text)
+        index = self._index
+        for i, token in enumerate(tokens):
+            candidates = index.get(token)
+            if not candidates:
+                continue
+            for phrase, keyword in candidates:
+                if len(phrase) == 1 or tuple(tokens[i:i + len(phrase)]) == phrase:
+                    return keyword
+        return None
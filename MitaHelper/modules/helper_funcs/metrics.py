@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики: время работы обработчиков, запросы к API, очереди и задержка обновлений
+"""
+
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram.ext import ConversationHandler, DispatcherHandlerStop
+
+from MitaHelper import LOGGER
+
+
+# Границы корзин гистограмм (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300)
+
+METRICS_PREFIX = "mita"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как в Prometheus)"""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # Последняя корзина - всё, что больше самой большой границы (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля (линейно внутри корзины, как histogram_quantile)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Корзины в формате Prometheus: [(le, накопленное количество)]"""
+        result = []
+        running = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            running += bucket_count
+            result.append((f"{bound:g}", running))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class TimedStats:
+    """Количество вызовов, ошибок и гистограмма времени"""
+
+    __slots__ = ("histogram", "errors")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.histogram = Histogram(bounds)
+        self.errors = 0
+
+
+class MetricsRegistry:
+    """Хранилище всех метрик бота. Запись - под одной блокировкой, это дёшево"""
+
+    def __init__(self):
+        self._lock = Lock()
+        # {"модуль.функция": TimedStats}
+        self.handlers: Dict[str, TimedStats] = {}
+        # {"sendMessage": TimedStats}
+        self.api: Dict[str, TimedStats] = {}
+        # Сколько запросы ждали разрешения планировщика отправки
+        self.outbound_wait = Histogram()
+        # Задержка обновлений: сейчас - message.date
+        self.update_lag = Histogram(LAG_BUCKETS)
+        self._last_update_id = 0
+        self.dispatcher = None
+        self.started = time.time()
+
+    def _observe(self, table: Dict[str, TimedStats], name: str, seconds: float, error: bool):
+        with self._lock:
+            stats = table.get(name)
+            if stats is None:
+                stats = table[name] = TimedStats()
+            stats.histogram.observe(seconds)
+            if error:
+                stats.errors += 1
+
+    def observe_handler(self, name: str, seconds: float, error: bool = False):
+        self._observe(self.handlers, name, seconds, error)
+
+    def observe_api(self, method: str, seconds: float, wait: float = 0.0, error: bool = False):
+        self._observe(self.api, method, seconds, error)
+        if wait:
+            with self._lock:
+                self.outbound_wait.observe(wait)
+
+    def observe_update(self, update):
+        """Задержка обновления - один раз на update_id (первым обработчиком)"""
+        message = getattr(update, "effective_message", None)
+        if message is None or message.date is None:
+            return
+        with self._lock:
+            # Обновления приходят по возрастанию update_id; отстающие
+            # (обработанные не по порядку) пропускаем - это лишь выборка
+            if update.update_id <= self._last_update_id:
+                return
+            self._last_update_id = update.update_id
+            self.update_lag.observe(max(0.0, time.time() - message.date.timestamp()))
+
+    # ───────────────────────── очереди ─────────────────────────
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Текущие длины очередей"""
+        depths = {}
+        dispatcher = self.dispatcher
+        if dispatcher is not None:
+            depths["updates"] = dispatcher.update_queue.qsize()
+            # Очередь пула воркеров (run_async) - в PTB 13 у неё нет публичного доступа
+            async_queue = getattr(dispatcher, "_Dispatcher__async_queue", None)
+            if async_queue is not None:
+                depths["workers"] = async_queue.qsize()
+            # Задачи, ждущие своей очереди в ящиках чатов
+            executor = getattr(dispatcher, "executor", None)
+            if executor is not None:
+                depths["mailboxes"] = executor.queued()
+            scheduler = getattr(dispatcher.bot, "scheduler", None)
+            if scheduler is not None:
+                depths["outbound"] = scheduler.queue_depth()
+            bulk = getattr(dispatcher.bot, "bulk", None)
+            if bulk is not None:
+                depths["bulk"] = bulk.pending()
+        return depths
+
+    def snapshot(self) -> Tuple[Dict[str, TimedStats], Dict[str, TimedStats]]:
+        """Копия таблиц для вывода (без удержания блокировки)"""
+        with self._lock:
+            return dict(self.handlers), dict(self.api)
+
+    # ───────────────────────── Prometheus ─────────────────────────
+
+    def render_prometheus(self) -> str:
+        handlers, api = self.snapshot()
+        lines = []
+
+        def histogram(name: str, help_text: str, series: List[Tuple[str, Histogram]]):
+            lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} histogram")
+            for labels, hist in series:
+                sep = "," if labels else ""
+                for le, value in hist.cumulative():
+                    lines.append(f'{METRICS_PREFIX}_{name}_bucket{{{labels}{sep}le="{le}"}} {value}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{METRICS_PREFIX}_{name}_sum{suffix} {hist.total:.6f}")
+                lines.append(f"{METRICS_PREFIX}_{name}_count{suffix} {hist.count}")
+
+        def counter(name: str, help_text: str, series: List[Tuple[str, float]], kind: str = "counter"):
+            lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+            for labels, value in series:
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{METRICS_PREFIX}_{name}{suffix} {value}")
+
+        histogram(
+            "handler_seconds", "Время работы обработчика",
+            [(f'handler="{name}"', stats.histogram) for name, stats in sorted(handlers.items())],
+        )
+        counter(
+            "handler_errors_total", "Исключения в обработчике",
+            [(f'handler="{name}"', stats.errors) for name, stats in sorted(handlers.items())],
+        )
+        histogram(
+            "api_seconds", "Время запроса к Telegram API",
+            [(f'method="{name}"', stats.histogram) for name, stats in sorted(api.items())],
+        )
+        counter(
+            "api_errors_total", "Ошибки запросов к Telegram API",
+            [(f'method="{name}"', stats.errors) for name, stats in sorted(api.items())],
+        )
+        histogram("outbound_wait_seconds", "Ожидание в планировщике отправки", [("", self.outbound_wait)])
+        histogram("update_lag_seconds", "Задержка обновления (сейчас - message.date)", [("", self.update_lag)])
+        counter(
+            "queue_depth", "Длина очереди",
+            [(f'queue="{name}"', depth) for name, depth in self.queue_depths().items()],
+            kind="gauge",
+        )
+        if self.dispatcher is not None:
+            counter("workers", "Количество воркеров", [("", self.dispatcher.workers)], kind="gauge")
+        counter("uptime_seconds", "Время работы", [("", round(time.time() - self.started))], kind="gauge")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ОБЁРТКИ ОБРАБОТЧИКОВ
+# ═══════════════════════════════════════════════════════════════
+
+def handler_name(callback: Callable) -> str:
+    module = getattr(callback, "__module__", "") or ""
+    name = getattr(callback, "__qualname__", None) or repr(callback)
+    return f"{module.rsplit('.', 1)[-1]}.{name}"
+
+
+def timed_callback(callback: Callable, name: str = None) -> Callable:
+    """Оборачивает callback обработчика: время, ошибки, задержка обновления"""
+    if getattr(callback, "__metrics_wrapped__", False):
+        return callback
+    name = name or handler_name(callback)
+
+    @wraps(callback)
+    def wrapper(update, context, *args, **kwargs):
+        METRICS.observe_update(update)
+        start = time.perf_counter()
+        error = False
+        try:
+            return callback(update, context, *args, **kwargs)
+        except DispatcherHandlerStop:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            METRICS.observe_handler(name, time.perf_counter() - start, error)
+
+    wrapper.__metrics_wrapped__ = True
+    return wrapper
+
+
+def _instrument_handler(handler) -> int:
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        return sum(_instrument_handler(nested_handler) for nested_handler in nested)
+    # Маршрутизатор кнопок (callback_router): метрики по каждому маршруту
+    wrap_callbacks = getattr(handler, "wrap_callbacks", None)
+    if wrap_callbacks is not None:
+        return wrap_callbacks(timed_callback)
+    if callable(getattr(handler, "callback", None)):
+        handler.callback = timed_callback(handler.callback)
+        return 1
+    return 0
+
+
+def instrument_dispatcher(dispatcher) -> int:
+    """
+    Оборачивает все зарегистрированные обработчики.
+    Вызывать после регистрации обработчиков всех модулей.
+    """
+    METRICS.dispatcher = dispatcher
+    count = 0
+    for handlers in dispatcher.handlers.values():
+        for handler in handlers:
+            count += _instrument_handler(handler)
+    LOGGER.info(f"Метрики: обёрнуто обработчиков - {count}")
+    return count
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      HTTP-ЭНДПОИНТ PROMETHEUS
+# ═══════════════════════════════════════════════════════════════
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(listen: str = "127.0.0.1", port: int = 9108) -> Optional[ThreadingHTTPServer]:
+    """Поднимает http://listen:port/metrics для Prometheus"""
+    try:
+        server = ThreadingHTTPServer((listen, port), _MetricsRequestHandler)
+    except OSError as e:
+        LOGGER.error(f"Метрики: не удалось занять {listen}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    LOGGER.info(f"Метрики: http://{listen}:{port}/metrics")
+    return server
@@ -3,10 +3,10 @@
 Вспомогательные функции
 """
 
-from typing import Dict, List
+from typing import Dict, Iterable, List
 
 from telegram import InlineKeyboardButton, MAX_MESSAGE_LENGTH, ParseMode
-from telegram.error import TelegramError
+from telegram.error import BadRequest, InvalidToken, RetryAfter, TelegramError
 
 from MitaHelper import NO_LOAD
 
@@ -127,3 +127,53 @@ def revert_buttons(buttons):
 def is_module_loaded(name: str) -> bool:
     """Проверяет, загружен ли модуль"""
     return name not in NO_LOAD
+
+
+# Сколько сообщений Bot API удаляет за один deleteMessages
+DELETE_BATCH_SIZE = 100
+
+# False - сервер Bot API не знает deleteMessages (старый локальный сервер)
+_batch_delete_supported = True
+
+
+def _method_missing(error: TelegramError) -> bool:
+    """Ошибка значит "нет такого метода" (404 в PTB 13 - InvalidToken)"""
+    if isinstance(error, InvalidToken):
+        return True
+    return isinstance(error, BadRequest) and "method" in error.message.lower()
+
+
+def delete_messages(bot, chat_id: int, message_ids: Iterable[int]) -> int:
+    """
+    Удаляет сообщения пачками через deleteMessages (до 100 за запрос).
+    Если метода нет на сервере - удаляет по одному. Возвращает число запросов.
+    RetryAfter и сетевые ошибки пробрасываются: повторять пачку поштучно,
+    когда Telegram и так ограничивает бота, - в 100 раз больше запросов.
+    """
+    global _batch_delete_supported
+    message_ids = sorted(set(message_ids))
+    requests_made = 0
+    for i in range(0, len(message_ids), DELETE_BATCH_SIZE):
+        batch = message_ids[i:i + DELETE_BATCH_SIZE]
+        if _batch_delete_supported:
+            try:
+                # В PTB 13 обёртки для deleteMessages нет, вызываем метод API напрямую
+                bot._post("deleteMessages", {"chat_id": chat_id, "message_ids": batch})
+                requests_made += 1
+                continue
+            except (BadRequest, InvalidToken) as e:
+                requests_made += 1
+                if not _method_missing(e):
+                    # Нет прав, сообщения уже удалены и т.п. - поштучно не лучше
+                    continue
+                _batch_delete_supported = False
+
+        for message_id in batch:
+            try:
+                bot.delete_message(chat_id, message_id)
+            except RetryAfter:
+                raise
+            except TelegramError:
+                pass
+            requests_made += 1
+    return requests_made
@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+"""
+Планировщик исходящих запросов к Telegram API - лимиты и приоритеты
+"""
+
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from time import monotonic, perf_counter, sleep
+from typing import Dict, Iterable, Optional, Union
+
+from telegram import ChatPermissions
+from telegram.error import RetryAfter, TelegramError, TimedOut
+from telegram.ext import ExtBot
+from telegram.utils.helpers import DEFAULT_NONE
+
+from MitaHelper import LOGGER
+from MitaHelper.modules.helper_funcs.metrics import METRICS
+
+
+# Приоритеты: меньше - важнее
+PRIORITY_HIGH = 0     # наказания, удаление спама, ответы на кнопки
+PRIORITY_NORMAL = 1   # ответы на команды и всё остальное
+PRIORITY_LOW = 2      # логи, приветствия, уведомления
+
+# Запросы, которые всегда идут с высоким приоритетом
+ENFORCEMENT_METHODS = frozenset({
+    "deleteMessage",
+    "deleteMessages",
+    "restrictChatMember",
+    "banChatMember",
+    "unbanChatMember",
+    "banChatSenderChat",
+    "answerCallbackQuery",
+    "approveChatJoinRequest",
+    "declineChatJoinRequest",
+})
+
+# Запросы, которые не ограничиваются (служебные; get* - тоже)
+UNLIMITED_METHODS = frozenset({
+    "getUpdates",
+    "setWebhook",
+    "deleteWebhook",
+    "logOut",
+    "close",
+})
+
+# Лимиты Telegram: ~30 сообщений в секунду всего,
+# 20 в минуту в одну группу и ~1 в секунду в личку
+GLOBAL_RATE = 30
+GROUP_RATE = 20          # в минуту
+GROUP_BURST = 20
+PRIVATE_RATE = 1
+PRIVATE_BURST = 3
+
+# Сколько раз повторять запрос после RetryAfter и до скольки секунд ждать
+MAX_RETRIES = 3
+MAX_RETRY_WAIT = 60
+
+# Как часто выбрасывать неиспользуемые счётчики чатов (секунды)
+SWEEP_INTERVAL = 60
+
+# Сколько запрос может ждать очереди сверх своего таймаута (больше
+# MAX_RETRY_WAIT - пауза после RetryAfter укладывается); дольше - TimedOut
+QUEUE_TIMEOUT = 2 * MAX_RETRY_WAIT
+
+# Потоки массовых наказаний (баны при рейде и т.п.)
+BULK_WORKERS = 4
+BULK_ACTIONS = ("ban", "kick", "mute")
+
+_local = threading.local()
+
+
+@contextmanager
+def outbound_priority(priority: int):
+    """
+    Все запросы к API внутри блока идут с указанным приоритетом:
+
+        with outbound_priority(PRIORITY_LOW):
+            bot.send_message(log_channel, text)
+    """
+    previous = getattr(_local, "priority", None)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def low_priority(func):
+    """Декоратор: запросы из функции идут с низким приоритетом"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with outbound_priority(PRIORITY_LOW):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def is_chat_limited(endpoint: str) -> bool:
+    """Запросы, на которые действует лимит сообщений в чат"""
+    return endpoint.startswith(("send", "forward", "copy"))
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        # До этого момента запросы не отправляются (после RetryAfter)
+        self.blocked_until = 0.0
+
+    def delay(self, now: float, need_token: bool = True) -> float:
+        """Сколько секунд ждать до следующего запроса (0 - можно сейчас)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if not need_token:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        """Корзина полна и не заблокирована - её можно не хранить"""
+        if now < self.blocked_until:
+            return False
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Ticket:
+    __slots__ = ("event", "chat_key", "limited")
+
+    def __init__(self, chat_key, limited: bool):
+        self.event = threading.Event()
+        self.chat_key = chat_key
+        self.limited = limited
+
+
+class OutboundScheduler:
+    """
+    Выдаёт разрешения на запросы к API.
+
+    - Общий лимит на бота и отдельный на каждый чат (только для отправки
+      сообщений; удаления и наказания ограничены только общим лимитом).
+    - Очереди по приоритетам: пока ждут наказания, логи и приветствия
+      не отправляются. Внутри приоритета чаты обслуживаются по кругу,
+      поэтому один шумный чат не задерживает остальные.
+    - Сам запрос выполняет вызывающий поток, планировщик только
+      решает, когда его можно отправить.
+    - RetryAfter от Telegram приостанавливает чат (или всех, если чат
+      неизвестен) на указанное время.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        group_rate: float = GROUP_RATE,
+        group_burst: float = GROUP_BURST,
+        private_rate: float = PRIVATE_RATE,
+        private_burst: float = PRIVATE_BURST,
+    ):
+        for name, value in (
+            ("global_rate", global_rate),
+            ("group_rate", group_rate),
+            ("private_rate", private_rate),
+        ):
+            if value <= 0:
+                raise ValueError(f"{name} должен быть больше 0, а не {value}")
+        for name, value in (("group_burst", group_burst), ("private_burst", private_burst)):
+            if value < 1:
+                raise ValueError(f"{name} должен быть не меньше 1, а не {value}")
+
+        now = monotonic()
+        self.group_rate = group_rate / 60
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+
+        self._global = TokenBucket(global_rate, global_rate, now)
+        # {chat_id: TokenBucket}
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        # По очереди на приоритет: OrderedDict{chat_id: deque[_Ticket]}
+        self._queues = [OrderedDict() for _ in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)]
+        self._depth = [0, 0, 0]
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._last_sweep = now
+
+        self.retry_after_count = 0
+
+    # ───────────────────────── лимиты ─────────────────────────
+
+    def _chat_bucket(self, chat_key, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_key)
+        if bucket is None:
+            if isinstance(chat_key, int) and chat_key > 0:
+                bucket = TokenBucket(self.private_rate, self.private_burst, now)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst, now)
+            self._chats[chat_key] = bucket
+        return bucket
+
+    def _delay(self, chat_key, limited: bool, now: float) -> float:
+        """Сколько ждать запросу в чат chat_key (0 - можно сейчас)"""
+        wait = self._global.delay(now)
+        if wait > 0 or chat_key is None:
+            return wait
+        return self._chat_bucket(chat_key, now).delay(now, limited)
+
+    def _take(self, chat_key, limited: bool):
+        self._global.take()
+        if limited and chat_key is not None:
+            self._chats[chat_key].take()
+
+    def _sweep(self, now: float):
+        self._last_sweep = now
+        for chat_key in [key for key, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_key]
+
+    # ───────────────────────── очередь ─────────────────────────
+
+    def acquire(self, chat_key=None, priority: int = PRIORITY_NORMAL, limited: bool = False,
+                timeout: float = QUEUE_TIMEOUT):
+        """
+        Блокирует поток, пока запрос нельзя отправить.
+        Не дождался за timeout секунд - TimedOut (запрос не отправляется).
+        """
+        with self._cond:
+            if self._stopped:
+                return
+            now = monotonic()
+            # Очередь пуста - отправляем сразу, без участия потока планировщика
+            if not any(self._depth) and self._delay(chat_key, limited, now) <= 0:
+                self._take(chat_key, limited)
+                return
+
+            ticket = _Ticket(chat_key, limited)
+            queue = self._queues[priority]
+            tickets = queue.get(chat_key)
+            if tickets is None:
+                tickets = queue[chat_key] = deque()
+            tickets.append(ticket)
+            self._depth[priority] += 1
+
+            self._ensure_thread()
+            self._cond.notify()
+
+        if ticket.event.wait(timeout):
+            return
+        with self._cond:
+            # Разрешение могло прийти, пока брали блокировку
+            if ticket.event.is_set():
+                return
+            tickets = queue.get(chat_key)
+            if tickets is not None and ticket in tickets:
+                tickets.remove(ticket)
+                if not tickets:
+                    del queue[chat_key]
+                self._depth[priority] -= 1
+            # Поток планировщика мог упасть - следующий запрос поднимет новый
+            self._ensure_thread()
+        LOGGER.warning(f"Очередь запросов к API не подошла за {timeout:g} сек (чат {chat_key})")
+        raise TimedOut()
+
+    def _ensure_thread(self):
+        """Запускает поток планировщика, если его нет или он упал (под self._cond)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="outbound", daemon=True)
+            self._thread.start()
+
+    def _pick(self, now: float):
+        """Выбирает следующий запрос. Возвращает (ticket, None) или (None, сколько ждать)"""
+        best_wait = None
+        for priority, queue in enumerate(self._queues):
+            for chat_key, tickets in queue.items():
+                ticket = tickets[0]
+                wait = self._delay(chat_key, ticket.limited, now)
+                if wait <= 0:
+                    tickets.popleft()
+                    if tickets:
+                        # Следующий запрос этого чата - после остальных чатов
+                        queue.move_to_end(chat_key)
+                    else:
+                        del queue[chat_key]
+                    self._depth[priority] -= 1
+                    self._take(chat_key, ticket.limited)
+                    return ticket, None
+                if best_wait is None or wait < best_wait:
+                    best_wait = wait
+        return None, best_wait
+
+    def _loop(self):
+        try:
+            self._serve()
+        except Exception:
+            LOGGER.exception("Планировщик запросов упал, перезапуск")
+            # Не крутимся вхолостую, если ошибка повторяется
+            sleep(1)
+            with self._cond:
+                if not self._stopped:
+                    self._thread = threading.Thread(target=self._loop, name="outbound", daemon=True)
+                    self._thread.start()
+
+    def _serve(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = monotonic()
+                    if now - self._last_sweep > SWEEP_INTERVAL:
+                        self._sweep(now)
+                    ticket, wait = self._pick(now)
+                    if ticket is not None:
+                        break
+                    # wait=None - очередь пуста, спим до нового запроса
+                    self._cond.wait(wait)
+            ticket.event.set()
+
+    def stop(self):
+        """Останавливает планировщик и отпускает все ждущие запросы"""
+        with self._cond:
+            self._stopped = True
+            for queue in self._queues:
+                for tickets in queue.values():
+                    for ticket in tickets:
+                        ticket.event.set()
+                queue.clear()
+            self._depth = [0, 0, 0]
+            self._cond.notify_all()
+
+    # ───────────────────────── RetryAfter ─────────────────────────
+
+    def retry_after(self, chat_key, seconds: float):
+        """Telegram попросил подождать: приостанавливает чат (None - всех)"""
+        with self._cond:
+            self.retry_after_count += 1
+            now = monotonic()
+            until = now + seconds
+            bucket = self._global if chat_key is None else self._chat_bucket(chat_key, now)
+            bucket.blocked_until = max(bucket.blocked_until, until)
+            if bucket is not self._global:
+                # После паузы - один запрос сразу, дальше по лимиту, а не всё разом
+                bucket.tokens = 1
+                bucket.updated = until
+            self._cond.notify()
+
+    # ───────────────────────── статистика ─────────────────────────
+
+    def queue_depth(self, priority: int = None) -> int:
+        """Сколько запросов ждут отправки (всего или с указанным приоритетом)"""
+        if priority is None:
+            return sum(self._depth)
+        return self._depth[priority]
+
+    def paused_chats(self) -> int:
+        """Сколько чатов сейчас на паузе после RetryAfter"""
+        now = monotonic()
+        with self._lock:
+            return sum(1 for bucket in self._chats.values() if bucket.blocked_until > now)
+
+
+class BulkBatch:
+    """Пачка массовых наказаний: сколько поставлено, сделано и с ошибками"""
+
+    __slots__ = ("total", "done", "failed", "_event")
+
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self._event = threading.Event()
+
+    def finished(self) -> bool:
+        return self.done + self.failed >= self.total
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._event.wait(timeout)
+
+
+class BulkRestrictor:
+    """
+    Массовые наказания в фоне: бан, кик или мут пачки пользователей.
+
+    - Вызывающий поток (воркер диспетчера) не ждёт API - пользователи
+      только ставятся в очередь, запросы шлют BULK_WORKERS потоков.
+    - Наказания идут через планировщик с высоким приоритетом и
+      ограничены только общим лимитом бота, поэтому сотни входов
+      в минуту разбираются параллельно, не вставая в очередь за
+      сообщениями.
+    - Один и тот же пользователь чата в очереди не дублируется.
+    - submit() возвращает BulkBatch - по нему видно, сколько уже сделано.
+    """
+
+    def __init__(self, bot: "OutboundBot", workers: int = BULK_WORKERS):
+        self._bot = bot
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # (chat_id, user_id, действие, until_date, BulkBatch)
+        self._pending = deque()
+        self._queued = set()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.done = 0
+        self.failed = 0
+
+    def submit(self, chat_id: int, user_ids: Iterable[int], action: str = "ban", until_date=None) -> BulkBatch:
+        """Ставит наказание пользователям в очередь (уже стоящие в ней пропускаются)"""
+        if action not in BULK_ACTIONS:
+            raise ValueError(f"Неизвестное действие: {action}")
+        batch = BulkBatch()
+        with self._lock:
+            for user_id in user_ids:
+                key = (chat_id, user_id)
+                if key in self._queued:
+                    continue
+                self._queued.add(key)
+                self._pending.append((chat_id, user_id, action, until_date, batch))
+                batch.total += 1
+            if not batch.total:
+                batch._event.set()
+            start = min(self._workers - self._running, len(self._pending))
+            if start <= 0:
+                return batch
+            self._running += start
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="bulk")
+        for _ in range(start):
+            self._executor.submit(self._drain)
+        return batch
+
+    def _apply(self, chat_id: int, user_id: int, action: str, until_date):
+        if action == "mute":
+            self._bot.restrict_chat_member(
+                chat_id, user_id, permissions=ChatPermissions(can_send_messages=False), until_date=until_date,
+            )
+            return
+        self._bot.ban_chat_member(chat_id, user_id, until_date=until_date)
+        if action == "kick":
+            self._bot.unban_chat_member(chat_id, user_id, only_if_banned=True)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running -= 1
+                    if not self._running:
+                        self._idle.notify_all()
+                    return
+                chat_id, user_id, action, until_date, batch = self._pending.popleft()
+            ok = False
+            try:
+                self._apply(chat_id, user_id, action, until_date)
+                ok = True
+            except TelegramError as e:
+                LOGGER.warning(f"Массовое наказание ({action}) {user_id} в {chat_id}: {e}")
+            except Exception as e:
+                LOGGER.error(f"Ошибка массового наказания ({action}) {user_id} в {chat_id}: {e}")
+            with self._lock:
+                self._queued.discard((chat_id, user_id))
+                if ok:
+                    self.done += 1
+                    batch.done += 1
+                else:
+                    self.failed += 1
+                    batch.failed += 1
+                if batch.finished():
+                    batch._event.set()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Ждёт, пока очередь разберётся (для тестов и бенчмарков)"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._running, timeout)
+
+
+class OutboundBot(ExtBot):
+    """
+    Бот, все запросы которого проходят через OutboundScheduler.
+    Вызовы bot.send_message() и т.п. в модулях менять не нужно.
+    """
+
+    def __init__(self, *args, scheduler: OutboundScheduler = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler or OutboundScheduler()
+        self.bulk = BulkRestrictor(self)
+
+    def bulk_restrict(self, chat_id: int, user_ids: Iterable[int], action: str = "ban", until_date=None) -> BulkBatch:
+        """Банит/кикает/мутит пачку пользователей в фоне (см. BulkRestrictor)"""
+        return self.bulk.submit(chat_id, user_ids, action, until_date)
+
+    def _send(self, endpoint: str, data: dict, timeout, api_kwargs: dict, wait: float = 0.0):
+        """Сам запрос к API (с записью в метрики)"""
+        start = perf_counter()
+        error = False
+        try:
+            return super()._post(endpoint, data, timeout=timeout, api_kwargs=api_kwargs)
+        except TelegramError:
+            error = True
+            raise
+        finally:
+            # getUpdates - long polling, его время ни о чём не говорит
+            if endpoint != "getUpdates":
+                METRICS.observe_api(endpoint, perf_counter() - start, wait, error)
+
+    def _post(self, endpoint: str, data: dict = None, timeout=DEFAULT_NONE, api_kwargs: dict = None):
+        if endpoint in UNLIMITED_METHODS or endpoint.startswith("get"):
+            return self._send(endpoint, data, timeout, api_kwargs)
+
+        chat_key = (data or {}).get("chat_id")
+        if chat_key is None and api_kwargs:
+            chat_key = api_kwargs.get("chat_id")
+
+        if endpoint in ENFORCEMENT_METHODS:
+            priority = PRIORITY_HIGH
+        else:
+            priority = getattr(_local, "priority", None)
+            if priority is None:
+                priority = PRIORITY_NORMAL
+        limited = is_chat_limited(endpoint)
+
+        retries = 0
+        while True:
+            start = perf_counter()
+            # Очередь ждём не дольше таймаута самого запроса плюс QUEUE_TIMEOUT
+            queue_timeout = QUEUE_TIMEOUT + (timeout if isinstance(timeout, (int, float)) else 0)
+            self.scheduler.acquire(chat_key, priority, limited, queue_timeout)
+            try:
+                return self._send(endpoint, data, timeout, api_kwargs, perf_counter() - start)
+            except RetryAfter as e:
+                self.scheduler.retry_after(chat_key, e.retry_after)
+                LOGGER.warning(f"Telegram: {endpoint} в {chat_key} - подождать {e.retry_after} сек")
+                retries += 1
+                if retries > MAX_RETRIES or e.retry_after > MAX_RETRY_WAIT:
+                    raise
+                # Повтор снова встанет в очередь и дождётся конца паузы
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+Единый конвейер обработки сообщений.
+
+Раньше каждый модуль (антиканал, медиа-фильтры, фильтры, заметки, вход
+участников, сервисные, трекинг) вешал свой MessageHandler: на каждое
+сообщение - несколько run_async-задач, каждая со своими фильтрами и
+поиском настроек. Теперь модули регистрируют этапы (register_stage), а
+сообщение проходит их за одну задачу:
+
+- признаки сообщения (MessageFeatures) считаются один раз;
+- для чата держится маска включённых этапов - пересчитывается только
+  после изменения настроек (invalidate_chat_features);
+- запускаются только этапы из маски, подходящие по признакам, по порядку.
+  Если этап удалил сообщение, остальные проверки его уже не трогают.
+"""
+
+import re
+import time
+from threading import Lock
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from telegram import Chat, Message, MessageEntity, Update
+from telegram.ext import CallbackContext, Filters, MessageHandler
+
+from MitaHelper import dispatcher, LOGGER
+from MitaHelper.modules.helper_funcs.executor import enforcement
+from MitaHelper.modules.helper_funcs.metrics import METRICS
+
+
+# Группа обработчиков конвейера (антифлуд -2 и кеш админов -1 идут раньше)
+PIPELINE_GROUP = 1
+
+GROUP_TYPES = (Chat.GROUP, Chat.SUPERGROUP)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ПРИЗНАКИ СООБЩЕНИЯ
+# ═══════════════════════════════════════════════════════════════
+
+# Вид сообщения (MessageFeatures.kinds)
+KIND_TEXT = 1 << 0          # есть message.text
+KIND_CAPTION = 1 << 1       # есть подпись к медиа
+KIND_COMMAND = 1 << 2       # начинается с /команды
+KIND_HASHTAG = 1 << 3       # текст начинается с #слова
+KIND_MEDIA = 1 << 4         # есть хотя бы один тип из CONTENT_TYPES
+KIND_SENDER_CHAT = 1 << 5   # от имени чужого канала
+KIND_STATUS = 1 << 6        # любое сервисное сообщение
+KIND_SERVICE = 1 << 7       # сервисное, которое можно чистить (вход, выход, закреп...)
+KIND_JOIN = 1 << 8          # вход участников
+KIND_EDITED = 1 << 9        # отредактированное сообщение
+
+# Типы содержимого (MessageFeatures.content) - имена как в media_filters.MEDIA_TYPES
+CONTENT_TYPES = (
+    "voice", "video_note", "sticker", "animation", "photo", "video", "document",
+    "audio", "forward", "url", "contact", "location", "poll", "game", "inline",
+)
+CONTENT_BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(CONTENT_TYPES)}
+
+# Отправитель (MessageFeatures.sender)
+SENDER_USER = "user"
+SENDER_BOT = "bot"
+SENDER_CHANNEL = "channel"                  # чужой канал (в т.ч. автопересылка привязанного)
+SENDER_ANONYMOUS_ADMIN = "anonymous_admin"  # анонимный админ группы (sender_chat == chat)
+SENDER_UNKNOWN = "unknown"
+
+URL_ENTITIES = (MessageEntity.URL, MessageEntity.TEXT_LINK)
+
+HASHTAG_RE = re.compile(r"^#(\w+)")
+
+
+def classify_content(msg: Message) -> int:
+    """Маска типов содержимого сообщения (CONTENT_BITS)"""
+    content = 0
+    if msg.voice:
+        content |= CONTENT_BITS["voice"]
+    if msg.video_note:
+        content |= CONTENT_BITS["video_note"]
+    if msg.sticker:
+        content |= CONTENT_BITS["sticker"]
+    if msg.animation:
+        content |= CONTENT_BITS["animation"]
+    elif msg.document:
+        # У GIF Telegram заполняет и document - файлом считаем только настоящий документ
+        content |= CONTENT_BITS["document"]
+    if msg.photo:
+        content |= CONTENT_BITS["photo"]
+    if msg.video:
+        content |= CONTENT_BITS["video"]
+    if msg.audio:
+        content |= CONTENT_BITS["audio"]
+    if msg.forward_date:
+        content |= CONTENT_BITS["forward"]
+    if msg.contact:
+        content |= CONTENT_BITS["contact"]
+    if msg.location or msg.venue:
+        content |= CONTENT_BITS["location"]
+    if msg.poll:
+        content |= CONTENT_BITS["poll"]
+    if msg.game:
+        content |= CONTENT_BITS["game"]
+    if msg.via_bot:
+        content |= CONTENT_BITS["inline"]
+    for entity in msg.entities or msg.caption_entities or ():
+        if entity.type in URL_ENTITIES:
+            content |= CONTENT_BITS["url"]
+            break
+    return content
+
+
+def _is_service(msg: Message) -> bool:
+    """Сервисные сообщения, которые удаляет модуль сервисных"""
+    return bool(
+        msg.new_chat_members
+        or msg.left_chat_member
+        or msg.new_chat_title
+        or msg.new_chat_photo
+        or msg.delete_chat_photo
+        or msg.pinned_message
+        or msg.migrate_from_chat_id
+        or msg.migrate_to_chat_id
+    )
+
+
+class MessageFeatures:
+    """
+    Всё, что этапам нужно знать о сообщении, - считается один раз.
+
+    removed - сообщение удалено одним из этапов;
+    removed_members - ID вошедших, которых уже забанили/кикнули
+    (капче и приветствию их пропускать).
+    """
+
+    __slots__ = (
+        "kinds", "content", "text", "text_lower", "hashtag", "entity_types",
+        "sender", "removed", "removed_members",
+    )
+
+    def __init__(self, update: Update, msg: Message, chat: Chat):
+        kinds = 0
+        if update.edited_message is not None or update.edited_channel_post is not None:
+            kinds |= KIND_EDITED
+
+        self.text = msg.text or msg.caption or ""
+        self.text_lower = self.text.lower()
+        self.hashtag: Optional[str] = None
+        if msg.text:
+            kinds |= KIND_TEXT
+            match = HASHTAG_RE.match(msg.text)
+            if match:
+                kinds |= KIND_HASHTAG
+                self.hashtag = match.group(1)
+        elif msg.caption:
+            kinds |= KIND_CAPTION
+
+        entities = msg.entities or msg.caption_entities or ()
+        self.entity_types: FrozenSet[str] = frozenset(entity.type for entity in entities)
+        if msg.entities and msg.entities[0].type == MessageEntity.BOT_COMMAND and msg.entities[0].offset == 0:
+            kinds |= KIND_COMMAND
+
+        self.content = classify_content(msg)
+        if self.content:
+            kinds |= KIND_MEDIA
+
+        if msg.sender_chat is not None:
+            if msg.sender_chat.id == chat.id:
+                self.sender = SENDER_ANONYMOUS_ADMIN
+            else:
+                self.sender = SENDER_CHANNEL
+                kinds |= KIND_SENDER_CHAT
+        elif msg.from_user is not None:
+            self.sender = SENDER_BOT if msg.from_user.is_bot else SENDER_USER
+        else:
+            self.sender = SENDER_UNKNOWN
+
+        if _is_service(msg):
+            kinds |= KIND_SERVICE | KIND_STATUS
+            if msg.new_chat_members:
+                kinds |= KIND_JOIN
+        elif Filters.status_update(update):
+            kinds |= KIND_STATUS
+
+        self.kinds = kinds
+        self.removed = False
+        self.removed_members: Set[int] = set()
+
+    def has_content(self, name: str) -> bool:
+        return bool(self.content & CONTENT_BITS[name])
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ЭТАПЫ
+# ═══════════════════════════════════════════════════════════════
+
+class Stage:
+    """
+    Этап конвейера: callback(update, context, features).
+    Вернул True - сообщение удалено, дальше идут только этапы с after_removal.
+    """
+
+    __slots__ = ("name", "callback", "order", "bit", "enabled", "kinds", "exclude", "groups_only", "after_removal")
+
+    def __init__(self, name: str, callback: Callable, order: int, bit: int,
+                 enabled: Optional[Callable[[int], bool]], kinds: int, exclude: int,
+                 groups_only: bool, after_removal: bool):
+        self.name = name
+        self.callback = callback
+        self.order = order
+        self.bit = bit
+        self.enabled = enabled
+        self.kinds = kinds
+        self.exclude = exclude
+        self.groups_only = groups_only
+        self.after_removal = after_removal
+
+    def accepts(self, features: MessageFeatures) -> bool:
+        if self.kinds and not features.kinds & self.kinds:
+            return False
+        if features.kinds & self.exclude:
+            return False
+        return self.after_removal or not features.removed
+
+
+_stages: List[Stage] = []
+
+# Маска включённых этапов по чатам {chat_id: mask} (только группы)
+_chat_masks: Dict[int, int] = {}
+# Этапы по маске {mask: (Stage, ...)} - один разбор на комбинацию
+_plans: Dict[int, Tuple[Stage, ...]] = {}
+# Растёт при каждом сбросе - маска, посчитанная до сброса, не сохраняется
+_generation = 0
+# Лички и каналы: этапы без enabled() включены всегда - их биты собраны
+# заранее, а enabled() проверяется только у остальных (обычно их нет)
+_open_mask = 0
+_open_checked: Tuple[Stage, ...] = ()
+MASKS_LOCK = Lock()
+
+
+def register_stage(
+    name: str,
+    callback: Callable,
+    order: int,
+    enabled: Callable[[int], bool] = None,
+    kinds: int = 0,
+    exclude: int = 0,
+    groups_only: bool = True,
+    after_removal: bool = False,
+) -> Stage:
+    """
+    Добавляет этап в конвейер.
+
+    - order - место в цепочке (меньше - раньше);
+    - enabled(chat_id) - включён ли этап в чате (None - всегда). Вызывается
+      только при пересчёте маски, поэтому модуль обязан звать
+      invalidate_chat_features() после изменения своих настроек;
+    - kinds - этап нужен, только если у сообщения есть хотя бы один из видов
+      KIND_* (0 - любые), exclude - виды, при которых этап пропускается;
+    - groups_only=False - этап работает и в личке/каналах;
+    - after_removal - запускать, даже если сообщение уже удалено.
+    """
+    global _stages, _open_mask, _open_checked
+    with MASKS_LOCK:
+        stage = Stage(name, callback, order, 1 << len(_stages), enabled, kinds, exclude, groups_only, after_removal)
+        _stages = sorted(_stages + [stage], key=lambda s: s.order)
+        open_stages = [s for s in _stages if not s.groups_only]
+        _open_mask = sum(s.bit for s in open_stages if s.enabled is None)
+        _open_checked = tuple(s for s in open_stages if s.enabled is not None)
+        _chat_masks.clear()
+        _plans.clear()
+    return stage
+
+
+def invalidate_chat_features(chat_id: int = None):
+    """Сбрасывает маску чата (или всех чатов) после изменения настроек"""
+    global _generation
+    with MASKS_LOCK:
+        _generation += 1
+        if chat_id is None:
+            _chat_masks.clear()
+        else:
+            _chat_masks.pop(chat_id, None)
+
+
+def _compute_mask(chat_id: int, stages: Iterable[Stage], mask: int = 0) -> int:
+    for stage in stages:
+        try:
+            if stage.enabled is None or stage.enabled(chat_id):
+                mask |= stage.bit
+        except Exception as e:
+            LOGGER.error(f"Конвейер: не удалось проверить этап {stage.name} в чате {chat_id}: {e}")
+    return mask
+
+
+def get_chat_mask(chat: Chat) -> int:
+    """Маска включённых в чате этапов"""
+    if chat.type not in GROUP_TYPES:
+        # Личка и каналы - только общие этапы; по чатам не кешируем
+        # (чатов слишком много), но и этапы групп не перебираем
+        if not _open_checked:
+            return _open_mask
+        return _compute_mask(chat.id, _open_checked, _open_mask)
+
+    mask = _chat_masks.get(chat.id)
+    if mask is None:
+        generation = _generation
+        mask = _compute_mask(chat.id, _stages)
+        with MASKS_LOCK:
+            if generation == _generation:
+                _chat_masks[chat.id] = mask
+    return mask
+
+
+def _get_plan(mask: int) -> Tuple[Stage, ...]:
+    plan = _plans.get(mask)
+    if plan is None:
+        plan = tuple(stage for stage in _stages if stage.bit & mask)
+        with MASKS_LOCK:
+            _plans[mask] = plan
+    return plan
+
+
+def enabled_stages(chat: Chat) -> List[str]:
+    """Имена включённых в чате этапов (для диагностики)"""
+    return [stage.name for stage in _get_plan(get_chat_mask(chat))]
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ОБРАБОТЧИК
+# ═══════════════════════════════════════════════════════════════
+
+@enforcement
+def process_message(update: Update, context: CallbackContext):
+    """Прогоняет сообщение через включённые в чате этапы"""
+    msg = update.effective_message
+    chat = update.effective_chat
+    if msg is None or chat is None:
+        return
+
+    plan = _get_plan(get_chat_mask(chat))
+    if not plan:
+        return
+
+    features = MessageFeatures(update, msg, chat)
+    for stage in plan:
+        if not stage.accepts(features):
+            continue
+        start = time.perf_counter()
+        error = False
+        try:
+            if stage.callback(update, context, features):
+                features.removed = True
+        except Exception as e:
+            # Ошибка одного этапа не мешает остальным
+            error = True
+            context.dispatcher.dispatch_error(update, e)
+        finally:
+            METRICS.observe_handler(f"pipeline.{stage.name}", time.perf_counter() - start, error)
+
+
+PIPELINE_HANDLER = MessageHandler(Filters.all, process_message, run_async=True)
+
+dispatcher.add_handler(PIPELINE_HANDLER, group=PIPELINE_GROUP)
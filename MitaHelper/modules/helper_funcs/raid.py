@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Рейды - частота входов в чат с учётом обычного фона и журнал недавних входов
+"""
+
+from collections import OrderedDict, deque
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional
+
+
+# Длина корзины и окна, по которому считается частота (секунды)
+BUCKET_SECONDS = 10
+WINDOW_BUCKETS = 6
+
+# Вес новой корзины в скользящем среднем (EWMA) обычного фона
+EWMA_ALPHA = 0.05
+
+# Рейд - частота выше порога и во столько раз выше обычного фона
+BASELINE_MULTIPLIER = 4.0
+
+# Сколько чатов держать в памяти (давно неактивные выбрасываются)
+MAX_CHATS = 20000
+
+# Сколько последних входов помнить в каждом чате
+RECENT_JOINS_SIZE = 2000
+
+# Итог входа
+JOIN_NEW = "new"            # вошёл, капчу ещё не прошёл (или капчи нет)
+JOIN_PASSED = "passed"      # прошёл капчу
+JOIN_FAILED = "failed"      # не прошёл капчу вовремя
+JOIN_REMOVED = "removed"    # уже забанен/кикнут (CAS, режим ЧС, /raidclean)
+
+
+class _ChatRate:
+    """Счётчики входов одного чата"""
+
+    __slots__ = ("bucket_start", "current", "buckets", "baseline", "threshold")
+
+    def __init__(self, now: float):
+        self.bucket_start = now - now % BUCKET_SECONDS
+        self.current = 0
+        # Завершённые корзины последнего окна
+        self.buckets = deque(maxlen=WINDOW_BUCKETS - 1)
+        # Обычное число входов за корзину (EWMA)
+        self.baseline = 0.0
+        # Порог из последнего record() - корзины выше него не идут в фон
+        self.threshold = float("inf")
+
+
+class JoinRateDetector:
+    """
+    Входы считаются по корзинам BUCKET_SECONDS секунд. Частота - входы
+    за последние WINDOW_BUCKETS корзин в пересчёте на минуту.
+
+    Обычный фон чата - EWMA входов за корзину. В него попадают только
+    корзины ниже порога, чтобы сам рейд не поднимал фон. Рейд - когда
+    частота не ниже порога и в BASELINE_MULTIPLIER раз выше фона:
+    в большом чате сотня входов в минуту может быть нормой.
+    """
+
+    def __init__(self, max_chats: int = MAX_CHATS):
+        self._chats: Dict[int, _ChatRate] = OrderedDict()
+        self._max_chats = max_chats
+        self._lock = Lock()
+
+    def _roll(self, state: _ChatRate, now: float):
+        """Закрывает прошедшие корзины"""
+        elapsed = int((now - state.bucket_start) // BUCKET_SECONDS)
+        if elapsed <= 0:
+            return
+        bucket_limit = state.threshold * BUCKET_SECONDS / 60
+        closed = [state.current] + [0] * min(elapsed - 1, WINDOW_BUCKETS)
+        for count in closed:
+            state.buckets.append(count)
+            if count < bucket_limit:
+                state.baseline += EWMA_ALPHA * (count - state.baseline)
+        # Долгая тишина - фон затухает и без перебора каждой корзины
+        skipped = elapsed - len(closed)
+        if skipped > 0:
+            state.baseline *= (1 - EWMA_ALPHA) ** skipped
+        state.current = 0
+        state.bucket_start += elapsed * BUCKET_SECONDS
+
+    def _state(self, chat_id: int, now: float) -> _ChatRate:
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatRate(now)
+            if len(self._chats) > self._max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return state
+
+    @staticmethod
+    def _rate(state: _ChatRate) -> float:
+        return (state.current + sum(state.buckets)) * 60 / (BUCKET_SECONDS * WINDOW_BUCKETS)
+
+    def record(self, chat_id: int, joins: int, threshold: float, now: float = None) -> bool:
+        """Учитывает joins входов. True - частота входов похожа на рейд"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            state = self._state(chat_id, now)
+            self._roll(state, now)
+            state.threshold = threshold
+            state.current += joins
+            rate = self._rate(state)
+            baseline = state.baseline * 60 / BUCKET_SECONDS
+            return rate >= threshold and rate >= BASELINE_MULTIPLIER * baseline
+
+    def rate(self, chat_id: int, now: float = None) -> float:
+        """Текущая частота входов (в минуту)"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            state = self._chats.get(chat_id)
+            if state is None:
+                return 0.0
+            self._roll(state, now)
+            return self._rate(state)
+
+    def baseline(self, chat_id: int) -> Optional[float]:
+        """Обычный фон входов (в минуту), None - чат ещё не наблюдался"""
+        with self._lock:
+            state = self._chats.get(chat_id)
+            return None if state is None else state.baseline * 60 / BUCKET_SECONDS
+
+    def forget(self, chat_id: int):
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+
+class JoinRecord:
+    """Вход участника: кто, когда (unix-время) и чем закончился"""
+
+    __slots__ = ("user_id", "name", "joined_at", "status")
+
+    def __init__(self, user_id: int, name: str, joined_at: float, status: str):
+        self.user_id = user_id
+        self.name = name
+        self.joined_at = joined_at
+        self.status = status
+
+
+class RecentJoins:
+    """
+    Последние RECENT_JOINS_SIZE входов каждого чата, по порядку входа.
+
+    Кольцевой буфер на OrderedDict {user_id: JoinRecord}: самый старый
+    вход вытесняется новым, повторный вход переносится в конец, а итог
+    капчи обновляется по user_id за O(1).
+    """
+
+    def __init__(self, size: int = RECENT_JOINS_SIZE, max_chats: int = MAX_CHATS):
+        self._size = size
+        self._max_chats = max_chats
+        self._chats: Dict[int, OrderedDict] = OrderedDict()
+        self._lock = Lock()
+
+    def add(self, chat_id: int, user_id: int, name: str, joined_at: float, status: str = JOIN_NEW):
+        with self._lock:
+            joins = self._chats.get(chat_id)
+            if joins is None:
+                joins = self._chats[chat_id] = OrderedDict()
+                if len(self._chats) > self._max_chats:
+                    self._chats.popitem(last=False)
+            else:
+                self._chats.move_to_end(chat_id)
+                joins.pop(user_id, None)
+            joins[user_id] = JoinRecord(user_id, name, joined_at, status)
+            if len(joins) > self._size:
+                joins.popitem(last=False)
+
+    def set_status(self, chat_id: int, user_id: int, status: str):
+        with self._lock:
+            record = self._chats.get(chat_id, {}).get(user_id)
+            if record is not None:
+                record.status = status
+
+    def since(self, chat_id: int, since: float) -> List[JoinRecord]:
+        """Входы не раньше since (unix-время), от старых к новым"""
+        result = []
+        with self._lock:
+            joins = self._chats.get(chat_id)
+            if not joins:
+                return result
+            for record in reversed(joins.values()):
+                if record.joined_at < since:
+                    break
+                result.append(record)
+        result.reverse()
+        return result
+
+    def forget(self, chat_id: int):
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+
+RECENT_JOINS = RecentJoins()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Долговременные таймеры - переживают перезапуск бота
+"""
+
+import heapq
+from itertools import count
+from threading import Condition, RLock, Thread
+from time import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from telegram.error import TelegramError
+
+from MitaHelper import LOGGER
+
+
+# Обработчики таймеров {вид: функция(bot, data)}
+TIMER_HANDLERS: Dict[str, Callable] = {}
+
+# Таймеры {имя: {"kind": вид, "at": время срабатывания (unix), "data": dict}}
+# Хранятся в БД, после перезапуска продолжают отсчёт,
+# просроченные за время простоя срабатывают сразу при старте.
+_timers: Dict[str, dict] = {}
+
+# Куча (время, порядковый номер, имя) - ближайший таймер всегда наверху.
+# Отменённые и перенесённые таймеры из кучи не удаляются,
+# а пропускаются при извлечении.
+_heap: List[Tuple[float, int, str]] = []
+_seq = count()
+
+TIMERS_LOCK = RLock()
+_wakeup = Condition(TIMERS_LOCK)
+
+_thread: Optional[Thread] = None
+_dispatcher = None
+_stopped = False
+
+# Загрузка из БД
+try:
+    from MitaHelper.modules.database import load_timers, save_timers
+    for _name, _timer in load_timers().items():
+        _timers[str(_name)] = _timer
+        heapq.heappush(_heap, (_timer["at"], next(_seq), str(_name)))
+    if _timers:
+        LOGGER.info(f"Загружено таймеров: {len(_timers)}")
+except Exception as e:
+    LOGGER.warning(f"Не удалось загрузить таймеры: {e}")
+    save_timers = None
+
+
+def _save_timers_to_db(name: str):
+    if save_timers:
+        save_timers(_timers, TIMERS_LOCK, {name})
+
+
+def register_timer(kind: str, func: Callable):
+    """Регистрирует обработчик таймеров вида kind: func(bot, data)"""
+    TIMER_HANDLERS[kind] = func
+
+
+def schedule_timer(kind: str, delay: float, data: dict = None, name: str = None) -> str:
+    """
+    Ставит таймер через delay секунд. data должен сериализоваться в JSON.
+    Таймер с тем же name заменяется. Возвращает имя таймера.
+    """
+    name = name or uuid4().hex
+    at = time() + delay
+    with TIMERS_LOCK:
+        _timers[name] = {"kind": kind, "at": at, "data": data or {}}
+        heapq.heappush(_heap, (at, next(_seq), name))
+        _save_timers_to_db(name)
+        # Будим поток, только если новый таймер стал ближайшим
+        if _heap[0][2] == name:
+            _wakeup.notify()
+    return name
+
+
+def cancel_timer(name: str) -> bool:
+    """Отменяет таймер. False - такого таймера нет"""
+    with TIMERS_LOCK:
+        if _timers.pop(name, None) is None:
+            return False
+        _save_timers_to_db(name)
+        return True
+
+
+def iter_timers(kind: str) -> Iterator[Tuple[str, dict]]:
+    """Таймеры указанного вида: (имя, data)"""
+    with TIMERS_LOCK:
+        items = [(name, timer["data"]) for name, timer in _timers.items() if timer["kind"] == kind]
+    return iter(items)
+
+
+def count_timers() -> int:
+    return len(_timers)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ПОТОК ТАЙМЕРОВ
+# ═══════════════════════════════════════════════════════════════
+
+def _run_timer(name: str, timer: dict):
+    """Выполняет таймер и удаляет его из БД (если его не переставили)"""
+    handler = TIMER_HANDLERS.get(timer["kind"])
+    if handler is None:
+        LOGGER.warning(f"Таймер {name}: нет обработчика для «{timer['kind']}»")
+    else:
+        try:
+            handler(_dispatcher.bot, timer["data"])
+        except Exception as e:
+            LOGGER.error(f"Ошибка таймера {name} ({timer['kind']}): {e}")
+
+    # Удаляем только после выполнения: если бот упадёт посередине,
+    # таймер выполнится ещё раз при следующем запуске
+    with TIMERS_LOCK:
+        if _timers.get(name) is timer:
+            del _timers[name]
+            _save_timers_to_db(name)
+
+
+def _timer_loop():
+    """Один поток на все таймеры: спит до ближайшего и отдаёт его воркерам"""
+    while True:
+        with TIMERS_LOCK:
+            while True:
+                if _stopped:
+                    return
+                if not _heap:
+                    _wakeup.wait()
+                    continue
+                at, _, name = _heap[0]
+                timer = _timers.get(name)
+                if timer is None or timer["at"] != at:
+                    # Отменён или переставлен на другое время
+                    heapq.heappop(_heap)
+                    continue
+                delay = at - time()
+                if delay > 0:
+                    _wakeup.wait(delay)
+                    continue
+                heapq.heappop(_heap)
+                break
+
+        # Сам обработчик (запросы к Telegram) - в пуле воркеров диспетчера
+        _dispatcher.run_async(_run_timer, name, timer)
+
+
+def start_timers(dispatcher):
+    """Запускает поток таймеров (просроченные сработают сразу)"""
+    global _thread, _dispatcher, _stopped
+    with TIMERS_LOCK:
+        if _thread is not None:
+            return
+        _dispatcher = dispatcher
+        _stopped = False
+        overdue = sum(1 for timer in _timers.values() if timer["at"] <= time())
+        _thread = Thread(target=_timer_loop, name="timers", daemon=True)
+        _thread.start()
+    if overdue:
+        LOGGER.info(f"Таймеров, просроченных за время простоя: {overdue}")
+
+
+def stop_timers():
+    """Останавливает поток таймеров (сами таймеры остаются в БД)"""
+    global _thread, _stopped
+    with TIMERS_LOCK:
+        _stopped = True
+        _wakeup.notify_all()
+        thread, _thread = _thread, None
+    if thread is not None:
+        thread.join(timeout=5)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ОТЛОЖЕННОЕ УДАЛЕНИЕ СООБЩЕНИЙ
+# ═══════════════════════════════════════════════════════════════
+
+def _delete_message_timer(bot, data: dict):
+    try:
+        bot.delete_message(data["chat_id"], data["message_id"])
+    except TelegramError:
+        pass
+
+
+register_timer("delete_message", _delete_message_timer)
+
+
+def delete_message_later(chat_id: int, message_id: int, delay: float) -> str:
+    """Удаляет сообщение через delay секунд (даже если бот перезапустится)"""
+    return schedule_timer(
+        "delete_message",
+        delay,
+        {"chat_id": chat_id, "message_id": message_id},
+        name=f"delete_{chat_id}_{message_id}",
+    )
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Получение обновлений через вебхук (вместо long polling)
+"""
+
+import hmac
+import ipaddress
+import json
+import secrets
+import ssl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Thread
+from typing import List, Optional
+
+from telegram import Update
+from telegram.ext import (
+    CallbackQueryHandler,
+    ChatJoinRequestHandler,
+    ChatMemberHandler,
+    ChosenInlineResultHandler,
+    CommandHandler,
+    ConversationHandler,
+    Filters,
+    InlineQueryHandler,
+    MessageHandler,
+    PollAnswerHandler,
+    PollHandler,
+    PreCheckoutQueryHandler,
+    ShippingQueryHandler,
+)
+from telegram.ext.filters import InvertedFilter, MergedFilter, XORFilter
+
+from MitaHelper import LOGGER
+
+
+# Максимальный размер тела запроса (обновления Telegram намного меньше)
+MAX_BODY_SIZE = 1024 * 1024
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ALLOWED_UPDATES ПО ОБРАБОТЧИКАМ
+# ═══════════════════════════════════════════════════════════════
+
+MESSAGE_KINDS = ("message", "edited_message", "channel_post", "edited_channel_post")
+
+# Фильтры Filters.update.* -> какие типы обновлений они пропускают
+_UPDATE_FILTERS = {
+    Filters.update: set(MESSAGE_KINDS),
+    Filters.update.message: {"message"},
+    Filters.update.edited_message: {"edited_message"},
+    Filters.update.messages: {"message", "edited_message"},
+    Filters.update.channel_post: {"channel_post"},
+    Filters.update.edited_channel_post: {"edited_channel_post"},
+    Filters.update.channel_posts: {"channel_post", "edited_channel_post"},
+}
+
+# Обработчики, тип обновления которых известен заранее
+_HANDLER_UPDATES = {
+    CallbackQueryHandler: ["callback_query"],
+    InlineQueryHandler: ["inline_query"],
+    ChosenInlineResultHandler: ["chosen_inline_result"],
+    ChatJoinRequestHandler: ["chat_join_request"],
+    PollHandler: ["poll"],
+    PollAnswerHandler: ["poll_answer"],
+    ShippingQueryHandler: ["shipping_query"],
+    PreCheckoutQueryHandler: ["pre_checkout_query"],
+}
+
+
+def _filter_passes(update_filter, kind: str) -> Optional[bool]:
+    """
+    Может ли фильтр пропустить обновление типа kind.
+    Смотрим только на Filters.update.*: True/False - точно да/нет,
+    None - зависит от содержимого сообщения.
+    """
+    if update_filter in _UPDATE_FILTERS:
+        return kind in _UPDATE_FILTERS[update_filter]
+    if isinstance(update_filter, InvertedFilter):
+        result = _filter_passes(update_filter.f, kind)
+        return None if result is None else not result
+    if isinstance(update_filter, MergedFilter):
+        left = _filter_passes(update_filter.base_filter, kind)
+        if update_filter.and_filter is not None:
+            right = _filter_passes(update_filter.and_filter, kind)
+            if left is False or right is False:
+                return False
+            return True if left and right else None
+        right = _filter_passes(update_filter.or_filter, kind)
+        if left or right:
+            return True
+        return False if left is False and right is False else None
+    if isinstance(update_filter, XORFilter):
+        left = _filter_passes(update_filter.base_filter, kind)
+        right = _filter_passes(update_filter.xor_filter, kind)
+        return None if left is None or right is None else left != right
+    return None
+
+
+def _handler_updates(handler) -> Optional[List[str]]:
+    """Типы обновлений, которые может принять обработчик (None - любые)"""
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        kinds = []
+        for nested_handler in nested:
+            nested_kinds = _handler_updates(nested_handler)
+            if nested_kinds is None:
+                return None
+            kinds.extend(nested_kinds)
+        return kinds
+
+    if isinstance(handler, (MessageHandler, CommandHandler)):
+        return [kind for kind in MESSAGE_KINDS if _filter_passes(handler.filters, kind) is not False]
+
+    if isinstance(handler, ChatMemberHandler):
+        if handler.chat_member_types == ChatMemberHandler.MY_CHAT_MEMBER:
+            return ["my_chat_member"]
+        if handler.chat_member_types == ChatMemberHandler.CHAT_MEMBER:
+            return ["chat_member"]
+        return ["my_chat_member", "chat_member"]
+
+    for handler_class, kinds in _HANDLER_UPDATES.items():
+        if isinstance(handler, handler_class):
+            return kinds
+
+    # Свои обработчики могут объявить типы сами (например, CallbackRouter)
+    update_types = getattr(handler, "update_types", None)
+    if update_types is not None:
+        return list(update_types)
+
+    # TypeHandler и прочие обработчики - не знаем, что им нужно
+    return None
+
+
+def collect_allowed_updates(dispatcher) -> List[str]:
+    """
+    Список allowed_updates по зарегистрированным обработчикам:
+    Telegram не будет присылать обновления, которые никто не обрабатывает.
+    """
+    kinds = set()
+    for handlers in dispatcher.handlers.values():
+        for handler in handlers:
+            handler_kinds = _handler_updates(handler)
+            if handler_kinds is None:
+                return list(Update.ALL_TYPES)
+            kinds.update(handler_kinds)
+    # Порядок как в Update.ALL_TYPES - так удобнее читать в логах
+    return [kind for kind in Update.ALL_TYPES if kind in kinds]
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      HTTP-СЕРВЕР
+# ═══════════════════════════════════════════════════════════════
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    """Принимает POST с обновлением и кладёт его в очередь диспетчера"""
+
+    server: "WebhookServer"
+
+    def do_POST(self):
+        server = self.server
+        if self.path.split("?", 1)[0] != server.url_path:
+            self.send_error(404)
+            return
+
+        if server.secret_token:
+            token = self.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token.encode(), server.secret_token.encode()):
+                self.send_error(403)
+                return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self.send_error(400 if length <= 0 else 413)
+            return
+
+        try:
+            data = json.loads(self.rfile.read(length).decode("utf-8"))
+            update = Update.de_json(data, server.bot)
+        except Exception as e:
+            LOGGER.warning(f"Вебхук: не удалось разобрать обновление: {e}")
+            self.send_error(400)
+            return
+
+        # Отвечаем сразу: обработка идёт в диспетчере
+        if update is not None:
+            server.update_queue.put(update)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self.send_error(405)
+
+    def log_message(self, format, *args):
+        LOGGER.debug(f"Вебхук: {self.address_string()} - {format % args}")
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP(S)-сервер вебхука. Каждый запрос - в своём потоке"""
+
+    daemon_threads = True
+
+    def __init__(self, listen: str, port: int, url_path: str, bot, update_queue,
+                 secret_token: str = None, ssl_context: ssl.SSLContext = None):
+        super().__init__((listen, port), WebhookRequestHandler)
+        self.url_path = url_path
+        self.bot = bot
+        self.update_queue = update_queue
+        self.secret_token = secret_token
+        if ssl_context is not None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+
+
+def is_loopback(host: str) -> bool:
+    """Слушает ли сервер только локальный интерфейс (127.0.0.1, ::1, localhost)"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def start_webhook(
+    updater,
+    listen: str = "0.0.0.0",
+    port: int = 8443,
+    url_path: str = "webhook",
+    webhook_url: str = None,
+    secret_token: str = None,
+    cert: str = None,
+    key: str = None,
+    allowed_updates: List[str] = None,
+    drop_pending_updates: bool = True,
+    max_connections: int = 40,
+) -> WebhookServer:
+    """
+    Запускает приём обновлений через вебхук.
+
+    - cert и key - свой TLS (сертификат, если он самоподписанный,
+      отправляется в Telegram). Без них сервер слушает обычный HTTP,
+      а TLS делает обратный прокси (nginx, caddy и т.д.).
+    - webhook_url - публичный адрес, который регистрируется в Telegram.
+      Без него вебхук не регистрируется: удобно для локальной проверки
+      (обновления можно слать curl'ом) или если адрес задан снаружи.
+    - secret_token - проверяется в заголовке каждого запроса. Если не задан,
+      а вебхук регистрируется, генерируется случайный на этот запуск.
+      Без секрета и без регистрации сервер принимает любые запросы, поэтому
+      так можно слушать только loopback - иначе ValueError.
+    """
+    url_path = "/" + url_path.lstrip("/")
+    if webhook_url and not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+    if not secret_token and not is_loopback(listen):
+        raise ValueError(
+            f"Вебхук без секрета можно слушать только на loopback, а не на {listen}: "
+            f"задайте WEBHOOK_SECRET или WEBHOOK_URL"
+        )
+
+    ssl_context = None
+    if cert and key:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(cert, key)
+
+    dispatcher = updater.dispatcher
+    server = WebhookServer(
+        listen, port, url_path, updater.bot, updater.update_queue, secret_token, ssl_context
+    )
+
+    # Диспетчер и очередь задач запускаются так же, как при start_polling
+    updater.job_queue.start()
+    dispatcher_ready = Event()
+    Thread(target=dispatcher.start, kwargs={"ready": dispatcher_ready}, name="dispatcher").start()
+    dispatcher_ready.wait()
+    Thread(target=server.serve_forever, name="webhook", daemon=True).start()
+
+    # updater.stop() (в том числе из updater.idle() по сигналу) остановит
+    # диспетчер и вызовет httpd.shutdown() у нашего сервера
+    updater.httpd = server
+    updater.running = True
+
+    if webhook_url:
+        certificate = open(cert, "rb") if cert and key else None
+        try:
+            updater.bot.set_webhook(
+                url=webhook_url,
+                certificate=certificate,
+                max_connections=max_connections,
+                allowed_updates=allowed_updates,
+                drop_pending_updates=drop_pending_updates,
+                secret_token=secret_token,
+            )
+        finally:
+            if certificate is not None:
+                certificate.close()
+        LOGGER.info(f"Вебхук зарегистрирован: {webhook_url}")
+    else:
+        LOGGER.warning("WEBHOOK_URL не задан - вебхук в Telegram не регистрируется")
+
+    LOGGER.info(f"Вебхук слушает {listen}:{port}{url_path}")
+    return server
@@ -4,11 +4,17 @@
 """
 
 from datetime import datetime
+from threading import Condition, RLock, Thread
+from time import monotonic
+from typing import Dict, List, Optional
+
 from telegram import ParseMode, Update
-from telegram.error import BadRequest, Unauthorized
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import BadRequest, TelegramError, Unauthorized
 from telegram.ext import CallbackContext, CommandHandler
 
 from MitaHelper import dispatcher, LOGGER, OWNER_ID, SUDO_USERS
+from MitaHelper.modules.helper_funcs.outbound import PRIORITY_LOW, outbound_priority
 
 
 # Хранилище настроек логов {chat_id: {"log_channel": channel_id, "events": [...]}}
@@ -46,9 +52,10 @@ LOG_EVENTS = {
     "warn": "⚠️ Варны",
     "filter": "📝 Фильтры",
     "settings": "⚙️ Настройки",
+    "raid": "🚨 Рейды",
 }
 
-DEFAULT_EVENTS = ["join", "captcha_pass", "captcha_fail", "ban", "kick", "mute", "warn"]
+DEFAULT_EVENTS = ["join", "captcha_pass", "captcha_fail", "ban", "kick", "mute", "warn", "raid"]
 
 
 def get_log_settings(chat_id: int) -> dict:
@@ -92,6 +99,166 @@ def is_event_enabled(chat_id: int, event: str) -> bool:
     return event in settings.get("events", [])
 
 
+# ═══════════════════════════════════════════════════════════════
+#                      ДОСТАВКА ЛОГОВ
+# ═══════════════════════════════════════════════════════════════
+
+# События копятся по каналам логов и уходят сводками: несколько записей
+# в одном сообщении (до лимита Telegram). Сводка отправляется через
+# LOG_FLUSH_INTERVAL секунд после первого события или сразу, как только
+# набралось на целое сообщение.
+LOG_FLUSH_INTERVAL = 3
+# Сколько записей канала держим в очереди; остальные только считаются
+# и попадают в итоговую строку «пропущено N»
+MAX_BUFFERED_EVENTS = 100
+LOG_SEPARATOR = "\n\n━━━━━━━━━━━━━━━\n\n"
+# Сколько ID перечислять в записи о пачке капч с таймаутом
+CAPTCHA_TIMEOUT_SHOWN = 30
+
+# {канал логов: [(событие, текст), ...]}
+_log_buffers: Dict[int, List[tuple]] = {}
+# {канал логов: длина накопленного текста}
+_log_sizes: Dict[int, int] = {}
+# {канал логов: когда пришло первое событие сводки (monotonic)}
+_log_first_at: Dict[int, float] = {}
+# {канал логов: {событие: сколько пропущено}}
+_log_dropped: Dict[int, Dict[str, int]] = {}
+
+LOGS_LOCK = RLock()
+_log_wakeup = Condition(LOGS_LOCK)
+_log_thread: Optional[Thread] = None
+_log_bot = None
+_log_stopped = False
+
+
+def _queue_log(bot, log_channel: int, event: str, log_text: str):
+    """Кладёт запись в очередь канала логов"""
+    global _log_bot, _log_thread
+    with LOGS_LOCK:
+        _log_bot = bot
+        entries = _log_buffers.setdefault(log_channel, [])
+        if len(entries) >= MAX_BUFFERED_EVENTS:
+            # Канал не успевает: запись не храним, только считаем
+            dropped = _log_dropped.setdefault(log_channel, {})
+            dropped[event] = dropped.get(event, 0) + 1
+            return
+
+        if not entries:
+            _log_first_at[log_channel] = monotonic()
+            _log_wakeup.notify()
+        entries.append((event, log_text))
+        size = _log_sizes.get(log_channel, 0) + len(log_text) + len(LOG_SEPARATOR)
+        _log_sizes[log_channel] = size
+        if size >= MAX_MESSAGE_LENGTH:
+            _log_wakeup.notify()
+
+        if _log_thread is None:
+            _log_thread = Thread(target=_log_loop, name="logs", daemon=True)
+            _log_thread.start()
+
+
+def _pack_log_messages(entries: List[tuple], dropped: Optional[Dict[str, int]]) -> List[str]:
+    """Собирает записи в сообщения не длиннее MAX_MESSAGE_LENGTH"""
+    texts = [text[:MAX_MESSAGE_LENGTH] for _, text in entries]
+    if dropped:
+        summary = ", ".join(
+            f"{LOG_EVENTS.get(event, event)} — {count}" for event, count in dropped.items()
+        )
+        texts.append(f"⚠️ *Слишком много событий, пропущено {sum(dropped.values())}:*\n{summary}")
+
+    messages = []
+    current = ""
+    for text in texts:
+        if current and len(current) + len(LOG_SEPARATOR) + len(text) > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = ""
+        current = f"{current}{LOG_SEPARATOR}{text}" if current else text
+    if current:
+        messages.append(current)
+    return messages
+
+
+def _send_log_message(bot, log_channel: int, text: str) -> bool:
+    """Отправляет сводку. False - в канал писать нельзя"""
+    try:
+        bot.send_message(
+            log_channel,
+            text,
+            parse_mode=ParseMode.MARKDOWN,
+            disable_web_page_preview=True,
+        )
+        return True
+    except Unauthorized as e:
+        LOGGER.warning(f"Нет доступа к каналу логов {log_channel}: {e}")
+        return False
+    except BadRequest as e:
+        if "parse" not in str(e).lower():
+            LOGGER.warning(f"Не удалось отправить лог в {log_channel}: {e}")
+            return "not found" not in str(e).lower()
+
+    # Markdown сломан (например, «_» в имени) - отправляем как есть
+    try:
+        bot.send_message(log_channel, text, disable_web_page_preview=True)
+    except TelegramError as e:
+        LOGGER.warning(f"Не удалось отправить лог в {log_channel}: {e}")
+    return True
+
+
+def _deliver_logs(log_channel: int, entries: List[tuple], dropped: Optional[Dict[str, int]]):
+    for text in _pack_log_messages(entries, dropped):
+        if not _send_log_message(_log_bot, log_channel, text):
+            break
+
+
+def _log_loop():
+    """Поток доставки: ждёт, пока сводка канала созреет, и отправляет её"""
+    global _log_thread
+    while True:
+        with LOGS_LOCK:
+            while True:
+                now = monotonic()
+                due = [
+                    channel for channel, first_at in _log_first_at.items()
+                    if _log_stopped
+                    or now - first_at >= LOG_FLUSH_INTERVAL
+                    or _log_sizes.get(channel, 0) >= MAX_MESSAGE_LENGTH
+                ]
+                if due:
+                    break
+                if _log_stopped:
+                    _log_thread = None
+                    return
+                wait = None
+                if _log_first_at:
+                    wait = LOG_FLUSH_INTERVAL - (now - min(_log_first_at.values()))
+                _log_wakeup.wait(wait)
+
+            batch = []
+            for channel in due:
+                batch.append((channel, _log_buffers.pop(channel, []), _log_dropped.pop(channel, None)))
+                _log_sizes.pop(channel, None)
+                _log_first_at.pop(channel, None)
+
+        # Отправка - вне блокировки: пока ждём лимитов, события продолжают копиться
+        with outbound_priority(PRIORITY_LOW):
+            for channel, entries, dropped in batch:
+                try:
+                    _deliver_logs(channel, entries, dropped)
+                except Exception as e:
+                    LOGGER.error(f"Ошибка доставки логов в {channel}: {e}")
+
+
+def flush_logs(timeout: float = 10):
+    """Отправляет всё накопленное и останавливает поток (при выключении бота)"""
+    global _log_stopped
+    with LOGS_LOCK:
+        _log_stopped = True
+        _log_wakeup.notify_all()
+        thread = _log_thread
+    if thread is not None:
+        thread.join(timeout)
+
+
 def send_log(
     bot,
     chat_id: int,
@@ -102,7 +269,7 @@ def send_log(
     extra_info: str = None
 ):
     """
-    Отправляет лог в канал логов.
+    Отправляет лог в канал логов (сводкой вместе с соседними событиями).
     
     Args:
         bot: Объект бота
@@ -143,15 +310,7 @@ def send_log(
     if extra_info:
         log_text += f"\n📝 {extra_info}"
     
-    try:
-        bot.send_message(
-            log_channel,
-            log_text,
-            parse_mode=ParseMode.MARKDOWN,
-            disable_web_page_preview=True,
-        )
-    except (BadRequest, Unauthorized) as e:
-        LOGGER.warning(f"Не удалось отправить лог в {log_channel}: {e}")
+    _queue_log(bot, log_channel, event, log_text)
 
 
 def log_join(bot, chat, user):
@@ -210,6 +369,24 @@ def log_captcha_fail(bot, chat, user, reason="Таймаут"):
         LOGGER.warning(f"Ошибка логирования провала капчи: {e}")
 
 
+def log_captcha_timeouts(bot, chat_id: int, user_ids: List[int], kicked: bool):
+    """
+    Логирует пачку капч, не решённых вовремя, одной записью
+    (при рейде это сотни пользователей - не по записи на каждого)
+    """
+    try:
+        shown = ", ".join(f"`{user_id}`" for user_id in user_ids[:CAPTCHA_TIMEOUT_SHOWN])
+        if len(user_ids) > CAPTCHA_TIMEOUT_SHOWN:
+            shown += f" и ещё {len(user_ids) - CAPTCHA_TIMEOUT_SHOWN}"
+        text = f"⏰ Не прошли капчу вовремя: *{len(user_ids)}*\n"
+        text += f"🆔 {shown}\n"
+        text += "👢 Удалены из чата" if kicked else "🔇 Остаются в муте"
+
+        send_log(bot, chat_id, "captcha_fail", text)
+    except Exception as e:
+        LOGGER.warning(f"Ошибка логирования провала капчи: {e}")
+
+
 def log_ban(bot, chat, admin, target_user, reason=None):
     """Логирует бан"""
     try:
@@ -300,6 +477,14 @@ def log_warn(bot, chat, admin, target_user, reason=None, warn_count=None):
         LOGGER.warning(f"Ошибка логирования варна: {e}")
 
 
+def log_raid(bot, chat_id: int, text: str, admin=None):
+    """Логирует рейд: автоматический режим ЧС, его снятие и /raidclean"""
+    try:
+        send_log(bot, chat_id, "raid", text, user=admin)
+    except Exception as e:
+        LOGGER.warning(f"Ошибка логирования рейда: {e}")
+
+
 def log_settings_change(bot, chat, admin, setting_name, new_value):
     """Логирует изменение настроек"""
     try:
@@ -329,6 +514,7 @@ __help__ = """
 • 👢 Кики
 • 🔇 Муты
 • ⚠️ Варны
+• 🚨 Рейды
 
 *Настройка:*
 /config → Выберите чат → 📋 Логи
@@ -3,51 +3,60 @@
 Модуль медиа-фильтров - запрет различных типов контента
 """
 
-import json
-import os
 from telegram import Update, ParseMode
 from telegram.error import BadRequest
+from threading import Lock
+from typing import Dict, FrozenSet, Optional
+
 from telegram.ext import (
     CallbackContext,
     CommandHandler,
-    MessageHandler,
     Filters,
 )
 
 from MitaHelper import dispatcher, LOGGER
-from MitaHelper.modules.helper_funcs.chat_status import user_admin, bot_admin, can_delete
+from MitaHelper.modules.helper_funcs.chat_status import user_admin, bot_admin, can_delete, is_chat_admin_cached
+from MitaHelper.modules.helper_funcs.extraction import extract_user
+from MitaHelper.modules.helper_funcs.pipeline import (
+    CONTENT_BITS,
+    CONTENT_TYPES,
+    KIND_MEDIA,
+    SENDER_ANONYMOUS_ADMIN,
+    MessageFeatures,
+    invalidate_chat_features,
+    register_stage,
+)
 
 
-# Путь к файлу с настройками
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-MEDIA_FILTERS_FILE = os.path.join(DATA_DIR, "media_filters.json")
+from MitaHelper.modules.database import load_media_filters_settings, save_media_filters_settings
+
 
 # Хранилище настроек медиа-фильтров
-# {chat_id: {"voice": True, "video_note": True, "sticker": False, ...}}
+# {chat_id: {"enabled": True, "filters": {"voice": True, ...}, "action": "delete",
+#            "actions": {"sticker": "warn"}, "exempt": [user_id, ...]}}
 media_filter_settings = {}
 
+# Скомпилированные правила {chat_id: MediaRules} - пересобираются после изменения настроек
+_compiled_rules: Dict[int, "MediaRules"] = {}
+RULES_LOCK = Lock()
+
 
 def load_media_filter_settings():
-    """Загружает настройки из файла"""
+    """Загружает настройки из БД"""
     global media_filter_settings
     try:
-        if os.path.exists(MEDIA_FILTERS_FILE):
-            with open(MEDIA_FILTERS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # Преобразуем строковые ключи обратно в int
-                media_filter_settings = {int(k): v for k, v in data.items()}
-                LOGGER.info(f"Загружены настройки медиа-фильтров для {len(media_filter_settings)} чатов")
+        media_filter_settings = load_media_filters_settings()
+        if media_filter_settings:
+            LOGGER.info(f"Загружены настройки медиа-фильтров для {len(media_filter_settings)} чатов")
     except Exception as e:
         LOGGER.error(f"Ошибка загрузки медиа-фильтров: {e}")
         media_filter_settings = {}
 
 
 def save_media_filter_settings():
-    """Сохраняет настройки в файл"""
+    """Сохраняет настройки в БД"""
     try:
-        os.makedirs(DATA_DIR, exist_ok=True)
-        with open(MEDIA_FILTERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(media_filter_settings, f, ensure_ascii=False, indent=2)
+        save_media_filters_settings(media_filter_settings)
     except Exception as e:
         LOGGER.error(f"Ошибка сохранения медиа-фильтров: {e}")
 
@@ -60,77 +69,77 @@ MEDIA_TYPES = {
     "voice": {
         "name": "🎤 Голосовые",
         "description": "Голосовые сообщения",
-        "filter": Filters.voice,
+        "bit": CONTENT_BITS["voice"],
     },
     "video_note": {
         "name": "🔵 Видеокружки",
         "description": "Круглые видеосообщения",
-        "filter": Filters.video_note,
+        "bit": CONTENT_BITS["video_note"],
     },
     "sticker": {
         "name": "😀 Стикеры",
         "description": "Стикеры и анимированные стикеры",
-        "filter": Filters.sticker,
+        "bit": CONTENT_BITS["sticker"],
     },
     "animation": {
         "name": "🎬 GIF",
         "description": "GIF анимации",
-        "filter": Filters.animation,
+        "bit": CONTENT_BITS["animation"],
     },
     "photo": {
         "name": "🖼 Фото",
         "description": "Фотографии",
-        "filter": Filters.photo,
+        "bit": CONTENT_BITS["photo"],
     },
     "video": {
         "name": "🎥 Видео",
         "description": "Видеофайлы",
-        "filter": Filters.video,
+        "bit": CONTENT_BITS["video"],
     },
     "document": {
         "name": "📎 Файлы",
         "description": "Документы и файлы",
-        "filter": Filters.document,
+        "bit": CONTENT_BITS["document"],
     },
     "audio": {
         "name": "🎵 Аудио",
         "description": "Аудиофайлы и музыка",
-        "filter": Filters.audio,
+        "bit": CONTENT_BITS["audio"],
     },
     "forward": {
         "name": "↩️ Пересланные",
         "description": "Пересланные сообщения",
-        "filter": Filters.forwarded,
+        "bit": CONTENT_BITS["forward"],
     },
     "url": {
         "name": "🔗 Ссылки",
         "description": "Сообщения со ссылками",
-        "filter": Filters.entity("url") | Filters.entity("text_link"),
+        "bit": CONTENT_BITS["url"],
     },
     "contact": {
         "name": "👤 Контакты",
         "description": "Контакты",
-        "filter": Filters.contact,
+        "bit": CONTENT_BITS["contact"],
     },
     "location": {
         "name": "📍 Локации",
         "description": "Геолокации",
-        "filter": Filters.location,
+        "bit": CONTENT_BITS["location"],
     },
     "poll": {
         "name": "📊 Опросы",
         "description": "Опросы",
-        "filter": Filters.poll,
+        "bit": CONTENT_BITS["poll"],
     },
     "game": {
         "name": "🎮 Игры",
         "description": "Игры",
-        "filter": Filters.game,
+        "bit": CONTENT_BITS["game"],
     },
     "inline": {
         "name": "🤖 Inline-боты",
         "description": "Сообщения от inline-ботов",
-        "filter": None,  # Проверяется вручную через msg.via_bot
+        "bit": CONTENT_BITS["inline"],
     },
 }
 
@@ -143,6 +152,54 @@ FILTER_ACTIONS = {
 }
 
 
+class MediaRules:
+    """Правила чата в готовом для проверки виде"""
+
+    __slots__ = ("blocked", "action", "actions", "exempt")
+
+    def __init__(self, blocked: int = 0, action: str = "delete",
+                 actions: Dict[str, str] = None, exempt: FrozenSet[int] = frozenset()):
+        # Маска запрещённых типов (CONTENT_BITS); 0 - фильтры выключены
+        self.blocked = blocked
+        self.action = action
+        self.actions = actions or {}
+        self.exempt = exempt
+
+
+def _compile_rules(settings: Optional[dict]) -> MediaRules:
+    if not settings or not settings.get("enabled", False):
+        return MediaRules()
+    blocked = 0
+    for media_type, is_blocked in settings.get("filters", {}).items():
+        if is_blocked and media_type in CONTENT_BITS:
+            blocked |= CONTENT_BITS[media_type]
+    actions = {
+        media_type: action
+        for media_type, action in settings.get("actions", {}).items()
+        if action in FILTER_ACTIONS
+    }
+    return MediaRules(
+        blocked,
+        settings.get("action", "delete"),
+        actions,
+        frozenset(settings.get("exempt", ())),
+    )
+
+
+def get_chat_media_rules(chat_id: int) -> MediaRules:
+    """Скомпилированные правила чата (одна выборка из словаря на сообщение)"""
+    rules = _compiled_rules.get(chat_id)
+    if rules is None:
+        # Проверка, компиляция и запись - под блокировкой: иначе правила,
+        # собранные из старых настроек, могли бы записаться после их смены
+        with RULES_LOCK:
+            rules = _compiled_rules.get(chat_id)
+            if rules is None:
+                rules = _compile_rules(media_filter_settings.get(chat_id))
+                _compiled_rules[chat_id] = rules
+    return rules
+
+
 def get_media_filter_settings(chat_id: int) -> dict:
     """Получает настройки медиа-фильтров для чата"""
     default = {
@@ -156,7 +213,10 @@ def get_media_filter_settings(chat_id: int) -> dict:
 
 def set_media_filter_settings(chat_id: int, settings: dict):
     """Сохраняет настройки медиа-фильтров"""
-    media_filter_settings[chat_id] = settings
+    with RULES_LOCK:
+        media_filter_settings[chat_id] = settings
+        _compiled_rules.pop(chat_id, None)
+    invalidate_chat_features(chat_id)
     save_media_filter_settings()
 
 
@@ -168,6 +228,11 @@ def is_media_filtered(chat_id: int, media_type: str) -> bool:
     return settings.get("filters", {}).get(media_type, False)
 
 
+def is_media_filter_active(chat_id: int) -> bool:
+    """Включены ли медиа-фильтры и запрещён ли хоть один тип"""
+    return bool(get_chat_media_rules(chat_id).blocked)
+
+
 def toggle_media_filter(chat_id: int, media_type: str) -> bool:
     """Переключает фильтр для типа медиа. Возвращает новое состояние."""
     settings = get_media_filter_settings(chat_id)
@@ -196,100 +261,58 @@ def set_filter_action(chat_id: int, action: str):
     set_media_filter_settings(chat_id, settings)
 
 
-def check_media_filter(update: Update, context: CallbackContext):
-    """Проверяет сообщение на запрещённые медиа"""
-    if not update.effective_message:
-        return
-    
+def set_media_type_action(chat_id: int, media_type: str, action: Optional[str]):
+    """Своё действие для типа медиа (None - общее действие чата)"""
+    settings = get_media_filter_settings(chat_id)
+    actions = dict(settings.get("actions", {}))
+    if action is None:
+        actions.pop(media_type, None)
+    else:
+        actions[media_type] = action
+    settings["actions"] = actions
+    set_media_filter_settings(chat_id, settings)
+
+
+def set_media_exempt(chat_id: int, user_id: int, exempt: bool) -> bool:
+    """Добавляет/убирает пользователя из исключений. False - ничего не изменилось"""
+    settings = get_media_filter_settings(chat_id)
+    users = list(settings.get("exempt", []))
+    if exempt == (user_id in users):
+        return False
+    if exempt:
+        users.append(user_id)
+    else:
+        users.remove(user_id)
+    settings["exempt"] = users
+    set_media_filter_settings(chat_id, settings)
+    return True
+
+
+def check_media_filter(update: Update, context: CallbackContext, features: MessageFeatures):
+    """
+    Проверяет сообщение на запрещённые медиа (этап конвейера).
+    Типы содержимого уже разобраны в features.content - нарушение ищется
+    одним AND с маской запрещённых в чате типов.
+    """
     chat = update.effective_chat
     user = update.effective_user
     msg = update.effective_message
     
-    # Только в группах
-    if chat.type == "private":
+    rules = get_chat_media_rules(chat.id)
+    violated = features.content & rules.blocked
+    if not violated:
         return
     
-    # Пропускаем админов
-    try:
-        member = chat.get_member(user.id)
-        if member.status in ("administrator", "creator"):
-            return
-    except:
-        pass
-    
-    settings = get_media_filter_settings(chat.id)
-    
-    if not settings.get("enabled", False):
+    # Исключения: анонимные админы, пользователи из списка, админы (по кешу)
+    if features.sender == SENDER_ANONYMOUS_ADMIN:
         return
-    
-    filters = settings.get("filters", {})
-    action = settings.get("action", "delete")
-    
-    # Проверяем каждый тип медиа
-    violated_type = None
-    
-    for media_type, is_blocked in filters.items():
-        if not is_blocked:
-            continue
-        
-        media_info = MEDIA_TYPES.get(media_type)
-        if not media_info:
-            continue
-        
-        # Проверяем, соответствует ли сообщение фильтру
-        media_filter = media_info.get("filter")
-        matched = False
-        
-        # Если есть фильтр - используем его
-        if media_filter is not None:
-            try:
-                matched = media_filter.check_update(update)
-            except:
-                pass
-        
-        # Альтернативная/ручная проверка
-        if not matched:
-            if media_type == "voice" and msg.voice:
-                matched = True
-            elif media_type == "video_note" and msg.video_note:
-                matched = True
-            elif media_type == "sticker" and msg.sticker:
-                matched = True
-            elif media_type == "animation" and msg.animation:
-                matched = True
-            elif media_type == "photo" and msg.photo:
-                matched = True
-            elif media_type == "video" and msg.video:
-                matched = True
-            elif media_type == "document" and msg.document and not msg.animation:
-                matched = True
-            elif media_type == "audio" and msg.audio:
-                matched = True
-            elif media_type == "forward" and msg.forward_date:
-                matched = True
-            elif media_type == "contact" and msg.contact:
-                matched = True
-            elif media_type == "location" and (msg.location or msg.venue):
-                matched = True
-            elif media_type == "poll" and msg.poll:
-                matched = True
-            elif media_type == "game" and msg.game:
-                matched = True
-            elif media_type == "inline" and msg.via_bot:
-                matched = True
-            elif media_type == "url" and msg.entities:
-                for ent in msg.entities:
-                    if ent.type in ("url", "text_link"):
-                        matched = True
-                        break
-        
-        if matched:
-            violated_type = media_type
-            break
-    
-    if not violated_type:
+    if user and (user.id in rules.exempt or is_chat_admin_cached(chat, user.id)):
         return
     
+    # Младший бит - первый по порядку MEDIA_TYPES тип
+    violated_type = CONTENT_TYPES[(violated & -violated).bit_length() - 1]
+    action = rules.actions.get(violated_type, rules.action)
+    
     # Выполняем действие
     type_name = MEDIA_TYPES[violated_type]["name"]
     
@@ -298,12 +321,13 @@ def check_media_filter(update: Update, context: CallbackContext):
         msg.delete()
     except BadRequest:
         pass
+    features.removed = True
     
     # Дополнительное действие
     if action == "warn":
         try:
             from MitaHelper.modules.warns import warn_user
-            warn_user(chat.id, user.id, f"Запрещённый контент: {type_name}")
+            warn_user(chat.id, user.id, f"Запрещённый контент: {type_name}", chat=chat, user=user, bot=context.bot)
         except:
             pass
         
@@ -350,22 +374,80 @@ def check_media_filter(update: Update, context: CallbackContext):
         pass  # Сообщение уже удалено
 
 
-# Регистрация обработчика для всех типов медиа
-MEDIA_FILTER_HANDLER = MessageHandler(
-    Filters.chat_type.groups & (
-        Filters.voice | Filters.video_note | Filters.sticker | 
-        Filters.animation | Filters.photo | Filters.video |
-        Filters.document | Filters.audio | Filters.forwarded |
-        Filters.contact | Filters.location | Filters.poll |
-        Filters.game |
-        Filters.entity("url") | Filters.entity("text_link")
-    ),
+@user_admin
+def media_exempt(update: Update, context: CallbackContext):
+    """Разрешает пользователю присылать любые медиа: /mediaexempt (ответом или ID)"""
+    msg = update.effective_message
+    user_id = extract_user(msg, context.args)
+    if not user_id:
+        msg.reply_text("❌ Ответьте на сообщение пользователя или укажите его ID.")
+        return
+    
+    if set_media_exempt(update.effective_chat.id, user_id, True):
+        msg.reply_text(f"✅ Медиа-фильтры не действуют на `{user_id}`.", parse_mode=ParseMode.MARKDOWN)
+    else:
+        msg.reply_text("ℹ️ Пользователь уже в исключениях.")
+
+
+@user_admin
+def media_unexempt(update: Update, context: CallbackContext):
+    """Убирает пользователя из исключений медиа-фильтров"""
+    msg = update.effective_message
+    user_id = extract_user(msg, context.args)
+    if not user_id:
+        msg.reply_text("❌ Ответьте на сообщение пользователя или укажите его ID.")
+        return
+    
+    if set_media_exempt(update.effective_chat.id, user_id, False):
+        msg.reply_text(f"✅ `{user_id}` больше не в исключениях.", parse_mode=ParseMode.MARKDOWN)
+    else:
+        msg.reply_text("ℹ️ Этого пользователя нет в исключениях.")
+
+
+@user_admin
+def media_action(update: Update, context: CallbackContext):
+    """Своё действие для типа медиа: /mediaaction <тип> <delete/warn/mute/kick/default>"""
+    msg = update.effective_message
+    chat = update.effective_chat
+    args = context.args
+    
+    if len(args) < 2 or args[0] not in MEDIA_TYPES or args[1] not in (*FILTER_ACTIONS, "default"):
+        settings = get_media_filter_settings(chat.id)
+        text = (
+            "⚡ *Действия по типам медиа*\n\n"
+            "`/mediaaction <тип> <действие>`\n"
+            f"Типы: {', '.join(f'`{media_type}`' for media_type in MEDIA_TYPES)}\n"
+            f"Действия: {', '.join(f'`{action}`' for action in FILTER_ACTIONS)}, `default` - общее\n"
+        )
+        for media_type, action in settings.get("actions", {}).items():
+            text += f"\n• {MEDIA_TYPES.get(media_type, {}).get('name', media_type)}: {FILTER_ACTIONS.get(action, action)}"
+        msg.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+        return
+    
+    media_type, action = args[0], args[1]
+    set_media_type_action(chat.id, media_type, None if action == "default" else action)
+    action_name = "общее действие" if action == "default" else FILTER_ACTIONS[action]
+    msg.reply_text(f"✅ {MEDIA_TYPES[media_type]['name']}: {action_name}")
+
+
+MEDIA_EXEMPT_HANDLER = CommandHandler("mediaexempt", media_exempt, filters=Filters.chat_type.groups, run_async=True)
+MEDIA_UNEXEMPT_HANDLER = CommandHandler("mediaunexempt", media_unexempt, filters=Filters.chat_type.groups, run_async=True)
+MEDIA_ACTION_HANDLER = CommandHandler("mediaaction", media_action, filters=Filters.chat_type.groups, run_async=True)
+
+dispatcher.add_handler(MEDIA_EXEMPT_HANDLER)
+dispatcher.add_handler(MEDIA_UNEXEMPT_HANDLER)
+dispatcher.add_handler(MEDIA_ACTION_HANDLER)
+
+
+# Этап конвейера: только сообщения с медиа (KIND_MEDIA) в чатах с фильтрами
+register_stage(
+    "media_filters",
     check_media_filter,
-    run_async=True
+    order=50,
+    enabled=is_media_filter_active,
+    kinds=KIND_MEDIA,
 )
 
-dispatcher.add_handler(MEDIA_FILTER_HANDLER, group=5)
-
 
 __mod_name__ = "🚫 Медиа-фильтры"
 
@@ -397,6 +479,13 @@ __help__ = """
 • Удалить + Мут на 1 час
 • Удалить + Кик
 
+*Команды (для админов):*
+• /mediaaction `<тип> <действие>` — своё действие для типа (`default` — общее)
+• /mediaexempt — разрешить пользователю любые медиа (ответом или ID)
+• /mediaunexempt — убрать из исключений
+
+Админы чата на фильтры не проверяются.
+
 *Настройка:*
 /config → Выберите чат → 🚫 Медиа-фильтры
 """
@@ -10,12 +10,16 @@ from telegram.ext import (
     CallbackContext,
     CallbackQueryHandler,
     CommandHandler,
-    Filters,
-    MessageHandler,
 )
 
 from MitaHelper import dispatcher, LOGGER
 from MitaHelper.modules.helper_funcs.chat_status import user_admin
+from MitaHelper.modules.helper_funcs.pipeline import (
+    KIND_HASHTAG,
+    MessageFeatures,
+    invalidate_chat_features,
+    register_stage,
+)
 
 
 # Хранилище заметок
@@ -35,6 +39,7 @@ except Exception as e:
 
 def _save_notes_to_db():
     """Сохраняет заметки в БД"""
+    invalidate_chat_features()
     if save_notes_settings:
         save_notes_settings(notes_storage)
 
@@ -89,6 +94,11 @@ def build_note_keyboard(buttons):
     return InlineKeyboardMarkup(keyboard) if keyboard else None
 
 
+def has_notes(chat_id) -> bool:
+    """Есть ли в чате заметки"""
+    return bool(notes_storage.get(chat_id))
+
+
 def get_note(chat_id, note_name):
     """Получает заметку по имени"""
     chat_notes = notes_storage.get(chat_id, {})
@@ -301,18 +311,13 @@ def notes_list(update: Update, context: CallbackContext):
     msg.reply_text(text, parse_mode=ParseMode.MARKDOWN)
 
 
-def hash_get(update: Update, context: CallbackContext):
-    """Обрабатывает сообщения с #имя_заметки"""
+def hash_get(update: Update, context: CallbackContext, features: MessageFeatures):
+    """Обрабатывает сообщения с #имя_заметки (этап конвейера)"""
     msg = update.effective_message
     chat = update.effective_chat
     
-    # Извлекаем имя заметки из хэштега
-    match = re.match(r"^#(\w+)", msg.text)
-    if not match:
-        return
-    
-    note_name = match.group(1)
-    note = get_note(chat.id, note_name)
+    # Имя заметки из хэштега уже разобрано конвейером
+    note = get_note(chat.id, features.hashtag)
     
     if not note:
         return
@@ -380,6 +385,7 @@ def clear_all_notes(update: Update, context: CallbackContext):
     if chat.id in notes_storage:
         count = len(notes_storage[chat.id])
         notes_storage[chat.id] = {}
+        _save_notes_to_db()
         msg.reply_text(f"✅ Удалено {count} заметок!")
     else:
         msg.reply_text("📝 В этом чате нет заметок.")
@@ -394,18 +400,15 @@ SAVE_HANDLER = CommandHandler("save", save, run_async=True)
 CLEAR_HANDLER = CommandHandler("clear", clear, run_async=True)
 NOTES_HANDLER = CommandHandler(["notes", "saved"], notes_list, run_async=True)
 CLEARALL_HANDLER = CommandHandler("clearall", clear_all_notes, run_async=True)
-HASH_HANDLER = MessageHandler(
-    Filters.regex(r"^#\w+") & Filters.chat_type.groups, 
-    hash_get, 
-    run_async=True
-)
 
 dispatcher.add_handler(GET_HANDLER)
 dispatcher.add_handler(SAVE_HANDLER)
 dispatcher.add_handler(CLEAR_HANDLER)
 dispatcher.add_handler(NOTES_HANDLER)
 dispatcher.add_handler(CLEARALL_HANDLER)
-dispatcher.add_handler(HASH_HANDLER)
+
+# Этап конвейера: текст, начинающийся с #слова, в чатах с заметками
+register_stage("notes", hash_get, order=70, enabled=has_notes, kinds=KIND_HASHTAG)
 
 
 __mod_name__ = "📝 Заметки"
@@ -7,7 +7,8 @@ import time
 from telegram import ParseMode, Update
 from telegram.ext import CallbackContext, CommandHandler
 
-from MitaHelper import StartTime, dispatcher
+from MitaHelper import DEV_USERS, OWNER_ID, StartTime, dispatcher
+from MitaHelper.modules.helper_funcs.metrics import METRICS
 
 
 def get_readable_time(seconds: int) -> str:
@@ -48,12 +49,21 @@ def ping(update: Update, context: CallbackContext):
     ping_time = round((end_time - start_time) * 1000, 2)
     uptime = get_readable_time((time.time() - StartTime))
     
-    message.edit_text(
+    text = (
         f"🏓 *Понг!*\n\n"
         f"⚡ *Скорость:* `{ping_time} мс`\n"
-        f"⏱ *Аптайм:* `{uptime}`",
-        parse_mode=ParseMode.MARKDOWN,
+        f"⏱ *Аптайм:* `{uptime}`"
     )
+    
+    # Очередь исходящих запросов (планировщик OutboundBot)
+    scheduler = getattr(context.bot, "scheduler", None)
+    if scheduler is not None:
+        text += f"\n📬 *Очередь отправки:* `{scheduler.queue_depth()}`"
+        paused = scheduler.paused_chats()
+        if paused:
+            text += f"\n⏳ *Чатов на паузе (RetryAfter):* `{paused}`"
+    
+    message.edit_text(text, parse_mode=ParseMode.MARKDOWN)
 
 
 def alive(update: Update, context: CallbackContext):
@@ -68,15 +78,69 @@ def alive(update: Update, context: CallbackContext):
     )
 
 
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}"
+
+
+def metrics(update: Update, context: CallbackContext):
+    """Показывает самые медленные обработчики и запросы к API (только для владельца)"""
+    user = update.effective_user
+    msg = update.effective_message
+    
+    if user.id != OWNER_ID and user.id not in DEV_USERS:
+        msg.reply_text("❌ Эта команда доступна только для владельца.")
+        return
+    
+    handlers, api = METRICS.snapshot()
+    
+    text = "📈 *Метрики*\n\n"
+    
+    depths = METRICS.queue_depths()
+    if depths:
+        text += "📬 *Очереди:* " + ", ".join(f"{name} `{depth}`" for name, depth in depths.items()) + "\n"
+    lag = METRICS.update_lag
+    if lag.count:
+        text += f"⏳ *Задержка обновлений:* p50 `{lag.quantile(0.5):.1f}` с, p95 `{lag.quantile(0.95):.1f}` с\n"
+    
+    # Обработчики - по суммарному времени: это и есть нагрузка на воркеры
+    text += "\n⚙️ *Обработчики* (вызовов · p50/p95 мс · ошибок):\n"
+    top = sorted(handlers.items(), key=lambda item: item[1].histogram.total, reverse=True)[:10]
+    for name, stats in top:
+        hist = stats.histogram
+        text += (
+            f"• `{name}` — {hist.count} · "
+            f"{_ms(hist.quantile(0.5))}/{_ms(hist.quantile(0.95))}"
+            f"{f' · ❗{stats.errors}' if stats.errors else ''}\n"
+        )
+    if not top:
+        text += "_пока нет данных_\n"
+    
+    text += "\n📡 *Telegram API* (вызовов · p50/p95 мс · ошибок):\n"
+    top = sorted(api.items(), key=lambda item: item[1].histogram.count, reverse=True)[:10]
+    for name, stats in top:
+        hist = stats.histogram
+        text += (
+            f"• `{name}` — {hist.count} · "
+            f"{_ms(hist.quantile(0.5))}/{_ms(hist.quantile(0.95))}"
+            f"{f' · ❗{stats.errors}' if stats.errors else ''}\n"
+        )
+    if not top:
+        text += "_пока нет данных_\n"
+    
+    msg.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+
 # ═══════════════════════════════════════════════════════════════
 #                      РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
 # ═══════════════════════════════════════════════════════════════
 
 PING_HANDLER = CommandHandler("ping", ping, run_async=True)
 ALIVE_HANDLER = CommandHandler("alive", alive, run_async=True)
+METRICS_HANDLER = CommandHandler("metrics", metrics, run_async=True)
 
 dispatcher.add_handler(PING_HANDLER)
 dispatcher.add_handler(ALIVE_HANDLER)
+dispatcher.add_handler(METRICS_HANDLER)
 
 
 __mod_name__ = "🏓 Пинг"
@@ -87,6 +151,7 @@ __help__ = """
 🏓 *Команды:*
 • /ping или /пинг — проверить скорость ответа
 • /alive или /жив — проверить, работает ли бот
+• /metrics — время обработчиков и запросов к API (для владельца)
 
 📊 *Показывает:*
 • Скорость ответа в миллисекундах
@@ -4,29 +4,27 @@
 """
 
 from telegram import Update
-from telegram.ext import (
-    CallbackContext,
-    MessageHandler,
-    Filters,
-)
+from telegram.ext import CallbackContext
+
+from MitaHelper import LOGGER
+from MitaHelper.modules.helper_funcs.pipeline import KIND_SERVICE, MessageFeatures, register_stage
+
 
-from MitaHelper import dispatcher, LOGGER
+def is_service_cleanup_enabled(chat_id: int) -> bool:
+    """Включено ли удаление сервисных сообщений"""
+    try:
+        from MitaHelper.modules.config_panel import get_delete_service_messages
+    except ImportError:
+        return False
+    return get_delete_service_messages(chat_id)
 
 
-def delete_service_message(update: Update, context: CallbackContext):
-    """Удаляет сервисные сообщения если включено"""
+def delete_service_message(update: Update, context: CallbackContext, features: MessageFeatures):
+    """Удаляет сервисные сообщения (этап конвейера - только если включено)"""
     chat = update.effective_chat
     msg = update.effective_message
     
-    if not msg:
-        return
-    
     try:
-        from MitaHelper.modules.config_panel import get_delete_service_messages
-        
-        if not get_delete_service_messages(chat.id):
-            return
-        
         # Для new_chat_members проверяем, включена ли капча
         # Если да - не удаляем, капча сама обработает
         if msg.new_chat_members:
@@ -39,28 +37,20 @@ def delete_service_message(update: Update, context: CallbackContext):
                 pass
         
         msg.delete()
+        return True
     except Exception as e:
         LOGGER.warning(f"Не удалось удалить сервисное сообщение: {e}")
 
 
-# Фильтр для всех сервисных сообщений
-SERVICE_FILTER = (
-    Filters.status_update.new_chat_members |
-    Filters.status_update.left_chat_member |
-    Filters.status_update.new_chat_title |
-    Filters.status_update.new_chat_photo |
-    Filters.status_update.delete_chat_photo |
-    Filters.status_update.pinned_message |
-    Filters.status_update.migrate
-)
-
-# Обработчик сервисных сообщений (низкий приоритет - group=100)
-service_handler = MessageHandler(
-    SERVICE_FILTER,
+# Вход, выход, название/фото чата, закреп, миграция (KIND_SERVICE) -
+# после капчи и приветствия, которые ещё смотрят на сообщение о входе
+register_stage(
+    "service_messages",
     delete_service_message,
-    run_async=True
+    order=80,
+    enabled=is_service_cleanup_enabled,
+    kinds=KIND_SERVICE,
 )
-dispatcher.add_handler(service_handler, group=100)
 
 
 __mod_name__ = "🧹 Сервисные"
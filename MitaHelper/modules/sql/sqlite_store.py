@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite хранилище для database.py
+
+Включается через DATABASE_URL=sqlite:///путь/к/bot.db
+Каждое хранилище database.py (chats, users, filters, ...) лежит в своей
+таблице построчно, поэтому изменение одного чата - это один UPSERT,
+а не перезапись всего файла.
+"""
+
+import json
+import os
+import sqlite3
+from threading import RLock
+from typing import Dict, List, Optional, Set, Tuple
+
+from MitaHelper import LOGGER
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id  INTEGER PRIMARY KEY,
+    title    TEXT,
+    added_by INTEGER,
+    data     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chats_added_by ON chats (added_by);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id    INTEGER PRIMARY KEY,
+    username   TEXT,
+    first_name TEXT,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id INTEGER PRIMARY KEY,
+    data    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rules (
+    chat_id INTEGER PRIMARY KEY,
+    data    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS filters (
+    chat_id INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (chat_id, keyword)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS multi_filters (
+    chat_id INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (chat_id, keyword)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS notes (
+    chat_id INTEGER NOT NULL,
+    name    TEXT NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (chat_id, name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS user_warns (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (chat_id, user_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS chat_settings (
+    store   TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (store, chat_id)
+) WITHOUT ROWID;
+"""
+
+# Хранилища со своей таблицей: {имя: (таблица, колонка ключа)}
+FLAT_TABLES = {
+    "chats": ("chats", "chat_id"),
+    "users": ("users", "user_id"),
+    "user_settings": ("user_settings", "user_id"),
+    "rules": ("rules", "chat_id"),
+}
+
+# Хранилища вида {chat_id: {ключ: значение}} - строка на каждый ключ
+NESTED_TABLES = {
+    "filters": ("filters", "keyword"),
+    "multi_filters": ("multi_filters", "keyword"),
+    "notes": ("notes", "name"),
+    "user_warns": ("user_warns", "user_id"),
+}
+
+# Отдельные колонки, которые дублируются из JSON ради индексов
+EXTRA_COLUMNS = {
+    "chats": ("title", "added_by"),
+    "users": ("username", "first_name"),
+}
+
+# Всё остальное (settings, captcha_settings, logs_settings, cas_settings, ...)
+# хранится в chat_settings с именем хранилища в колонке store
+
+
+def store_name(filepath: str) -> str:
+    """Имя хранилища по пути к JSON файлу: data/chats.json -> chats"""
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+
+def path_from_url(url: str) -> Optional[str]:
+    """
+    Путь к файлу из DATABASE_URL.
+    sqlite:///bot.db - относительный путь, sqlite:////var/bot.db - абсолютный.
+    """
+    if not url or not url.startswith("sqlite:///"):
+        return None
+    return url[len("sqlite:///"):] or ":memory:"
+
+
+def _dump(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+class SQLiteStore:
+    """
+    Хранилище database.py поверх SQLite.
+
+    Запись идёт в два шага, как и у JSON: prepare() под блокировкой
+    хранилища превращает словарь в строки таблицы, commit() уже без неё
+    пишет в базу только строки, изменившиеся с прошлой записи.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        # Последнее записанное состояние: {хранилище: {ключ строки: JSON}}
+        self._written: Dict[str, Dict[Tuple, str]] = {}
+
+        LOGGER.info(f"SQLite база: {path}")
+
+    # ───────────────────────── чтение ─────────────────────────
+
+    def load(self, filepath: str) -> dict:
+        """Загружает хранилище в том же виде, что и JSON файл (ключи - str)"""
+        name = store_name(filepath)
+        with self._lock:
+            rows = self._select(name)
+        written = {}
+        result = {}
+        for key, text in rows:
+            written[key] = text
+            value = json.loads(text)
+            if len(key) == 1:
+                result[key[0]] = value
+            else:
+                result.setdefault(key[0], {})[key[1]] = value
+        self._written[name] = written
+        return result
+
+    def _select(self, name: str) -> List[Tuple[Tuple, str]]:
+        if name in FLAT_TABLES:
+            table, column = FLAT_TABLES[name]
+            cursor = self._conn.execute(f"SELECT {column}, data FROM {table}")
+            return [((str(row[0]),), row[1]) for row in cursor]
+        if name in NESTED_TABLES:
+            table, column = NESTED_TABLES[name]
+            cursor = self._conn.execute(f"SELECT chat_id, {column}, data FROM {table}")
+            return [((str(row[0]), str(row[1])), row[2]) for row in cursor]
+        cursor = self._conn.execute(
+            "SELECT chat_id, data FROM chat_settings WHERE store = ?", (name,)
+        )
+        return [((row[0],), row[1]) for row in cursor]
+
+    # ───────────────────────── запись ─────────────────────────
+
+    def prepare(self, filepath: str, data: dict, keys: Optional[Set] = None):
+        """
+        Раскладывает словарь хранилища по строкам таблицы.
+        Если известны изменённые ключи (keys), берутся только они
+        (для вложенных хранилищ keys - это chat_id изменённых чатов).
+        """
+        rows = {}
+        name = store_name(filepath)
+        if name in NESTED_TABLES:
+            chats = data if keys is None else {key: data.get(key) or {} for key in keys}
+            for chat_id, items in chats.items():
+                for item_key, value in items.items():
+                    rows[(str(chat_id), str(item_key))] = _dump(value)
+            if keys is None:
+                return rows, None
+            # Строки этих чатов, которые были записаны, но пропали - на удаление
+            changed_chats = {str(key) for key in keys}
+            written = self._written.get(name, {})
+            scope = set(rows) | {key for key in written if key[0] in changed_chats}
+            return rows, scope
+
+        if keys is None:
+            for key, value in data.items():
+                rows[(str(key),)] = _dump(value)
+            return rows, None
+
+        for key in keys:
+            if key in data:
+                rows[(str(key),)] = _dump(data[key])
+        return rows, {(str(key),) for key in keys}
+
+    def commit(self, filepath: str, payload):
+        """Записывает изменившиеся строки одной транзакцией"""
+        rows, keys = payload
+        name = store_name(filepath)
+        written = self._written.setdefault(name, {})
+        changed = [(key, text) for key, text in rows.items() if written.get(key) != text]
+        if keys is None:
+            removed = [key for key in written if key not in rows]
+        else:
+            removed = [key for key in keys if key not in rows and key in written]
+        if not changed and not removed:
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._upsert(name, changed)
+                self._delete(name, removed)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if keys is None:
+            self._written[name] = rows
+        else:
+            written.update(changed)
+            for key in removed:
+                written.pop(key, None)
+
+    def _upsert(self, name: str, changed: List[Tuple[Tuple, str]]):
+        if not changed:
+            return
+        if name in FLAT_TABLES:
+            table, column = FLAT_TABLES[name]
+            extra = EXTRA_COLUMNS.get(name, ())
+            columns = (column,) + extra + ("data",)
+            updates = ", ".join(f"{c} = excluded.{c}" for c in extra + ("data",))
+            sql = (
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT ({column}) DO UPDATE SET {updates}"
+            )
+            params = []
+            for key, text in changed:
+                values = json.loads(text) if extra else {}
+                if not isinstance(values, dict):
+                    values = {}
+                params.append((key[0],) + tuple(values.get(c) for c in extra) + (text,))
+            self._conn.executemany(sql, params)
+        elif name in NESTED_TABLES:
+            table, column = NESTED_TABLES[name]
+            self._conn.executemany(
+                f"INSERT INTO {table} (chat_id, {column}, data) VALUES (?, ?, ?) "
+                f"ON CONFLICT (chat_id, {column}) DO UPDATE SET data = excluded.data",
+                [(key[0], key[1], text) for key, text in changed],
+            )
+        else:
+            self._conn.executemany(
+                "INSERT INTO chat_settings (store, chat_id, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (store, chat_id) DO UPDATE SET data = excluded.data",
+                [(name, key[0], text) for key, text in changed],
+            )
+
+    def _delete(self, name: str, removed: List[Tuple]):
+        if not removed:
+            return
+        if name in FLAT_TABLES:
+            table, column = FLAT_TABLES[name]
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE {column} = ?", [(key[0],) for key in removed]
+            )
+        elif name in NESTED_TABLES:
+            table, column = NESTED_TABLES[name]
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE chat_id = ? AND {column} = ?", removed
+            )
+        else:
+            self._conn.executemany(
+                "DELETE FROM chat_settings WHERE store = ? AND chat_id = ?",
+                [(name, key[0]) for key in removed],
+            )
+
+    # ───────────────────────── служебное ─────────────────────────
+
+    def import_json_dir(self, directory: str) -> List[str]:
+        """
+        Однократный импорт data/*.json.
+        Отметка в meta ставится, только когда импортированы все файлы;
+        если какой-то не удался - RuntimeError, а при следующем запуске
+        импортируются только оставшиеся (уже импортированные отмечены
+        по отдельности).
+        """
+        with self._lock:
+            done = self._meta("json_imported")
+        if done is not None or not os.path.isdir(directory):
+            return []
+
+        imported = []
+        failed = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            file_key = f"json_imported:{filename}"
+            with self._lock:
+                if self._meta(file_key) is not None:
+                    continue
+            filepath = os.path.join(directory, filename)
+            try:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if not isinstance(data, dict):
+                    continue
+                self.load(filepath)
+                self.commit(filepath, self.prepare(filepath, data))
+            except Exception as e:
+                LOGGER.error(f"Ошибка импорта {filepath} в SQLite: {e}")
+                failed.append(filename)
+                continue
+            with self._lock:
+                self._set_meta(file_key, "1")
+            imported.append(filename)
+
+        if imported:
+            LOGGER.info(f"Импортировано в SQLite из JSON: {', '.join(imported)}")
+        if failed:
+            raise RuntimeError(f"не импортированы из JSON: {', '.join(failed)}")
+
+        with self._lock:
+            self._set_meta("json_imported", ",".join(imported))
+        return imported
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def reset(self) -> List[str]:
+        """Очищает все таблицы с данными (отметку об импорте оставляет)"""
+        tables = [t for t, _ in FLAT_TABLES.values()] + [t for t, _ in NESTED_TABLES.values()]
+        tables.append("chat_settings")
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for table in tables:
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.execute("COMMIT")
+        self._written.clear()
+        return tables
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -17,6 +17,7 @@ from MitaHelper import (
     WHITELIST_USERS,
     dispatcher,
 )
+from MitaHelper.modules.helper_funcs.chat_status import get_chat_admins
 from MitaHelper.modules.helper_funcs.extraction import extract_user
 
 
@@ -100,7 +101,8 @@ def info(update: Update, context: CallbackContext):
     # Информация в чате
     if chat.type != "private":
         try:
-            member = chat.get_member(user.id)
+            # Админы есть в кеше, за остальными идём в API
+            member = get_chat_admins(chat).get(user.id) or chat.get_member(user.id)
             if member.status == "creator":
                 text += f"\n\n👑 *Роль в чате:* Создатель"
             elif member.status == "administrator":
@@ -4,17 +4,14 @@
 """
 
 from telegram import Update
-from telegram.ext import (
-    CallbackContext,
-    MessageHandler,
-    Filters,
-)
+from telegram.ext import CallbackContext
 
-from MitaHelper import dispatcher, LOGGER
+from MitaHelper import LOGGER
+from MitaHelper.modules.helper_funcs.pipeline import KIND_COMMAND, KIND_JOIN, MessageFeatures, register_stage
 from MitaHelper.modules.sql.users_sql import ensure_user, ensure_chat
 
 
-def track_user(update: Update, context: CallbackContext):
+def track_user(update: Update, context: CallbackContext, features: MessageFeatures):
     """Отслеживает пользователей и сохраняет их в базу"""
     msg = update.effective_message
     user = update.effective_user
@@ -54,11 +51,11 @@ def track_user(update: Update, context: CallbackContext):
         )
 
 
-def track_new_members(update: Update, context: CallbackContext):
+def track_new_members(update: Update, context: CallbackContext, features: MessageFeatures):
     """Отслеживает новых участников чата"""
     msg = update.effective_message
     
-    if msg and msg.new_chat_members:
+    if msg.new_chat_members:
         for member in msg.new_chat_members:
             if not member.is_bot:
                 ensure_user(
@@ -68,21 +65,23 @@ def track_new_members(update: Update, context: CallbackContext):
                 )
 
 
-# Обработчик всех сообщений (самый низкий приоритет)
-track_handler = MessageHandler(
-    Filters.all & ~Filters.command,
-    track_user,
-    run_async=True
-)
-dispatcher.add_handler(track_handler, group=999)
-
-# Обработчик новых участников
-new_members_handler = MessageHandler(
-    Filters.status_update.new_chat_members,
+# Последние этапы конвейера: во всех чатах, даже если сообщение удалено
+register_stage(
+    "track_new_members",
     track_new_members,
-    run_async=True
+    order=90,
+    kinds=KIND_JOIN,
+    groups_only=False,
+    after_removal=True,
+)
+register_stage(
+    "track_user",
+    track_user,
+    order=95,
+    exclude=KIND_COMMAND,
+    groups_only=False,
+    after_removal=True,
 )
-dispatcher.add_handler(new_members_handler, group=998)
 
 
 __mod_name__ = "👥 Трекинг"
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+Модуль варнов - предупреждения с наказанием при достижении лимита
+"""
+
+import html
+from datetime import datetime, timedelta
+from itertools import islice
+from threading import RLock
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram import ChatPermissions, ParseMode, Update
+from telegram.error import BadRequest
+from telegram.ext import CallbackContext, CommandHandler
+from telegram.utils.helpers import mention_html
+
+from MitaHelper import dispatcher, LOGGER, WARN_EXPIRE_DAYS
+from MitaHelper.modules.helper_funcs.chat_status import (
+    bot_admin,
+    can_restrict,
+    is_user_ban_protected,
+    user_admin,
+)
+from MitaHelper.modules.helper_funcs.extraction import (
+    extract_user_and_text_for_moderation,
+    extract_user_for_moderation,
+)
+
+# Импорт логов
+try:
+    from MitaHelper.modules.logs import log_ban, log_kick, log_mute, log_warn
+except ImportError:
+    log_ban = None
+    log_kick = None
+    log_mute = None
+    log_warn = None
+
+
+# Длительность мута при достижении лимита варнов
+WARN_MUTE_TIME = timedelta(days=1)
+
+# Варны {chat_id: {user_id: [{"reason": str, "time": int, "by": int}, ...]}}
+# Список варнов пользователя идёт по времени - сгоревшие всегда в начале
+user_warns: Dict[int, Dict[int, List[dict]]] = {}
+
+# Пользователи чата по числу варнов {chat_id: {count: {user_id: None}}}
+# Позволяет получить самых «предупреждённых» без перебора всего чата
+_buckets: Dict[int, Dict[int, Dict[int, None]]] = {}
+
+WARNS_LOCK = RLock()
+
+# Загрузка из БД
+try:
+    from MitaHelper.modules.database import load_user_warns, save_user_warns
+    for _chat_id, _users in load_user_warns().items():
+        user_warns[_chat_id] = {int(uid): warns for uid, warns in _users.items() if warns}
+        for _user_id, _warns in user_warns[_chat_id].items():
+            _buckets.setdefault(_chat_id, {}).setdefault(len(_warns), {})[_user_id] = None
+    if user_warns:
+        LOGGER.info(f"Загружены варны для {len(user_warns)} чатов")
+except Exception as e:
+    LOGGER.warning(f"Не удалось загрузить варны: {e}")
+    save_user_warns = None
+
+
+def _save_warns_to_db(chat_id: int):
+    """Ставит варны чата в очередь на запись"""
+    if save_user_warns:
+        save_user_warns(user_warns, WARNS_LOCK, {chat_id})
+
+
+def _get_warns_settings(chat_id: int) -> dict:
+    """Лимит и действие хранятся в панели управления"""
+    try:
+        from MitaHelper.modules.config_panel import get_warns_settings
+    except ImportError:
+        return {"limit": 3, "action": "ban"}
+    return get_warns_settings(chat_id)
+
+
+def _expire_seconds(chat_id: int) -> int:
+    """Срок жизни варна в секундах (0 - бессрочно)"""
+    days = _get_warns_settings(chat_id).get("expire_days", WARN_EXPIRE_DAYS)
+    return int(days) * 24 * 60 * 60
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ХРАНИЛИЩЕ ВАРНОВ
+# ═══════════════════════════════════════════════════════════════
+
+def _move_bucket(chat_id: int, user_id: int, old: int, new: int):
+    """Переносит пользователя в корзину с новым числом варнов"""
+    buckets = _buckets.setdefault(chat_id, {})
+    if old:
+        bucket = buckets.get(old)
+        if bucket is not None:
+            bucket.pop(user_id, None)
+            if not bucket:
+                del buckets[old]
+    if new:
+        buckets.setdefault(new, {})[user_id] = None
+    if not buckets:
+        del _buckets[chat_id]
+
+
+def _set_warns(chat_id: int, user_id: int, warns: List[dict]):
+    """Записывает варны пользователя и обновляет корзины"""
+    chat_warns = user_warns.setdefault(chat_id, {})
+    old = len(chat_warns.get(user_id, ()))
+    if warns:
+        chat_warns[user_id] = warns
+    else:
+        chat_warns.pop(user_id, None)
+        if not chat_warns:
+            del user_warns[chat_id]
+    if old != len(warns):
+        _move_bucket(chat_id, user_id, old, len(warns))
+    _save_warns_to_db(chat_id)
+
+
+def _prune(chat_id: int, user_id: int, expire: int) -> List[dict]:
+    """Убирает сгоревшие варны пользователя и возвращает оставшиеся"""
+    warns = user_warns.get(chat_id, {}).get(user_id, [])
+    if not expire or not warns:
+        return warns
+    border = time() - expire
+    fresh = 0
+    while fresh < len(warns) and warns[fresh]["time"] < border:
+        fresh += 1
+    if fresh:
+        warns = warns[fresh:]
+        _set_warns(chat_id, user_id, warns)
+    return warns
+
+
+def get_warns(chat_id: int, user_id: int) -> List[dict]:
+    """Действующие варны пользователя"""
+    expire = _expire_seconds(chat_id)
+    with WARNS_LOCK:
+        return list(_prune(chat_id, user_id, expire))
+
+
+def add_warn(chat_id: int, user_id: int, reason: str = None, by: int = None) -> int:
+    """Добавляет варн и возвращает число действующих варнов"""
+    expire = _expire_seconds(chat_id)
+    with WARNS_LOCK:
+        warns = _prune(chat_id, user_id, expire) + [
+            {"reason": reason or "", "time": int(time()), "by": by}
+        ]
+        _set_warns(chat_id, user_id, warns)
+        return len(warns)
+
+
+def remove_last_warn(chat_id: int, user_id: int) -> int:
+    """Снимает последний варн. Возвращает сколько осталось (-1 - варнов не было)"""
+    expire = _expire_seconds(chat_id)
+    with WARNS_LOCK:
+        warns = _prune(chat_id, user_id, expire)
+        if not warns:
+            return -1
+        _set_warns(chat_id, user_id, warns[:-1])
+        return len(warns) - 1
+
+
+def reset_warns(chat_id: int, user_id: int) -> int:
+    """Снимает все варны пользователя, возвращает сколько было"""
+    with WARNS_LOCK:
+        count = len(user_warns.get(chat_id, {}).get(user_id, ()))
+        if count:
+            _set_warns(chat_id, user_id, [])
+        return count
+
+
+def top_warned(chat_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+    """
+    Пользователи с наибольшим числом варнов: [(user_id, число варнов), ...]
+    Идёт по корзинам от большего числа к меньшему и останавливается,
+    набрав limit человек, - остальные пользователи чата не перебираются.
+    """
+    expire = _expire_seconds(chat_id)
+    result = []
+    with WARNS_LOCK:
+        buckets = _buckets.get(chat_id)
+        if not buckets:
+            return result
+        count = max(buckets)
+        while count > 0 and len(result) < limit:
+            # Проверенные и оставшиеся в корзине пропускаем
+            skip = 0
+            while len(result) < limit:
+                bucket = _buckets.get(chat_id, {}).get(count)
+                if not bucket:
+                    break
+                batch = list(islice(bucket, skip, skip + limit - len(result)))
+                if not batch:
+                    break
+                for user_id in batch:
+                    # Сгоревшие варны уводят пользователя в корзину пониже
+                    if len(_prune(chat_id, user_id, expire)) == count:
+                        result.append((user_id, count))
+                        skip += 1
+            count -= 1
+    return result
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      ВЫДАЧА ВАРНА
+# ═══════════════════════════════════════════════════════════════
+
+def _punish(bot, chat_id: int, user_id: int, action: str, chat=None, user=None, admin=None) -> Optional[str]:
+    """Наказание за лимит варнов. Возвращает текст действия или None"""
+    reason = "Достигнут лимит варнов"
+    try:
+        if action == "kick":
+            bot.ban_chat_member(chat_id, user_id)
+            bot.unban_chat_member(chat_id, user_id)
+            if log_kick and chat and user:
+                log_kick(bot, chat, admin, user, reason)
+            return "кикнут"
+        if action == "mute":
+            bot.restrict_chat_member(
+                chat_id,
+                user_id,
+                permissions=ChatPermissions(can_send_messages=False),
+                until_date=datetime.utcnow() + WARN_MUTE_TIME,
+            )
+            if log_mute and chat and user:
+                log_mute(bot, chat, admin, user, "1 день", reason)
+            return "замучен на сутки"
+        bot.ban_chat_member(chat_id, user_id)
+        if log_ban and chat and user:
+            log_ban(bot, chat, admin, user, reason)
+        return "забанен"
+    except BadRequest as e:
+        LOGGER.warning(f"Варны: не удалось наказать {user_id} в {chat_id}: {e}")
+        return None
+
+
+def warn_user(chat_id: int, user_id: int, reason: str = None, chat=None, user=None, admin=None, bot=None):
+    """
+    Выдаёт варн. При достижении лимита варны сбрасываются
+    и применяется действие из настроек чата.
+    Возвращает (число варнов, лимит, текст наказания или None).
+    chat/user/admin - объекты Telegram для логов (необязательно).
+    """
+    settings = _get_warns_settings(chat_id)
+    limit = settings.get("limit", 3)
+    count = add_warn(chat_id, user_id, reason, admin.id if admin else None)
+
+    if log_warn and chat and user:
+        log_warn(bot or dispatcher.bot, chat, admin, user, reason, f"{count}/{limit}")
+
+    if count < limit:
+        return count, limit, None
+
+    reset_warns(chat_id, user_id)
+    punishment = _punish(
+        bot or dispatcher.bot, chat_id, user_id, settings.get("action", "ban"), chat, user, admin
+    )
+    return count, limit, punishment
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      КОМАНДЫ
+# ═══════════════════════════════════════════════════════════════
+
+@bot_admin
+@can_restrict
+@user_admin
+def warn(update: Update, context: CallbackContext):
+    """Выдаёт варн пользователю"""
+    chat = update.effective_chat
+    msg = update.effective_message
+    admin = update.effective_user
+
+    user_id, reason = extract_user_and_text_for_moderation(msg, context.args, context.bot, chat.id)
+    if not user_id:
+        msg.reply_text("❌ Укажите пользователя.")
+        return
+
+    if user_id == context.bot.id:
+        msg.reply_text("❌ Я не буду предупреждать себя!")
+        return
+
+    try:
+        member = chat.get_member(user_id)
+    except BadRequest:
+        msg.reply_text("❌ Пользователь не найден.")
+        return
+
+    if is_user_ban_protected(chat, user_id, member):
+        msg.reply_text("❌ Этого пользователя нельзя предупредить!")
+        return
+
+    count, limit, punishment = warn_user(
+        chat.id, user_id, reason, chat=chat, user=member.user, admin=admin, bot=context.bot
+    )
+
+    mention = mention_html(member.user.id, member.user.first_name)
+    if punishment:
+        text = f"⛔️ {mention} набрал {count}/{limit} варнов и {punishment}!"
+    elif count >= limit:
+        text = f"⚠️ {mention} набрал {count}/{limit} варнов, но наказать не удалось."
+    else:
+        text = f"⚠️ {mention} получил варн ({count}/{limit})"
+    if reason:
+        text += f"\n📝 Причина: {html.escape(reason)}"
+
+    msg.reply_text(text, parse_mode=ParseMode.HTML)
+
+
+@user_admin
+def unwarn(update: Update, context: CallbackContext):
+    """Снимает последний варн"""
+    chat = update.effective_chat
+    msg = update.effective_message
+
+    user_id = extract_user_for_moderation(msg, context.args, context.bot, chat.id)
+    if not user_id:
+        msg.reply_text("❌ Укажите пользователя.")
+        return
+
+    left = remove_last_warn(chat.id, user_id)
+    if left < 0:
+        msg.reply_text("ℹ️ У пользователя нет варнов.")
+    else:
+        limit = _get_warns_settings(chat.id).get("limit", 3)
+        msg.reply_text(f"✅ Варн снят. Осталось: {left}/{limit}")
+
+
+@user_admin
+def resetwarns(update: Update, context: CallbackContext):
+    """Снимает все варны пользователя"""
+    chat = update.effective_chat
+    msg = update.effective_message
+
+    user_id = extract_user_for_moderation(msg, context.args, context.bot, chat.id)
+    if not user_id:
+        msg.reply_text("❌ Укажите пользователя.")
+        return
+
+    if reset_warns(chat.id, user_id):
+        msg.reply_text("✅ Все варны пользователя сняты.")
+    else:
+        msg.reply_text("ℹ️ У пользователя нет варнов.")
+
+
+def warns(update: Update, context: CallbackContext):
+    """Показывает варны пользователя (по умолчанию - свои)"""
+    chat = update.effective_chat
+    msg = update.effective_message
+
+    user_id = None
+    if msg.reply_to_message or context.args:
+        user_id = extract_user_for_moderation(msg, context.args, context.bot, chat.id)
+    if not user_id:
+        user_id = update.effective_user.id
+
+    user_list = get_warns(chat.id, user_id)
+    limit = _get_warns_settings(chat.id).get("limit", 3)
+    if not user_list:
+        msg.reply_text("✅ Варнов нет.")
+        return
+
+    text = f"⚠️ <b>Варны</b> <code>{user_id}</code>: {len(user_list)}/{limit}\n\n"
+    for i, entry in enumerate(user_list, 1):
+        date = datetime.fromtimestamp(entry["time"]).strftime("%d.%m.%Y")
+        reason = html.escape(entry.get("reason") or "без причины")
+        text += f"{i}. {reason} <i>({date})</i>\n"
+
+    msg.reply_text(text, parse_mode=ParseMode.HTML)
+
+
+@user_admin
+def warnlist(update: Update, context: CallbackContext):
+    """Показывает пользователей с наибольшим числом варнов"""
+    chat = update.effective_chat
+    msg = update.effective_message
+
+    top = top_warned(chat.id, 10)
+    if not top:
+        msg.reply_text("✅ В этом чате ни у кого нет варнов.")
+        return
+
+    try:
+        from MitaHelper.modules.database import get_user
+    except ImportError:
+        get_user = None
+
+    limit = _get_warns_settings(chat.id).get("limit", 3)
+    text = "⚠️ <b>Больше всего варнов:</b>\n\n"
+    for user_id, count in top:
+        info = get_user(user_id) if get_user else None
+        name = (info or {}).get("first_name") or str(user_id)
+        text += f"• {mention_html(user_id, name)} — {count}/{limit}\n"
+
+    msg.reply_text(text, parse_mode=ParseMode.HTML)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
+# ═══════════════════════════════════════════════════════════════
+
+WARN_HANDLER = CommandHandler("warn", warn, run_async=True)
+UNWARN_HANDLER = CommandHandler(["unwarn", "rmwarn"], unwarn, run_async=True)
+RESETWARNS_HANDLER = CommandHandler("resetwarns", resetwarns, run_async=True)
+WARNS_HANDLER = CommandHandler("warns", warns, run_async=True)
+WARNLIST_HANDLER = CommandHandler("warnlist", warnlist, run_async=True)
+
+dispatcher.add_handler(WARN_HANDLER)
+dispatcher.add_handler(UNWARN_HANDLER)
+dispatcher.add_handler(RESETWARNS_HANDLER)
+dispatcher.add_handler(WARNS_HANDLER)
+dispatcher.add_handler(WARNLIST_HANDLER)
+
+
+__mod_name__ = "⚠️ Варны"
+
+__help__ = """
+*Предупреждения:*
+
+⚠️ *Команды (для админов):*
+• /warn `<@username или ID>` `[причина]` — выдать варн
+• /unwarn `<@username или ID>` — снять последний варн
+• /resetwarns `<@username или ID>` — снять все варны
+• /warnlist — у кого больше всего варнов
+
+👤 *Для всех:*
+• /warns — свои варны (ответом или с ID — чужие)
+
+При достижении лимита варны сбрасываются и применяется
+наказание: бан, кик или мут на сутки.
+Старые варны со временем сгорают.
+
+*Настройка:*
+/config → Выберите чат → ⚠️ Варны
+"""
@@ -5,7 +5,9 @@
 
 import html
 import random
+import time
 from datetime import datetime
+from threading import RLock
 
 from telegram import (
     ChatPermissions,
@@ -26,17 +28,41 @@ from telegram.utils.helpers import escape_markdown, mention_html, mention_markdo
 
 from MitaHelper import dispatcher, LOGGER
 from MitaHelper.modules.helper_funcs.chat_status import (
+    bot_admin,
+    can_restrict,
+    get_chat_admins,
     is_user_ban_protected,
     user_admin,
 )
+from MitaHelper.modules.helper_funcs.outbound import low_priority
+from MitaHelper.modules.helper_funcs.pipeline import (
+    KIND_JOIN,
+    MessageFeatures,
+    invalidate_chat_features,
+    register_stage,
+)
+from MitaHelper.modules.helper_funcs.raid import (
+    JOIN_NEW,
+    JOIN_PASSED,
+    JOIN_REMOVED,
+    RECENT_JOINS,
+    JoinRateDetector,
+)
+from MitaHelper.modules.helper_funcs.timers import (
+    cancel_timer,
+    delete_message_later,
+    register_timer,
+    schedule_timer,
+)
 from MitaHelper.modules.helper_funcs.topics import get_thread_id
 
 # Импорт логов
 try:
-    from MitaHelper.modules.logs import log_join, log_leave
+    from MitaHelper.modules.logs import log_join, log_leave, log_raid
 except ImportError:
     log_join = None
     log_leave = None
+    log_raid = None
 
 
 # Стандартные приветствия
@@ -64,7 +90,30 @@ RANDOM_WELCOMES = [
 # Хранилище настроек
 welcome_settings = {}
 goodbye_settings = {}
-lockdown_settings = {}  # {chat_id: {"enabled": True/False, "reason": "..."}}
+lockdown_settings = {}  # {chat_id: {"enabled": True/False, "reason": "...", "auto": ..., ...}}
+
+# Режим ЧС и автоматическая защита от рейдов
+DEFAULT_LOCKDOWN = {
+    "enabled": False,
+    "reason": "Спам-атака",
+    "action": "ban",            # что делать с вошедшими: ban / kick / mute
+    "auto": False,              # включать режим ЧС при рейде автоматически
+    "threshold": 30,            # входов в минуту, с которых начинается рейд
+    "cooldown": 600,            # секунд без рейда до снятия режима ЧС
+    "harden_captcha": False,    # после рейда - сложная капча ещё на cooldown
+    "auto_active": False,       # режим ЧС включён автоматически (снимется сам)
+    "captcha_mode_before": None,  # режим капчи до ужесточения
+}
+LOCKDOWN_ACTIONS = {
+    "ban": "забанены",
+    "kick": "кикнуты",
+    "mute": "замучены",
+}
+HARD_CAPTCHA_MODE = "text"
+
+# /raidclean: самое большое окно и как часто обновлять прогресс (секунды)
+RAIDCLEAN_MAX_WINDOW = 24 * 3600
+RAIDCLEAN_PROGRESS_INTERVAL = 3
 
 # Загрузка настроек из БД
 try:
@@ -87,6 +136,7 @@ except Exception as e:
 
 def _save_all_welcome_settings():
     """Сохраняет все настройки приветствий в БД"""
+    invalidate_chat_features()
     if save_welcome_settings:
         data = {}
         all_chats = set(welcome_settings.keys()) | set(goodbye_settings.keys()) | set(lockdown_settings.keys())
@@ -103,10 +153,7 @@ def _save_all_welcome_settings():
 
 def get_lockdown_settings(chat_id):
     """Получает настройки режима ЧС (lockdown) для чата"""
-    return lockdown_settings.get(chat_id, {
-        "enabled": False,
-        "reason": "Спам-атака",
-    })
+    return {**DEFAULT_LOCKDOWN, **lockdown_settings.get(chat_id, {})}
 
 
 def set_lockdown_settings(chat_id, settings):
@@ -120,6 +167,12 @@ def is_lockdown_enabled(chat_id):
     return lockdown_settings.get(chat_id, {}).get("enabled", False)
 
 
+def is_raid_guard_active(chat_id):
+    """Нужно ли смотреть на входы: режим ЧС включён или ждём рейда"""
+    settings = lockdown_settings.get(chat_id, {})
+    return settings.get("enabled", False) or settings.get("auto", False)
+
+
 def get_welcome_settings(chat_id):
     """Получает настройки приветствий для чата"""
     return welcome_settings.get(chat_id, {
@@ -133,6 +186,11 @@ def get_welcome_settings(chat_id):
     })
 
 
+def is_welcome_enabled(chat_id):
+    """Включены ли приветствия в чате (по умолчанию - да)"""
+    return welcome_settings.get(chat_id, {}).get("enabled", True)
+
+
 def set_welcome_settings(chat_id, settings):
     """Сохраняет настройки приветствий для чата"""
     welcome_settings[chat_id] = settings
@@ -168,16 +226,14 @@ def format_welcome(text, user, chat):
     )
 
 
-def new_member(update: Update, context: CallbackContext):
-    """Обрабатывает новых участников чата"""
+@low_priority
+def new_member(update: Update, context: CallbackContext, features: MessageFeatures):
+    """Обрабатывает новых участников чата (этап конвейера, после CAS и капчи)"""
     chat = update.effective_chat
     msg = update.effective_message
     
     settings = get_welcome_settings(chat.id)
     
-    if not settings["enabled"]:
-        return
-    
     # Если включена капча, не отправляем приветствие здесь
     # Приветствие будет после прохождения капчи
     try:
@@ -199,21 +255,10 @@ def new_member(update: Update, context: CallbackContext):
     thread_id = get_thread_id(msg)
     
     for new_mem in msg.new_chat_members:
-        # Пропускаем ботов
-        if new_mem.is_bot:
+        # Пропускаем ботов и уже забаненных CAS или режимом ЧС
+        if new_mem.is_bot or new_mem.id in features.removed_members:
             continue
         
-        # ПРОВЕРКА РЕЖИМА ЧС (LOCKDOWN)
-        if is_lockdown_enabled(chat.id):
-            lockdown = get_lockdown_settings(chat.id)
-            reason = lockdown.get("reason", "Режим ЧС")
-            try:
-                context.bot.ban_chat_member(chat.id, new_mem.id)
-                LOGGER.info(f"[LOCKDOWN] Забанен {new_mem.id} в чате {chat.id}")
-            except Exception as e:
-                LOGGER.warning(f"[LOCKDOWN] Не удалось забанить {new_mem.id}: {e}")
-            continue  # Не отправляем приветствие
-        
         # Логируем вход
         if log_join:
             log_join(context.bot, chat, new_mem)
@@ -282,12 +327,7 @@ def new_member(update: Update, context: CallbackContext):
             # Автоудаление приветствия
             delete_after = settings.get("delete_after", 0)
             if delete_after > 0 and sent_msg:
-                context.job_queue.run_once(
-                    delete_welcome_message,
-                    delete_after,
-                    context={"chat_id": chat.id, "message_id": sent_msg.message_id},
-                    name=f"del_welcome_{sent_msg.message_id}"
-                )
+                delete_message_later(chat.id, sent_msg.message_id, delete_after)
                 
         except BadRequest as e:
             LOGGER.warning(f"Ошибка отправки приветствия: {e}")
@@ -297,15 +337,7 @@ def new_member(update: Update, context: CallbackContext):
             )
 
 
-def delete_welcome_message(context: CallbackContext):
-    """Удаляет приветственное сообщение по таймеру"""
-    job_data = context.job.context
-    try:
-        context.bot.delete_message(job_data["chat_id"], job_data["message_id"])
-    except BadRequest:
-        pass
-
-
+@low_priority
 def left_member(update: Update, context: CallbackContext):
     """Обрабатывает ушедших участников"""
     chat = update.effective_chat
@@ -342,12 +374,14 @@ def welcome(update: Update, context: CallbackContext):
         if chat.id not in welcome_settings:
             welcome_settings[chat.id] = get_welcome_settings(chat.id)
         welcome_settings[chat.id]["enabled"] = True
+        _save_all_welcome_settings()
         msg.reply_text("✅ Приветствия включены!")
         
     elif args[0].lower() in ("off", "no", "выкл", "нет"):
         if chat.id not in welcome_settings:
             welcome_settings[chat.id] = get_welcome_settings(chat.id)
         welcome_settings[chat.id]["enabled"] = False
+        _save_all_welcome_settings()
         msg.reply_text("❌ Приветствия выключены!")
 
 
@@ -483,9 +517,6 @@ def cleanservice(update: Update, context: CallbackContext):
 #                      РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
 # ═══════════════════════════════════════════════════════════════
 
-NEW_MEMBER_HANDLER = MessageHandler(
-    Filters.status_update.new_chat_members, new_member, run_async=True
-)
 LEFT_MEMBER_HANDLER = MessageHandler(
     Filters.status_update.left_chat_member, left_member, run_async=True
 )
@@ -496,7 +527,6 @@ GOODBYE_HANDLER = CommandHandler("goodbye", goodbye, run_async=True)
 SET_GOODBYE_HANDLER = CommandHandler("setgoodbye", set_goodbye, run_async=True)
 CLEANSERVICE_HANDLER = CommandHandler("cleanservice", cleanservice, run_async=True)
 
-dispatcher.add_handler(NEW_MEMBER_HANDLER)
 dispatcher.add_handler(LEFT_MEMBER_HANDLER)
 dispatcher.add_handler(WELCOME_HANDLER)
 dispatcher.add_handler(SET_WELCOME_HANDLER)
@@ -505,11 +535,290 @@ dispatcher.add_handler(GOODBYE_HANDLER)
 dispatcher.add_handler(SET_GOODBYE_HANDLER)
 dispatcher.add_handler(CLEANSERVICE_HANDLER)
 
+# Этап конвейера: вход участников, после CAS и капчи
+register_stage("welcome", new_member, order=40, enabled=is_welcome_enabled, kinds=KIND_JOIN)
+
 
 # ═══════════════════════════════════════════════════════════════
 #                      РЕЖИМ ЧС (LOCKDOWN)
 # ═══════════════════════════════════════════════════════════════
 
+# Частота входов по чатам (см. helper_funcs/raid.py)
+RAID_DETECTOR = JoinRateDetector()
+
+# Когда в чате последний раз видели рейд {chat_id: unix-время}
+_raid_seen = {}
+
+RAID_LOCK = RLock()
+
+
+def _harden_captcha(chat_id, settings):
+    """Переводит капчу чата в сложный режим, запомнив прежний"""
+    try:
+        from MitaHelper.modules.captcha import get_captcha_settings, set_captcha_settings
+    except ImportError:
+        return
+    captcha = get_captcha_settings(chat_id)
+    if not captcha.get("enabled") or captcha.get("mode") == HARD_CAPTCHA_MODE:
+        return
+    if settings.get("captcha_mode_before") is None:
+        settings["captcha_mode_before"] = captcha.get("mode")
+    set_captcha_settings(chat_id, {**captcha, "mode": HARD_CAPTCHA_MODE})
+
+
+def _restore_captcha(chat_id, settings):
+    """Возвращает режим капчи, который был до рейда"""
+    mode = settings.get("captcha_mode_before")
+    if mode is None:
+        return
+    settings["captcha_mode_before"] = None
+    cancel_timer(f"raid_captcha_{chat_id}")
+    try:
+        from MitaHelper.modules.captcha import get_captcha_settings, set_captcha_settings
+    except ImportError:
+        return
+    captcha = get_captcha_settings(chat_id)
+    # Админ сам поменял режим после рейда - не трогаем
+    if captcha.get("mode") == HARD_CAPTCHA_MODE:
+        set_captcha_settings(chat_id, {**captcha, "mode": mode})
+
+
+def _start_auto_lockdown(chat_id, rate):
+    """Рейд обнаружен - включает режим ЧС, снимется сам после cooldown"""
+    settings = get_lockdown_settings(chat_id)
+    settings["enabled"] = True
+    settings["auto_active"] = True
+    settings["reason"] = f"Рейд: {rate:.0f} входов в минуту"
+    set_lockdown_settings(chat_id, settings)
+    schedule_timer("raid_cooldown", settings["cooldown"], {"chat_id": chat_id}, name=f"raid_cooldown_{chat_id}")
+    return settings
+
+
+def _announce_raid(bot, chat, settings, rate):
+    """Сообщает о рейде в чат и в канал логов"""
+    action = LOCKDOWN_ACTIONS.get(settings["action"], settings["action"])
+    minutes = max(1, settings["cooldown"] // 60)
+    LOGGER.warning(f"[RAID] Чат {chat.id}: {rate:.0f} входов/мин - режим ЧС включён автоматически")
+    try:
+        bot.send_message(
+            chat.id,
+            f"🚨 *Обнаружен рейд* ({rate:.0f} входов в минуту)\n\n"
+            f"🔒 Режим ЧС включён автоматически: новые участники будут *{action}*.\n"
+            f"Режим снимется сам через {minutes} мин. без рейда, или командой /unlock",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+    except BadRequest as e:
+        LOGGER.warning(f"[RAID] Не удалось отправить уведомление в {chat.id}: {e}")
+    if log_raid:
+        log_raid(bot, chat.id, f"🏠 Чат: *{chat.title or 'Чат'}*\n🔒 Режим ЧС включён автоматически\n📝 {settings['reason']}")
+
+
+def check_raid(update: Update, context: CallbackContext, features: MessageFeatures):
+    """
+    Входы участников (этап конвейера, после CAS, до капчи): считает
+    частоту входов, при рейде включает режим ЧС, а в режиме ЧС отдаёт
+    вошедших на массовое наказание - без капчи и приветствий.
+    """
+    chat = update.effective_chat
+    members = [
+        member.id for member in update.effective_message.new_chat_members
+        if not member.is_bot and member.id not in features.removed_members
+    ]
+    if not members:
+        return
+
+    started = None
+    with RAID_LOCK:
+        settings = get_lockdown_settings(chat.id)
+        if settings["auto"]:
+            if RAID_DETECTOR.record(chat.id, len(members), settings["threshold"]):
+                _raid_seen[chat.id] = time.time()
+                if not settings["enabled"]:
+                    started = RAID_DETECTOR.rate(chat.id)
+                    settings = _start_auto_lockdown(chat.id, started)
+        if not settings["enabled"]:
+            return
+
+    if started is not None:
+        _announce_raid(context.bot, chat, settings, started)
+
+    # Запросы уходят в фоне, воркер не ждёт API на каждого вошедшего
+    context.bot.bulk_restrict(chat.id, members, settings["action"])
+    features.removed_members.update(members)
+
+
+def _raid_cooldown_timer(bot, data):
+    """Снимает автоматический режим ЧС, если рейд закончился"""
+    chat_id = data["chat_id"]
+    with RAID_LOCK:
+        settings = get_lockdown_settings(chat_id)
+        # Режим ЧС сняли или включили вручную - таймер больше не нужен
+        if not settings["enabled"] or not settings["auto_active"]:
+            return
+        remaining = _raid_seen.get(chat_id, 0) + settings["cooldown"] - time.time()
+        if remaining > 1:
+            schedule_timer("raid_cooldown", remaining, data, name=f"raid_cooldown_{chat_id}")
+            return
+
+        settings["enabled"] = False
+        settings["auto_active"] = False
+        if settings["harden_captcha"]:
+            # Сразу после рейда - сложная капча для тех, кто зайдёт следом
+            _harden_captcha(chat_id, settings)
+            if settings["captcha_mode_before"] is not None:
+                schedule_timer("raid_captcha", settings["cooldown"], data, name=f"raid_captcha_{chat_id}")
+        set_lockdown_settings(chat_id, settings)
+        _raid_seen.pop(chat_id, None)
+
+    LOGGER.info(f"[RAID] Чат {chat_id}: рейд закончился, режим ЧС снят")
+    try:
+        bot.send_message(chat_id, "🔓 Рейд закончился - режим ЧС снят автоматически.")
+    except BadRequest as e:
+        LOGGER.warning(f"[RAID] Не удалось отправить уведомление в {chat_id}: {e}")
+    if log_raid:
+        log_raid(bot, chat_id, "🔓 Рейд закончился, режим ЧС снят автоматически")
+
+
+def _raid_captcha_timer(bot, data):
+    """Возвращает обычную капчу после рейда"""
+    chat_id = data["chat_id"]
+    with RAID_LOCK:
+        settings = get_lockdown_settings(chat_id)
+        _restore_captcha(chat_id, settings)
+        set_lockdown_settings(chat_id, settings)
+
+
+def record_joins(update: Update, context: CallbackContext, features: MessageFeatures):
+    """Запоминает вошедших для /raidclean (этап конвейера, после всех проверок)"""
+    chat = update.effective_chat
+    joined_at = time.time()
+    for member in update.effective_message.new_chat_members:
+        if member.is_bot:
+            continue
+        status = JOIN_REMOVED if member.id in features.removed_members else JOIN_NEW
+        RECENT_JOINS.add(chat.id, member.id, member.first_name, joined_at, status)
+
+
+# Незаконченные /raidclean {chat_id: {...}}
+_raidclean_runs = {}
+
+
+def _raidclean_progress(context: CallbackContext):
+    """Обновляет сообщение о ходе /raidclean, в конце пишет сводку в логи"""
+    chat_id = context.job.context
+    run = _raidclean_runs.get(chat_id)
+    if run is None:
+        return
+    batch = run["batch"]
+    action = LOCKDOWN_ACTIONS.get(run["action"], run["action"])
+    finished = batch.finished()
+    if finished:
+        text = (
+            f"✅ *Зачистка завершена*\n\n"
+            f"👥 {action.capitalize()}: `{batch.done}` из `{batch.total}`"
+            f"{f', ошибок: `{batch.failed}`' if batch.failed else ''}"
+        )
+    else:
+        text = (
+            f"🧹 *Зачистка рейда...*\n\n"
+            f"👥 {action.capitalize()}: `{batch.done + batch.failed}` из `{batch.total}`"
+        )
+    try:
+        context.bot.edit_message_text(
+            text, chat_id=chat_id, message_id=run["message_id"], parse_mode=ParseMode.MARKDOWN,
+        )
+    except BadRequest:
+        pass
+
+    if not finished:
+        context.job_queue.run_once(_raidclean_progress, RAIDCLEAN_PROGRESS_INTERVAL, context=chat_id)
+        return
+    _raidclean_runs.pop(chat_id, None)
+    LOGGER.info(f"[RAID] Чат {chat_id}: /raidclean - {run['action']} {batch.done}/{batch.total}")
+    if log_raid:
+        log_raid(
+            context.bot,
+            chat_id,
+            f"🏠 Чат: *{run['title']}*\n"
+            f"🧹 Зачистка рейда за последние {run['window']}\n"
+            f"👥 {action.capitalize()}: {batch.done} из {batch.total}"
+            f"{f', ошибок: {batch.failed}' if batch.failed else ''}",
+            admin=run["admin"],
+        )
+
+
+@bot_admin
+@can_restrict
+@user_admin
+def raidclean_cmd(update: Update, context: CallbackContext):
+    """
+    Банит (или кикает) всех, кто вошёл за последнее окно и не прошёл
+    капчу. Берёт вошедших из журнала входов, без запросов на каждого,
+    и отдаёт их массовым наказаниям в фоне.
+    """
+    chat = update.effective_chat
+    msg = update.effective_message
+    args = [arg.lower() for arg in context.args]
+
+    if not args:
+        msg.reply_text(
+            "❌ Укажите окно: `/raidclean <время> [ban/kick]`, например `/raidclean 10m`",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+        return
+    from MitaHelper.modules.bans import parse_time
+    try:
+        window = parse_time(args[0] if not args[0].isdigit() else f"{args[0]}m")
+    except ValueError:
+        window = None
+    if not window or not 0 < window.total_seconds() <= RAIDCLEAN_MAX_WINDOW:
+        msg.reply_text("❌ Неверное окно. Примеры: `30s`, `10m`, `2h` (не больше суток).", parse_mode=ParseMode.MARKDOWN)
+        return
+    action = args[1] if len(args) > 1 else get_lockdown_settings(chat.id)["action"]
+    if action not in ("ban", "kick"):
+        msg.reply_text("❌ Действие: `ban` или `kick`.", parse_mode=ParseMode.MARKDOWN)
+        return
+    if chat.id in _raidclean_runs:
+        msg.reply_text("⏳ Зачистка в этом чате уже идёт.")
+        return
+
+    admins = get_chat_admins(chat)
+    targets = [
+        record.user_id for record in RECENT_JOINS.since(chat.id, time.time() - window.total_seconds())
+        if record.status not in (JOIN_PASSED, JOIN_REMOVED) and record.user_id not in admins
+    ]
+    if not targets:
+        msg.reply_text("ℹ️ За это время не было вошедших без пройденной капчи.")
+        return
+
+    batch = context.bot.bulk_restrict(chat.id, targets, action)
+    for user_id in targets:
+        RECENT_JOINS.set_status(chat.id, user_id, JOIN_REMOVED)
+    status = msg.reply_text(
+        f"🧹 *Зачистка рейда...*\n\n"
+        f"👥 {LOCKDOWN_ACTIONS[action].capitalize()}: `0` из `{batch.total}`",
+        parse_mode=ParseMode.MARKDOWN,
+    )
+    _raidclean_runs[chat.id] = {
+        "batch": batch,
+        "action": action,
+        "message_id": status.message_id,
+        "title": chat.title or "Чат",
+        "window": args[0],
+        "admin": update.effective_user,
+    }
+    context.job_queue.run_once(_raidclean_progress, RAIDCLEAN_PROGRESS_INTERVAL, context=chat.id)
+
+
+register_timer("raid_cooldown", _raid_cooldown_timer)
+register_timer("raid_captcha", _raid_captcha_timer)
+
+# Этап конвейера: после CAS (20), до капчи (30) и приветствия (40)
+register_stage("raid", check_raid, order=25, enabled=is_raid_guard_active, kinds=KIND_JOIN)
+# Журнал входов для /raidclean: во всех группах, после всех проверок входа
+register_stage("recent_joins", record_joins, order=85, kinds=KIND_JOIN, after_removal=True)
+
+
 @user_admin
 def lockdown_cmd(update: Update, context: CallbackContext):
     """Включает режим ЧС - все новые участники банятся"""
@@ -519,14 +828,19 @@ def lockdown_cmd(update: Update, context: CallbackContext):
     
     reason = " ".join(args) if args else "Спам-атака"
     
-    settings = get_lockdown_settings(chat.id)
-    settings["enabled"] = True
-    settings["reason"] = reason
-    set_lockdown_settings(chat.id, settings)
+    with RAID_LOCK:
+        settings = get_lockdown_settings(chat.id)
+        settings["enabled"] = True
+        settings["reason"] = reason
+        # Включён вручную - сам не снимется
+        settings["auto_active"] = False
+        set_lockdown_settings(chat.id, settings)
+    cancel_timer(f"raid_cooldown_{chat.id}")
+    action = LOCKDOWN_ACTIONS.get(settings["action"], settings["action"])
     
     msg.reply_text(
         f"🔒 *РЕЖИМ ЧС АКТИВИРОВАН*\n\n"
-        f"⚠️ Все новые участники будут *автоматически забанены*!\n\n"
+        f"⚠️ Все новые участники будут *автоматически {action}*!\n\n"
         f"📝 Причина: `{reason}`\n\n"
         f"Для отключения используйте /unlock",
         parse_mode=ParseMode.MARKDOWN
@@ -540,18 +854,24 @@ def unlock_cmd(update: Update, context: CallbackContext):
     chat = update.effective_chat
     msg = update.effective_message
     
-    settings = get_lockdown_settings(chat.id)
+    with RAID_LOCK:
+        settings = get_lockdown_settings(chat.id)
+        was_enabled = settings.get("enabled", False)
+        if was_enabled:
+            settings["enabled"] = False
+            settings["auto_active"] = False
+            _restore_captcha(chat.id, settings)
+            set_lockdown_settings(chat.id, settings)
+            _raid_seen.pop(chat.id, None)
     
-    if not settings.get("enabled", False):
+    if not was_enabled:
         msg.reply_text("ℹ️ Режим ЧС не был активирован.")
         return
-    
-    settings["enabled"] = False
-    set_lockdown_settings(chat.id, settings)
+    cancel_timer(f"raid_cooldown_{chat.id}")
     
     msg.reply_text(
         "🔓 *Режим ЧС отключён*\n\n"
-        "✅ Новые участники больше не будут автоматически баниться.",
+        "✅ Новые участники больше не будут наказываться автоматически.",
         parse_mode=ParseMode.MARKDOWN
     )
     LOGGER.info(f"[LOCKDOWN] Выключен в чате {chat.id} ({chat.title})")
@@ -565,31 +885,102 @@ def lockdown_status_cmd(update: Update, context: CallbackContext):
     
     settings = get_lockdown_settings(chat.id)
     enabled = settings.get("enabled", False)
+    auto = "включена" if settings["auto"] else "выключена"
     
     if enabled:
         reason = settings.get("reason", "Не указана")
+        action = LOCKDOWN_ACTIONS.get(settings["action"], settings["action"])
+        origin = "автоматически, снимется сам" if settings["auto_active"] else "вручную"
         msg.reply_text(
-            f"🔒 *Режим ЧС: АКТИВЕН*\n\n"
+            f"🔒 *Режим ЧС: АКТИВЕН* ({origin})\n\n"
             f"📝 Причина: `{reason}`\n\n"
-            f"⚠️ Все новые участники банятся автоматически.\n"
+            f"⚠️ Все новые участники {action} автоматически.\n"
+            f"🛡 Защита от рейдов: {auto}\n"
             f"Для отключения: /unlock",
             parse_mode=ParseMode.MARKDOWN
         )
     else:
         msg.reply_text(
             "🔓 *Режим ЧС: выключен*\n\n"
+            f"🛡 Защита от рейдов: {auto}\n"
             "Для включения: /lockdown [причина]",
             parse_mode=ParseMode.MARKDOWN
         )
 
 
+@user_admin
+def antiraid_cmd(update: Update, context: CallbackContext):
+    """Настройки автоматической защиты от рейдов"""
+    chat = update.effective_chat
+    msg = update.effective_message
+    args = [arg.lower() for arg in context.args]
+    
+    settings = get_lockdown_settings(chat.id)
+    
+    if not args:
+        rate = RAID_DETECTOR.rate(chat.id)
+        baseline = RAID_DETECTOR.baseline(chat.id)
+        action = LOCKDOWN_ACTIONS.get(settings["action"], settings["action"])
+        msg.reply_text(
+            f"🛡 *Защита от рейдов:* {'✅ включена' if settings['auto'] else '❌ выключена'}\n\n"
+            f"📈 Порог: `{settings['threshold']}` входов в минуту\n"
+            f"⏱ Снимать режим ЧС через: `{settings['cooldown'] // 60}` мин. без рейда\n"
+            f"⚖️ Вошедшие во время ЧС: *{action}*\n"
+            f"🧩 Сложная капча после рейда: {'да' if settings['harden_captcha'] else 'нет'}\n\n"
+            f"📊 Сейчас: `{rate:.0f}` входов в минуту"
+            f"{f', обычно `{baseline:.1f}`' if baseline is not None else ''}\n\n"
+            f"*Команды:*\n"
+            f"• `/antiraid on/off`\n"
+            f"• `/antiraid threshold <входов в минуту>`\n"
+            f"• `/antiraid cooldown <минут>`\n"
+            f"• `/antiraid action <ban/kick/mute>`\n"
+            f"• `/antiraid captcha on/off`",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+        return
+    
+    cmd = args[0]
+    value = args[1] if len(args) > 1 else None
+    
+    if cmd in ("on", "off"):
+        settings["auto"] = cmd == "on"
+        reply = "✅ Защита от рейдов включена." if settings["auto"] else "❌ Защита от рейдов выключена."
+    elif cmd == "threshold" and value and value.isdigit() and 5 <= int(value) <= 10000:
+        settings["threshold"] = int(value)
+        reply = f"✅ Рейд - от `{value}` входов в минуту."
+    elif cmd == "cooldown" and value and value.isdigit() and 1 <= int(value) <= 1440:
+        settings["cooldown"] = int(value) * 60
+        reply = f"✅ Режим ЧС снимется через `{value}` мин. без рейда."
+    elif cmd == "action" and value in LOCKDOWN_ACTIONS:
+        settings["action"] = value
+        reply = f"✅ Во время ЧС вошедшие будут *{LOCKDOWN_ACTIONS[value]}*."
+    elif cmd == "captcha" and value in ("on", "off"):
+        settings["harden_captcha"] = value == "on"
+        reply = "✅ После рейда капча станет сложной." if value == "on" else "✅ Капча после рейда не меняется."
+    else:
+        msg.reply_text("❌ Неверная команда. Напишите /antiraid для справки.")
+        return
+    
+    with RAID_LOCK:
+        stored = get_lockdown_settings(chat.id)
+        stored.update({key: settings[key] for key in ("auto", "threshold", "cooldown", "action", "harden_captcha")})
+        set_lockdown_settings(chat.id, stored)
+    if cmd in ("on", "off"):
+        RAID_DETECTOR.forget(chat.id)
+    msg.reply_text(reply, parse_mode=ParseMode.MARKDOWN)
+
+
 LOCKDOWN_HANDLER = CommandHandler("lockdown", lockdown_cmd, filters=Filters.chat_type.groups, run_async=True)
 UNLOCK_HANDLER = CommandHandler("unlock", unlock_cmd, filters=Filters.chat_type.groups, run_async=True)
 LOCKSTATUS_HANDLER = CommandHandler("lockstatus", lockdown_status_cmd, filters=Filters.chat_type.groups, run_async=True)
+ANTIRAID_HANDLER = CommandHandler("antiraid", antiraid_cmd, filters=Filters.chat_type.groups, run_async=True)
+RAIDCLEAN_HANDLER = CommandHandler("raidclean", raidclean_cmd, filters=Filters.chat_type.groups, run_async=True)
 
 dispatcher.add_handler(LOCKDOWN_HANDLER)
 dispatcher.add_handler(UNLOCK_HANDLER)
 dispatcher.add_handler(LOCKSTATUS_HANDLER)
+dispatcher.add_handler(ANTIRAID_HANDLER)
+dispatcher.add_handler(RAIDCLEAN_HANDLER)
 
 
 __mod_name__ = "👋 Приветствия"
@@ -616,7 +1007,16 @@ __help__ = """
 • /unlock — выключить режим ЧС
 • /lockstatus — статус режима
 
-_При включённом режиме ЧС все новые участники автоматически банятся!_
+_При включённом режиме ЧС все новые участники автоматически банятся (или кикаются/мутятся, см. /antiraid action)!_
+
+🛡 *Защита от рейдов:*
+• /antiraid — настройки и текущая частота входов
+• /antiraid `on/off` — включать режим ЧС при рейде автоматически
+• /antiraid threshold `<N>` — рейд от N входов в минуту
+• /antiraid cooldown `<мин>` — снять режим ЧС через N минут без рейда
+• /antiraid action `<ban/kick/mute>` — что делать с вошедшими во время ЧС
+• /antiraid captcha `on/off` — сложная капча сразу после рейда
+• /raidclean `<время> [ban/kick]` — убрать всех, кто вошёл за это время и не прошёл капчу
 
 📝 *Переменные для текста:*
 • `{first}` — имя пользователя
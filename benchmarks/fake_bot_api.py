@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Фейковый Bot API для бенчмарков - отвечает как Telegram, но локально
+"""
+
+import json
+import random
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+
+BOT_ID = 100000
+BOT_USER = {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+# Права администратора (все поля, которые ждёт ChatMemberAdministrator в PTB 13)
+ADMIN_RIGHTS = {
+    "can_be_edited": False,
+    "is_anonymous": False,
+    "can_manage_chat": True,
+    "can_delete_messages": True,
+    "can_manage_voice_chats": True,
+    "can_restrict_members": True,
+    "can_promote_members": True,
+    "can_change_info": True,
+    "can_invite_users": True,
+    "can_pin_messages": True,
+}
+
+
+class FakeBotApi:
+    """
+    HTTP-сервер, изображающий api.telegram.org.
+
+    - Каждый ответ задерживается на latency + случайное [0, jitter) секунд,
+      как сетевой запрос к настоящему API.
+    - admins - ID пользователей, которые считаются админами во всех чатах
+      (бот - админ всегда).
+    - Запросы считаются по методам (calls), чтобы видеть нагрузку на API.
+    - /cas?user_id=... отвечает как CAS API «пользователь чист».
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, admins=(), listen: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.admins = set(admins)
+        self.calls = Counter()
+        self._lock = Lock()
+        self._message_ids = count(1000000)
+        self._server = ThreadingHTTPServer((listen, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """Для Bot(base_url=...): токен дописывается в конец"""
+        return f"{self.url}/bot"
+
+    @property
+    def cas_url(self) -> str:
+        return f"{self.url}/cas?user_id="
+
+    def start(self):
+        self._thread = Thread(target=self._server.serve_forever, name="fake-bot-api", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    # ───────────────────────── ответы ─────────────────────────
+
+    def _message(self, data: dict) -> dict:
+        chat_id = data.get("chat_id", 0)
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+        }
+        if "text" in data:
+            message["text"] = data["text"]
+        return message
+
+    def _member(self, user_id: int) -> dict:
+        user = {"id": user_id, "is_bot": user_id == BOT_ID, "first_name": f"User{user_id}"}
+        if user_id == BOT_ID or user_id in self.admins:
+            return {"status": "administrator", "user": user, **ADMIN_RIGHTS}
+        return {"status": "member", "user": user}
+
+    def answer(self, method: str, data: dict):
+        """Результат метода Bot API"""
+        if method == "getMe":
+            return BOT_USER
+        if method == "getChat":
+            return {"id": data.get("chat_id"), "type": "supergroup", "title": "Bench chat"}
+        if method == "getChatMember":
+            return self._member(int(data.get("user_id", 0)))
+        if method == "getChatAdministrators":
+            return [self._member(BOT_ID)] + [self._member(admin) for admin in sorted(self.admins)]
+        if method in ("getChatMemberCount", "getChatMembersCount"):
+            return 100
+        if method == "copyMessage":
+            return {"message_id": next(self._message_ids)}
+        if method.startswith("send") and method != "sendChatAction" or method.startswith("edit"):
+            return self._message(data)
+        return True
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _delay(self):
+                if api.latency or api.jitter:
+                    time.sleep(api.latency + random.random() * api.jitter)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/cas":
+                    with api._lock:
+                        api.calls["cas"] += 1
+                    self._delay()
+                    self._reply({"ok": False, "description": "Record not found."})
+                    return
+                self._handle(url.path, {key: values[0] for key, values in parse_qs(url.query).items()})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length) if length else b""
+                data = {}
+                if raw and self.headers.get("Content-Type", "").startswith("application/json"):
+                    data = json.loads(raw.decode("utf-8"))
+                self._handle(urlparse(self.path).path, data)
+
+            def _handle(self, path: str, data: dict):
+                # /bot<токен>/<метод>
+                method = path.rsplit("/", 1)[-1]
+                with api._lock:
+                    api.calls[method] += 1
+                self._delay()
+                try:
+                    self._reply({"ok": True, "result": api.answer(method, data)})
+                except Exception as e:
+                    self._reply({"ok": False, "error_code": 400, "description": f"Bad Request: {e}"})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк MitaHelper: настоящий диспетчер со всеми модулями против
+фейкового Bot API.
+
+    python -m benchmarks.run                          # все сценарии
+    python -m benchmarks.run -s join_raid -s chatter --latency 0.05
+    python -m benchmarks.run --replay updates.jsonl   # записанный поток
+    python -m benchmarks.run --compare benchmarks/results/old.json
+
+Результаты пишутся в JSON (по умолчанию benchmarks/results/<коммит>.json),
+--compare выводит разницу с прошлым прогоном.
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_bot_api import FakeBotApi  # noqa: E402
+from benchmarks.scenarios import SCENARIOS, Scenario, UpdateFactory, replay  # noqa: E402
+
+BENCH_TOKEN = "123456:BENCHMARKbenchmarkBENCHMARKbench"
+BENCH_OWNER = 1
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class TrackingQueue(Queue):
+    """
+    Очередь пула воркеров, запоминающая задачи - чтобы дождаться их всех.
+    for_queue() строит её поверх класса очереди диспетчера (LaneQueue),
+    чтобы не потерять порядок задач.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.promises = []
+
+    @classmethod
+    def for_queue(cls, queue: Queue) -> "TrackingQueue":
+        if isinstance(queue, cls) or type(queue) is Queue:
+            return cls()
+        return type(cls.__name__, (cls, type(queue)), {})()
+
+    def put(self, item, block=True, timeout=None):
+        if item is not None:
+            self.promises.append(item)
+        super().put(item, block, timeout)
+
+    def wait_all(self, timeout: float = 300):
+        deadline = time.monotonic() + timeout
+        while self.promises:
+            promise = self.promises.pop()
+            if not promise.done.wait(max(0.0, deadline - time.monotonic())):
+                raise TimeoutError("обработчики не завершились вовремя")
+
+
+class DispatcherBench:
+    """Гоняет обновления через dispatcher и замеряет обработчики"""
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.samples: List[float] = []
+        self.errors = 0
+        self._lock = Lock()
+        self._queue = TrackingQueue.for_queue(dispatcher._Dispatcher__async_queue)
+        self._thread = None
+
+    def _wrap(self, callback):
+        # wraps сохраняет пометки обработчика (например, enforcement)
+        @functools.wraps(callback)
+        def wrapper(update, context, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return callback(update, context, *args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.samples.append(elapsed)
+        return wrapper
+
+    def _instrument(self, handler):
+        from telegram.ext import ConversationHandler
+        if isinstance(handler, ConversationHandler):
+            nested = list(handler.entry_points) + list(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                nested.extend(state_handlers)
+            for nested_handler in nested:
+                self._instrument(nested_handler)
+        elif callable(getattr(handler, "callback", None)):
+            handler.callback = self._wrap(handler.callback)
+
+    def start(self):
+        for handlers in self.dispatcher.handlers.values():
+            for handler in handlers:
+                self._instrument(handler)
+        # Очередь run_async в PTB 13 приватная - подменяем до запуска воркеров
+        self.dispatcher._Dispatcher__async_queue = self._queue
+        ready = Event()
+        self._thread = Thread(target=self.dispatcher.start, kwargs={"ready": ready}, name="dispatcher", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self):
+        self.dispatcher.stop()
+
+    def process(self, updates: list):
+        """Обрабатывает обновления, как поток диспетчера, и ждёт все run_async"""
+        for update in updates:
+            self.dispatcher.process_update(update)
+        # Задачи чата попадают в пул по одной, когда закончилась предыдущая
+        executor = getattr(self.dispatcher, "executor", None)
+        while True:
+            self._queue.wait_all()
+            if executor is not None:
+                executor.wait_idle(300)
+            if not self._queue.promises:
+                break
+        # Массовые наказания (режим ЧС) отправляются в фоне
+        bulk = getattr(self.dispatcher.bot, "bulk", None)
+        if bulk is not None:
+            bulk.wait_idle(300)
+
+    def run(self, scenario: Scenario, api: FakeBotApi) -> dict:
+        from telegram import Update
+        bot = self.dispatcher.bot
+
+        if scenario.setup:
+            scenario.setup()
+        if scenario.warmup:
+            self.process([Update.de_json(data, bot) for data in scenario.warmup])
+
+        updates = [Update.de_json(data, bot) for data in scenario.updates]
+        with self._lock:
+            self.samples = []
+            self.errors = 0
+        api.reset_calls()
+
+        start = time.perf_counter()
+        self.process(updates)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            samples, errors = self.samples, self.errors
+        return {
+            "description": scenario.description,
+            "updates": len(updates),
+            "seconds": round(elapsed, 4),
+            "updates_per_sec": round(len(updates) / elapsed, 1) if elapsed else 0.0,
+            "handler_calls": len(samples),
+            "handler_errors": errors,
+            "handler_p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "handler_p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "api_calls": dict(api.calls.most_common()),
+        }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: Dict[str, dict], baseline: Dict[str, dict] = None):
+    header = f"{'сценарий':<16} {'обновл.':>8} {'обн/с':>10} {'p50 мс':>9} {'p99 мс':>9} {'API':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        line = (
+            f"{name:<16} {result['updates']:>8} {result['updates_per_sec']:>10.1f} "
+            f"{result['handler_p50_ms']:>9.2f} {result['handler_p99_ms']:>9.2f} "
+            f"{sum(result['api_calls'].values()):>7}"
+        )
+        old = (baseline or {}).get(name)
+        if old and old.get("updates_per_sec"):
+            change = (result["updates_per_sec"] / old["updates_per_sec"] - 1) * 100
+            line += f"   {change:+.1f}% обн/с, p99 {old['handler_p99_ms']:.2f} → {result['handler_p99_ms']:.2f}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк обработки обновлений MitaHelper")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="сценарий (можно несколько; по умолчанию все)")
+    parser.add_argument("--replay", action="append", default=[], help="JSONL с записанными обновлениями")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель размера сценариев")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа фейкового API, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument("--workers", type=int, default=8, help="WORKERS диспетчера")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию benchmarks/results/<коммит>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    api = FakeBotApi(args.latency, args.jitter, admins={BENCH_OWNER})
+    api.start()
+
+    # Окружение бота - до импорта MitaHelper: конфиг читается при импорте
+    data_dir = tempfile.mkdtemp(prefix="mita-bench-")
+    os.environ.update({
+        "BOT_TOKEN": BENCH_TOKEN,
+        "OWNER_ID": str(BENCH_OWNER),
+        "BOT_API_URL": api.base_url,
+        "CAS_API_URL": api.cas_url,
+        "DATABASE_URL": f"sqlite:///{os.path.join(data_dir, 'bench.db')}",
+        "WORKERS": str(args.workers),
+        # Лимиты Telegram в бенчмарке не нужны - меряем сам бот
+        "OUTBOUND_GLOBAL_RATE": "1000000",
+        "OUTBOUND_GROUP_RATE": "60000000",
+    })
+
+    # __main__ при импорте загружает все модули и регистрирует их обработчики
+    # (сам main() с polling не вызывается)
+    from MitaHelper.__main__ import IMPORTED
+    from MitaHelper import dispatcher
+    from MitaHelper.modules.database import shutdown_database
+    from MitaHelper.modules.logs import flush_logs
+
+    print(f"Модулей загружено: {len(IMPORTED)}", flush=True)
+
+    bench = DispatcherBench(dispatcher)
+    bench.start()
+
+    rng = random.Random(args.seed)
+    factory = UpdateFactory()
+    scenarios = [SCENARIOS[name](factory, args.scale, rng) for name in (args.scenario or SCENARIOS)]
+    scenarios += [replay(path) for path in args.replay]
+
+    results = {}
+    for scenario in scenarios:
+        print(f"▶ {scenario.name}: {scenario.description}", flush=True)
+        results[scenario.name] = bench.run(scenario, api)
+
+    bench.stop()
+    flush_logs()
+    shutdown_database()
+    api.stop()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "workers": args.workers,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "scale": args.scale,
+        "scenarios": results,
+    }
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("scenarios")
+
+    print()
+    print_results(results, baseline)
+    print(f"\nРезультаты: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Сценарии бенчмарков: генераторы потоков обновлений и настройка чатов
+"""
+
+import json
+import random
+import time
+from itertools import count
+from typing import Callable, Dict, List, Optional
+
+
+WORDS = (
+    "привет как дела что нового сегодня завтра погода бот чат группа "
+    "hello world test spam crypto free bonus link join channel ok да нет "
+    "спасибо пожалуйста кто где когда почему потому что играть смотреть"
+).split()
+
+
+class UpdateFactory:
+    """Собирает JSON обновлений в формате Telegram"""
+
+    def __init__(self):
+        self._update_ids = count(1)
+        self._message_ids = count(1)
+
+    @staticmethod
+    def user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    @staticmethod
+    def chat(chat_id: int) -> dict:
+        return {"id": chat_id, "type": "supergroup", "title": f"Chat {chat_id}"}
+
+    def message(self, chat_id: int, user_id: int, text: str = None, **extra) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": self.chat(chat_id),
+            "from": self.user(user_id),
+        }
+        if text is not None:
+            message["text"] = text
+        message.update(extra)
+        return {"update_id": next(self._update_ids), "message": message}
+
+    def join(self, chat_id: int, user_ids: List[int]) -> dict:
+        return self.message(
+            chat_id,
+            user_ids[0],
+            new_chat_members=[self.user(user_id) for user_id in user_ids],
+        )
+
+    def callback(self, chat_id: int, user_id: int, data: str) -> dict:
+        message = self.message(chat_id, 100000, "🤖 Капча")["message"]
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self.user(user_id),
+                "message": message,
+                "chat_instance": str(chat_id),
+                "data": data,
+            },
+        }
+
+
+def random_text(rng: random.Random, words: int = 8) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, words)))
+
+
+class Scenario:
+    """
+    Сценарий: setup() настраивает чаты, warmup - обновления до замера
+    (например, вход участников перед штормом нажатий на капчу),
+    updates - то, что замеряется.
+    """
+
+    def __init__(self, name: str, description: str, setup: Callable = None,
+                 warmup: List[dict] = None, updates: List[dict] = None):
+        self.name = name
+        self.description = description
+        self.setup = setup
+        self.warmup = warmup or []
+        self.updates = updates or []
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      СЦЕНАРИИ
+# ═══════════════════════════════════════════════════════════════
+
+def chatter(factory: UpdateFactory, scale: float, rng: random.Random) -> Scenario:
+    """Обычная переписка: 10 чатов, антифлуд и чёрный список включены"""
+    chats = [-1001000000001 - i for i in range(10)]
+    blacklist = [f"запрет{i}" for i in range(300)]
+
+    def setup():
+        from MitaHelper.modules.config_panel import set_antiflood_settings, set_blacklist_settings
+        for chat_id in chats:
+            set_antiflood_settings(chat_id, {"enabled": True, "limit": 10, "action": "mute"})
+            set_blacklist_settings(chat_id, {"enabled": True, "words": blacklist, "action": "delete"})
+
+    updates = [
+        factory.message(rng.choice(chats), rng.randint(1, 2000), random_text(rng))
+        for _ in range(int(2000 * scale))
+    ]
+    return Scenario("chatter", "10 чатов, 2000 пользователей, антифлуд + чёрный список", setup, updates=updates)
+
+
+def filter_heavy(factory: UpdateFactory, scale: float, rng: random.Random) -> Scenario:
+    """Чат с тысячей фильтров: каждое сообщение проверяется по всем"""
+    chat_id = -1001000000100
+    keywords = [f"ключ{i}" for i in range(1000)]
+
+    def setup():
+        from MitaHelper.modules.filters import save_filter
+        for keyword in keywords:
+            save_filter(chat_id, keyword, f"Ответ на {keyword}")
+
+    updates = []
+    for _ in range(int(2000 * scale)):
+        text = random_text(rng)
+        # Каждое десятое сообщение срабатывает на фильтр
+        if rng.random() < 0.1:
+            text += " " + rng.choice(keywords)
+        updates.append(factory.message(chat_id, rng.randint(1, 500), text))
+    return Scenario("filter_heavy", "1000 фильтров, 10% сообщений с ответом", setup, updates=updates)
+
+
+def _raid_setup(chat_id: int) -> Callable:
+    def setup():
+        from MitaHelper.modules.captcha import DEFAULT_SETTINGS, set_captcha_settings
+        from MitaHelper.modules.logs import set_log_channel
+        set_captcha_settings(chat_id, {**DEFAULT_SETTINGS, "enabled": True, "mode": "button"})
+        set_log_channel(chat_id, -1009999999999)
+    return setup
+
+
+def join_raid(factory: UpdateFactory, scale: float, rng: random.Random) -> Scenario:
+    """Рейд: сотни входов подряд, капча-кнопка и логи включены"""
+    chat_id = -1001000000200
+    updates = [factory.join(chat_id, [500000 + i]) for i in range(int(300 * scale))]
+    return Scenario("join_raid", "300 входов, капча + логи", _raid_setup(chat_id), updates=updates)
+
+
+def raid_lockdown(factory: UpdateFactory, scale: float, rng: random.Random) -> Scenario:
+    """Рейд при включённой защите: после порога вошедших банят пачкой, без капчи"""
+    chat_id = -1001000000400
+    raid_setup = _raid_setup(chat_id)
+
+    def setup():
+        from MitaHelper.modules.welcome import get_lockdown_settings, set_lockdown_settings
+        raid_setup()
+        set_lockdown_settings(chat_id, {**get_lockdown_settings(chat_id), "auto": True, "threshold": 30})
+
+    updates = [factory.join(chat_id, [700000 + i]) for i in range(int(500 * scale))]
+    return Scenario("raid_lockdown", "500 входов, защита от рейдов + капча", setup, updates=updates)
+
+
+def callback_storm(factory: UpdateFactory, scale: float, rng: random.Random) -> Scenario:
+    """Все участники рейда разом жмут кнопку капчи"""
+    chat_id = -1001000000300
+    user_ids = [600000 + i for i in range(int(300 * scale))]
+    warmup = [factory.join(chat_id, [user_id]) for user_id in user_ids]
+    updates = [factory.callback(chat_id, user_id, f"captcha_{user_id}_human") for user_id in user_ids]
+    rng.shuffle(updates)
+    return Scenario("callback_storm", "300 нажатий на капчу после рейда", _raid_setup(chat_id), warmup, updates)
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "chatter": chatter,
+    "filter_heavy": filter_heavy,
+    "join_raid": join_raid,
+    "raid_lockdown": raid_lockdown,
+    "callback_storm": callback_storm,
+}
+
+
+def replay(path: str, name: Optional[str] = None) -> Scenario:
+    """Записанный поток: по одному JSON обновления на строку (как присылает Telegram)"""
+    with open(path, "r", encoding="utf-8") as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+    return Scenario(name or f"replay:{path}", f"{len(updates)} обновлений из {path}", updates=updates)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Общая настройка тестов: окружение бота задаётся до импорта MitaHelper
+(конфиг читается при импорте), данные - во временной папке.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DATA_DIR = tempfile.mkdtemp(prefix="mita-tests-")
+
+os.environ.update({
+    "BOT_TOKEN": "123456:TESTtestTESTtestTESTtestTESTtest",
+    "OWNER_ID": "1",
+    # Bot API недоступен: getMe при импорте сразу падает, тестам он не нужен
+    "BOT_API_URL": "http://127.0.0.1:9/bot",
+    "DATABASE_URL": f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}",
+    "WEBHOOK": "",
+})
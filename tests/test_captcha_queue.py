@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Очередь незавершённых капч
+"""
+
+from MitaHelper.modules.helper_funcs.captcha_queue import PendingCaptchas
+
+
+def test_snapshot_is_a_copy():
+    pending = PendingCaptchas(shards=4)
+    pending.add(-100, 1, {"answer": "a", "deadline": 10})
+    pending.add(-100, 2, {"answer": "b", "deadline": 20})
+    pending.add(-200, 3, {"answer": "c", "deadline": 30})
+
+    snapshot = pending.snapshot()
+    assert snapshot == {
+        -100: {1: {"answer": "a", "deadline": 10}, 2: {"answer": "b", "deadline": 20}},
+        -200: {3: {"answer": "c", "deadline": 30}},
+    }
+
+    pending.pop(-100, 1)
+    pending.add(-200, 4, {"answer": "d", "deadline": 40})
+    assert set(snapshot[-100]) == {1, 2}
+    assert set(snapshot[-200]) == {3}
+
+
+def test_snapshot_of_chats():
+    pending = PendingCaptchas(shards=4)
+    pending.add(-100, 1, {"answer": "a", "deadline": 10})
+    pending.add(-200, 3, {"answer": "c", "deadline": 30})
+
+    # Чат без капч в снимок не попадает (в SQLite его строки удалятся)
+    assert pending.snapshot([-200, -300]) == {-200: {3: {"answer": "c", "deadline": 30}}}
+
+
+def test_pop_expired():
+    pending = PendingCaptchas(shards=4)
+    pending.add(-100, 1, {"answer": "a", "deadline": 10})
+    pending.add(-100, 2, {"answer": "b", "deadline": 20})
+    pending.add(-200, 3, {"answer": "c", "deadline": 30})
+    # Решённая капча из кучи не удаляется, но и не возвращается
+    pending.pop(-100, 2)
+
+    assert pending.pop_expired(now=25) == {-100: [(1, {"answer": "a", "deadline": 10})]}
+    assert len(pending) == 1
+    assert pending.pop_expired(now=25) == {}
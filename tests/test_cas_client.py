@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+CasClient против локальной заглушки CAS API (http.server)
+"""
+
+import json
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from MitaHelper.modules.helper_funcs.cas_client import CasClient
+
+
+SPAM_RESULT = {"offenses": 3, "messages": ["spam"], "time_added": "2024-01-01T00:00:00.000Z"}
+
+
+class CasStub:
+    """
+    Заглушка CAS API: /check?user_id=N.
+    spammers - ID в базе, errors - ID, на которые отвечаем 500,
+    delays - задержка ответа по ID; hits - сколько раз спрашивали каждый ID.
+    """
+
+    def __init__(self):
+        self.spammers = set()
+        self.errors = set()
+        self.delays = {}
+        self.hits = Counter()
+        self._lock = Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                user_id = int(parse_qs(url.query)["user_id"][0])
+                with stub._lock:
+                    stub.hits[user_id] += 1
+                time.sleep(stub.delays.get(user_id, 0))
+                if user_id in stub.errors:
+                    self.send_error(500)
+                    return
+                if user_id in stub.spammers:
+                    payload = {"ok": True, "result": SPAM_RESULT}
+                else:
+                    payload = {"ok": False, "description": "Record not found."}
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/check?user_id="
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = CasStub()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_client(stub):
+    clients = []
+
+    def make(**kwargs):
+        client = CasClient(stub.url, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client._executor.shutdown(wait=False)
+
+
+def test_positive_result_is_cached(stub, make_client):
+    stub.spammers.add(100)
+    client = make_client()
+
+    assert client.check(100) == SPAM_RESULT
+    assert client.check(100) == SPAM_RESULT
+    assert stub.hits[100] == 1
+
+
+def test_negative_result_is_cached(stub, make_client):
+    client = make_client()
+
+    assert client.check(200) is None
+    assert client.check(200) is None
+    assert stub.hits[200] == 1
+
+
+def test_positive_and_negative_ttl_are_separate(stub, make_client):
+    stub.spammers.add(100)
+    client = make_client(positive_ttl=60, negative_ttl=0.3)
+
+    client.check_many([100, 200])
+    time.sleep(0.4)
+    client.check_many([100, 200])
+
+    # Чистый истёк и спрошен заново, спамер ещё в кеше
+    assert stub.hits[100] == 1
+    assert stub.hits[200] == 2
+
+
+def test_inflight_lookups_are_deduplicated(stub, make_client):
+    stub.spammers.add(300)
+    stub.delays[300] = 0.3
+    client = make_client()
+
+    futures = []
+    threads = [Thread(target=lambda: futures.append(client.lookup(300))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [future.result(timeout=5) for future in futures] == [SPAM_RESULT] * 10
+    assert stub.hits[300] == 1
+
+
+def test_check_many_is_bounded_by_one_timeout(stub, make_client):
+    slow = list(range(400, 410))
+    for user_id in slow:
+        stub.delays[user_id] = 3
+    client = make_client(timeout=0.5, max_workers=2)
+
+    start = time.monotonic()
+    results = client.check_many(slow)
+    elapsed = time.monotonic() - start
+
+    # Не сумма таймаутов по 10 пользователям, а один (+1 с на ожидание)
+    assert elapsed < 0.5 + 1 + 0.5
+    assert results == {user_id: None for user_id in slow}
+
+
+def test_errors_are_not_cached(stub, make_client):
+    stub.errors.add(666)
+    client = make_client()
+
+    assert client.check(666) is None
+
+    stub.errors.discard(666)
+    stub.spammers.add(666)
+    assert client.check(666) == SPAM_RESULT
+    assert stub.hits[666] == 2
+
+
+def test_export_lookup(stub, make_client, tmp_path):
+    export = tmp_path / "export.csv"
+    export.write_text(
+        "user_id,offenses,time_added\n"
+        "500,1,2024-01-01\n"
+        "300,2,2024-01-02\n"
+        "not-a-number,1,2024-01-03\n"
+        "\n"
+        "500,1,2024-01-04\n",
+        encoding="utf-8",
+    )
+    client = make_client()
+
+    assert client.load_export(str(export)) == 2
+    assert client.offline
+    assert client._in_export(300)
+    assert client._in_export(500)
+    assert not client._in_export(400)
+    assert not client._in_export(0)
+    assert not client._in_export(10 ** 12)
+
+    # В офлайн-режиме API не спрашивается
+    assert client.check(500) == {"offline": True}
+    assert client.check(400) is None
+    assert sum(stub.hits.values()) == 0
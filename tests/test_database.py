@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Отложенная запись database.py
+"""
+
+import os
+
+from MitaHelper.modules import database
+
+
+def test_module_settings_are_snapshotted_on_save():
+    filepath = os.path.join(database.DB_PATH, "test_snapshot.json")
+    data = {-100: {"enabled": True}}
+
+    database.save_module_settings(filepath, data)
+    # Изменения без сохранения не должны попасть в очередь записи
+    data[-200] = {"enabled": False}
+    data[-100]["enabled"] = False
+
+    assert database.load_module_settings(filepath) == {-100: {"enabled": True}}
+    database.flush_database()
+    assert database.load_module_settings(filepath) == {-100: {"enabled": True}}
+
+
+def test_username_index_follows_username_changes():
+    database.ensure_user(5001, "Old_Name", "Тест")
+    assert database.get_user_by_username("@old_name") == 5001
+
+    database.ensure_user(5001, "new_name", "Тест")
+    assert database.get_user_by_username("old_name") is None
+    assert database.get_user_by_username("NEW_NAME") == 5001
+
+    # Username убран - поиск по старому больше не находит пользователя
+    database.ensure_user(5001, None, "Тест")
+    assert database.get_user_by_username("new_name") is None
+    assert "username" not in database.get_user(5001)
+
+    # Освободившийся username занял другой
+    database.ensure_user(5002, "new_name", "Другой")
+    assert database.get_user_by_username("new_name") == 5002
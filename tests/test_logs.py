@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Записи в канал логов
+"""
+
+from MitaHelper.modules import logs
+
+
+def test_captcha_timeouts_are_logged_once(monkeypatch):
+    sent = []
+    monkeypatch.setattr(logs, "send_log", lambda bot, chat_id, event, text, **kwargs: sent.append((chat_id, event, text)))
+    user_ids = list(range(1, logs.CAPTCHA_TIMEOUT_SHOWN + 6))
+
+    logs.log_captcha_timeouts(None, -100, user_ids, kicked=True)
+
+    assert len(sent) == 1
+    chat_id, event, text = sent[0]
+    assert (chat_id, event) == (-100, "captcha_fail")
+    assert f"*{len(user_ids)}*" in text
+    assert f"`{logs.CAPTCHA_TIMEOUT_SHOWN}`" in text
+    assert f"`{logs.CAPTCHA_TIMEOUT_SHOWN + 1}`" not in text
+    assert "и ещё 5" in text
+    assert "Удалены" in text
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Маски этапов конвейера
+"""
+
+import pytest
+from telegram import Chat
+
+from MitaHelper.modules.helper_funcs import pipeline
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Пустой конвейер на время теста"""
+    for name, value in (("_stages", []), ("_chat_masks", {}), ("_plans", {}),
+                        ("_open_mask", 0), ("_open_checked", ())):
+        monkeypatch.setattr(pipeline, name, value)
+    calls = []
+
+    def enabled(chat_id):
+        calls.append(chat_id)
+        return chat_id == -100
+
+    group_stage = pipeline.register_stage("group", lambda *args: None, order=10, enabled=enabled)
+    open_stage = pipeline.register_stage("open", lambda *args: None, order=20, groups_only=False)
+    return group_stage, open_stage, calls
+
+
+def test_group_mask_is_cached_until_invalidated(stages):
+    group_stage, open_stage, calls = stages
+    chat = Chat(-100, Chat.SUPERGROUP)
+
+    assert pipeline.get_chat_mask(chat) == group_stage.bit | open_stage.bit
+    assert pipeline.get_chat_mask(chat) == group_stage.bit | open_stage.bit
+    assert calls == [-100]
+
+    pipeline.invalidate_chat_features(-100)
+    pipeline.get_chat_mask(chat)
+    assert calls == [-100, -100]
+
+
+def test_private_chats_skip_group_stages(stages):
+    group_stage, open_stage, calls = stages
+
+    assert pipeline.get_chat_mask(Chat(42, Chat.PRIVATE)) == open_stage.bit
+    assert pipeline.get_chat_mask(Chat(-1001, Chat.CHANNEL)) == open_stage.bit
+    assert calls == []
+    assert pipeline.enabled_stages(Chat(42, Chat.PRIVATE)) == ["open"]
+
+
+def test_private_stage_with_predicate(stages):
+    _, open_stage, _ = stages
+    checked = pipeline.register_stage(
+        "checked", lambda *args: None, order=30, enabled=lambda chat_id: chat_id == 42, groups_only=False
+    )
+
+    assert pipeline.get_chat_mask(Chat(42, Chat.PRIVATE)) == open_stage.bit | checked.bit
+    assert pipeline.get_chat_mask(Chat(43, Chat.PRIVATE)) == open_stage.bit
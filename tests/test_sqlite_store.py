@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Импорт data/*.json в SQLiteStore
+"""
+
+import json
+
+import pytest
+
+from MitaHelper.modules.sql.sqlite_store import SQLiteStore
+
+
+def _write(directory, name, text):
+    (directory / name).write_text(text, encoding="utf-8")
+
+
+def test_import_marks_done_only_when_all_files_imported(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write(data_dir, "chats.json", json.dumps({"-100": {"title": "чат", "added_by": 1}}))
+    _write(data_dir, "rules.json", "{broken")
+    store = SQLiteStore(str(tmp_path / "bot.db"))
+
+    with pytest.raises(RuntimeError, match="rules.json"):
+        store.import_json_dir(str(data_dir))
+    assert store._meta("json_imported") is None
+    assert store.load(str(data_dir / "chats.json")) == {"-100": {"title": "чат", "added_by": 1}}
+
+    # Файл исправили: переносится только он, уже перенесённые не трогаем
+    _write(data_dir, "chats.json", json.dumps({}))
+    _write(data_dir, "rules.json", json.dumps({"-100": {"text": "правила"}}))
+    assert store.import_json_dir(str(data_dir)) == ["rules.json"]
+    assert store._meta("json_imported") == "rules.json"
+    assert store.load(str(data_dir / "chats.json")) == {"-100": {"title": "чат", "added_by": 1}}
+    assert store.load(str(data_dir / "rules.json")) == {"-100": {"text": "правила"}}
+
+    # После отметки импорт больше не выполняется
+    assert store.import_json_dir(str(data_dir)) == []
+    store.close()
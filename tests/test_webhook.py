@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Сервер вебхука и сбор allowed_updates по обработчикам
+"""
+
+import json
+import os
+from http.client import HTTPConnection
+from queue import Empty, Queue
+from threading import Thread
+
+import pytest
+from telegram import Bot
+from telegram.ext import (
+    CallbackQueryHandler,
+    CommandHandler,
+    ConversationHandler,
+    Dispatcher,
+    Filters,
+    MessageHandler,
+)
+
+from MitaHelper.modules.helper_funcs.webhook import (
+    MAX_BODY_SIZE,
+    SECRET_HEADER,
+    WebhookServer,
+    collect_allowed_updates,
+    is_loopback,
+    start_webhook,
+)
+
+
+SECRET = "s3cr3t"
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 0,
+        "chat": {"id": -100, "type": "supergroup", "title": "test"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "привет",
+    },
+}
+
+
+@pytest.fixture
+def server():
+    bot = Bot(os.environ["BOT_TOKEN"])
+    webhook = WebhookServer("127.0.0.1", 0, "/hook", bot, Queue(), SECRET)
+    Thread(target=webhook.serve_forever, daemon=True).start()
+    yield webhook
+    webhook.shutdown()
+    webhook.server_close()
+
+
+def post(server, path="/hook", body=None, secret=SECRET, headers=None) -> int:
+    """POST на сервер вебхука, возвращает код ответа"""
+    body = json.dumps(UPDATE).encode("utf-8") if body is None else body
+    all_headers = {"Content-Type": "application/json"}
+    if secret is not None:
+        all_headers[SECRET_HEADER] = secret
+    all_headers.update(headers or {})
+    connection = HTTPConnection(*server.server_address[:2], timeout=5)
+    try:
+        connection.request("POST", path, body=body, headers=all_headers)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_valid_update_is_queued(server):
+    assert post(server) == 200
+
+    update = server.update_queue.get(timeout=5)
+    assert update.update_id == 1
+    assert update.effective_message.text == "привет"
+    assert update.effective_user.id == 42
+
+
+def test_wrong_path(server):
+    assert post(server, path="/other") == 404
+    assert server.update_queue.empty()
+
+
+@pytest.mark.parametrize("secret", [None, "", "wrong"])
+def test_bad_secret(server, secret):
+    assert post(server, secret=secret) == 403
+    assert server.update_queue.empty()
+
+
+def test_oversized_body(server):
+    # Тело не отправляем: сервер должен отказать по одному Content-Length
+    headers = {"Content-Length": str(MAX_BODY_SIZE + 1)}
+    assert post(server, body=b"", headers=headers) == 413
+    assert server.update_queue.empty()
+
+
+def test_broken_json(server):
+    assert post(server, body=b"{not json") == 400
+    with pytest.raises(Empty):
+        server.update_queue.get(timeout=0.1)
+
+
+def test_open_webhook_only_on_loopback():
+    assert is_loopback("127.0.0.1")
+    assert is_loopback("::1")
+    assert is_loopback("localhost")
+    assert not is_loopback("0.0.0.0")
+    assert not is_loopback("example.com")
+
+    # Проверка до запуска чего-либо: updater не нужен
+    with pytest.raises(ValueError):
+        start_webhook(None, listen="0.0.0.0")
+
+
+def _dispatcher(*handlers) -> Dispatcher:
+    dispatcher = Dispatcher(Bot(os.environ["BOT_TOKEN"]), Queue(), workers=1)
+    for group, handler in enumerate(handlers):
+        dispatcher.add_handler(handler, group=group)
+    return dispatcher
+
+
+def _noop(update, context):
+    pass
+
+
+@pytest.mark.filterwarnings("ignore:If 'per_message=False'")
+def test_allowed_updates_from_handlers():
+    conversation = ConversationHandler(
+        entry_points=[CommandHandler("start", _noop)],
+        states={0: [CallbackQueryHandler(_noop)]},
+        fallbacks=[MessageHandler(Filters.update.edited_message & Filters.text, _noop)],
+    )
+    dispatcher = _dispatcher(
+        MessageHandler(Filters.update.message & Filters.text, _noop),
+        MessageHandler(Filters.update.channel_posts, _noop),
+        conversation,
+    )
+
+    assert collect_allowed_updates(dispatcher) == [
+        "message", "edited_message", "channel_post", "edited_channel_post", "callback_query",
+    ]
+
+
+def test_allowed_updates_narrow_filters():
+    dispatcher = _dispatcher(
+        MessageHandler(Filters.update.message & ~Filters.update.edited_message, _noop),
+        CallbackQueryHandler(_noop),
+    )
+
+    assert collect_allowed_updates(dispatcher) == ["message", "callback_query"]
+
+
+def test_allowed_updates_inverted_filter():
+    dispatcher = _dispatcher(MessageHandler(~Filters.update.channel_posts, _noop))
+
+    assert collect_allowed_updates(dispatcher) == ["message", "edited_message"]